@@ -34,7 +34,10 @@ functions to easily create several wrapper objects with common settings. Some
 control functions are also provided, for example, to check the status of
 connections during a siege, but in general the global functions only cover
 creating and deleting the wrappers, and once created any specific action should
-be executed on the wrapper objects themselves.
+be executed on the wrapper objects themselves. Nevertheless, an action can be
+executed on several wrappers at once (for example, to mute all the virtual
+participants at the same time) with:
+>>>> broadcast(virtualParticipants, 'setAudioEnabled', False)
 
 The values set using the global functions are not taken into account if a
 Talkbuchet wrapper is manually created; they only affect the wrappers created
@@ -42,15 +45,50 @@ using the global functions. Moreover, existing Talkbuchet wrappers
 already created by the global helper functions are not affected either, only
 those created after the value was changed.
 
+During long runs the state of the connections of all the wrappers (connection
+states and failures, handshake timings, sent and received bytes...) can be
+scraped by Prometheus (or any other OpenMetrics compatible scraper) from a local
+HTTP endpoint started with:
+>>>> startMetricsServer(THE-PORT)
+
+A single client system is likely to be saturated before the server, so the CPU,
+memory, threads and file descriptors used by the browsers and the CLI, as well
+as the network throughput and "/dev/shm" usage, can be sampled, and the run
+flagged as client bound if they are too high, with:
+>>>> startResourceMonitor()
+
 By default the browser instances will be launched in the local Selenium server.
 A remote server can be used instead with:
 >>>> setRemoteSeleniumUrl(THE-SELENIUM-SERVER-URL)
 
+If a single Selenium server is not able to run all the needed browsers they can
+be distributed between several remote Selenium servers, each one with its own
+maximum number of browsers, with:
+>>>> addRemoteSeleniumServer(THE-SELENIUM-SERVER-URL, CAPACITY)
+
 Independently of the server used, by default the browser will be launched in
 headless mode. If the browser needs to be interacted with this can be disabled
 with:
 >>>> setHeadless(False)
 
+Browser logs are kept in memory until printed, but only the last logs of each
+browser, and repetitions of the same log are counted rather than kept. The
+number of logs kept and the least severe level kept can be set with
+"setLogsBuffering()", and the logs can be additionally written to compressed,
+rotated files (which can be searched later) with:
+>>>> setLogsDirectory(THE-DIRECTORY)
+
+Launching a browser takes several seconds, so when wrappers are repeatedly added
+and removed (for example, on each iteration of a test) it is possible to keep
+the browsers of removed wrappers warm and reuse them for new wrappers with:
+>>>> setBrowserPoolSize(NUMBER-OF-IDLE-BROWSERS)
+
+Loading Talkbuchet in a new browser can be also made faster by opening a
+lightweight page of the Nextcloud instance instead of the web UI, reading
+Talkbuchet.js just once and sharing the capabilities of the Nextcloud instance
+between all the browsers with:
+>>>> setFastBootstrap(True)
+
 Talkbuchet-cli.py supports launching Chrome and Firefox instances. Nevertheless,
 note that the browser to be used also needs to be supported by the Selenium
 server. When Talkbuchet-cli.py was started through Talkbuchet-run.sh and a
@@ -99,24 +137,595 @@ simulated with them in the system running the test is much higher.
 
 Unlike the other modes, the real participant mode does not require an HPB server
 to be configured in Nextcloud Talk.
+
+The cost of the Talk web UI (and of Talkbuchet) in the browser, like the time
+spent running tasks, layouts or the JavaScript heap used, can be periodically
+sampled in Chrome with:
+>>>> startPerformanceMetricsCollector()
+
+Load tests can be also described in a scenario file, with the settings and a
+timeline of the actions to perform, and replayed exactly with:
+>>>> runScenario(THE-SCENARIO-FILE, THE-OUTPUT-DIRECTORY)
+or, without the interactive mode, with:
+python3 Talkbuchet-cli.py --scenario THE-SCENARIO-FILE --output THE-OUTPUT-DIRECTORY
+
+A standard benchmark suite (sieges of fixed sizes, a virtual participant ramp
+and churn of virtual participants) can be run to compare different Talk or HPB
+versions, and the results of two runs can be compared to find regressions,
+with:
+>>>> runBenchmarks(THE-RESULTS-FILE)
+>>>> compareBenchmarks(THE-BASELINE-RESULTS-FILE, THE-RESULTS-FILE)
+
+Finally, the signaling benchmark mode, which can be activated with
+"switchToSignalingBenchmarkMode()", measures the throughput and latency of the
+message relay of the signaling server without using any browser, so the scaling
+of the signaling server can be tested independently of Janus.
 """
 
+import argparse
+import array
+import asyncio
 import atexit
+import base64
+import collections
+import fractions
+import gzip
+import hashlib
+import http.cookiejar
+import inspect
 import json
+import math
+import os
+import random
+import re
+import resource
+import ssl
+import struct
+import sys
 import threading
+import urllib.error
+import urllib.parse
+import urllib.request
+import weakref
 import websocket
 
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from http.server import BaseHTTPRequestHandler
+from http.server import HTTPServer
 from pathlib import Path
 from selenium import webdriver
+from selenium.common.exceptions import JavascriptException
 from selenium.common.exceptions import NoSuchElementException
 from selenium.common.exceptions import TimeoutException
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.wait import WebDriverWait
+from shutil import copyfileobj
 from shutil import disk_usage
+from time import monotonic
+from time import perf_counter
 from time import sleep
 
 
+# Prefix of the console messages with the structured events emitted by
+# Talkbuchet.js.
+_eventMarker = '@talkbuchet-event '
+
+
+class EventLog:
+    """
+    Central log of the structured events emitted by Talkbuchet.
+
+    Talkbuchet.js emits events when the ICE connection state of a publisher or
+    subscriber changes ("iceConnectionStateChange"), when a connection could
+    not be established ("connectionError") and when a disconnection was not
+    restored in time ("disconnectWarning"). The events are received in real
+    time from the logs of the browsers (and browserless sieges add their events
+    directly), so the state of the connections can be followed without polling
+    them.
+
+    Each event is a dict with at least "type", "time" (in milliseconds since
+    the epoch, as set when the event was emitted) and "source" (the browser
+    session, and window if the browser is shared, that emitted it). Connection
+    events also have "role" ("publisher" or "subscriber"), "sessionId" and,
+    for subscribers, "signalingIndex"; state changes have "state" too.
+
+    Only the last "maxLength" events are kept, but the counters include all the
+    events since the log was cleared. Events are counted by type, by type and
+    role, and by type, role and state (for example,
+    "iceConnectionStateChange subscriber failed").
+    """
+
+    def __init__(self, maxLength = 100000):
+        """
+        :param maxLength: the maximum number of events to keep.
+        """
+
+        self.events = collections.deque(maxlen=maxLength)
+        self.counters = {}
+        self.listeners = []
+        self.lock = threading.Lock()
+
+    def addEvent(self, event, source = None):
+        """
+        Adds an event to the log.
+
+        :param event: the event, a dict with at least "type".
+        :param source: the source of the event, if any.
+        """
+
+        event = dict(event)
+        event.setdefault('time', datetime.now().timestamp() * 1000)
+        event['source'] = source
+
+        counterKeys = [event['type']]
+        if 'role' in event:
+            counterKeys.append(event['type'] + ' ' + event['role'])
+            if 'state' in event:
+                counterKeys.append(event['type'] + ' ' + event['role'] + ' ' + event['state'])
+
+        with self.lock:
+            self.events.append(event)
+
+            for counterKey in counterKeys:
+                self.counters[counterKey] = self.counters.get(counterKey, 0) + 1
+
+            listeners = list(self.listeners)
+
+        for listener in listeners:
+            listener(event)
+
+    def addListener(self, listener):
+        """
+        Adds a function to be called with each new event.
+
+        Listeners are called from the thread that received the event, so they
+        should return quickly.
+
+        :param listener: the function to call.
+        """
+
+        with self.lock:
+            self.listeners.append(listener)
+
+    def removeListener(self, listener):
+        """
+        Removes a previously added listener.
+
+        :param listener: the function to remove.
+        """
+
+        with self.lock:
+            if listener in self.listeners:
+                self.listeners.remove(listener)
+
+    def getEvents(self, type = None, since = None):
+        """
+        Returns the kept events.
+
+        :param type: the type of the events to return, or None for all types.
+        :param since: only events emitted after this time (in milliseconds
+            since the epoch) are returned, if given.
+        :return: a list with the events.
+        """
+
+        with self.lock:
+            events = list(self.events)
+
+        return [event for event in events if (type == None or event['type'] == type) and (since == None or event['time'] > since)]
+
+    def getCounters(self):
+        """
+        Returns a copy of the counters.
+        """
+
+        with self.lock:
+            return dict(self.counters)
+
+    def printCounters(self):
+        """
+        Prints the counters.
+        """
+
+        for counterKey, count in sorted(self.getCounters().items()):
+            print(counterKey + ': ' + str(count))
+
+    def printEvents(self, type = None, since = None):
+        """
+        Prints the kept events.
+
+        See :py:meth:`getEvents`.
+        """
+
+        for event in self.getEvents(type, since):
+            details = {key: value for key, value in event.items() if key not in ['type', 'time', 'source']}
+
+            print(datetime.fromtimestamp(event['time'] / 1000).strftime('%H:%M:%S.%f')[:-3] + ' ' + event['type'] + ' ' + json.dumps(details))
+
+    def clear(self):
+        """
+        Removes all the events and resets the counters.
+        """
+
+        with self.lock:
+            self.events.clear()
+            self.counters = {}
+
+# Log of the events of all the Talkbuchet instances.
+eventLog = EventLog()
+
+
+def _parseEvent(text):
+    """
+    Returns the event in the given log text, or None if it is not an event.
+    """
+
+    if not text.startswith(_eventMarker):
+        return None
+
+    try:
+        return json.loads(text[len(_eventMarker):])
+    except ValueError:
+        return None
+
+
+# Prefix of the console messages logged after a command to know when all its
+# logs were received.
+_flushMarker = '@talkbuchet-flush '
+
+
+# Levels of the browser logs, from the least to the most severe.
+_logLevels = ['debug', 'info', 'log', 'warn', 'error']
+
+# Session IDs, tokens and numbers (like the index of a connection) are ignored
+# when looking for repetitions of a log.
+_logVariablePartsPattern = re.compile(r'[A-Za-z0-9+/=_|-]{16,}|[0-9]+')
+
+def _getConsoleFilterScript(minimumLevel):
+    """
+    Returns a script that makes the console methods less severe than the given
+    level discard the logs in the browser itself, so they are not even sent to
+    the CLI.
+
+    The events and flushes of Talkbuchet, which are logged with "console.debug",
+    are never discarded.
+
+    :param minimumLevel: the least severe level of the logs to keep, or None to
+        keep all.
+    """
+
+    if not minimumLevel:
+        return ''
+
+    return '''
+        for (const level of ''' + json.dumps(_logLevels[:_logLevels.index(minimumLevel)]) + ''') {
+            const log = console[level]
+
+            console[level] = function(...args) {
+                if (typeof args[0] === 'string' && ''' + json.dumps([_eventMarker, _flushMarker]) + '''.some(marker => args[0].startsWith(marker))) {
+                    log.apply(console, args)
+                }
+            }
+        }
+    '''
+
+
+class LogBuffer:
+    """
+    Bounded buffer for the browser logs not printed yet.
+
+    Only the last "maxLength" logs are kept in memory; when the buffer is full
+    the oldest logs are dropped, and the number of dropped logs is printed
+    before the rest. Logs less severe than "minimumLevel" are ignored as soon as
+    they are received (the console logs of Talkbuchet are already discarded in
+    the browser; see "setLogsBuffering()").
+
+    A log repeated within "repeatInterval" seconds since it was first received
+    is suppressed. Logs with the same level and the same text once session IDs,
+    tokens and numbers are ignored are considered repetitions, so the same
+    warning emitted by hundreds of connections (like "Subscriber disconnected"
+    followed by a different session ID) is kept just once. Once the interval
+    ends, or when the logs are printed, the last repetition is added with the
+    number of repetitions suppressed.
+
+    If a file is given the logs are also written to it, including those printed
+    in real time, so they can be searched with "searchLogs()" even after being
+    printed. The file is rotated when it reaches "maxFileSize" bytes; rotated
+    files are compressed with gzip, and only the last "backupCount" rotated
+    files are kept.
+    """
+
+    def __init__(self, maxLength = 10000, minimumLevel = None, repeatInterval = 10, file = None, maxFileSize = 10485760, backupCount = 5):
+        """
+        :param maxLength: the maximum number of logs to keep in memory.
+        :param minimumLevel: the least severe level of the logs to keep (one of
+            "debug", "info", "log", "warn" or "error"), or None to keep all.
+        :param repeatInterval: the seconds during which repetitions of a log
+            are suppressed, or 0 to keep every repetition.
+        :param file: the path of the file to write the logs to, if any.
+        :param maxFileSize: the size in bytes at which the file is rotated.
+        :param backupCount: the number of rotated files to keep.
+        """
+
+        if minimumLevel != None and minimumLevel not in _logLevels:
+            raise Exception('Invalid log level: ' + str(minimumLevel))
+
+        self.minimumLevel = minimumLevel
+        self.repeatInterval = repeatInterval
+
+        self.logs = collections.deque(maxlen=maxLength)
+        self.droppedCount = 0
+
+        # Logs received in their repeat interval, in the order in which the
+        # intervals started, with the start of the interval, the number of
+        # suppressed repetitions and the last suppressed repetition.
+        self.repeatedLogs = collections.OrderedDict()
+
+        self.lock = threading.Lock()
+
+        self.file = file
+        self.maxFileSize = maxFileSize
+        self.backupCount = backupCount
+        self.fileObject = None
+
+        if file:
+            self.fileObject = open(file, 'a')
+
+    def close(self):
+        """
+        Closes the file, if any.
+
+        Logs added after closing the buffer are no longer written to the file.
+        """
+
+        with self.lock:
+            if self.fileObject:
+                self.fileObject.close()
+
+            self.fileObject = None
+
+    def addLog(self, level, text, message, realtime = False):
+        """
+        Adds a log.
+
+        :param level: the level of the log; logs with a level not known are
+            never ignored.
+        :param text: the text of the log, used (ignoring session IDs, tokens
+            and numbers) to find repetitions.
+        :param message: the log as it will be printed.
+        :param realtime: True to print the log now instead of keeping it.
+        """
+
+        if self.minimumLevel and level in _logLevels and _logLevels.index(level) < _logLevels.index(self.minimumLevel):
+            return
+
+        now = monotonic()
+        key = level + ' ' + _logVariablePartsPattern.sub('#', text)
+
+        with self.lock:
+            messages = self.__endRepeatIntervals(now)
+
+            if key in self.repeatedLogs:
+                self.repeatedLogs[key][1] += 1
+                self.repeatedLogs[key][2] = message
+            else:
+                if self.repeatInterval > 0:
+                    self.repeatedLogs[key] = [now, 0, None]
+
+                messages.append(message)
+
+            self.__addMessages(messages, realtime)
+
+    def __endRepeatIntervals(self, now = None):
+        """
+        Ends the repeat intervals that expired, or all of them if no time is
+        given, and returns the logs with the suppressed repetitions.
+        """
+
+        messages = []
+
+        while self.repeatedLogs:
+            key, (start, repeatedCount, lastMessage) = next(iter(self.repeatedLogs.items()))
+            if now != None and now - start < self.repeatInterval:
+                break
+
+            del self.repeatedLogs[key]
+
+            if repeatedCount:
+                messages.append(lastMessage + ' [repeated ' + str(repeatedCount) + ' times]')
+
+        return messages
+
+    def __addMessages(self, messages, realtime):
+        for message in messages:
+            self.__writeToFile(message)
+
+            if realtime:
+                print(message)
+                continue
+
+            if len(self.logs) == self.logs.maxlen:
+                self.droppedCount += 1
+
+            self.logs.append(message)
+
+    def __writeToFile(self, message):
+        if not self.fileObject:
+            return
+
+        self.fileObject.write(message + '\n')
+
+        if self.fileObject.tell() >= self.maxFileSize:
+            self.__rotateFile()
+
+    def __rotateFile(self):
+        self.fileObject.close()
+
+        for index in range(self.backupCount - 1, 0, -1):
+            if os.path.exists(self.file + '.' + str(index) + '.gz'):
+                os.replace(self.file + '.' + str(index) + '.gz', self.file + '.' + str(index + 1) + '.gz')
+
+        if self.backupCount > 0:
+            with open(self.file, 'rb') as source, gzip.open(self.file + '.1.gz', 'wb') as destination:
+                copyfileobj(source, destination)
+
+        self.fileObject = open(self.file, 'w')
+
+    def clearLogs(self):
+        """
+        Clears, without printing, the logs kept in memory.
+
+        The logs written to the file are not affected.
+        """
+
+        with self.lock:
+            self.__endRepeatIntervals()
+
+            self.logs.clear()
+            self.droppedCount = 0
+
+    def printLogs(self):
+        """
+        Prints the logs kept in memory, including the repetitions suppressed so
+        far.
+
+        The logs are cleared after printing them.
+        """
+
+        with self.lock:
+            self.__addMessages(self.__endRepeatIntervals(), False)
+
+            if self.droppedCount:
+                print('(' + str(self.droppedCount) + ' older logs were dropped)')
+
+            for log in self.logs:
+                print(log)
+
+            self.logs.clear()
+            self.droppedCount = 0
+
+            if self.fileObject:
+                self.fileObject.flush()
+
+    def searchLogs(self, pattern):
+        """
+        Returns the logs that match the given regular expression.
+
+        If the logs are written to a file the file and the rotated files are
+        searched, so logs already printed are returned too. Otherwise only the
+        logs kept in memory are searched.
+
+        :param pattern: the regular expression to search for.
+        :return: a list with the matching logs, from oldest to newest.
+        """
+
+        regex = re.compile(pattern)
+
+        with self.lock:
+            if not self.fileObject:
+                return [log for log in self.logs if regex.search(log)]
+
+            self.fileObject.flush()
+
+        matchingLogs = []
+
+        files = [self.file + '.' + str(index) + '.gz' for index in range(self.backupCount, 0, -1)] + [self.file]
+        for file in files:
+            try:
+                with (gzip.open(file, 'rt') if file.endswith('.gz') else open(file)) as fileObject:
+                    matchingLogs += [line.rstrip('\n') for line in fileObject if regex.search(line)]
+            except FileNotFoundError:
+                # Not rotated yet, or rotated while searching.
+                pass
+
+        return matchingLogs
+
+
+def _serializeBiDiValue(value):
+    """
+    Returns the given value as a BiDi local value, to be passed as an argument
+    to a script.
+
+    :param value: None, a bool, a number, a string, or a list or dict of them.
+    :return: the BiDi local value.
+    """
+
+    if value is None:
+        return {'type': 'null'}
+
+    if isinstance(value, bool):
+        return {'type': 'boolean', 'value': value}
+
+    if isinstance(value, (int, float)):
+        if math.isnan(value):
+            return {'type': 'number', 'value': 'NaN'}
+
+        if math.isinf(value):
+            return {'type': 'number', 'value': 'Infinity' if value > 0 else '-Infinity'}
+
+        return {'type': 'number', 'value': value}
+
+    if isinstance(value, str):
+        return {'type': 'string', 'value': value}
+
+    if isinstance(value, (list, tuple)):
+        return {'type': 'array', 'value': [_serializeBiDiValue(item) for item in value]}
+
+    if isinstance(value, dict):
+        return {'type': 'object', 'value': [[str(key), _serializeBiDiValue(item)] for key, item in value.items()]}
+
+    raise Exception('Value can not be passed to the browser: ' + repr(value))
+
+def _deserializeBiDiValue(remoteValue):
+    """
+    Returns the Python value of the given BiDi remote value, returned by a
+    script.
+
+    Arrays and sets are returned as lists, and objects and maps as dicts.
+    Dates and regular expressions are returned as strings, and other values
+    that can not be represented in Python (like functions or DOM nodes) are
+    returned as None.
+
+    :param remoteValue: the BiDi remote value.
+    :return: the Python value.
+    """
+
+    valueType = remoteValue['type']
+    value = remoteValue.get('value')
+
+    if valueType in ['string', 'boolean']:
+        return value
+
+    if valueType == 'number':
+        if value == 'NaN':
+            return math.nan
+        if value == '-0':
+            return -0.0
+        if value == 'Infinity':
+            return math.inf
+        if value == '-Infinity':
+            return -math.inf
+
+        return value
+
+    if valueType == 'bigint':
+        return int(value)
+
+    if valueType in ['array', 'set']:
+        return [_deserializeBiDiValue(item) for item in value or []]
+
+    if valueType in ['object', 'map']:
+        return {key if isinstance(key, str) else _deserializeBiDiValue(key): _deserializeBiDiValue(item) for key, item in value or []}
+
+    if valueType == 'date':
+        return value
+
+    if valueType == 'regexp':
+        return '/' + value['pattern'] + '/' + value.get('flags', '')
+
+    return None
+
+
 class BiDiLogsHelper:
     """
     Helper class to get browser logs using the BiDi protocol.
@@ -124,16 +733,47 @@ class BiDiLogsHelper:
     A new thread is started by each object to receive the logs, so they can be
     printed in real time even if the main thread is waiting for some script to
     finish.
+
+    Other BiDi commands can be sent through the same connection with
+    "sendCommand()", and scripts can be executed with "callFunction()".
+
+    Structured events emitted by Talkbuchet.js are not printed, but added to
+    the event log instead.
+
+    Logs received while realtime logs are not enabled are kept in a LogBuffer
+    until they are printed.
     """
 
-    def __init__(self, driver):
+    def __init__(self, driver, eventLog = None, logBuffer = None):
+        """
+        :param driver: the driver of the browser.
+        :param eventLog: the EventLog to add the received events to, if any.
+        :param logBuffer: the LogBuffer to keep the logs in; a LogBuffer with
+            the default options is used if none is given.
+        """
+
         if not 'webSocketUrl' in driver.capabilities:
             raise Exception('webSocketUrl not found in capabilities')
 
+        if not logBuffer:
+            logBuffer = LogBuffer()
+
+        self.eventLog = eventLog
+        self.sessionId = driver.session_id
+
         self.realtimeLogsEnabled = False
-        self.pendingLogs = []
+        self.logBuffer = logBuffer
         self.logsLock = threading.Lock()
 
+        self.lastFlushSequence = 0
+        self.receivedFlushSequence = 0
+        self.flushCondition = threading.Condition()
+
+        # The ID 1 is used for the subscription to the logs.
+        self.lastCommandId = 1
+        self.pendingCommands = {}
+        self.commandsLock = threading.Lock()
+
         # Web socket connection is rejected by Firefox with "Bad request" if
         # "Origin" header is present; logs show:
         # "The handshake request has incorrect Origin header".
@@ -164,16 +804,23 @@ class BiDiLogsHelper:
         if self.loggingThread:
             self.loggingThread.join()
 
-    def __messageFromEvent(self, event):
-            if not 'params' in event:
-                return '???'
+        self.logBuffer.close()
 
+    def __methodFromEvent(self, event):
             method = ''
             if 'method' in event['params']:
                 method = event['params']['method']
             elif 'level' in event['params']:
                 method = event['params']['level'] if event['params']['level'] != 'warning' else 'warn'
 
+            return method
+
+    def __messageFromEvent(self, event):
+            if not 'params' in event:
+                return '???'
+
+            method = self.__methodFromEvent(event)
+
             text = ''
             if 'text' in event['params']:
                 text = event['params']['text']
@@ -212,52 +859,339 @@ class BiDiLogsHelper:
                 self.initialLogsLock.release()
                 continue
 
+            if 'id' in event:
+                with self.commandsLock:
+                    pendingCommand = self.pendingCommands.pop(event['id'], None)
+
+                if pendingCommand:
+                    pendingCommand['response'] = event
+                    pendingCommand['received'].set()
+
+                continue
+
             if not 'method' in event or event['method'] != 'log.entryAdded':
                 continue
 
+            text = event.get('params', {}).get('text', '')
+            if text.startswith(_flushMarker):
+                with self.flushCondition:
+                    self.receivedFlushSequence = max(self.receivedFlushSequence, int(text[len(_flushMarker):]))
+                    self.flushCondition.notify_all()
+
+                continue
+
+            talkbuchetEvent = _parseEvent(event.get('params', {}).get('text', ''))
+            if talkbuchetEvent:
+                if self.eventLog:
+                    source = self.sessionId
+                    if 'context' in event['params'].get('source', {}):
+                        source += ' ' + event['params']['source']['context']
+
+                    self.eventLog.addEvent(talkbuchetEvent, source)
+
+                continue
+
             message = self.__messageFromEvent(event)
 
             with self.logsLock:
-                if self.realtimeLogsEnabled:
-                    print(message)
-                else:
-                    self.pendingLogs.append(message)
+                self.logBuffer.addLog(self.__methodFromEvent(event), event['params'].get('text', ''), message, self.realtimeLogsEnabled)
 
-    def clearLogs(self):
+    def sendCommand(self, method, params, timeout = 30):
         """
-        Clears, without printing, the logs received while realtime logs were not
-        enabled.
+        Sends a BiDi command and waits for its response.
+
+        :param method: the BiDi method to call (for example,
+            "browsingContext.create").
+        :param params: the parameters of the method.
+        :param timeout: the seconds to wait for the response.
+        :return: the result of the command.
         """
 
-        with self.logsLock:
-            self.pendingLogs = []
+        pendingCommand = {
+            'received': threading.Event(),
+            'response': None,
+        }
 
-    def printLogs(self):
-        """
-        Prints the logs received while realtime logs were not enabled.
+        with self.commandsLock:
+            self.lastCommandId += 1
+            commandId = self.lastCommandId
 
-        The logs are cleared after printing them.
-        """
+            self.pendingCommands[commandId] = pendingCommand
 
-        with self.logsLock:
-            for log in self.pendingLogs:
-                print(log)
+            # The websocket is not thread safe, so the command is sent while
+            # holding the lock.
+            self.websocket.send(json.dumps({
+                'id': commandId,
+                'method': method,
+                'params': params,
+            }))
 
-            self.pendingLogs = []
+        if not pendingCommand['received'].wait(timeout):
+            with self.commandsLock:
+                self.pendingCommands.pop(commandId, None)
 
-    def setRealtimeLogsEnabled(self, realtimeLogsEnabled):
-        """
-        Enable or disable realtime logs.
+            raise TimeoutException('No response received for ' + method)
 
-        If logs are received while realtime logs are not enabled they can be
-        printed using "printLogs()".
+        response = pendingCommand['response']
+        if response.get('type') == 'error':
+            raise Exception(method + ' failed: ' + response.get('error', '') + ' ' + response.get('message', ''))
+
+        return response.get('result', {})
+
+    def callFunction(self, context, functionDeclaration, args = [], timeout = 30):
+        """
+        Calls the given function in the given browsing context and waits for its
+        result.
+
+        If the function returns a promise it is waited for, and its value is
+        returned instead.
+
+        :param context: the ID of the browsing context (which is the same as the
+            WebDriver handle of its window).
+        :param functionDeclaration: the declaration of the function to call (for
+            example, "function(a, b) { return a + b }").
+        :param args: the arguments to call the function with; see
+            :py:func:`_serializeBiDiValue`.
+        :param timeout: the seconds to wait for the result.
+        :return: the value returned by the function; see
+            :py:func:`_deserializeBiDiValue`.
+        :raises JavascriptException: if the function threw an exception (or the
+            promise was rejected); the message includes the type of the thrown
+            value and the stack trace, like when a script fails in
+            "execute_script()".
         """
 
-        with self.logsLock:
-            self.realtimeLogsEnabled = realtimeLogsEnabled
+        result = self.sendCommand('script.callFunction', {
+            'functionDeclaration': functionDeclaration,
+            'awaitPromise': True,
+            'target': {
+                'context': context,
+            },
+            'arguments': [_serializeBiDiValue(arg) for arg in args],
+            'resultOwnership': 'none',
+            'serializationOptions': {
+                'maxObjectDepth': None,
+            },
+        }, timeout)
 
+        if result.get('type') == 'exception':
+            exceptionDetails = result['exceptionDetails']
 
-class SeleniumHelper:
+            # Thrown errors have just the "error" type, but their text already
+            # includes their class (like "TypeError: ...").
+            exceptionType = exceptionDetails.get('exception', {}).get('type', 'unknown')
+
+            # Line and column numbers are 0-based.
+            stackTrace = []
+            for callFrame in exceptionDetails.get('stackTrace', {}).get('callFrames', []):
+                stackTrace.append('    at ' + (callFrame.get('functionName') or '<anonymous>') + ' (' + callFrame.get('url', '') + ':' + str(callFrame.get('lineNumber', 0) + 1) + ':' + str(callFrame.get('columnNumber', 0) + 1) + ')')
+
+            raise JavascriptException('Script failed: ' + exceptionDetails.get('text', '') + ' (' + exceptionType + ' thrown)', stacktrace=stackTrace)
+
+        return _deserializeBiDiValue(result['result'])
+
+    def newFlushScript(self):
+        """
+        Returns a new script to log a flush marker.
+
+        Logs are received in the same order as they were logged, so once the
+        flush marker is received all the logs logged before it were received
+        too.
+
+        :return: a tuple with the sequence number of the flush marker, to wait
+            for it with "waitForFlush()", and the script.
+        """
+
+        with self.flushCondition:
+            self.lastFlushSequence += 1
+
+            return self.lastFlushSequence, 'console.debug(' + json.dumps(_flushMarker + str(self.lastFlushSequence)) + ')'
+
+    def waitForFlush(self, flushSequence, timeout = 2):
+        """
+        Waits until the flush marker with the given sequence number (or a later
+        one) was received.
+
+        :param flushSequence: the sequence number returned by
+            "newFlushScript()".
+        :param timeout: the seconds to wait at most, in case the flush marker
+            was never logged.
+        :return: True if the flush marker was received, False otherwise.
+        """
+
+        with self.flushCondition:
+            return self.flushCondition.wait_for(lambda: self.receivedFlushSequence >= flushSequence, timeout)
+
+    def clearLogs(self):
+        """
+        Clears, without printing, the logs received while realtime logs were not
+        enabled.
+        """
+
+        self.logBuffer.clearLogs()
+
+    def printLogs(self):
+        """
+        Prints the logs received while realtime logs were not enabled.
+
+        The logs are cleared after printing them.
+        """
+
+        self.logBuffer.printLogs()
+
+    def searchLogs(self, pattern):
+        """
+        See :py:meth:`LogBuffer.searchLogs`.
+        """
+
+        return self.logBuffer.searchLogs(pattern)
+
+    def setRealtimeLogsEnabled(self, realtimeLogsEnabled):
+        """
+        Enable or disable realtime logs.
+
+        If logs are received while realtime logs are not enabled they can be
+        printed using "printLogs()".
+        """
+
+        with self.logsLock:
+            self.realtimeLogsEnabled = realtimeLogsEnabled
+
+
+class PollingLogsHelper:
+    """
+    Helper class to get browser logs by periodically polling them.
+
+    This is used when BiDi is not available (Chrome < 115, or when
+    ChromeDriver does not support it). A new thread is started
+    by each object to poll the logs, so the structured events emitted by
+    Talkbuchet.js are added to the event log shortly after being emitted, even
+    if no command is executed. The rest of the logs are kept in a LogBuffer
+    until they are printed or cleared.
+
+    Note that this is still polling: each poll is a request to the Selenium
+    server, so it should be used only as a fallback for browsers without BiDi.
+
+    The logs are polled from the thread and from "clearLogs()" and
+    "printLogs()", so polls are serialized to prevent logs from being lost or
+    reordered.
+    """
+
+    # Chrome reports "console.log()" and "console.info()" with the same level.
+    _logLevelsByChromeLevel = {
+        'DEBUG': 'debug',
+        'INFO': 'log',
+        'WARNING': 'warn',
+        'SEVERE': 'error',
+    }
+
+    def __init__(self, driver, eventLog = None, interval = 0.5, logBuffer = None):
+        """
+        :param driver: the driver of the browser.
+        :param eventLog: the EventLog to add the received events to, if any.
+        :param interval: the seconds between polls.
+        :param logBuffer: the LogBuffer to keep the logs in; a LogBuffer with
+            the default options is used if none is given.
+        """
+
+        if not logBuffer:
+            logBuffer = LogBuffer()
+
+        self.driver = driver
+        self.eventLog = eventLog
+        self.interval = interval
+
+        self.logBuffer = logBuffer
+
+        # Reentrant, as the logs are polled too while clearing or printing them.
+        self.pollLock = threading.RLock()
+
+        self.stopped = threading.Event()
+
+        self.pollingThread = threading.Thread(target=self.__pollLogs, daemon=True)
+        self.pollingThread.start()
+
+    def stop(self):
+        """
+        Stops polling the logs.
+        """
+
+        self.stopped.set()
+
+        self.logBuffer.close()
+
+    def __pollLogs(self):
+        while not self.stopped.wait(self.interval):
+            self.pollLogs()
+
+    def pollLogs(self):
+        """
+        Gets the new logs from the browser.
+        """
+
+        with self.pollLock:
+            self.__pollLogsLocked()
+
+    def __pollLogsLocked(self):
+        try:
+            logs = self.driver.get_log('browser')
+        except Exception:
+            # The browser was quit.
+            self.stopped.set()
+
+            return
+
+        for log in logs:
+            # Messages of console calls are like 'URL LINE:COLUMN "TEXT"', with
+            # the text quoted as a JSON string.
+            eventIndex = log['message'].find('"' + _eventMarker)
+            if eventIndex >= 0:
+                try:
+                    talkbuchetEvent = _parseEvent(json.JSONDecoder().raw_decode(log['message'], eventIndex)[0])
+                except ValueError:
+                    talkbuchetEvent = None
+
+                if talkbuchetEvent:
+                    if self.eventLog:
+                        self.eventLog.addEvent(talkbuchetEvent, self.driver.session_id)
+
+                    continue
+
+            self.logBuffer.addLog(self._logLevelsByChromeLevel.get(log.get('level'), ''), log['message'], log['message'])
+
+    def clearLogs(self):
+        """
+        Clears, without printing, the logs received so far.
+        """
+
+        with self.pollLock:
+            self.pollLogs()
+
+            self.logBuffer.clearLogs()
+
+    def printLogs(self):
+        """
+        Prints the logs received so far.
+
+        The logs are cleared after printing them.
+        """
+
+        with self.pollLock:
+            self.pollLogs()
+
+            self.logBuffer.printLogs()
+
+    def searchLogs(self, pattern):
+        """
+        See :py:meth:`LogBuffer.searchLogs`.
+        """
+
+        self.pollLogs()
+
+        return self.logBuffer.searchLogs(pattern)
+
+
+class SeleniumHelper:
     """
     Helper class to start a browser and execute scripts in it using Selenium.
 
@@ -272,18 +1206,61 @@ class SeleniumHelper:
     used its session timeout (which is independent from the timeouts set in the
     driver) must be kept in mind, as it can cause the browser to "unexpectedly"
     close.
+
+    If BiDi is available (Firefox, and Chrome >= 115) scripts are executed
+    through the BiDi connection by default rather than through the classic
+    WebDriver protocol, which needs an HTTP request to the Selenium server for
+    each script; see "setBiDiScriptsEnabled()". Note that, in that case, objects
+    returned by the scripts are serialized following the BiDi rules rather than
+    with "toJSON()".
     """
 
     def __init__(self):
         self.driver = None
         self.bidiLogsHelper = None
+        self.pollingLogsHelper = None
+        self.seleniumScheduler = None
+        self.remoteSeleniumUrl = None
+
+        self.bidiScriptsEnabled = False
+        self.bidiContext = None
+        self.scriptTimeout = 30
+
+        self.performanceMetricsWarningPrinted = False
 
     def __del__(self):
+        if self.pollingLogsHelper:
+            self.pollingLogsHelper.stop()
+
         if self.driver:
             # The session must be explicitly quit to remove the temporary files
             # created in "/tmp".
             self.driver.quit()
 
+            if self.seleniumScheduler:
+                self.seleniumScheduler.sessionEnded(self.remoteSeleniumUrl)
+
+    def startBrowser(self, browser, headless = True, remoteSeleniumUrl = None):
+        """
+        Starts a Chrome or Firefox instance.
+
+        :param browser: "firefox" or "chrome".
+        :param headless: whether the browser will be started in headless mode or
+            not; headless mode is used by default.
+        :param remoteSeleniumUrl: the URL of the Selenium server to connect to,
+            or a SeleniumScheduler to choose the Selenium server from; the local
+            server is used by default.
+        """
+
+        if isinstance(remoteSeleniumUrl, SeleniumScheduler):
+            remoteSeleniumUrl.startBrowser(self, browser, headless)
+        elif browser == 'chrome':
+            self.startChrome(headless, remoteSeleniumUrl)
+        elif browser == 'firefox':
+            self.startFirefox(headless, remoteSeleniumUrl)
+        else:
+            raise Exception('Invalid browser: ' + browser)
+
     def startChrome(self, headless = True, remoteSeleniumUrl = None):
         """
         Starts a Chrome instance.
@@ -298,6 +1275,10 @@ class SeleniumHelper:
 
         options.set_capability('acceptInsecureCerts', True)
 
+        # "webSocketUrl" is needed for BiDi, which is used to receive the logs
+        # in real time. "goog:loggingPrefs" is needed to poll the logs instead
+        # if BiDi is not supported by ChromeDriver.
+        options.set_capability('webSocketUrl', True)
         options.set_capability("goog:loggingPrefs", { 'browser': 'ALL' })
         options.add_argument('--use-fake-device-for-media-stream')
         options.add_argument('--use-fake-ui-for-media-stream')
@@ -332,6 +1313,14 @@ class SeleniumHelper:
                 options=options
             )
 
+        # If BiDi is supported the URL of the web socket is returned in the
+        # capabilities, otherwise the requested value is returned or the
+        # capability is ignored.
+        if isinstance(self.driver.capabilities.get('webSocketUrl'), str):
+            self.__startBiDi()
+        else:
+            self.pollingLogsHelper = PollingLogsHelper(self.driver, eventLog, logBuffer=_newLogBuffer(self.driver.session_id))
+
     def startFirefox(self, headless = True, remoteSeleniumUrl = None):
         """
         Starts a Firefox instance.
@@ -376,7 +1365,99 @@ class SeleniumHelper:
                 options=options
             )
 
-        self.bidiLogsHelper = BiDiLogsHelper(self.driver)
+        self.__startBiDi()
+
+    def __startBiDi(self):
+        self.bidiLogsHelper = BiDiLogsHelper(self.driver, eventLog, _newLogBuffer(self.driver.session_id))
+
+        self.bidiScriptsEnabled = _bidiScriptsEnabled
+        if self.bidiScriptsEnabled:
+            # Scripts are executed in the initial window, like classic scripts
+            # unless the current window is switched.
+            self.bidiContext = self.driver.current_window_handle
+            self.scriptTimeout = self.driver.timeouts.script
+
+    def getScriptTimeout(self):
+        """
+        Returns the seconds to wait for a script to finish.
+        """
+
+        return self.scriptTimeout
+
+    def setScriptTimeout(self, scriptTimeout):
+        """
+        Sets the seconds to wait for a script to finish.
+
+        :param scriptTimeout: the timeout, in seconds.
+        """
+
+        self.driver.set_script_timeout(scriptTimeout)
+
+        self.scriptTimeout = scriptTimeout
+
+    def __callFunction(self, functionDeclaration, args, context):
+        return self.bidiLogsHelper.callFunction(context or self.bidiContext, functionDeclaration, args, self.scriptTimeout)
+
+    def getProcessId(self):
+        """
+        Returns the ID of the process of the driver, which is the root of the
+        process tree of the browser.
+
+        :return: the process ID, or None if the browser was launched by a
+            remote Selenium server.
+        """
+
+        service = getattr(self.driver, 'service', None)
+        if not service or not service.process:
+            return None
+
+        return service.process.pid
+
+    def getPerformanceMetrics(self):
+        """
+        Returns the performance metrics of the current window, as returned by
+        "Performance.getMetrics" in the DevTools protocol, as well as the used
+        and total size of the JavaScript heap ("HeapUsedSize" and
+        "HeapTotalSize", from "Runtime.getHeapUsage").
+
+        The metrics can be got only from Chrome, either launched by a local
+        Selenium server or by a remote one (which forwards the DevTools
+        commands to ChromeDriver). Otherwise a warning is printed the first
+        time that the metrics are requested.
+
+        :return: a dict with the name of the metric as key and its value as
+            value, or None if the metrics can not be got from the browser.
+        """
+
+        browserName = self.driver.capabilities.get('browserName', '')
+        if browserName != 'chrome' or not hasattr(self.driver, 'execute_cdp_cmd'):
+            if not self.performanceMetricsWarningPrinted:
+                print('Warning: performance metrics can not be got from ' + (browserName or 'the browser') + ', they are only available in Chrome')
+
+                self.performanceMetricsWarningPrinted = True
+
+            return None
+
+        # Enabling the metrics again has no effect, so it is done every time to
+        # also cover new windows.
+        self.driver.execute_cdp_cmd('Performance.enable', {})
+
+        metrics = {metric['name']: metric['value'] for metric in self.driver.execute_cdp_cmd('Performance.getMetrics', {})['metrics']}
+
+        heapUsage = self.driver.execute_cdp_cmd('Runtime.getHeapUsage', {})
+        metrics['HeapUsedSize'] = heapUsage['usedSize']
+        metrics['HeapTotalSize'] = heapUsage['totalSize']
+
+        return metrics
+
+    def get(self, url):
+        """
+        Opens the given URL.
+
+        :param url: the URL to open.
+        """
+
+        self.driver.get(url)
 
     def clearLogs(self):
         """
@@ -390,6 +1471,10 @@ class SeleniumHelper:
             self.bidiLogsHelper.clearLogs()
             return
 
+        if self.pollingLogsHelper:
+            self.pollingLogsHelper.clearLogs()
+            return
+
         self.driver.get_log('browser')
 
     def printLogs(self):
@@ -404,10 +1489,34 @@ class SeleniumHelper:
             self.bidiLogsHelper.printLogs()
             return
 
+        if self.pollingLogsHelper:
+            self.pollingLogsHelper.printLogs()
+            return
+
         for log in self.driver.get_log('browser'):
             print(log['message'])
 
-    def execute(self, script):
+    def searchLogs(self, pattern):
+        """
+        Returns the browser logs that match the given regular expression.
+
+        Only the logs not printed yet are searched, unless the logs are written
+        to a file (see "setLogsDirectory()"), in which case all the logs in the
+        file and the rotated files are searched.
+
+        :param pattern: the regular expression to search for.
+        :return: a list with the matching logs, from oldest to newest.
+        """
+
+        if self.bidiLogsHelper:
+            return self.bidiLogsHelper.searchLogs(pattern)
+
+        if self.pollingLogsHelper:
+            return self.pollingLogsHelper.searchLogs(pattern)
+
+        return []
+
+    def execute(self, script, *args, context = None):
         """
         Executes the given script.
 
@@ -422,25 +1531,102 @@ class SeleniumHelper:
 
         If realtime logs are available logs are printed as soon as they are
         received. Otherwise they will be printed once the script has finished.
+
+        Any additional argument is passed to the script, which can get them
+        from "arguments", so values do not need to be quoted and escaped to
+        be embedded in the script.
+
+        The value returned by the script (if any) is returned.
+
+        :param context: the BiDi browsing context to execute the script in, if
+            BiDi scripts are enabled; the initial window is used by default.
         """
 
-        # Real time logs are enabled while the command is being executed.
-        if self.bidiLogsHelper:
+        if not self.bidiLogsHelper:
+            result = self.driver.execute_script(script, *args)
+
             self.printLogs()
-            self.bidiLogsHelper.setRealtimeLogsEnabled(True)
 
-        self.driver.execute_script(script)
+            return result
 
-        if self.bidiLogsHelper:
-            # Give it some time to receive the last real time logs before
-            # disabling them again.
-            sleep(0.5)
+        # Real time logs are enabled while the command is being executed.
+        self.printLogs()
+        self.bidiLogsHelper.setRealtimeLogsEnabled(True)
+
+        # A flush marker is logged once the script finished (or once the
+        # promise returned by the script, if any, is settled), so it is known
+        # when the last real time logs were received.
+        flushSequence, flushScript = self.bidiLogsHelper.newFlushScript()
 
+        script = 'let result; try { result = (function() { ' + script + ' }).apply(this, arguments) } catch (error) { ' + flushScript + '; throw error } if (result instanceof Promise) { return result.finally(() => { ' + flushScript + ' }) } ' + flushScript + '; return result'
+
+        try:
+            if self.bidiScriptsEnabled:
+                result = self.__callFunction('function() { ' + script + ' }', args, context)
+            else:
+                result = self.driver.execute_script(script, *args)
+        finally:
+            self.bidiLogsHelper.waitForFlush(flushSequence)
             self.bidiLogsHelper.setRealtimeLogsEnabled(False)
 
         self.printLogs()
 
-    def executeAsync(self, script):
+        return result
+
+    def call(self, function, *args, context = None):
+        """
+        Calls the given Talkbuchet function with the given arguments.
+
+        The arguments are passed as they are (they just need to be serializable
+        to JSON), so there is no need to build the script for the call.
+
+        If the function returns a promise it is waited for, and its value is
+        returned instead.
+
+        :param function: the name of the function to call.
+        :param context: see :py:meth:`execute`.
+        :return: the value returned by the function.
+        """
+
+        return self.execute('return window[arguments[0]](...arguments[1])', function, list(args), context=context)
+
+    def callBatch(self, calls, context = None):
+        """
+        Calls several Talkbuchet functions in a single round trip to the
+        browser.
+
+        The functions are called one after the other, waiting for the promise
+        returned by the previous function, if any, before calling the next one.
+
+        :param calls: a list of (function name, list of arguments) tuples.
+        :param context: see :py:meth:`execute`.
+        :return: a list with the value returned by each function.
+        """
+
+        return self.execute('return (async (calls) => { const results = []; for (const [name, args] of calls) { results.push(await window[name](...args)) } return results })(arguments[0])', [[function, list(args)] for function, args in calls], context=context)
+
+    def executeWithoutLogs(self, script, *args, context = None):
+        """
+        Executes the given script without printing the logs.
+
+        This is meant for scripts that just get some values and that can be
+        executed from a background thread, like when collecting metrics; the
+        logs are kept and printed by the next "execute()" or "executeAsync()".
+
+        The script can return a promise, which is waited for, but it can not use
+        "await" in the root context.
+
+        The value returned by the script (if any) is returned.
+
+        :param context: see :py:meth:`execute`.
+        """
+
+        if self.bidiScriptsEnabled:
+            return self.__callFunction('function() { ' + script + ' }', args, context)
+
+        return self.driver.execute_script(script, *args)
+
+    def executeAsync(self, script, *args, context = None):
         """
         Executes the given script asynchronously.
 
@@ -448,1330 +1634,9062 @@ class SeleniumHelper:
         wait for a promise to be fulfilled, either explicitly or through "await"
         calls.
 
-        The script needs to explicitly signal that the execution has finished by
-        including the special text "{RETURN}" (without quotes). If "{RETURN}" is
-        not included the function will automatically return once all the root
-        statements of the script were executed (which works as expected if using
-        "await" calls, but not if the script includes something like
-        "someFunctionReturningAPromise().then(() => { more code })"; in that
-        case the script should be written as
-        "someFunctionReturningAPromise().then(() => { more code {RETURN} })").
+        The script is run in an async function, and the function returns once
+        all the root statements of the script were executed (which works as
+        expected if using "await" calls, but not if the script includes
+        something like "someFunctionReturningAPromise().then(() => { more code
+        })"; in that case the promise should be awaited).
+
+        If BiDi scripts are not enabled the script can instead explicitly signal
+        that the execution has finished by including the special text
+        "{RETURN}" (without quotes), like in
+        "someFunctionReturningAPromise().then(() => { more code {RETURN} })".
+        When BiDi scripts are enabled the promise of the async function itself
+        is waited for, so "{RETURN}" can not be used and an exception is raised
+        if the script includes it.
 
         If realtime logs are available logs are printed as soon as they are
         received. Otherwise they will be printed once the script has finished.
+
+        Like in "execute()", any additional argument is passed to the script.
+
+        :param context: see :py:meth:`execute`.
         """
 
+        if self.bidiScriptsEnabled and '{RETURN}' in script:
+            raise Exception('"{RETURN}" can not be used when BiDi scripts are enabled, the script should await the promise instead')
+
         # Real time logs are enabled while the command is being executed.
+        flushScript = ''
         if self.bidiLogsHelper:
             self.printLogs()
             self.bidiLogsHelper.setRealtimeLogsEnabled(True)
 
-        # Add an explicit return point at the end of the script if none is
-        # given.
-        if script.find('{RETURN}') == -1:
-            script += '{RETURN}'
+            # A flush marker is logged once the script finished, so it is
+            # known when the last real time logs were received.
+            flushSequence, flushScript = self.bidiLogsHelper.newFlushScript()
 
-        # await is not valid in the root context in Firefox, so the script to be
-        # executed needs to be wrapped in an async function.
-        script = '(async() => { ' + script  + ' })().catch(error => { console.error(error) {RETURN} })'
+        try:
+            if self.bidiScriptsEnabled:
+                # await is not valid in the root context in Firefox, so the
+                # script to be executed needs to be wrapped in an async
+                # function. BiDi waits for the promise returned by the function,
+                # so the promise of the async function is returned as is.
+                script = 'function() { return (async() => { ' + script + ' })().catch(error => { console.error(error) }).finally(() => { ' + flushScript + ' }) }'
+
+                self.__callFunction(script, args, context)
+            else:
+                # Add an explicit return point at the end of the script if none
+                # is given.
+                if script.find('{RETURN}') == -1:
+                    script += '{RETURN}'
+
+                # await is not valid in the root context in Firefox, so the
+                # script to be executed needs to be wrapped in an async
+                # function.
+                script = '(async() => { ' + script  + ' })().catch(error => { console.error(error) {RETURN} })'
+
+                # Asynchronous scripts need to explicitly signal that they are
+                # finished by invoking the callback injected as the last
+                # argument.
+                # https://www.selenium.dev/documentation/legacy/json_wire_protocol/#sessionsessionidexecute_async
+                script = script.replace('{RETURN}', '; ' + flushScript + '; arguments[arguments.length - 1]()')
+
+                self.driver.execute_async_script(script, *args)
+        finally:
+            if self.bidiLogsHelper:
+                self.bidiLogsHelper.waitForFlush(flushSequence)
+                self.bidiLogsHelper.setRealtimeLogsEnabled(False)
 
-        # Asynchronous scripts need to explicitly signal that they are finished
-        # by invoking the callback injected as the last argument.
-        # https://www.selenium.dev/documentation/legacy/json_wire_protocol/#sessionsessionidexecute_async
-        script = script.replace('{RETURN}', '; arguments[arguments.length - 1]()')
+        self.printLogs()
 
-        self.driver.execute_async_script(script)
 
-        if self.bidiLogsHelper:
-            # Give it some time to receive the last real time logs before
-            # disabling them again.
-            sleep(0.5)
+class SeleniumServer:
+    """
+    Remote Selenium server registered in a SeleniumScheduler.
 
-            self.bidiLogsHelper.setRealtimeLogsEnabled(False)
+    The capacity is the maximum number of sessions (browsers) that the server
+    can run at the same time, and the weight is its relative share of new
+    sessions when weighted round-robin is used.
+    """
 
-        self.printLogs()
+    def __init__(self, url, capacity, weight):
+        self.url = url
+        self.capacity = capacity
+        self.weight = weight
 
+        self.sessions = 0
+        self.failures = 0
+        self.unavailableUntil = 0
 
-class TalkbuchetCommon:
-    """
-    Base class for Talkbuchet wrappers.
+        # Used by the smooth weighted round-robin.
+        self.currentWeight = 0
 
-    Talkbuchet wrappers load Talkbuchet on a given Nextcloud URL and provide
-    methods to call the different Talkbuchet functions in the browser.
+    def isAvailable(self, now):
+        return self.sessions < self.capacity and self.unavailableUntil <= now
+
+
+class SeleniumScheduler:
+    """
+    Helper class to distribute browsers between several remote Selenium servers.
+
+    Each server is registered with the maximum number of sessions that it can
+    run at the same time. When a new browser is started the scheduler chooses
+    one of the servers with available capacity using the configured strategy:
+    - "leastLoaded" (default): the server with the lowest ratio of sessions to
+      capacity.
+    - "weightedRoundRobin": the servers are chosen in turns, each one
+      proportionally to its weight (which is its capacity unless explicitly
+      given).
+
+    If a server fails to create a session it is not used for new sessions for
+    some time (which doubles on each consecutive failure), and the browser is
+    started in the next server instead. The existing sessions in the failed
+    server are not affected.
     """
 
-    def __init__(self, browser, nextcloudUrl, headless = True, remoteSeleniumUrl = None):
+    def __init__(self, strategy = 'leastLoaded', failureCooldown = 30):
         """
-        Loads Talkbuchet on the given Nextcloud URL using the given browser.
-
-        :param browser: "firefox" or "chrome".
-        :param nextcloudUrl: the URL of the Nextcloud instance to load
-            Talkbuchet on.
-        :param headless: whether the browser will be started in headless mode or
-            not; headless mode is used by default.
-        :param remoteSeleniumUrl: the URL of the Selenium server to connect to;
-            the local server is used by default.
+        :param strategy: "leastLoaded" or "weightedRoundRobin".
+        :param failureCooldown: the seconds to wait before using again a server
+            that failed to create a session.
         """
 
-        self.seleniumHelper = SeleniumHelper()
-
-        if browser == 'chrome':
-            self.seleniumHelper.startChrome(headless, remoteSeleniumUrl)
-        elif browser == 'firefox':
-            self.seleniumHelper.startFirefox(headless, remoteSeleniumUrl)
-        else:
-            raise Exception('Invalid browser: ' + browser)
+        self.setStrategy(strategy)
 
-        self.seleniumHelper.driver.get(nextcloudUrl)
+        self.failureCooldown = failureCooldown
 
-        self.__loadTalkbuchet()
-
-    def __loadTalkbuchet(self):
-        talkbuchet = Path('Talkbuchet.js').read_text()
-
-        # Explicitly assign all the needed functions defined in Talkbuchet.js to
-        # the Window object to be able to access them at a later point.
-        talkbuchet = talkbuchet + '''
-        window.getPublishers = getPublishers
-        window.getSubscribers = getSubscribers
-        window.closeConnections = closeConnections
-        window.setAudioEnabled = setAudioEnabled
-        window.setVideoEnabled = setVideoEnabled
-        window.setSentAudioStreamEnabled = setSentAudioStreamEnabled
-        window.setSentVideoStreamEnabled = setSentVideoStreamEnabled
-        window.checkPublishersConnections = checkPublishersConnections
-        window.checkSubscribersConnections = checkSubscribersConnections
-        window.printPublisherStats = printPublisherStats
-        window.printSubscriberStats = printSubscriberStats
-        window.setCredentials = setCredentials
-        window.setToken = setToken
-        window.setPublishersAndSubscribersCount = setPublishersAndSubscribersCount
-        window.startMedia = startMedia
-        window.setConnectionWarningTimeout = setConnectionWarningTimeout
-        window.siege = siege
-        window.getVirtualParticipant = getVirtualParticipant
-        window.startVirtualParticipant = startVirtualParticipant
-        window.stopVirtualParticipant = stopVirtualParticipant
-        window.sendMediaEnabledStateThroughDataChannel = sendMediaEnabledStateThroughDataChannel
-        window.sendSpeakingStateThroughDataChannel = sendSpeakingStateThroughDataChannel
-        window.sendNickThroughDataChannel = sendNickThroughDataChannel
-        '''
-
-        # Clear previous logs
-        self.seleniumHelper.clearLogs()
-
-        self.seleniumHelper.executeAsync(talkbuchet)
+        self.servers = []
+        self.lock = threading.Lock()
 
-    def setAudioEnabled(self, audioEnabled):
+    def setStrategy(self, strategy):
         """
-        Sets the enabled state of the audio track in the media stream.
+        Sets the strategy to choose the server for new sessions.
 
-        :param audioEnabled: True to enable, False to disable.
+        :param strategy: "leastLoaded" or "weightedRoundRobin".
         """
 
-        self.seleniumHelper.execute('setAudioEnabled(' + ('true' if audioEnabled else 'false') + ')')
+        if strategy != 'leastLoaded' and strategy != 'weightedRoundRobin':
+            raise Exception('Invalid strategy: ' + strategy)
 
-    def setVideoEnabled(self, videoEnabled):
+        self.strategy = strategy
+
+    def addServer(self, url, capacity, weight = None):
         """
-        Sets the enabled state of the video track in the media stream.
+        Adds a Selenium server.
 
-        :param videoEnabled: True to enable, False to disable.
+        :param url: the URL of the Selenium server.
+        :param capacity: the maximum number of sessions that the server can run
+            at the same time.
+        :param weight: the relative share of new sessions for the server when
+            weighted round-robin is used; by default it is the capacity.
         """
 
-        self.seleniumHelper.execute('setVideoEnabled(' + ('true' if videoEnabled else 'false') + ')')
+        with self.lock:
+            for server in self.servers:
+                if server.url == url:
+                    server.capacity = capacity
+                    server.weight = weight if weight != None else capacity
 
-    def setSentAudioStreamEnabled(self, sentAudioStreamEnabled):
-        """
-        Sets whether the audio track is sent or not.
+                    return
 
-        :param sentAudioStreamEnabled: True to send the actual track, False to
-            send a null track.
+            self.servers.append(SeleniumServer(url, capacity, weight if weight != None else capacity))
+
+    def removeServer(self, url):
         """
+        Removes a Selenium server.
 
-        self.seleniumHelper.execute('setSentAudioStreamEnabled(' + ('true' if sentAudioStreamEnabled else 'false') + ')')
+        The sessions already running in the server are not affected.
 
-    def setSentVideoStreamEnabled(self, sentVideoStreamEnabled):
+        :param url: the URL of the Selenium server.
         """
-        Sets whether the video track is sent or not.
 
-        :param sentVideoStreamEnabled: True to send the actual track, False to
-            send a null track.
-        """
+        with self.lock:
+            self.servers = [server for server in self.servers if server.url != url]
 
-        self.seleniumHelper.execute('setSentVideoStreamEnabled(' + ('true' if sentVideoStreamEnabled else 'false') + ')')
+    def hasServers(self):
+        return len(self.servers) > 0
 
-    def setCredentials(self, user, appToken):
+    def printServers(self):
+        """
+        Prints the sessions, capacity and state of each server.
         """
-        The user and app token to use.
 
-        An app token/password can be generated in the Security section of the
-        personal settings (index.php/settings/user/security).
+        now = monotonic()
 
-        In siege mode the credentials always need to be set.
+        with self.lock:
+            for server in self.servers:
+                state = 'available'
+                if server.unavailableUntil > now:
+                    state = 'unavailable for ' + str(round(server.unavailableUntil - now)) + ' seconds after ' + str(server.failures) + ' failures'
+                elif server.sessions >= server.capacity:
+                    state = 'full'
 
-        In virtual participant mode the participant will be a guest if the
-        credentials are not set.
+                print(server.url + ': ' + str(server.sessions) + '/' + str(server.capacity) + ' sessions, ' + state)
 
-        :param user: the user ID.
-        :param appToken: the app token for the user.
-        """
+    def __reserveServer(self, excludedServers):
+        now = monotonic()
 
-        self.seleniumHelper.execute('setCredentials(\'' + user + '\', \'' + appToken + '\')')
+        with self.lock:
+            servers = [server for server in self.servers if server.isAvailable(now) and server not in excludedServers]
+            if not servers:
+                return None
 
-    def setToken(self, token):
-        """
-        Sets the conversation token to use.
+            if self.strategy == 'leastLoaded':
+                server = min(servers, key=lambda server: server.sessions / server.capacity)
+            else:
+                # Smooth weighted round-robin, the same algorithm used by nginx.
+                totalWeight = 0
+                for candidate in servers:
+                    candidate.currentWeight += candidate.weight
+                    totalWeight += candidate.weight
 
-        In siege mode this should be set only when conversation clustering is
-        enabled in the server.
+                server = max(servers, key=lambda server: server.currentWeight)
+                server.currentWeight -= totalWeight
 
-        In virtual participant mode the token always needs to be set.
+            server.sessions += 1
 
-        :param token: the conversation token.
-        """
+            return server
 
-        self.seleniumHelper.execute('setToken(\'' + token + '\')')
+    def startBrowser(self, seleniumHelper, browser, headless = True):
+        """
+        Starts a browser in one of the servers.
 
-    def startMedia(self, audio, video):
+        :param seleniumHelper: the SeleniumHelper to start the browser with.
+        :param browser: "firefox" or "chrome".
+        :param headless: whether the browser will be started in headless mode or
+            not; headless mode is used by default.
         """
-        Starts the media stream to be used by publishers (including virtual
-        participants).
 
-        By default in siege mode audio will be used, and in virtual participant
-        mode neither audio nor video will be used.
+        failedServers = []
 
-        Only one media stream can be active at the same time, so any previous
-        stream is stopped when starting a new one. This should be done only when
-        the siege or the virtual participant is not active.
+        while True:
+            server = self.__reserveServer(failedServers)
+            if not server:
+                raise Exception('No Selenium server with available capacity')
 
-        If both audio and video are False then there will be no media. This is
-        only allowed in virtual participant mode, but not in siege mode.
+            try:
+                seleniumHelper.startBrowser(browser, headless, server.url)
+            except Exception as exception:
+                print('Session could not be created in ' + server.url + ': ' + str(exception))
 
-        :param audio: True to start audio, False otherwise
-        :param video: True to start video, False otherwise
+                with self.lock:
+                    server.sessions -= 1
+                    server.failures += 1
+                    server.unavailableUntil = monotonic() + self.failureCooldown * 2 ** (server.failures - 1)
+
+                failedServers.append(server)
+
+                continue
+
+            with self.lock:
+                server.failures = 0
+
+            seleniumHelper.seleniumScheduler = self
+            seleniumHelper.remoteSeleniumUrl = server.url
+
+            return
+
+    def sessionEnded(self, url):
+        """
+        Notifies that a session started by the scheduler has ended.
+
+        :param url: the URL of the Selenium server of the session.
         """
 
-        self.seleniumHelper.executeAsync('await startMedia(' + ('true' if audio else 'false') + ', ' + ('true' if video else 'false') + ')')
+        with self.lock:
+            for server in self.servers:
+                if server.url == url:
+                    server.sessions = max(server.sessions - 1, 0)
 
 
-class Siege(TalkbuchetCommon):
+class SharedBrowser:
     """
-    Wrapper for Talkbuchet in siege mode.
+    Browser shared by several Talkbuchet wrappers.
 
-    Besides the common functions this wrapper exposes only the Talkbuchet
-    functions for siege mode.
+    Each wrapper uses its own window in the shared browser, and each window is
+    opened in its own user context, so cookies and storage are not shared
+    between the windows and each one behaves like an independent browser
+    session (for example, guests in different windows are different guests).
+    Sharing a browser greatly reduces the memory needed for each wrapper, which
+    is specially relevant for virtual participants without media or with just
+    audio.
+
+    Windows are opened and user contexts are created using the BiDi protocol,
+    so the browser must support it.
+
+    The browser is lazily launched when the first window is opened, and it is
+    quit once all its windows were closed and the shared browser is no longer
+    referenced.
+
+    Note that the windows share the logs of the browser, so printing the logs of
+    one window prints the logs of all the windows.
     """
 
-    def __init__(self, browser, nextcloudUrl, headless = True, remoteSeleniumUrl = None):
+    def __init__(self, browser, headless = True, remoteSeleniumUrl = None, maxWindows = None):
         """
-        See :py:meth:`TalkbuchetCommon.__init__`.
+        :param browser: "firefox" or "chrome".
+        :param headless: whether the browser will be started in headless mode or
+            not; headless mode is used by default.
+        :param remoteSeleniumUrl: the URL of the Selenium server to connect to,
+            or a SeleniumScheduler to choose the Selenium server from; the local
+            server is used by default.
+        :param maxWindows: the maximum number of windows that can be opened at
+            the same time; unlimited by default.
         """
 
-        super().__init__(browser, nextcloudUrl, headless, remoteSeleniumUrl)
+        self.browser = browser
+        self.headless = headless
+        self.remoteSeleniumUrl = remoteSeleniumUrl
+        self.maxWindows = maxWindows
 
-        # Set default values from Talkbuchet.js.
-        self.publishersCount = 5
-        self.subscribersPerPublisherCount = 40
-        self.connectionWarningTimeout = 5000
+        self.seleniumHelper = None
+        self.launchLock = threading.Lock()
 
-    def closeConnections(self):
-        """
-        Stops the siege by closing the publisher and subscriber connections
+        self.windowsCount = 0
+        self.windowsLock = threading.Lock()
 
-        As the media stream is no longer needed it is also stopped.
+        # Classic WebDriver commands are executed on the current window of the
+        # browser, so the lock must be held while switching to a window and
+        # executing a command on it. Scripts executed through BiDi do not
+        # need to switch to the window, but the lock is held too, as the logs
+        # of all the windows are received by the same BiDiLogsHelper.
+        self.lock = threading.Lock()
+
+    def reserveWindow(self):
         """
+        Reserves a window in the browser.
 
-        self.seleniumHelper.execute('closeConnections()')
+        A window must be reserved before opening it, and the reservation is
+        given back when the window is closed.
 
-    def checkPublishersConnections(self):
-        """
-        Prints the state of the publisher connections.
+        :return: True if the window was reserved, False if the browser has
+            already the maximum number of windows.
         """
 
-        self.seleniumHelper.execute('checkPublishersConnections()')
+        with self.windowsLock:
+            if self.maxWindows != None and self.windowsCount >= self.maxWindows:
+                return False
 
-    def checkSubscribersConnections(self):
-        """
-        Prints the state of the subscriber connections.
-        """
+            self.windowsCount += 1
 
-        self.seleniumHelper.execute('checkSubscribersConnections()')
+            return True
 
-    def printPublisherStats(self, publisherSessionId):
+    def windowClosed(self):
+        with self.windowsLock:
+            self.windowsCount -= 1
+
+    def newWindow(self):
         """
-        Prints the stats of the given publisher connection.
+        Opens a new window, in its own user context, in a previously reserved
+        slot.
 
-        :param publisherSessionId: the session ID of the publisher.
+        :return: a SeleniumWindowHelper to execute scripts in the window.
         """
 
-        self.seleniumHelper.executeAsync('await printPublisherStats(\'' + publisherSessionId + '\', true)')
+        try:
+            with self.launchLock:
+                if not self.seleniumHelper:
+                    seleniumHelper = SeleniumHelper()
+                    seleniumHelper.startBrowser(self.browser, self.headless, self.remoteSeleniumUrl)
 
-    def printSubscriberStats(self, index):
-        """
-        Prints the stats of the given subscriber connection.
+                    if not seleniumHelper.bidiLogsHelper:
+                        raise Exception('Browser can not be shared, BiDi is not available in ' + self.browser)
 
-        :param index: the index of the subscriber in the list of subscribers.
-        """
+                    self.seleniumHelper = seleniumHelper
 
-        self.seleniumHelper.executeAsync('await printSubscriberStats(' + str(index) + ', true)')
+                bidiLogsHelper = self.seleniumHelper.bidiLogsHelper
 
-    def setPublishersAndSubscribersCount(self, publishersCount, subscribersPerPublisherCount):
-        """
-        Sets the number of publishers and subscribers per publisher to use.
+            userContext = bidiLogsHelper.sendCommand('browser.createUserContext', {})['userContext']
 
-        If not explicitly set the default number from Talkbuchet.js is used,
-        which is 5 publishers and 40 subscribers per publisher.
+            # Windows rather than tabs are used, as background tabs have their
+            # timers throttled.
+            context = bidiLogsHelper.sendCommand('browsingContext.create', {
+                'type': 'window',
+                'userContext': userContext,
+            })['context']
+        except:
+            self.windowClosed()
 
-        :param publishersCount: the number of publishers.
-        :param subscribersPerPublisherCount: the number of subscribers for each
-            publisher.
-        """
+            raise
 
-        self.publishersCount = publishersCount
-        self.subscribersPerPublisherCount = subscribersPerPublisherCount
+        return SeleniumWindowHelper(self, userContext, context)
 
-        self.seleniumHelper.execute('setPublishersAndSubscribersCount(' + str(publishersCount) + ', ' + str(subscribersPerPublisherCount) + ')')
 
-    def setConnectionWarningTimeout(self, connectionWarningTimeout):
-        """
-        Sets the milliseconds to wait before warning about connection problems.
+class SeleniumWindowHelper:
+    """
+    Helper class to execute scripts in a window of a SharedBrowser.
 
-        A message is printed when a connection was not established after or has
-        been disconnected for more than the given time. However, note that the
-        message might not be printed in CLI until another command is executed.
+    It provides the same methods as SeleniumHelper, but each method switches to
+    the window before executing it. The window (and its user context) is closed
+    once the helper is no longer referenced.
+    """
 
-        :param connectionWarningTimeout: the milliseconds to wait before
-            warning about connection issues.
-        """
+    def __init__(self, sharedBrowser, userContext, context):
+        self.sharedBrowser = sharedBrowser
+        self.userContext = userContext
+        self.context = context
 
-        self.connectionWarningTimeout = connectionWarningTimeout
+        self.driver = sharedBrowser.seleniumHelper.driver
 
-        self.seleniumHelper.execute('setConnectionWarningTimeout(' + str(connectionWarningTimeout) + ')')
+    def __switchToWindowForScript(self):
+        # Scripts executed through BiDi are executed directly in the context of
+        # the window.
+        if not self.sharedBrowser.seleniumHelper.bidiScriptsEnabled:
+            self.driver.switch_to.window(self.context)
 
-    def siege(self):
+    def __del__(self):
+        try:
+            # Removing the user context also closes its windows.
+            self.sharedBrowser.seleniumHelper.bidiLogsHelper.sendCommand('browser.removeUserContext', {
+                'userContext': self.userContext,
+            })
+        except Exception as exception:
+            print('Window could not be closed: ' + str(exception))
+
+        self.sharedBrowser.windowClosed()
+
+    def get(self, url):
         """
-        Starts a siege.
+        See :py:meth:`SeleniumHelper.get`.
         """
 
-        savedScriptTimeout = self.seleniumHelper.driver.timeouts.script
+        with self.sharedBrowser.lock:
+            self.driver.switch_to.window(self.context)
 
-        # Adjust script timeout to prevent it from ending before the siege has
-        # started.
-        scriptTimeout = (self.publishersCount + self.publishersCount * self.subscribersPerPublisherCount) * (self.connectionWarningTimeout / 1000)
-        if scriptTimeout > savedScriptTimeout:
-            self.seleniumHelper.driver.set_script_timeout(scriptTimeout)
+            self.sharedBrowser.seleniumHelper.get(url)
 
-        self.seleniumHelper.executeAsync('await siege()')
+    def getPerformanceMetrics(self):
+        """
+        See :py:meth:`SeleniumHelper.getPerformanceMetrics`.
+        """
 
-        self.seleniumHelper.driver.set_script_timeout(savedScriptTimeout)
+        with self.sharedBrowser.lock:
+            self.driver.switch_to.window(self.context)
 
+            return self.sharedBrowser.seleniumHelper.getPerformanceMetrics()
 
-class VirtualParticipant(TalkbuchetCommon):
-    """
-    Wrapper for Talkbuchet in virtual participant mode.
+    def getScriptTimeout(self):
+        """
+        See :py:meth:`SeleniumHelper.getScriptTimeout`.
+        """
 
-    Besides the common functions this wrapper exposes only the Talkbuchet
-    functions for virtual participant mode.
-    """
+        return self.sharedBrowser.seleniumHelper.getScriptTimeout()
 
-    def __init__(self, browser, nextcloudUrl, headless = True, remoteSeleniumUrl = None):
+    def setScriptTimeout(self, scriptTimeout):
         """
-        See :py:meth:`TalkbuchetCommon.__init__`.
+        See :py:meth:`SeleniumHelper.setScriptTimeout`.
         """
 
-        super().__init__(browser, nextcloudUrl, headless, remoteSeleniumUrl)
+        self.sharedBrowser.seleniumHelper.setScriptTimeout(scriptTimeout)
 
-    def startVirtualParticipant(self):
+    def clearLogs(self):
         """
-        Starts the virtual participant.
+        See :py:meth:`SeleniumHelper.clearLogs`.
         """
 
-        self.seleniumHelper.executeAsync('await startVirtualParticipant()')
+        self.sharedBrowser.seleniumHelper.clearLogs()
 
-    def stopVirtualParticipant(self):
+    def printLogs(self):
         """
-        Stops the virtual participant.
+        See :py:meth:`SeleniumHelper.printLogs`.
         """
 
-        self.seleniumHelper.executeAsync('await stopVirtualParticipant()')
+        self.sharedBrowser.seleniumHelper.printLogs()
 
-    def sendMediaEnabledStateThroughDataChannel(self, mediaType, enabled):
+    def searchLogs(self, pattern):
+        """
+        See :py:meth:`SeleniumHelper.searchLogs`.
         """
-        Sends the enabled state of the media using a data channel message.
 
-        :param mediaType: "audio" or "video".
-        :param enabled: True or False.
+        return self.sharedBrowser.seleniumHelper.searchLogs(pattern)
+
+    def execute(self, script, *args):
+        """
+        See :py:meth:`SeleniumHelper.execute`.
         """
 
-        self.seleniumHelper.execute('sendMediaEnabledStateThroughDataChannel(\'' + mediaType + '\', ' + ('true' if enabled else 'false') + ')')
+        with self.sharedBrowser.lock:
+            self.__switchToWindowForScript()
 
-    def sendSpeakingStateThroughDataChannel(self, speaking):
+            return self.sharedBrowser.seleniumHelper.execute(script, *args, context=self.context)
+
+    def call(self, function, *args):
+        """
+        See :py:meth:`SeleniumHelper.call`.
         """
-        Sends the speaking state using a data channel message.
 
-        :param speaking: True for speaking, False for not speaking.
+        with self.sharedBrowser.lock:
+            self.__switchToWindowForScript()
+
+            return self.sharedBrowser.seleniumHelper.call(function, *args, context=self.context)
+
+    def callBatch(self, calls):
+        """
+        See :py:meth:`SeleniumHelper.callBatch`.
         """
 
-        self.seleniumHelper.execute('sendSpeakingStateThroughDataChannel(' + ('true' if speaking else 'false') + ')')
+        with self.sharedBrowser.lock:
+            self.__switchToWindowForScript()
 
-    def sendNickThroughDataChannel(self, nick):
+            return self.sharedBrowser.seleniumHelper.callBatch(calls, context=self.context)
+
+    def executeWithoutLogs(self, script, *args):
+        """
+        See :py:meth:`SeleniumHelper.executeWithoutLogs`.
         """
-        Sends the nick of the participant using a data channel message.
 
-        :param nick: the nick to send.
+        with self.sharedBrowser.lock:
+            self.__switchToWindowForScript()
+
+            return self.sharedBrowser.seleniumHelper.executeWithoutLogs(script, *args, context=self.context)
+
+    def executeAsync(self, script, *args):
+        """
+        See :py:meth:`SeleniumHelper.executeAsync`.
         """
 
-        self.seleniumHelper.execute('sendNickThroughDataChannel(\'' + nick + '\')')
+        with self.sharedBrowser.lock:
+            self.__switchToWindowForScript()
 
+            return self.sharedBrowser.seleniumHelper.executeAsync(script, *args, context=self.context)
 
-class RealParticipant():
+
+def _readTalkbuchetScript():
     """
-    Wrapper for Talkbuchet in real participant mode.
+    Reads Talkbuchet.js and prepares it to be loaded in a browser.
 
-    This wrapper exposes functions to use a real participant in a browser.
+    The script expects the capabilities of the Nextcloud instance as its first
+    argument, or null to fetch them from the browser.
     """
 
-    def __init__(self, browser, nextcloudUrl, headless = True, remoteSeleniumUrl = None):
-        """
-        Starts a real participant in the given Nextcloud URL using the given
-        browser.
+    # The capabilities are provided to Talkbuchet.js in the variable that it
+    # checks before fetching them.
+    talkbuchet = 'const talkbuchetCapabilities = arguments[0]\n' + Path('Talkbuchet.js').read_text()
+
+    # Explicitly assign all the needed functions defined in Talkbuchet.js to
+    # the Window object to be able to access them at a later point.
+    talkbuchet = talkbuchet + '''
+    window.getPublishers = getPublishers
+    window.getSubscribers = getSubscribers
+    window.closeConnections = closeConnections
+    window.setAudioEnabled = setAudioEnabled
+    window.setVideoEnabled = setVideoEnabled
+    window.setSentAudioStreamEnabled = setSentAudioStreamEnabled
+    window.setSentVideoStreamEnabled = setSentVideoStreamEnabled
+    window.checkPublishersConnections = checkPublishersConnections
+    window.checkSubscribersConnections = checkSubscribersConnections
+    window.getPublishersConnectionsSummary = getPublishersConnectionsSummary
+    window.getSubscribersConnectionsSummary = getSubscribersConnectionsSummary
+    window.printPublisherStats = printPublisherStats
+    window.printSubscriberStats = printSubscriberStats
+    window.startStatsSampler = startStatsSampler
+    window.stopStatsSampler = stopStatsSampler
+    window.takeStatsSamples = takeStatsSamples
+    window.getHandshakePhases = getHandshakePhases
+    window.getMetrics = getMetrics
+    window.setCredentials = setCredentials
+    window.setToken = setToken
+    window.setPublishersAndSubscribersCount = setPublishersAndSubscribersCount
+    window.startMedia = startMedia
+    window.setConnectionWarningTimeout = setConnectionWarningTimeout
+    window.setRampPolicy = setRampPolicy
+    window.siege = siege
+    window.addPublishers = addPublishers
+    window.removePublishers = removePublishers
+    window.addSubscribers = addSubscribers
+    window.removeSubscribers = removeSubscribers
+    window.getVirtualParticipant = getVirtualParticipant
+    window.startVirtualParticipant = startVirtualParticipant
+    window.stopVirtualParticipant = stopVirtualParticipant
+    window.sendMediaEnabledStateThroughDataChannel = sendMediaEnabledStateThroughDataChannel
+    window.sendSpeakingStateThroughDataChannel = sendSpeakingStateThroughDataChannel
+    window.sendNickThroughDataChannel = sendNickThroughDataChannel
+    '''
+
+    return talkbuchet
+
+def _loadTalkbuchet(seleniumHelper, nextcloudUrl):
+    """
+    Opens the given Nextcloud URL and loads Talkbuchet on it.
 
-        :param browser: "firefox" or "chrome".
-        :param nextcloudUrl: the URL of the Nextcloud instance to start the real
-            participant in.
-        :param headless: whether the browser will be started in headless mode or
-            not; headless mode is used by default.
-        :param remoteSeleniumUrl: the URL of the Selenium server to connect to;
-            the local server is used by default.
-        """
+    If fast bootstrap is enabled (see "setFastBootstrap()") a lightweight page
+    of the Nextcloud instance is opened instead, Talkbuchet.js is read only
+    once, and the capabilities of the Nextcloud instance are fetched only once
+    and shared between all the browsers.
 
-        self.loggedIn = False
+    :param seleniumHelper: the SeleniumHelper of the browser to load Talkbuchet
+        on.
+    :param nextcloudUrl: the URL of the Nextcloud instance to load Talkbuchet
+        on.
+    """
 
-        self.nextcloudUrl = nextcloudUrl
+    global _talkbuchetScript
 
-        self.seleniumHelper = SeleniumHelper()
+    if _fastBootstrap:
+        # Talkbuchet just needs a page with the same origin as the Nextcloud
+        # instance, whatever its contents are.
+        seleniumHelper.get(nextcloudUrl.rstrip('/') + _fastBootstrapLandingPath)
 
-        if browser == 'chrome':
-            self.seleniumHelper.startChrome(headless, remoteSeleniumUrl)
-        elif browser == 'firefox':
-            self.seleniumHelper.startFirefox(headless, remoteSeleniumUrl)
-        else:
-            raise Exception('Invalid browser: ' + browser)
+        if not _talkbuchetScript:
+            _talkbuchetScript = _readTalkbuchetScript()
 
-        self.seleniumHelper.driver.get(nextcloudUrl)
+        talkbuchet = _talkbuchetScript
+        capabilities = _runInAsyncioLoop(TalkOcsClient(nextcloudUrl).getCapabilities())
+    else:
+        seleniumHelper.get(nextcloudUrl)
 
-    def login(self, user, appToken):
-        """
-        Logs in Nextcloud as the given user with the given app token.
+        talkbuchet = _readTalkbuchetScript()
+        capabilities = None
 
-        :param user: the ID of the user to log as.
-        :param appToken: an app token of the user.
-        """
+    # Clear previous logs
+    seleniumHelper.clearLogs()
 
-        # Fetching a Nextcloud URL in the browser console with a user and an app
-        # token implicitly does a login with that user. Visiting any page in the
-        # Nextcloud server will be done as a logged in user after that.
-        self.seleniumHelper.executeAsync('''
-            const fetchOptions = {
-                headers: {
-                    'Authorization': 'Basic ' + btoa(\'''' + user + ':' + appToken + '''\'),
-                },
-            }
+    seleniumHelper.executeAsync(_getConsoleFilterScript(_logsMinimumLevel) + talkbuchet, capabilities)
 
-            await fetch(\'''' + self.nextcloudUrl + '''\', fetchOptions)
-        ''')
 
-        self.loggedIn = True
+class BrowserPool:
+    """
+    Pool of browsers with Talkbuchet already loaded.
+
+    Launching a browser and loading Talkbuchet on it takes several seconds, and
+    each launch creates (and each quit removes) temporary files in "/tmp" and
+    "/dev/shm". The pool keeps up to "size" idle browsers warm, so new
+    Talkbuchet wrappers can take an already launched browser instead of
+    launching a new one, and wrappers that are no longer needed can give their
+    browser back to the pool instead of quitting it.
+
+    Browsers given back to the pool are reset by stopping the virtual
+    participant and closing the connections, clearing the local and session
+    storage, the IndexedDB databases and the caches of the Nextcloud site and
+    the cookies, and then reloading the page and Talkbuchet, so the next wrapper
+    gets a browser in the same state as a freshly launched one.
+
+    Browsers are only handed out to wrappers that use the same browser name,
+    Nextcloud URL, headless mode and Selenium server that the browser was
+    launched with.
+    """
 
-    def joinRoom(self, token):
+    def __init__(self, size = 0):
         """
-        Joins the room with the given token.
-
-        If no login was done before the participant will join as a guest.
-
-        :param token: the token of the room to join.
+        :param size: the maximum number of idle browsers to keep.
         """
 
-        self.seleniumHelper.driver.get(self.nextcloudUrl + '/call/' + token)
+        self.size = size
 
-        if self.loggedIn:
-            return
+        self.idleSeleniumHelpers = []
+        # Browsers in use are weakly referenced so they are still quit if their
+        # wrapper is deleted without releasing them.
+        self.seleniumHelperKeys = weakref.WeakKeyDictionary()
+        self.lock = threading.Lock()
 
-        # Starting with Talk 18 guests need to set their name after joining a
-        # room. If the dialog is not shown it is assumed that an older version
-        # is being used.
-        try:
-            submitNameButton = WebDriverWait(self.seleniumHelper.driver, timeout=10).until(lambda driver: driver.find_element(By.XPATH, '//button[contains(., "Submit name and join")]'))
+    def __launch(self, key):
+        browser, nextcloudUrl, headless, remoteSeleniumUrl = key
 
-            submitNameButton.find_element(By.XPATH, '..//input[@type="text"]').send_keys('Talkbuchet')
+        seleniumHelper = SeleniumHelper()
+        seleniumHelper.startBrowser(browser, headless, remoteSeleniumUrl)
 
-            submitNameButton.click()
-        except TimeoutException:
-            pass
+        _loadTalkbuchet(seleniumHelper, nextcloudUrl)
 
-    def joinCall(self):
-        """
-        Joins (or starts) the call in the current room.
+        return seleniumHelper
 
-        A room must have been joined before joining the call.
+    def setSize(self, size):
         """
+        Sets the maximum number of idle browsers to keep.
 
-        self.seleniumHelper.driver.find_element(By.CSS_SELECTOR, '.top-bar #call_button').click()
+        If there are more idle browsers than the new size the extra browsers are
+        quit.
 
-        try:
-            # If the device selector is shown click on the "Join call" button
-            # in the dialog to actually join the call. Recording consent is
-            # granted first if needed.
-            callButton = WebDriverWait(self.seleniumHelper.driver, timeout=5).until(lambda driver: driver.find_element(By.CSS_SELECTOR, '.device-checker #call_button, .media-settings #call_button'))
+        :param size: the maximum number of idle browsers to keep.
+        """
 
-            try:
-                self.seleniumHelper.driver.find_element(By.XPATH, '//label[contains(., "Give consent to the recording of this call")]').click()
-            except NoSuchElementException:
-                pass
+        with self.lock:
+            self.size = size
 
-            callButton.click()
-        except TimeoutException:
-            pass
+            # Idle browsers are quit once they are no longer referenced.
+            while len(self.idleSeleniumHelpers) > self.size:
+                self.idleSeleniumHelpers.pop()
 
-    def leaveCall(self):
+    def warmUp(self, count, browser, nextcloudUrl, headless = True, remoteSeleniumUrl = None, parallelism = 1):
         """
-        Leaves the current call.
+        Launches new idle browsers.
 
-        The call must have been joined first.
+        No more browsers than the pool size will be launched.
+
+        :param count: the number of browsers to launch.
+        :param browser: "firefox" or "chrome".
+        :param nextcloudUrl: the URL of the Nextcloud instance to load
+            Talkbuchet on.
+        :param headless: whether the browser will be started in headless mode or
+            not; headless mode is used by default.
+        :param remoteSeleniumUrl: the URL of the Selenium server to connect to;
+            the local server is used by default.
+        :param parallelism: the maximum number of browsers to launch at the same
+            time.
         """
 
-        self.seleniumHelper.driver.find_element(By.CSS_SELECTOR, '.top-bar #call_button').click()
+        key = (browser, nextcloudUrl, headless, remoteSeleniumUrl)
 
+        with self.lock:
+            count = min(count, self.size - len(self.idleSeleniumHelpers))
 
-_talkbuchetMode = ''
+        if count <= 0:
+            return
 
-_browser = ''
-_browserDefault = ''
+        report = StartupPool(parallelism).run(count, lambda: self.__launch(key))
 
-_nextcloudUrl = ''
-_remoteSeleniumUrl = ''
-_headless = True
+        with self.lock:
+            for seleniumHelper in report.wrappers:
+                if len(self.idleSeleniumHelpers) < self.size:
+                    self.idleSeleniumHelpers.append((key, seleniumHelper))
+
+    def acquire(self, browser, nextcloudUrl, headless = True, remoteSeleniumUrl = None):
+        """
+        Returns a browser with Talkbuchet loaded.
+
+        An idle browser is returned if available; otherwise a new browser is
+        launched.
+
+        :param browser: "firefox" or "chrome".
+        :param nextcloudUrl: the URL of the Nextcloud instance to load
+            Talkbuchet on.
+        :param headless: whether the browser will be started in headless mode or
+            not; headless mode is used by default.
+        :param remoteSeleniumUrl: the URL of the Selenium server to connect to;
+            the local server is used by default.
+        :return: the SeleniumHelper of the browser.
+        """
+
+        key = (browser, nextcloudUrl, headless, remoteSeleniumUrl)
+
+        seleniumHelper = None
+
+        with self.lock:
+            for i in range(len(self.idleSeleniumHelpers)):
+                if self.idleSeleniumHelpers[i][0] == key:
+                    seleniumHelper = self.idleSeleniumHelpers.pop(i)[1]
+
+                    break
+
+        if not seleniumHelper:
+            seleniumHelper = self.__launch(key)
+
+        with self.lock:
+            self.seleniumHelperKeys[seleniumHelper] = key
+
+        return seleniumHelper
+
+    def release(self, seleniumHelper):
+        """
+        Gives back a browser to the pool.
+
+        The browser is reset and kept as an idle browser if the pool is not
+        full; otherwise it is quit.
+
+        :param seleniumHelper: the SeleniumHelper of the browser, as returned by
+            :py:meth:`acquire`.
+        """
+
+        with self.lock:
+            key = self.seleniumHelperKeys.pop(seleniumHelper, None)
+
+            if not key or len(self.idleSeleniumHelpers) >= self.size:
+                return
+
+        browser, nextcloudUrl, headless, remoteSeleniumUrl = key
+
+        try:
+            # Talkbuchet is not loaded in the page if the browser was used by a
+            # real participant.
+            seleniumHelper.executeAsync('if (window.stopVirtualParticipant) { await stopVirtualParticipant(); closeConnections() }')
+
+            # The page is in the Nextcloud site, so its storage is the one used
+            # by the previous wrapper. Unlike "executeAsync()", "execute()"
+            # raises if clearing fails, so the browser is discarded.
+            # "indexedDB.databases()" is not available in older Firefox
+            # versions.
+            seleniumHelper.execute('''return (async () => {
+                localStorage.clear()
+                sessionStorage.clear()
+
+                if (indexedDB.databases) {
+                    await Promise.all((await indexedDB.databases()).map(database => new Promise(resolve => {
+                        const request = indexedDB.deleteDatabase(database.name)
+                        request.onsuccess = request.onerror = request.onblocked = resolve
+                    })))
+                }
+
+                if (window.caches) {
+                    await Promise.all((await caches.keys()).map(name => caches.delete(name)))
+                }
+            })()''')
+
+            seleniumHelper.driver.delete_all_cookies()
+
+            _loadTalkbuchet(seleniumHelper, nextcloudUrl)
+        except Exception as exception:
+            print('Browser could not be reset, discarding it: ' + str(exception))
+
+            return
+
+        with self.lock:
+            if len(self.idleSeleniumHelpers) < self.size:
+                self.idleSeleniumHelpers.append((key, seleniumHelper))
+
+    def clear(self):
+        """
+        Quits all the idle browsers.
+        """
+
+        with self.lock:
+            self.idleSeleniumHelpers = []
+
+
+class TalkbuchetCommon:
+    """
+    Base class for Talkbuchet wrappers.
+
+    Talkbuchet wrappers load Talkbuchet on a given Nextcloud URL and provide
+    methods to call the different Talkbuchet functions in the browser.
+    """
+
+    def __init__(self, browser, nextcloudUrl, headless = True, remoteSeleniumUrl = None, browserPool = None, sharedBrowser = None):
+        """
+        Loads Talkbuchet on the given Nextcloud URL using the given browser.
+
+        :param browser: "firefox" or "chrome".
+        :param nextcloudUrl: the URL of the Nextcloud instance to load
+            Talkbuchet on.
+        :param headless: whether the browser will be started in headless mode or
+            not; headless mode is used by default.
+        :param remoteSeleniumUrl: the URL of the Selenium server to connect to,
+            or a SeleniumScheduler to choose the Selenium server from; the local
+            server is used by default.
+        :param browserPool: the BrowserPool to take the browser from; a new
+            browser is launched by default.
+        :param sharedBrowser: the SharedBrowser to open a window in instead of
+            using a whole browser; a window must have been reserved in it for
+            the wrapper. The browser, headless and remote Selenium URL
+            parameters, as well as the browser pool, are ignored if a shared
+            browser is given.
+        """
+
+        self.browserPool = browserPool
+
+        if sharedBrowser:
+            self.browserPool = None
+            self.seleniumHelper = sharedBrowser.newWindow()
+
+            _loadTalkbuchet(self.seleniumHelper, nextcloudUrl)
+
+            return
+
+        if browserPool:
+            self.seleniumHelper = browserPool.acquire(browser, nextcloudUrl, headless, remoteSeleniumUrl)
+
+            return
+
+        self.seleniumHelper = SeleniumHelper()
+        self.seleniumHelper.startBrowser(browser, headless, remoteSeleniumUrl)
+
+        _loadTalkbuchet(self.seleniumHelper, nextcloudUrl)
+
+    def release(self):
+        """
+        Releases the browser used by the wrapper.
+
+        If the wrapper was created with a browser pool the browser is given back
+        to the pool, otherwise it is quit. The wrapper can not be used after
+        releasing it.
+        """
+
+        if self.browserPool and self.seleniumHelper:
+            self.browserPool.release(self.seleniumHelper)
+
+        self.seleniumHelper = None
+
+    def setAudioEnabled(self, audioEnabled):
+        """
+        Sets the enabled state of the audio track in the media stream.
+
+        :param audioEnabled: True to enable, False to disable.
+        """
+
+        self.seleniumHelper.call('setAudioEnabled', audioEnabled)
+
+    def setVideoEnabled(self, videoEnabled):
+        """
+        Sets the enabled state of the video track in the media stream.
+
+        :param videoEnabled: True to enable, False to disable.
+        """
+
+        self.seleniumHelper.call('setVideoEnabled', videoEnabled)
+
+    def setSentAudioStreamEnabled(self, sentAudioStreamEnabled):
+        """
+        Sets whether the audio track is sent or not.
+
+        :param sentAudioStreamEnabled: True to send the actual track, False to
+            send a null track.
+        """
+
+        self.seleniumHelper.call('setSentAudioStreamEnabled', sentAudioStreamEnabled)
+
+    def setSentVideoStreamEnabled(self, sentVideoStreamEnabled):
+        """
+        Sets whether the video track is sent or not.
+
+        :param sentVideoStreamEnabled: True to send the actual track, False to
+            send a null track.
+        """
+
+        self.seleniumHelper.call('setSentVideoStreamEnabled', sentVideoStreamEnabled)
+
+    def setMediaEnabled(self, audioEnabled = None, videoEnabled = None, sentAudioStreamEnabled = None, sentVideoStreamEnabled = None):
+        """
+        Sets several media states at once.
+
+        All the given states are set in a single round trip to the browser,
+        which matters when they are set in hundreds of wrappers at the same time
+        (for example, with "broadcast()").
+
+        :param audioEnabled: see :py:meth:`setAudioEnabled`; None to keep it.
+        :param videoEnabled: see :py:meth:`setVideoEnabled`; None to keep it.
+        :param sentAudioStreamEnabled: see
+            :py:meth:`setSentAudioStreamEnabled`; None to keep it.
+        :param sentVideoStreamEnabled: see
+            :py:meth:`setSentVideoStreamEnabled`; None to keep it.
+        """
+
+        calls = [
+            ('setAudioEnabled', [audioEnabled]),
+            ('setVideoEnabled', [videoEnabled]),
+            ('setSentAudioStreamEnabled', [sentAudioStreamEnabled]),
+            ('setSentVideoStreamEnabled', [sentVideoStreamEnabled]),
+        ]
+
+        calls = [(function, args) for function, args in calls if args[0] != None]
+        if not calls:
+            return
+
+        self.seleniumHelper.callBatch(calls)
+
+    def setCredentials(self, user, appToken):
+        """
+        The user and app token to use.
+
+        An app token/password can be generated in the Security section of the
+        personal settings (index.php/settings/user/security).
+
+        In siege mode the credentials always need to be set.
+
+        In virtual participant mode the participant will be a guest if the
+        credentials are not set.
+
+        :param user: the user ID.
+        :param appToken: the app token for the user.
+        """
+
+        self.seleniumHelper.call('setCredentials', user, appToken)
+
+    def setToken(self, token):
+        """
+        Sets the conversation token to use.
+
+        In siege mode this should be set only when conversation clustering is
+        enabled in the server.
+
+        In virtual participant mode the token always needs to be set.
+
+        :param token: the conversation token.
+        """
+
+        self.seleniumHelper.call('setToken', token)
+
+    def startMedia(self, audio, video):
+        """
+        Starts the media stream to be used by publishers (including virtual
+        participants).
+
+        By default in siege mode audio will be used, and in virtual participant
+        mode neither audio nor video will be used.
+
+        Only one media stream can be active at the same time, so any previous
+        stream is stopped when starting a new one. This should be done only when
+        the siege or the virtual participant is not active.
+
+        If both audio and video are False then there will be no media. This is
+        only allowed in virtual participant mode, but not in siege mode.
+
+        :param audio: True to start audio, False otherwise
+        :param video: True to start video, False otherwise
+        """
+
+        self.seleniumHelper.call('startMedia', audio, video)
+
+    def getMetrics(self):
+        """
+        Returns the state of the connections, as returned by "getMetrics()" in
+        Talkbuchet.js.
+
+        The logs are not printed, so this can be called from a background
+        thread.
+
+        :return: a dict with "publishers" and "subscribers" (each one a dict
+            with "iceConnectionStates", "connectionFailures", "bytesSent" and
+            "bytesReceived"), "handshakePhases" and "virtualParticipantStarted".
+        """
+
+        return self.seleniumHelper.executeWithoutLogs('return getMetrics()')
+
+    def getPerformanceMetrics(self):
+        """
+        Returns the performance metrics of the browser window.
+
+        See :py:meth:`SeleniumHelper.getPerformanceMetrics`.
+        """
+
+        return self.seleniumHelper.getPerformanceMetrics()
+
+
+_rampArrivals = ['constant', 'linear', 'step', 'poisson']
+
+def _newRampPolicy(maxInFlight = 1, arrival = 'constant', rate = 0, startRate = 0, rampDuration = 0, stepSize = 1, stepInterval = 0):
+    """
+    Returns a ramp policy, that is, how the connections of a siege are
+    established.
+
+    See :py:meth:`Siege.setRampPolicy` for the parameters.
+
+    :return: a dict with the ramp policy.
+    """
+
+    if arrival not in _rampArrivals:
+        raise Exception('Invalid arrival: ' + str(arrival))
+
+    if maxInFlight != None and (not isinstance(maxInFlight, int) or maxInFlight < 1):
+        raise Exception('Invalid maxInFlight, it must be at least 1 (or None for no limit): ' + str(maxInFlight))
+
+    for name, value in [('rate', rate), ('startRate', startRate), ('rampDuration', rampDuration), ('stepInterval', stepInterval)]:
+        if value < 0:
+            raise Exception('Invalid ' + name + ', it can not be negative: ' + str(value))
+
+    if arrival in ['linear', 'poisson'] and rate <= 0:
+        raise Exception('A rate is needed for ' + arrival + ' arrival')
+
+    if arrival == 'step' and stepSize < 1:
+        raise Exception('Step size must be at least 1')
+
+    return {
+        'maxInFlight': maxInFlight,
+        'arrival': arrival,
+        'rate': rate,
+        'startRate': startRate,
+        'rampDuration': rampDuration,
+        'stepSize': stepSize,
+        'stepInterval': stepInterval,
+    }
+
+def _getRampArrivalTimes(rampPolicy, count):
+    """
+    Returns the time, in seconds since the first one, at which each of the given
+    number of connection attempts should start according to the ramp policy.
+
+    This is the counterpart of "getRampArrivalTimes()" in Talkbuchet.js.
+    """
+
+    arrivalTimes = []
+
+    arrivalTime = 0
+    for i in range(count):
+        if rampPolicy['arrival'] == 'constant':
+            arrivalTime = i / rampPolicy['rate'] if rampPolicy['rate'] else 0
+        elif rampPolicy['arrival'] == 'linear':
+            # Connections started until "t" are "startRate * t + (rate -
+            # startRate) * t^2 / (2 * rampDuration)" during the ramp, so the
+            # quadratic equation is solved to get when "i" connections were
+            # started.
+            rampConnections = (rampPolicy['startRate'] + rampPolicy['rate']) * rampPolicy['rampDuration'] / 2
+            if i >= rampConnections:
+                arrivalTime = rampPolicy['rampDuration'] + (i - rampConnections) / rampPolicy['rate']
+            elif rampPolicy['startRate'] == rampPolicy['rate']:
+                arrivalTime = i / rampPolicy['rate']
+            else:
+                acceleration = (rampPolicy['rate'] - rampPolicy['startRate']) / (2 * rampPolicy['rampDuration'])
+                arrivalTime = (-rampPolicy['startRate'] + math.sqrt(rampPolicy['startRate'] ** 2 + 4 * acceleration * i)) / (2 * acceleration)
+        elif rampPolicy['arrival'] == 'step':
+            arrivalTime = (i // rampPolicy['stepSize']) * rampPolicy['stepInterval']
+        elif rampPolicy['arrival'] == 'poisson' and i > 0:
+            arrivalTime += random.expovariate(rampPolicy['rate'])
+
+        arrivalTimes.append(arrivalTime)
+
+    return arrivalTimes
+
+def _estimateRampDuration(rampPolicy, count, connectionTimeout):
+    """
+    Returns the maximum seconds that establishing the given number of
+    connections with the ramp policy should take.
+
+    As Poisson arrivals are random the expected duration is doubled for them.
+    """
+
+    if rampPolicy['arrival'] == 'poisson':
+        arrivalsDuration = 2 * count / rampPolicy['rate']
+    else:
+        arrivalsDuration = _getRampArrivalTimes(rampPolicy, count)[-1] if count else 0
+
+    maxInFlight = rampPolicy['maxInFlight'] or count or 1
+
+    return arrivalsDuration + math.ceil(count / maxInFlight) * connectionTimeout
+
+async def _runWithRampPolicy(rampPolicy, count, connect):
+    """
+    Awaits "connect(i)" for each of the given number of connections following
+    the ramp policy.
+
+    This is the counterpart of "runWithRampPolicy()" in Talkbuchet.js.
+    """
+
+    arrivalTimes = _getRampArrivalTimes(rampPolicy, count)
+
+    semaphore = asyncio.Semaphore(rampPolicy['maxInFlight'] or max(count, 1))
+
+    async def connectAndRelease(i):
+        try:
+            await connect(i)
+        finally:
+            semaphore.release()
+
+    connectionAttempts = []
+
+    startTime = monotonic()
+    for i in range(count):
+        await asyncio.sleep(startTime + arrivalTimes[i] - monotonic())
+
+        await semaphore.acquire()
+
+        connectionAttempts.append(asyncio.get_running_loop().create_task(connectAndRelease(i)))
+
+    await asyncio.gather(*connectionAttempts)
+
+
+def _importNumpy():
+    """
+    Returns the numpy module, or None if it is not available.
+
+    NumPy is optional; if it is not available Python arrays are used instead.
+    """
+
+    try:
+        import numpy
+    except ImportError:
+        return None
+
+    return numpy
+
+# Fields of the stats of each connection kept by the stats sampler, like in
+# Talkbuchet.js.
+_statsSamplerFields = ['bytesSent', 'packetsSent', 'bytesReceived', 'packetsReceived', 'packetsLost', 'jitter', 'framesDecoded', 'roundTripTime']
+
+
+class StatsStore:
+    """
+    Columnar time series of the stats sampled from the connections of a siege.
+
+    Each sample is a row with a "timestamp" column (in milliseconds since the
+    epoch), a "connection" column (a numeric ID; the label of each connection
+    is in "connections") and a column for each of the sampled fields (bytes,
+    packets, packets lost and frames decoded are cumulative counters for the
+    whole connection, while jitter and round trip time are the maximum between
+    all the streams of the connection). Missing values are NaN.
+
+    In memory the columns are NumPy arrays if NumPy is available, or Python
+    arrays otherwise. If a directory is given the samples are also appended to a
+    file for each column ("COLUMN.f64", or "connection.u32", with the raw
+    little-endian values) and the connection labels are written to
+    "connections.json", so long runs can be analysed later.
+
+    If the performance metrics collector is running the performance metrics of
+    the browser of the siege are stored too, in "performanceMetrics" (and in
+    "performanceMetrics.jsonl" if a directory is given), so they can be
+    related to the stats of the connections.
+    """
+
+    columnTypes = dict([('timestamp', 'd'), ('connection', 'I')] + [(field, 'd') for field in _statsSamplerFields])
+
+    def __init__(self, directory = None):
+        """
+        :param directory: the directory to store the samples in, if any.
+        """
+
+        self.numpy = _importNumpy()
+
+        self.connections = {}
+        self.count = 0
+        self.droppedCount = 0
+
+        self.columnChunks = {column: [] for column in self.columnTypes}
+
+        self.performanceMetrics = []
+
+        self.directory = Path(directory) if directory else None
+        if self.directory:
+            self.directory.mkdir(parents=True, exist_ok=True)
+
+    def __columnFile(self, column):
+        return self.directory / (column + ('.u32' if self.columnTypes[column] == 'I' else '.f64'))
+
+    def appendColumns(self, connections, columns, droppedCount = 0):
+        """
+        Appends samples to the store.
+
+        :param connections: dict with the labels of new connections by their ID.
+        :param columns: dict with the raw little-endian values of each column.
+        :param droppedCount: the number of samples that were dropped before
+            these ones.
+        """
+
+        self.connections.update({int(connectionId): label for connectionId, label in connections.items()})
+        self.droppedCount += droppedCount
+
+        count = 0
+        for column, typeCode in self.columnTypes.items():
+            if self.numpy:
+                values = self.numpy.frombuffer(columns[column], dtype='<u4' if typeCode == 'I' else '<f8')
+            else:
+                values = array.array(typeCode)
+                values.frombytes(columns[column])
+                if sys.byteorder == 'big':
+                    values.byteswap()
+
+            self.columnChunks[column].append(values)
+            count = len(values)
+
+            if self.directory:
+                with open(self.__columnFile(column), 'ab') as columnFile:
+                    columnFile.write(columns[column])
+
+        self.count += count
+
+        if self.directory:
+            (self.directory / 'connections.json').write_text(json.dumps(self.connections))
+
+    def appendPerformanceMetrics(self, timestamp, metrics):
+        """
+        Appends a sample of the performance metrics of the browser.
+
+        :param timestamp: the time of the sample, in milliseconds since the
+            epoch like the "timestamp" column.
+        :param metrics: the metrics; see
+            :py:meth:`SeleniumHelper.getPerformanceMetrics`.
+        """
+
+        sample = {
+            'timestamp': timestamp,
+            'metrics': metrics,
+        }
+
+        self.performanceMetrics.append(sample)
+
+        if self.directory:
+            with open(self.directory / 'performanceMetrics.jsonl', 'a') as performanceMetricsFile:
+                performanceMetricsFile.write(json.dumps(sample) + '\n')
+
+    def appendBatch(self, batch):
+        """
+        Appends a batch of samples taken from Talkbuchet.js.
+
+        :param batch: the batch returned by "takeStatsSamples()".
+        """
+
+        columns = {
+            'timestamp': base64.b64decode(batch['timestamp']),
+            'connection': base64.b64decode(batch['connection']),
+        }
+        for field in _statsSamplerFields:
+            columns[field] = base64.b64decode(batch['values'][field])
+
+        self.appendColumns(batch['connections'], columns, batch['droppedCount'])
+
+    def getColumn(self, column):
+        """
+        Returns all the values of the given column.
+
+        :param column: "timestamp", "connection" or a sampled field.
+        :return: a NumPy array, or a Python array if NumPy is not available.
+        """
+
+        chunks = self.columnChunks[column]
+
+        if len(chunks) != 1:
+            if self.numpy:
+                values = self.numpy.concatenate(chunks) if chunks else self.numpy.array([], dtype='<u4' if self.columnTypes[column] == 'I' else '<f8')
+            else:
+                values = array.array(self.columnTypes[column])
+                for chunk in chunks:
+                    values.extend(chunk)
+
+            self.columnChunks[column] = [values]
+
+        return self.columnChunks[column][0]
+
+    def __len__(self):
+        return self.count
+
+    def getSummary(self):
+        """
+        Returns the bitrates and losses of each connection over the whole run.
+
+        :return: a dict with the label of each connection as key, and a dict
+            with "duration" (in seconds), "sentBitrate" and "receivedBitrate"
+            (in bits per second), "packetsLost", "lossRate" and "maxJitter" as
+            value.
+        """
+
+        timestamps = self.getColumn('timestamp')
+        connections = self.getColumn('connection')
+        columns = {field: self.getColumn(field) for field in ['bytesSent', 'bytesReceived', 'packetsReceived', 'packetsLost', 'jitter']}
+
+        # Samples are ordered by time, so the first and last indexes of each
+        # connection are those of its first and last samples.
+        firstIndexes = {}
+        lastIndexes = {}
+        maxJitters = {}
+        if self.numpy:
+            connectionIds, indexes = self.numpy.unique(connections, return_index=True)
+            firstIndexes = dict(zip(connectionIds.tolist(), indexes.tolist()))
+            connectionIds, indexes = self.numpy.unique(connections[::-1], return_index=True)
+            lastIndexes = dict(zip(connectionIds.tolist(), (len(connections) - 1 - indexes).tolist()))
+
+            jitters = self.numpy.full(int(connections.max()) + 1 if len(connections) else 0, self.numpy.nan)
+            self.numpy.fmax.at(jitters, connections, columns['jitter'])
+            maxJitters = {connectionId: jitters[connectionId] for connectionId in firstIndexes}
+        else:
+            for index, connectionId in enumerate(connections):
+                firstIndexes.setdefault(connectionId, index)
+                lastIndexes[connectionId] = index
+
+                jitter = columns['jitter'][index]
+                if not math.isnan(jitter):
+                    maxJitters[connectionId] = max(maxJitters.get(connectionId, jitter), jitter)
+
+        def delta(column, connectionId):
+            value = columns[column][lastIndexes[connectionId]] - columns[column][firstIndexes[connectionId]]
+            return 0 if math.isnan(value) else float(value)
+
+        summary = {}
+        for connectionId, firstIndex in firstIndexes.items():
+            duration = (timestamps[lastIndexes[connectionId]] - timestamps[firstIndex]) / 1000
+
+            packetsLost = delta('packetsLost', connectionId)
+            packetsReceived = delta('packetsReceived', connectionId)
+
+            summary[self.connections.get(connectionId, str(connectionId))] = {
+                'duration': float(duration),
+                'sentBitrate': delta('bytesSent', connectionId) * 8 / duration if duration else 0,
+                'receivedBitrate': delta('bytesReceived', connectionId) * 8 / duration if duration else 0,
+                'packetsLost': packetsLost,
+                'lossRate': packetsLost / (packetsLost + packetsReceived) if packetsLost + packetsReceived else 0.0,
+                'maxJitter': float(maxJitters.get(connectionId, math.nan)),
+            }
+
+        return summary
+
+    def printSummary(self):
+        """
+        Prints the bitrates and losses of each connection over the whole run.
+        """
+
+        for label, connectionSummary in self.getSummary().items():
+            print(label + ': '
+                  + 'sent ' + str(round(connectionSummary['sentBitrate'] / 1000, 1)) + ' kbps, '
+                  + 'received ' + str(round(connectionSummary['receivedBitrate'] / 1000, 1)) + ' kbps, '
+                  + 'lost ' + str(int(connectionSummary['packetsLost'])) + ' packets (' + str(round(connectionSummary['lossRate'] * 100, 2)) + '%), '
+                  + 'max jitter ' + str(connectionSummary['maxJitter']))
+
+        if self.droppedCount:
+            print(str(self.droppedCount) + ' samples were dropped; pull the stats more often or increase the sampler capacity')
+
+
+class LatencyHistogram:
+    """
+    Histogram of latencies (in milliseconds) with a bounded relative error.
+
+    Like in HdrHistogram, the values are counted in buckets whose width grows
+    with the value: values are recorded with microsecond resolution, and each
+    power of two is split in "subBucketCount" buckets. Therefore, the
+    percentiles have a relative error lower than 1 / subBucketCount (below 1%
+    with the default value), while the memory used does not depend on the
+    number of recorded values.
+
+    Histograms with the same "subBucketCount" can be merged, for example, to
+    aggregate the latencies of several sieges.
+    """
+
+    def __init__(self, subBucketCount = 128):
+        """
+        :param subBucketCount: the number of buckets of each power of two; it
+            is rounded up to a power of two.
+        """
+
+        self.subBucketBits = (subBucketCount - 1).bit_length()
+
+        self.bucketCounts = {}
+        self.count = 0
+        self.sum = 0
+        self.max = 0
+
+    def __getBucketRange(self, value):
+        # Values in [2^(n - 1), 2^n) are split in 2^subBucketBits buckets, so
+        # the width of each bucket is 2^(n - 1 - subBucketBits).
+        shift = max(value.bit_length() - 1 - self.subBucketBits, 0)
+        lowest = (value >> shift) << shift
+
+        return lowest, lowest + (1 << shift) - 1
+
+    def record(self, latency):
+        """
+        Records a latency.
+
+        :param latency: the latency, in milliseconds.
+        """
+
+        bucket, _ = self.__getBucketRange(max(round(latency * 1000), 0))
+
+        self.bucketCounts[bucket] = self.bucketCounts.get(bucket, 0) + 1
+        self.count += 1
+        self.sum += latency
+        self.max = max(self.max, latency)
+
+    def merge(self, histogram):
+        """
+        Adds the latencies recorded in the given histogram to this one.
+
+        :param histogram: the LatencyHistogram to merge.
+        """
+
+        if histogram.subBucketBits != self.subBucketBits:
+            raise Exception('Only histograms with the same number of sub buckets can be merged')
+
+        for bucket, count in histogram.bucketCounts.items():
+            self.bucketCounts[bucket] = self.bucketCounts.get(bucket, 0) + count
+
+        self.count += histogram.count
+        self.sum += histogram.sum
+        self.max = max(self.max, histogram.max)
+
+    def getCountAtOrBelow(self, latency):
+        """
+        Returns the number of recorded latencies lower than or equal to the
+        given one.
+
+        All the values in a bucket are considered equivalent, so the count
+        includes the bucket that the given latency falls in.
+
+        :param latency: the latency, in milliseconds.
+        """
+
+        bucket, _ = self.__getBucketRange(max(round(latency * 1000), 0))
+
+        return sum([count for lowest, count in self.bucketCounts.items() if lowest <= bucket])
+
+    def getValueAtPercentile(self, percentile):
+        """
+        Returns the given percentile (nearest-rank) of the recorded latencies.
+
+        As all the values in a bucket are considered equivalent, the highest
+        value of the bucket is returned (but never a value higher than the
+        maximum recorded latency).
+
+        :param percentile: the percentile, from 0 to 100.
+        :return: the latency, in milliseconds.
+        """
+
+        if not self.count:
+            return 0
+
+        rank = max(math.ceil(percentile / 100 * self.count), 1)
+
+        cumulativeCount = 0
+        for bucket in sorted(self.bucketCounts):
+            cumulativeCount += self.bucketCounts[bucket]
+            if cumulativeCount >= rank:
+                return min(self.__getBucketRange(bucket)[1] / 1000, self.max)
+
+        return self.max
+
+    def getPercentiles(self):
+        """
+        Returns the p50, p90, p99 and max latencies.
+
+        :return: a dict with "p50", "p90", "p99" and "max" keys.
+        """
+
+        return {
+            'p50': self.getValueAtPercentile(50),
+            'p90': self.getValueAtPercentile(90),
+            'p99': self.getValueAtPercentile(99),
+            'max': self.max,
+        }
+
+    def __repr__(self):
+        percentiles = self.getPercentiles()
+
+        return ('<LatencyHistogram: ' + str(self.count) + ' values, '
+                + 'p50=' + str(round(percentiles['p50'], 1)) + 'ms '
+                + 'p90=' + str(round(percentiles['p90'], 1)) + 'ms '
+                + 'p99=' + str(round(percentiles['p99'], 1)) + 'ms '
+                + 'max=' + str(round(percentiles['max'], 1)) + 'ms>')
+
+# Phases of the handshake of each connection, like in Talkbuchet.js.
+_handshakePhases = ['offer', 'answer', 'iceGathering', 'iceConnected', 'total']
+
+
+def _newHandshakeHistograms(handshakePhases):
+    """
+    Returns a LatencyHistogram for each phase of the handshake with the
+    durations of the given publisher and subscriber handshakes.
+
+    :param handshakePhases: dict with "publishers" and "subscribers" keys and a
+        list with the phases of the handshake of each peer as values, as
+        returned by "getHandshakePhases()" in Talkbuchet.js.
+    :return: dict with "publishers" and "subscribers" keys and a dict with a
+        LatencyHistogram for each phase as values.
+    """
+
+    handshakeHistograms = {}
+
+    for peerType in ['publishers', 'subscribers']:
+        handshakeHistograms[peerType] = {phase: LatencyHistogram() for phase in _handshakePhases}
+
+        for peerHandshakePhases in handshakePhases[peerType]:
+            for phase, duration in peerHandshakePhases.items():
+                handshakeHistograms[peerType][phase].record(duration)
+
+    return handshakeHistograms
+
+
+def _mergeHandshakeHistograms(handshakeHistogramsList):
+    """
+    Returns the handshake histograms of several sieges merged.
+
+    :param handshakeHistogramsList: list with the handshake histograms of each
+        siege.
+    """
+
+    mergedHandshakeHistograms = _newHandshakeHistograms({'publishers': [], 'subscribers': []})
+
+    for handshakeHistograms in handshakeHistogramsList:
+        for peerType, phaseHistograms in handshakeHistograms.items():
+            for phase, histogram in phaseHistograms.items():
+                mergedHandshakeHistograms[peerType][phase].merge(histogram)
+
+    return mergedHandshakeHistograms
+
+
+def _printHandshakeHistograms(handshakeHistograms):
+    for peerType, phaseHistograms in handshakeHistograms.items():
+        print(peerType.capitalize() + ':')
+
+        for phase in _handshakePhases:
+            histogram = phaseHistograms[phase]
+            percentiles = histogram.getPercentiles()
+
+            print('  - ' + phase + ': '
+                  + 'count=' + str(histogram.count) + ' '
+                  + 'p50=' + str(round(percentiles['p50'], 1)) + 'ms '
+                  + 'p90=' + str(round(percentiles['p90'], 1)) + 'ms '
+                  + 'p99=' + str(round(percentiles['p99'], 1)) + 'ms '
+                  + 'max=' + str(round(percentiles['max'], 1)) + 'ms')
+
+
+# ICE connection states with problems, which are the ones listed by default in
+# the connection summaries.
+_problemIceConnectionStates = ['failed', 'disconnected']
+
+
+def _getConnectionsSummary(connections, states, offset, limit):
+    """
+    Returns a compact summary of the state of the given connections, like
+    "getConnectionsSummary()" in Talkbuchet.js.
+
+    :param connections: list of (details, peer) tuples.
+    """
+
+    summary = {
+        'count': len(connections),
+        'iceConnectionStates': {},
+        'matchingCount': 0,
+        'matchingConnections': [],
+    }
+
+    for details, peer in connections:
+        iceConnectionState = peer.peerConnection.iceConnectionState
+
+        summary['iceConnectionStates'][iceConnectionState] = summary['iceConnectionStates'].get(iceConnectionState, 0) + 1
+
+        if iceConnectionState not in states:
+            continue
+
+        if summary['matchingCount'] >= offset and len(summary['matchingConnections']) < limit:
+            summary['matchingConnections'].append(dict(details, state=iceConnectionState))
+
+        summary['matchingCount'] += 1
+
+    return summary
+
+
+def _mergeConnectionsSummaries(summaries, offset, limit):
+    """
+    Returns the connection summaries of several sieges merged.
+
+    The matching connections of each siege are labelled with the index of the
+    siege, and they are paged again after merging them, so the summaries must
+    include their matching connections from the beginning up to "offset +
+    limit".
+
+    :param summaries: list of (siege index, summary) tuples.
+    """
+
+    mergedSummary = {
+        'count': 0,
+        'iceConnectionStates': {},
+        'matchingCount': 0,
+        'matchingConnections': [],
+    }
+
+    for index, summary in summaries:
+        mergedSummary['count'] += summary['count']
+        mergedSummary['matchingCount'] += summary['matchingCount']
+
+        for iceConnectionState, count in summary['iceConnectionStates'].items():
+            mergedSummary['iceConnectionStates'][iceConnectionState] = mergedSummary['iceConnectionStates'].get(iceConnectionState, 0) + count
+
+        mergedSummary['matchingConnections'] += [dict(connection, siege=index) for connection in summary['matchingConnections']]
+
+    mergedSummary['matchingConnections'] = mergedSummary['matchingConnections'][offset:offset + limit]
+
+    return mergedSummary
+
+
+def _printConnectionsSummary(summary, states, offset):
+    iceConnectionStates = summary['iceConnectionStates']
+
+    print('Summary (' + str(summary['count']) + ' connections):')
+    print('  - New: ' + str(iceConnectionStates.get('new', 0) + iceConnectionStates.get('checking', 0)))
+    print('  - Connected: ' + str(iceConnectionStates.get('connected', 0) + iceConnectionStates.get('completed', 0)))
+    print('  - Disconnected: ' + str(iceConnectionStates.get('disconnected', 0)))
+    print('  - Failed: ' + str(iceConnectionStates.get('failed', 0)))
+
+    if not summary['matchingCount']:
+        return
+
+    print(' or '.join(states).capitalize() + ' (' + str(summary['matchingCount']) + ', showing ' + str(offset + 1) + '-' + str(offset + len(summary['matchingConnections'])) + '):')
+    for connection in summary['matchingConnections']:
+        if 'index' in connection:
+            name = str(connection['index']) + ' (subscribed to ' + connection['sessionId'] + ')'
+        else:
+            name = connection['sessionId']
+
+        if 'siege' in connection:
+            name = 'siege ' + str(connection['siege']) + ', ' + name
+
+        print('  - ' + name + ': ' + connection['state'])
+
+
+class Siege(TalkbuchetCommon):
+    """
+    Wrapper for Talkbuchet in siege mode.
+
+    Besides the common functions this wrapper exposes only the Talkbuchet
+    functions for siege mode.
+    """
+
+    def __init__(self, browser, nextcloudUrl, headless = True, remoteSeleniumUrl = None, browserPool = None, sharedBrowser = None):
+        """
+        See :py:meth:`TalkbuchetCommon.__init__`.
+        """
+
+        super().__init__(browser, nextcloudUrl, headless, remoteSeleniumUrl, browserPool, sharedBrowser)
+
+        # Set default values from Talkbuchet.js.
+        self.publishersCount = 5
+        self.subscribersPerPublisherCount = 40
+        self.connectionWarningTimeout = 5000
+        self.rampPolicy = _newRampPolicy()
+
+        self.statsStore = None
+
+    def closeConnections(self):
+        """
+        Stops the siege by closing the publisher and subscriber connections
+
+        As the media stream is no longer needed it is also stopped.
+        """
+
+        self.seleniumHelper.execute('closeConnections()')
+
+    def checkPublishersConnections(self):
+        """
+        Prints the state of the publisher connections.
+        """
+
+        self.seleniumHelper.execute('checkPublishersConnections()')
+
+    def checkSubscribersConnections(self):
+        """
+        Prints the state of the subscriber connections.
+        """
+
+        self.seleniumHelper.execute('checkSubscribersConnections()')
+
+    def getPublishersConnectionsSummary(self, states = None, offset = 0, limit = 100):
+        """
+        Returns a compact summary of the state of the publisher connections.
+
+        Unlike :py:meth:`checkPublishersConnections` the state of every
+        connection is not returned, but just the number of connections in each
+        ICE connection state and the connections in the given states, so it is
+        cheap enough to be periodically called even with thousands of
+        connections.
+
+        :param states: the ICE connection states of the connections to
+            return; failed and disconnected connections by default.
+        :param offset: the number of matching connections to skip.
+        :param limit: the maximum number of matching connections to return.
+        :return: a dict with "count" (the number of connections),
+            "iceConnectionStates" (the number of connections in each state),
+            "matchingCount" (the number of connections in the given states)
+            and "matchingConnections" (a list with the session ID and state of
+            the connections in the given states).
+        """
+
+        return self.seleniumHelper.executeWithoutLogs('return getPublishersConnectionsSummary(...arguments)', states or _problemIceConnectionStates, offset, limit)
+
+    def getSubscribersConnectionsSummary(self, states = None, offset = 0, limit = 100):
+        """
+        Returns a compact summary of the state of the subscriber connections.
+
+        See :py:meth:`getPublishersConnectionsSummary`; besides the session ID
+        of the publisher and the state, the index of the subscriber and its
+        signaling index are returned for each matching connection.
+        """
+
+        return self.seleniumHelper.executeWithoutLogs('return getSubscribersConnectionsSummary(...arguments)', states or _problemIceConnectionStates, offset, limit)
+
+    def printPublisherStats(self, publisherSessionId):
+        """
+        Prints the stats of the given publisher connection.
+
+        :param publisherSessionId: the session ID of the publisher.
+        """
+
+        self.seleniumHelper.call('printPublisherStats', publisherSessionId, True)
+
+    def printSubscriberStats(self, index):
+        """
+        Prints the stats of the given subscriber connection.
+
+        :param index: the index of the subscriber in the list of subscribers.
+        """
+
+        self.seleniumHelper.call('printSubscriberStats', index, True)
+
+    def startStatsSampler(self, interval = 1000, capacity = 100000, directory = None):
+        """
+        Starts periodically sampling the stats of all the siege connections.
+
+        Some fields of the stats of each connection are sampled and kept in the
+        browser until they are pulled with :py:meth:`pullStats`, which adds
+        them to :py:attr:`statsStore`. Samples are kept in a ring buffer, so
+        the stats should be pulled before the buffer is full (for example,
+        with 1000 connections and the default values the stats should be
+        pulled at least every 100 seconds).
+
+        :param interval: the milliseconds between samples.
+        :param capacity: the maximum number of samples kept in the browser.
+        :param directory: the directory to store the samples in, if any.
+        """
+
+        self.statsStore = StatsStore(directory)
+
+        self.seleniumHelper.call('startStatsSampler', interval, capacity)
+
+    def pullStats(self, maxCount = None):
+        """
+        Pulls the stats sampled since the previous call and adds them to
+        :py:attr:`statsStore`.
+
+        :param maxCount: the maximum number of samples to pull, or None to pull
+            all of them.
+        :return: the StatsStore.
+        """
+
+        if self.statsStore is None:
+            print('Stats sampler was not started')
+
+            return None
+
+        # A null maximum count would take no samples, so it is not passed at
+        # all to take all of them.
+        batch = self.seleniumHelper.call('takeStatsSamples', *([maxCount] if maxCount else []))
+        if batch:
+            self.statsStore.appendBatch(batch)
+
+        return self.statsStore
+
+    def stopStatsSampler(self):
+        """
+        Stops sampling the stats and pulls the remaining samples.
+        """
+
+        self.seleniumHelper.execute('stopStatsSampler()')
+
+        self.pullStats()
+
+    def getHandshakeHistograms(self):
+        """
+        Returns histograms with the duration of each phase of the handshake of
+        the publisher and subscriber connections.
+
+        The phases are "offer" (for publishers, creating the offer; for
+        subscribers, from requesting the offer until it is received), "answer"
+        (for publishers, from setting the offer until the answer is received;
+        for subscribers, from receiving the offer until the answer is
+        created), "iceGathering" (from setting the local description until all
+        the local candidates were gathered), "iceConnected" (from having both
+        descriptions until ICE is connected) and "total" (from the start until
+        ICE is connected). Phases that did not end (yet) are not counted, so
+        the count of "total" is the number of connections that were
+        established.
+
+        Only the current connections are taken into account; connections that
+        were removed from the siege are not.
+
+        :return: dict with "publishers" and "subscribers" keys and a dict with
+            a LatencyHistogram for each phase as values.
+        """
+
+        return _newHandshakeHistograms(self.getHandshakePhases())
+
+    def getHandshakePhases(self):
+        """
+        Returns the duration of each phase of the handshake of each publisher
+        and subscriber connection.
+
+        See :py:meth:`getHandshakeHistograms`.
+
+        :return: dict with "publishers" and "subscribers" keys and a list with
+            a dict with the duration (in milliseconds) of each ended phase of
+            each connection as values.
+        """
+
+        return self.seleniumHelper.executeWithoutLogs('return getHandshakePhases()')
+
+    def printHandshakeTimings(self):
+        """
+        Prints the p50, p90, p99 and max durations of each phase of the
+        handshake of the publisher and subscriber connections.
+
+        See :py:meth:`getHandshakeHistograms`.
+        """
+
+        _printHandshakeHistograms(self.getHandshakeHistograms())
+
+    def setPublishersAndSubscribersCount(self, publishersCount, subscribersPerPublisherCount):
+        """
+        Sets the number of publishers and subscribers per publisher to use.
+
+        If not explicitly set the default number from Talkbuchet.js is used,
+        which is 5 publishers and 40 subscribers per publisher.
+
+        :param publishersCount: the number of publishers.
+        :param subscribersPerPublisherCount: the number of subscribers for each
+            publisher.
+        """
+
+        self.publishersCount = publishersCount
+        self.subscribersPerPublisherCount = subscribersPerPublisherCount
+
+        self.seleniumHelper.call('setPublishersAndSubscribersCount', publishersCount, subscribersPerPublisherCount)
+
+    def setConnectionWarningTimeout(self, connectionWarningTimeout):
+        """
+        Sets the milliseconds to wait before warning about connection problems.
+
+        A message is printed when a connection was not established after or has
+        been disconnected for more than the given time. However, note that the
+        message might not be printed in CLI until another command is executed.
+
+        :param connectionWarningTimeout: the milliseconds to wait before
+            warning about connection issues.
+        """
+
+        self.connectionWarningTimeout = connectionWarningTimeout
+
+        self.seleniumHelper.call('setConnectionWarningTimeout', connectionWarningTimeout)
+
+    def setRampPolicy(self, maxInFlight = 1, arrival = 'constant', rate = 0, startRate = 0, rampDuration = 0, stepSize = 1, stepInterval = 0):
+        """
+        Sets how the connections of the siege are established.
+
+        By default the connections are established one after the other, as fast
+        as possible. Several connections can be established at the same time,
+        and the start of each connection attempt can follow an arrival schedule
+        to, for example, quickly reach the full load or to simulate everyone
+        joining at the same time.
+
+        The publishers are all established before the subscribers, and the ramp
+        policy is applied to each of them separately.
+
+        :param maxInFlight: the maximum number of connections being established
+            at the same time, or None for no limit.
+        :param arrival: when each connection attempt starts; "constant" ("rate"
+            connections per second, or as fast as possible if "rate" is 0),
+            "linear" (the rate grows from "startRate" to "rate" connections per
+            second during "rampDuration" seconds, and then it stays at "rate"),
+            "step" ("stepSize" connections every "stepInterval" seconds) or
+            "poisson" (random arrivals, "rate" connections per second on
+            average).
+        :param rate: the connections per second.
+        :param startRate: the initial connections per second of a linear ramp.
+        :param rampDuration: the seconds of a linear ramp.
+        :param stepSize: the connections started at once in each step.
+        :param stepInterval: the seconds between steps.
+        """
+
+        self.rampPolicy = _newRampPolicy(maxInFlight, arrival, rate, startRate, rampDuration, stepSize, stepInterval)
+
+        self.seleniumHelper.call('setRampPolicy', self.rampPolicy)
+
+    def __callEstablishingConnections(self, function, args, publishersCount, subscribersCount):
+        savedScriptTimeout = self.seleniumHelper.getScriptTimeout()
+
+        # Adjust script timeout to prevent it from ending before the connections
+        # have been established.
+        connectionTimeout = self.connectionWarningTimeout / 1000
+        scriptTimeout = (_estimateRampDuration(self.rampPolicy, publishersCount, connectionTimeout)
+                         + _estimateRampDuration(self.rampPolicy, subscribersCount, connectionTimeout))
+        if scriptTimeout > savedScriptTimeout:
+            self.seleniumHelper.setScriptTimeout(scriptTimeout)
+
+        try:
+            self.seleniumHelper.call(function, *args)
+        finally:
+            self.seleniumHelper.setScriptTimeout(savedScriptTimeout)
+
+    def siege(self):
+        """
+        Starts a siege.
+        """
+
+        self.__callEstablishingConnections('siege', [], self.publishersCount, self.publishersCount * self.subscribersPerPublisherCount)
+
+    def addPublishers(self, count):
+        """
+        Adds publishers to the active siege.
+
+        Like in a real call, the existing subscribers also subscribe to the new
+        publishers, so the number of subscribers per publisher does not change.
+
+        :param count: the number of publishers to add.
+        """
+
+        if not isinstance(count, int) or count < 1:
+            raise Exception('Invalid count of publishers, it must be a positive integer: ' + str(count))
+
+        self.__callEstablishingConnections('addPublishers', [count], count, count * self.subscribersPerPublisherCount)
+
+        self.publishersCount += count
+
+    def removePublishers(self, count):
+        """
+        Removes publishers, and the subscribers to them, from the active siege.
+
+        The last added publishers are removed first.
+
+        :param count: the number of publishers to remove.
+        """
+
+        self.seleniumHelper.call('removePublishers', count)
+
+        self.publishersCount = max(self.publishersCount - count, 0)
+
+    def addSubscribers(self, countPerPublisher):
+        """
+        Adds subscribers to each publisher of the active siege.
+
+        :param countPerPublisher: the number of subscribers to add to each
+            publisher.
+        """
+
+        if not isinstance(countPerPublisher, int) or countPerPublisher < 1:
+            raise Exception('Invalid count of subscribers per publisher, it must be a positive integer: ' + str(countPerPublisher))
+
+        self.__callEstablishingConnections('addSubscribers', [countPerPublisher], 0, countPerPublisher * self.publishersCount)
+
+        self.subscribersPerPublisherCount += countPerPublisher
+
+    def removeSubscribers(self, countPerPublisher):
+        """
+        Removes subscribers to each publisher from the active siege.
+
+        The last added subscribers are removed first.
+
+        :param countPerPublisher: the number of subscribers to remove from each
+            publisher.
+        """
+
+        self.seleniumHelper.call('removeSubscribers', countPerPublisher)
+
+        self.subscribersPerPublisherCount = max(self.subscribersPerPublisherCount - countPerPublisher, 0)
+
+class VirtualParticipant(TalkbuchetCommon):
+    """
+    Wrapper for Talkbuchet in virtual participant mode.
+
+    Besides the common functions this wrapper exposes only the Talkbuchet
+    functions for virtual participant mode.
+    """
+
+    def __init__(self, browser, nextcloudUrl, headless = True, remoteSeleniumUrl = None, browserPool = None, sharedBrowser = None):
+        """
+        See :py:meth:`TalkbuchetCommon.__init__`.
+        """
+
+        super().__init__(browser, nextcloudUrl, headless, remoteSeleniumUrl, browserPool, sharedBrowser)
+
+    def startVirtualParticipant(self):
+        """
+        Starts the virtual participant.
+        """
+
+        self.seleniumHelper.executeAsync('await startVirtualParticipant()')
+
+    def stopVirtualParticipant(self):
+        """
+        Stops the virtual participant.
+        """
+
+        self.seleniumHelper.executeAsync('await stopVirtualParticipant()')
+
+    def isStarted(self):
+        """
+        Returns whether the virtual participant is started or not.
+
+        :return: True if the virtual participant joined the call, False
+            otherwise.
+        """
+
+        return self.seleniumHelper.execute('return getVirtualParticipant() ? true : false')
+
+    def sendMediaEnabledStateThroughDataChannel(self, mediaType, enabled):
+        """
+        Sends the enabled state of the media using a data channel message.
+
+        :param mediaType: "audio" or "video".
+        :param enabled: True or False.
+        """
+
+        self.seleniumHelper.call('sendMediaEnabledStateThroughDataChannel', mediaType, enabled)
+
+    def sendSpeakingStateThroughDataChannel(self, speaking):
+        """
+        Sends the speaking state using a data channel message.
+
+        :param speaking: True for speaking, False for not speaking.
+        """
+
+        self.seleniumHelper.call('sendSpeakingStateThroughDataChannel', speaking)
+
+    def sendNickThroughDataChannel(self, nick):
+        """
+        Sends the nick of the participant using a data channel message.
+
+        :param nick: the nick to send.
+        """
+
+        self.seleniumHelper.call('sendNickThroughDataChannel', nick)
+
+
+class RealParticipant():
+    """
+    Wrapper for Talkbuchet in real participant mode.
+
+    This wrapper exposes functions to use a real participant in a browser.
+    """
+
+    def __init__(self, browser, nextcloudUrl, headless = True, remoteSeleniumUrl = None, browserPool = None):
+        """
+        Starts a real participant in the given Nextcloud URL using the given
+        browser.
+
+        :param browser: "firefox" or "chrome".
+        :param nextcloudUrl: the URL of the Nextcloud instance to start the real
+            participant in.
+        :param headless: whether the browser will be started in headless mode or
+            not; headless mode is used by default.
+        :param remoteSeleniumUrl: the URL of the Selenium server to connect to,
+            or a SeleniumScheduler to choose the Selenium server from; the local
+            server is used by default.
+        :param browserPool: the BrowserPool to take the browser from; a new
+            browser is launched by default.
+        """
+
+        self.loggedIn = False
+        self.inRoom = False
+        self.inCall = False
+
+        self.nextcloudUrl = nextcloudUrl
+
+        self.browserPool = browserPool
+
+        if browserPool:
+            # Browsers in the pool already have Talkbuchet loaded in the
+            # Nextcloud URL, but that does not interfere with the real
+            # participant.
+            self.seleniumHelper = browserPool.acquire(browser, nextcloudUrl, headless, remoteSeleniumUrl)
+
+            return
+
+        self.seleniumHelper = SeleniumHelper()
+        self.seleniumHelper.startBrowser(browser, headless, remoteSeleniumUrl)
+
+        self.seleniumHelper.driver.get(nextcloudUrl)
+
+    def release(self):
+        """
+        Releases the browser used by the real participant.
+
+        If the real participant was created with a browser pool the call is
+        left (if it was joined) and then the conversation is left (by opening
+        the Nextcloud URL, which unloads the conversation), and the browser is
+        given back to the pool, which clears the cookies (which logs out) and
+        the storage and loads Talkbuchet again. Otherwise the browser is quit. The real
+        participant can not be used after releasing it.
+        """
+
+        if self.browserPool and self.seleniumHelper:
+            try:
+                if self.inCall:
+                    self.leaveCall()
+
+                if self.inRoom:
+                    self.seleniumHelper.get(self.nextcloudUrl)
+                    self.inRoom = False
+            except Exception as exception:
+                print('Call or conversation could not be left: ' + str(exception))
+
+            self.browserPool.release(self.seleniumHelper)
+
+        self.seleniumHelper = None
+
+    def login(self, user, appToken):
+        """
+        Logs in Nextcloud as the given user with the given app token.
+
+        :param user: the ID of the user to log as.
+        :param appToken: an app token of the user.
+        """
+
+        # Fetching a Nextcloud URL in the browser console with a user and an app
+        # token implicitly does a login with that user. Visiting any page in the
+        # Nextcloud server will be done as a logged in user after that.
+        # The values are passed as arguments rather than in the script, so they
+        # do not need to be escaped.
+        self.seleniumHelper.executeAsync('''
+            const fetchOptions = {
+                headers: {
+                    'Authorization': 'Basic ' + btoa(arguments[0] + ':' + arguments[1]),
+                },
+            }
+
+            await fetch(arguments[2], fetchOptions)
+        ''', user, appToken, self.nextcloudUrl)
+
+        self.loggedIn = True
+
+    def joinRoom(self, token):
+        """
+        Joins the room with the given token.
+
+        If no login was done before the participant will join as a guest.
+
+        :param token: the token of the room to join.
+        """
+
+        self.seleniumHelper.driver.get(self.nextcloudUrl + '/call/' + token)
+
+        self.inRoom = True
+
+        if self.loggedIn:
+            return
+
+        # Starting with Talk 18 guests need to set their name after joining a
+        # room. If the dialog is not shown it is assumed that an older version
+        # is being used.
+        try:
+            submitNameButton = WebDriverWait(self.seleniumHelper.driver, timeout=10).until(lambda driver: driver.find_element(By.XPATH, '//button[contains(., "Submit name and join")]'))
+
+            submitNameButton.find_element(By.XPATH, '..//input[@type="text"]').send_keys('Talkbuchet')
+
+            submitNameButton.click()
+        except TimeoutException:
+            pass
+
+    def joinCall(self):
+        """
+        Joins (or starts) the call in the current room.
+
+        A room must have been joined before joining the call.
+        """
+
+        self.seleniumHelper.driver.find_element(By.CSS_SELECTOR, '.top-bar #call_button').click()
+
+        try:
+            # If the device selector is shown click on the "Join call" button
+            # in the dialog to actually join the call. Recording consent is
+            # granted first if needed.
+            callButton = WebDriverWait(self.seleniumHelper.driver, timeout=5).until(lambda driver: driver.find_element(By.CSS_SELECTOR, '.device-checker #call_button, .media-settings #call_button'))
+
+            try:
+                self.seleniumHelper.driver.find_element(By.XPATH, '//label[contains(., "Give consent to the recording of this call")]').click()
+            except NoSuchElementException:
+                pass
+
+            callButton.click()
+        except TimeoutException:
+            pass
+
+        self.inCall = True
+
+    def leaveCall(self):
+        """
+        Leaves the current call.
+
+        The call must have been joined first.
+        """
+
+        self.seleniumHelper.driver.find_element(By.CSS_SELECTOR, '.top-bar #call_button').click()
+
+        self.inCall = False
+
+    def getPerformanceMetrics(self):
+        """
+        Returns the performance metrics of the browser window, which show the
+        cost of the Talk web UI.
+
+        See :py:meth:`SeleniumHelper.getPerformanceMetrics`.
+        """
+
+        return self.seleniumHelper.getPerformanceMetrics()
+
+
+class StartupReport:
+    """
+    Result of creating several Talkbuchet wrappers with a StartupPool.
+
+    The wrappers that were successfully created are in "wrappers" (in the same
+    order in which they were requested), while the wrappers that could not be
+    created are in "failures", which maps the index of the failed wrapper to the
+    exception raised when creating it. The time, in seconds, that it took to
+    create all the wrappers is in "rampTime", and the time that it took to
+    create each wrapper (whether it failed or not) is in "creationTimes", which
+    maps the index of the wrapper to the time.
+    """
+
+    def __init__(self, count):
+        self.count = count
+        self.wrappers = []
+        self.failures = {}
+        self.creationTimes = {}
+        self.rampTime = 0
+
+    def __repr__(self):
+        return '<StartupReport: ' + str(len(self.wrappers)) + '/' + str(self.count) + ' created in ' + str(round(self.rampTime, 1)) + ' seconds>'
+
+
+def _releaseWrapper(wrapper):
+    """
+    Stops (if it is a started virtual participant) and releases a wrapper that
+    could not be fully created, so its browser, window or pool slot is not
+    leaked.
+
+    Errors are printed rather than raised, as the wrapper is being released
+    due to a previous error.
+    """
+
+    try:
+        if hasattr(wrapper, 'isStarted') and wrapper.isStarted():
+            wrapper.stopVirtualParticipant()
+    except Exception as exception:
+        print('Instance could not be stopped: ' + str(exception))
+
+    try:
+        if hasattr(wrapper, 'release'):
+            wrapper.release()
+    except Exception as exception:
+        print('Instance could not be released: ' + str(exception))
+
+
+class StartupPool:
+    """
+    Helper class to create several Talkbuchet wrappers in parallel.
+
+    Creating a wrapper launches a new browser, opens the Nextcloud URL and loads
+    Talkbuchet on it, and then the wrapper is typically configured and started.
+    All that takes several seconds for each wrapper, so the pool runs those
+    steps for several wrappers at the same time, up to the given parallelism
+    level.
+
+    Note that launching several browsers at the same time needs more CPU and
+    memory in the system running them (or in the remote Selenium server), so
+    the parallelism level should be adjusted to the available resources.
+    """
+
+    def __init__(self, parallelism = 1):
+        """
+        :param parallelism: the maximum number of wrappers to create at the same
+            time.
+        """
+
+        if parallelism < 1:
+            raise Exception('Invalid parallelism: ' + str(parallelism))
+
+        self.parallelism = parallelism
+
+    def run(self, count, createWrapper):
+        """
+        Creates as many wrappers as the given count.
+
+        Wrappers that could not be created are reported as soon as they fail,
+        and once all the wrappers were created a summary is printed.
+
+        :param count: the number of wrappers to create.
+        :param createWrapper: the function to create, configure and (if needed)
+            start a single wrapper; it must return the wrapper, or release the
+            partially created wrapper and raise an exception if the wrapper
+            could not be created.
+        :return: a :py:class:`StartupReport` with the created wrappers.
+        """
+
+        report = StartupReport(count)
+
+        startTime = monotonic()
+
+        wrappers = [None] * count
+
+        def createWrapperWithIndex(index):
+            creationStartTime = monotonic()
+
+            try:
+                wrappers[index] = createWrapper()
+            except Exception as exception:
+                print('Instance ' + str(index) + ' failed: ' + str(exception))
+
+                # The traceback references the partially created wrapper, which
+                # would prevent its browser from being quit.
+                report.failures[index] = exception.with_traceback(None)
+
+            report.creationTimes[index] = monotonic() - creationStartTime
+
+        try:
+            with ThreadPoolExecutor(max_workers=self.parallelism) as executor:
+                futures = [executor.submit(createWrapperWithIndex, index) for index in range(count)]
+
+                for future in futures:
+                    future.result()
+        except BaseException:
+            # The wrappers already created would never be returned (for
+            # example, if the creation was interrupted), so they are released
+            # rather than leaked.
+            for wrapper in wrappers:
+                if wrapper != None:
+                    _releaseWrapper(wrapper)
+
+            raise
+
+        report.wrappers = [wrapper for wrapper in wrappers if wrapper != None]
+        report.rampTime = monotonic() - startTime
+
+        print('Created ' + str(len(report.wrappers)) + '/' + str(count) + ' instances in ' + str(round(report.rampTime, 1)) + ' seconds')
+
+        return report
+
+
+class BroadcastReport:
+    """
+    Result of calling a method in several Talkbuchet wrappers with a
+    Broadcaster.
+
+    "results" maps the index of each wrapper to a dict with "success" (whether
+    the method returned without raising an exception), "latency" (the seconds
+    that the call took) and either "result" (the value returned by the method)
+    or "error" (the exception raised). The time, in seconds, that it took to
+    call the method in all the wrappers is in "totalTime".
+    """
+
+    def __init__(self, method):
+        self.method = method
+        self.results = {}
+        self.totalTime = 0
+
+    def __repr__(self):
+        latencies = sorted(result['latency'] for result in self.results.values())
+
+        return '<BroadcastReport: ' + self.method + ' succeeded in ' + str(len(self.getSuccesses())) + '/' + str(len(self.results)) + ' instances in ' + str(round(self.totalTime, 1)) + ' seconds (latency p50 ' + str(round(_percentile(latencies, 50), 3)) + ', max ' + str(round(_percentile(latencies, 100), 3)) + ')>'
+
+    def getSuccesses(self):
+        """
+        Returns the results of the calls that succeeded, by wrapper index.
+        """
+
+        return {index: result for index, result in self.results.items() if result['success']}
+
+    def getFailures(self):
+        """
+        Returns the results of the calls that failed, by wrapper index.
+        """
+
+        return {index: result for index, result in self.results.items() if not result['success']}
+
+
+def _selectWrappers(wrappers, selection):
+    """
+    Returns a list of (index, wrapper) tuples with the selected wrappers.
+
+    :param wrappers: the list of wrappers to select from.
+    :param selection: None to select all the wrappers, an index, a range, a
+        slice or a list of indexes to select those wrappers, or a function that
+        returns True for the wrappers to select.
+    """
+
+    if selection == None:
+        return list(enumerate(wrappers))
+
+    if callable(selection):
+        return [(index, wrapper) for index, wrapper in enumerate(wrappers) if selection(wrapper)]
+
+    if isinstance(selection, int):
+        selection = [selection]
+    elif isinstance(selection, slice):
+        selection = range(*selection.indices(len(wrappers)))
+
+    if not all(isinstance(index, int) and 0 <= index < len(wrappers) for index in selection):
+        raise Exception('Invalid selection: ' + str(selection))
+
+    return [(index, wrappers[index]) for index in selection]
+
+
+class Broadcaster:
+    """
+    Helper class to call a method in several Talkbuchet wrappers at the same
+    time.
+
+    The method is called in each wrapper from its own thread, up to the given
+    parallelism level, and the calls are started together once all the threads
+    are ready, so it can be used to simulate synchronized actions of many
+    participants (for example, all of them muting at once).
+    """
+
+    def __init__(self, parallelism = None):
+        """
+        :param parallelism: the maximum number of calls to make at the same
+            time; all the calls are made at the same time by default.
+        """
+
+        if parallelism != None and parallelism < 1:
+            raise Exception('Invalid parallelism: ' + str(parallelism))
+
+        self.parallelism = parallelism
+
+    def run(self, wrappers, method, *args, **kwargs):
+        """
+        Calls the given method in the given wrappers.
+
+        Calls that failed are reported as soon as they fail, and once the
+        method was called in all the wrappers a summary is printed.
+
+        :param wrappers: a list of (index, wrapper) tuples.
+        :param method: the name of the wrapper method to call, or a function
+            that receives the wrapper as its first argument.
+        :return: a :py:class:`BroadcastReport` with the result of each call.
+        """
+
+        report = BroadcastReport(method if isinstance(method, str) else getattr(method, '__name__', str(method)))
+
+        if not wrappers:
+            return report
+
+        # Calls wait until all of them were scheduled, so the first ones are
+        # not started while the executor is still starting threads for the
+        # rest.
+        started = threading.Event()
+
+        def callMethod(index, wrapper):
+            started.wait()
+
+            startTime = monotonic()
+
+            try:
+                if isinstance(method, str):
+                    result = getattr(wrapper, method)(*args, **kwargs)
+                else:
+                    result = method(wrapper, *args, **kwargs)
+
+                report.results[index] = {
+                    'success': True,
+                    'latency': monotonic() - startTime,
+                    'result': result,
+                }
+            except Exception as exception:
+                report.results[index] = {
+                    'success': False,
+                    'latency': monotonic() - startTime,
+                    'error': exception.with_traceback(None),
+                }
+
+                print('Instance ' + str(index) + ' failed: ' + str(exception))
+
+        startTime = monotonic()
+
+        with ThreadPoolExecutor(max_workers=self.parallelism or len(wrappers)) as executor:
+            for index, wrapper in wrappers:
+                executor.submit(callMethod, index, wrapper)
+
+            started.set()
+
+        report.totalTime = monotonic() - startTime
+
+        # Keep the results in the order of the wrappers.
+        report.results = {index: report.results[index] for index, wrapper in wrappers}
+
+        print(report.method + ' succeeded in ' + str(len(report.getSuccesses())) + '/' + str(len(wrappers)) + ' instances in ' + str(round(report.totalTime, 1)) + ' seconds')
+
+        return report
+
+
+class MetricsServer:
+    """
+    HTTP server that exposes metrics of Talkbuchet wrappers.
+
+    The metrics are served in the OpenMetrics text format (which can be scraped
+    by Prometheus) at "/metrics". Each time that they are scraped the metrics
+    are collected from all the wrappers and aggregated:
+    - talkbuchet_wrappers: the number of wrappers of each type.
+    - talkbuchet_browsers: the number of browsers used by the wrappers (several
+      wrappers can share a browser).
+    - talkbuchet_virtual_participants_started: the number of virtual
+      participants that are started.
+    - talkbuchet_connections: the number of publisher and subscriber
+      connections in each ICE connection state.
+    - talkbuchet_connection_failures: the number of publisher and subscriber
+      connections of the current wrappers that were not established in time or
+      that failed after being established.
+    - talkbuchet_sent_bytes and talkbuchet_received_bytes: the bytes sent and
+      received by the current publisher and subscriber connections.
+    - talkbuchet_handshake_phase_seconds: gauge histograms with the duration of
+      each phase of the handshake of the current publisher and subscriber
+      connections (see :py:meth:`Siege.getHandshakeHistograms`).
+
+    Except for talkbuchet_metrics_collection_errors, the metrics are computed
+    from the current wrappers and connections, so they decrease when wrappers
+    or connections are removed; therefore they are gauges rather than
+    counters.
+    - talkbuchet_metrics_collection_errors: the number of times that the
+      metrics could not be collected from a wrapper.
+
+    The server runs in its own thread, and the metrics are collected from that
+    thread without printing the logs of the browsers.
+    """
+
+    handshakePhaseBuckets = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10]
+
+    iceConnectionStates = ['new', 'checking', 'connected', 'completed', 'disconnected', 'failed', 'closed']
+
+    def __init__(self, getWrappersByType, port = 9464, address = '127.0.0.1'):
+        """
+        :param getWrappersByType: function that returns a dict with the type of
+            the wrappers as key and a list with the wrappers as value.
+        :param port: the port to listen on.
+        :param address: the address to listen on; by default only local
+            connections are accepted.
+        """
+
+        self.getWrappersByType = getWrappersByType
+
+        self.collectionErrors = 0
+
+        metricsServer = self
+
+        class MetricsRequestHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if urllib.parse.urlparse(self.path).path != '/metrics':
+                    self.send_error(404)
+
+                    return
+
+                body = metricsServer.getMetricsText().encode()
+
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/openmetrics-text; version=1.0.0; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                # Requests are not logged to not clutter the CLI.
+                pass
+
+        # Requests are handled one after the other, so the metrics are never
+        # collected twice at the same time.
+        self.httpServer = HTTPServer((address, port), MetricsRequestHandler)
+
+        self.thread = threading.Thread(target=self.httpServer.serve_forever, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """
+        Stops the server.
+        """
+
+        self.httpServer.shutdown()
+        self.httpServer.server_close()
+
+    def collectMetrics(self):
+        """
+        Collects the metrics from all the wrappers and aggregates them.
+
+        :return: a dict with the aggregated metrics.
+        """
+
+        metrics = {
+            'wrappers': {},
+            'browsers': 0,
+            'virtualParticipantsStarted': 0,
+            'iceConnectionStates': {'publishers': {}, 'subscribers': {}},
+            'connectionFailures': {'publishers': 0, 'subscribers': 0},
+            'bytesSent': {'publishers': 0, 'subscribers': 0},
+            'bytesReceived': {'publishers': 0, 'subscribers': 0},
+        }
+
+        seleniumHelpers = set()
+        handshakeHistogramsList = []
+
+        for wrapperType, wrappers in self.getWrappersByType().items():
+            # The list is copied, as wrappers could be added or removed from
+            # the CLI while the metrics are collected.
+            wrappers = list(wrappers)
+
+            metrics['wrappers'][wrapperType] = len(wrappers)
+
+            for wrapper in wrappers:
+                seleniumHelper = getattr(wrapper, 'seleniumHelper', None)
+                if isinstance(seleniumHelper, SeleniumWindowHelper):
+                    seleniumHelper = seleniumHelper.sharedBrowser.seleniumHelper
+                if seleniumHelper:
+                    seleniumHelpers.add(seleniumHelper)
+
+                if not hasattr(wrapper, 'getMetrics'):
+                    continue
+
+                try:
+                    wrapperMetrics = wrapper.getMetrics()
+                except Exception:
+                    self.collectionErrors += 1
+
+                    continue
+
+                if wrapperMetrics['virtualParticipantStarted']:
+                    metrics['virtualParticipantsStarted'] += 1
+
+                for peerType in ['publishers', 'subscribers']:
+                    peersMetrics = wrapperMetrics[peerType]
+
+                    for iceConnectionState, count in peersMetrics['iceConnectionStates'].items():
+                        metrics['iceConnectionStates'][peerType][iceConnectionState] = metrics['iceConnectionStates'][peerType].get(iceConnectionState, 0) + count
+
+                    for metric in ['connectionFailures', 'bytesSent', 'bytesReceived']:
+                        metrics[metric][peerType] += peersMetrics[metric]
+
+                handshakeHistogramsList.append(_newHandshakeHistograms(wrapperMetrics['handshakePhases']))
+
+        metrics['browsers'] = len(seleniumHelpers)
+        metrics['handshakeHistograms'] = _mergeHandshakeHistograms(handshakeHistogramsList)
+
+        return metrics
+
+    def getMetricsText(self):
+        """
+        Returns the metrics in the OpenMetrics text format.
+        """
+
+        metrics = self.collectMetrics()
+
+        lines = []
+
+        def addMetricFamily(name, metricType, help, unit = None):
+            lines.append('# TYPE ' + name + ' ' + metricType)
+            if unit:
+                lines.append('# UNIT ' + name + ' ' + unit)
+            lines.append('# HELP ' + name + ' ' + help)
+
+        def addSample(name, labels, value):
+            labelsText = ','.join([label + '="' + labelValue + '"' for label, labelValue in labels.items()])
+
+            lines.append(name + ('{' + labelsText + '}' if labelsText else '') + ' ' + str(value))
+
+        roles = {'publishers': 'publisher', 'subscribers': 'subscriber'}
+
+        addMetricFamily('talkbuchet_wrappers', 'gauge', 'Number of Talkbuchet wrappers.')
+        for wrapperType, count in metrics['wrappers'].items():
+            addSample('talkbuchet_wrappers', {'type': wrapperType}, count)
+
+        addMetricFamily('talkbuchet_browsers', 'gauge', 'Number of browsers used by the wrappers.')
+        addSample('talkbuchet_browsers', {}, metrics['browsers'])
+
+        addMetricFamily('talkbuchet_virtual_participants_started', 'gauge', 'Number of started virtual participants.')
+        addSample('talkbuchet_virtual_participants_started', {}, metrics['virtualParticipantsStarted'])
+
+        addMetricFamily('talkbuchet_connections', 'gauge', 'Number of connections in each ICE connection state.')
+        for peerType, role in roles.items():
+            iceConnectionStates = metrics['iceConnectionStates'][peerType]
+            for iceConnectionState in self.iceConnectionStates + [state for state in iceConnectionStates if state not in self.iceConnectionStates]:
+                addSample('talkbuchet_connections', {'role': role, 'state': iceConnectionState}, iceConnectionStates.get(iceConnectionState, 0))
+
+        # A decrease in a counter is seen as a reset, so metrics of the current
+        # connections are gauges.
+        addMetricFamily('talkbuchet_connection_failures', 'gauge', 'Number of connections of the current wrappers not established in time or failed.')
+        for peerType, role in roles.items():
+            addSample('talkbuchet_connection_failures', {'role': role}, metrics['connectionFailures'][peerType])
+
+        addMetricFamily('talkbuchet_sent_bytes', 'gauge', 'Bytes sent by the current connections.', 'bytes')
+        for peerType, role in roles.items():
+            addSample('talkbuchet_sent_bytes', {'role': role}, int(metrics['bytesSent'][peerType]))
+
+        addMetricFamily('talkbuchet_received_bytes', 'gauge', 'Bytes received by the current connections.', 'bytes')
+        for peerType, role in roles.items():
+            addSample('talkbuchet_received_bytes', {'role': role}, int(metrics['bytesReceived'][peerType]))
+
+        addMetricFamily('talkbuchet_handshake_phase_seconds', 'gaugehistogram', 'Duration of each phase of the handshake of the current connections.', 'seconds')
+        for peerType, role in roles.items():
+            for phase in _handshakePhases:
+                histogram = metrics['handshakeHistograms'][peerType][phase]
+
+                for bucket in self.handshakePhaseBuckets:
+                    addSample('talkbuchet_handshake_phase_seconds_bucket', {'role': role, 'phase': phase, 'le': str(bucket)}, histogram.getCountAtOrBelow(bucket * 1000))
+                addSample('talkbuchet_handshake_phase_seconds_bucket', {'role': role, 'phase': phase, 'le': '+Inf'}, histogram.count)
+                addSample('talkbuchet_handshake_phase_seconds_gcount', {'role': role, 'phase': phase}, histogram.count)
+                addSample('talkbuchet_handshake_phase_seconds_gsum', {'role': role, 'phase': phase}, histogram.sum / 1000)
+
+        addMetricFamily('talkbuchet_metrics_collection_errors', 'counter', 'Number of times that the metrics could not be collected from a wrapper.')
+        addSample('talkbuchet_metrics_collection_errors_total', {}, self.collectionErrors)
+
+        lines.append('# EOF')
+
+        return '\n'.join(lines) + '\n'
+
+
+def _readProcessStats():
+    """
+    Returns the stats of all the processes of the system, read from "/proc".
+
+    :return: a dict with the process ID as key and a dict with "parentId",
+        "cpuTime" (in seconds), "rss" (in bytes) and "threads" as value.
+    """
+
+    clockTicks = os.sysconf('SC_CLK_TCK')
+    pageSize = os.sysconf('SC_PAGE_SIZE')
+
+    processStats = {}
+
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+
+        try:
+            with open('/proc/' + entry + '/stat') as file:
+                stat = file.read()
+        except OSError:
+            # The process ended.
+            continue
+
+        # The name of the process is between parentheses and can contain
+        # spaces, so the fields are split after it.
+        fields = stat[stat.rfind(')') + 2:].split()
+
+        processStats[int(entry)] = {
+            'parentId': int(fields[1]),
+            'cpuTime': (int(fields[11]) + int(fields[12])) / clockTicks,
+            'threads': int(fields[17]),
+            'rss': int(fields[21]) * pageSize,
+        }
+
+    return processStats
+
+def _getChildrenIds(processStats):
+    """
+    Returns the children of each process in the given stats.
+
+    :param processStats: the stats returned by "_readProcessStats()".
+    :return: a dict with the process ID as key and a list with the IDs of its
+        children as value.
+    """
+
+    childrenIds = {}
+    for processId, stats in processStats.items():
+        childrenIds.setdefault(stats['parentId'], []).append(processId)
+
+    return childrenIds
+
+def _getFileDescriptorsCount(processId):
+    try:
+        return len(os.listdir('/proc/' + str(processId) + '/fd'))
+    except OSError:
+        # The process ended, or it belongs to another user.
+        return 0
+
+def _getNetworkBytes():
+    """
+    Returns the bytes received and sent by all the network interfaces (except
+    the loopback one), read from "/proc/net/dev".
+    """
+
+    receivedBytes = 0
+    sentBytes = 0
+
+    with open('/proc/net/dev') as file:
+        # The first two lines are headers.
+        for line in file.readlines()[2:]:
+            interface, counters = line.split(':', 1)
+            if interface.strip() == 'lo':
+                continue
+
+            counters = counters.split()
+            receivedBytes += int(counters[0])
+            sentBytes += int(counters[8])
+
+    return receivedBytes, sentBytes
+
+def _getMemoryUsage():
+    """
+    Returns the fraction of the memory of the system that is not available,
+    read from "/proc/meminfo".
+    """
+
+    memoryInfo = {}
+
+    with open('/proc/meminfo') as file:
+        for line in file:
+            name, value = line.split(':', 1)
+            memoryInfo[name] = int(value.split()[0])
+
+    return 1 - memoryInfo['MemAvailable'] / memoryInfo['MemTotal']
+
+
+class ResourceMonitor:
+    """
+    Periodically samples the resources used in the client system.
+
+    In each sample the CPU (in cores), resident memory, threads and file
+    descriptors used by the process tree of the browser of each wrapper (see
+    "getProcessId()" in SeleniumHelper) and by the CLI process itself are
+    measured, as well as the CPU and memory usage of the whole system, the
+    network throughput of the system and the usage of "/dev/shm". Wrappers
+    that share a browser get the resources of the whole browser, and
+    browserless wrappers use the CLI process. Browsers launched by a remote
+    Selenium server can not be measured. The network throughput can not be
+    measured by process, so it is only measured for the whole system.
+
+    The client is considered saturated ("client bound") when the system CPU,
+    the system memory or "/dev/shm" usage, or the CPU used by the CLI process
+    (which, as browserless wrappers run in a single asyncio loop, can use a
+    single CPU at most) is higher than the thresholds. The first time that a
+    threshold is crossed a warning is printed and a "clientBound" event is
+    added to the event log, so results of that run should not be blamed on
+    the server.
+
+    Everything is read from "/proc", so it is only available in Linux.
+    """
+
+    def __init__(self, getWrappersByType, interval = 1, maxLength = 3600, cpuThreshold = 0.9, memoryThreshold = 0.9, shmThreshold = 0.9, cliCpuThreshold = 0.9):
+        """
+        :param getWrappersByType: function that returns a dict with the type of
+            the wrappers as key and a list with the wrappers as value.
+        :param interval: the seconds between samples.
+        :param maxLength: the maximum number of samples to keep.
+        :param cpuThreshold: the fraction of the CPU of the system above which
+            the client is saturated.
+        :param memoryThreshold: the fraction of the memory of the system above
+            which the client is saturated.
+        :param shmThreshold: the fraction of "/dev/shm" above which the client
+            is saturated.
+        :param cliCpuThreshold: the CPU used by the CLI process (in cores)
+            above which the client is saturated.
+        """
+
+        if not os.path.exists('/proc/stat'):
+            raise Exception('"/proc" is not available')
+
+        self.getWrappersByType = getWrappersByType
+        self.interval = interval
+
+        self.thresholds = {
+            'cpu': cpuThreshold,
+            'memory': memoryThreshold,
+            'shm': shmThreshold,
+            'cliCpu': cliCpuThreshold,
+        }
+
+        self.samples = collections.deque(maxlen=maxLength)
+        self.clientBoundReasons = {}
+        self.lock = threading.Lock()
+
+        self.previousTime = None
+        self.previousCpuTimes = None
+        self.previousNetworkBytes = None
+        self.previousProcessStats = None
+
+        self.stopped = threading.Event()
+
+        # A first sample is taken right away to have a reference for the
+        # usage in the next one.
+        self.takeSample()
+
+        self.thread = threading.Thread(target=self.__sampleResources, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """
+        Stops sampling the resources.
+        """
+
+        self.stopped.set()
+
+    def __sampleResources(self):
+        while not self.stopped.wait(self.interval):
+            try:
+                self.takeSample()
+            except Exception as exception:
+                print('Resources could not be sampled: ' + str(exception))
+
+    def __getProcessTreeResources(self, rootProcessId, processStats, childrenIds, elapsed, includeChildren = True):
+        resources = {
+            'cpu': 0,
+            'rss': 0,
+            'threads': 0,
+            'fileDescriptors': 0,
+            'processes': 0,
+        }
+
+        processIds = [rootProcessId]
+        while processIds:
+            processId = processIds.pop()
+            if processId not in processStats:
+                continue
+
+            stats = processStats[processId]
+            previousStats = self.previousProcessStats.get(processId) if self.previousProcessStats else None
+
+            if previousStats and elapsed:
+                resources['cpu'] += (stats['cpuTime'] - previousStats['cpuTime']) / elapsed
+            resources['rss'] += stats['rss']
+            resources['threads'] += stats['threads']
+            resources['fileDescriptors'] += _getFileDescriptorsCount(processId)
+            resources['processes'] += 1
+
+            if includeChildren:
+                processIds += childrenIds.get(processId, [])
+
+        return resources
+
+    def takeSample(self):
+        """
+        Samples the resources.
+
+        This is periodically called from the thread of the monitor, but it can
+        be also called to take a sample right away.
+
+        :return: the sample; see :py:meth:`getSamples`.
+        """
+
+        with self.lock:
+            now = monotonic()
+            elapsed = now - self.previousTime if self.previousTime else None
+
+            processStats = _readProcessStats()
+            childrenIds = _getChildrenIds(processStats)
+
+            cpuTimes = _getCpuTimes()
+            networkBytes = _getNetworkBytes()
+            shmUsage = disk_usage('/dev/shm')
+
+            sample = {
+                'time': datetime.now().timestamp(),
+                'system': {
+                    'cpuUsage': _getCpuUsage(self.previousCpuTimes, cpuTimes),
+                    'memoryUsage': _getMemoryUsage(),
+                    'shmUsage': shmUsage.used / shmUsage.total if shmUsage.total else 0,
+                    'networkReceivedBytesPerSecond': (networkBytes[0] - self.previousNetworkBytes[0]) / elapsed if elapsed else None,
+                    'networkSentBytesPerSecond': (networkBytes[1] - self.previousNetworkBytes[1]) / elapsed if elapsed else None,
+                },
+                'cli': self.__getProcessTreeResources(os.getpid(), processStats, childrenIds, elapsed, includeChildren=False),
+                'wrappers': {},
+            }
+
+            browserResources = {}
+
+            for wrapperType, wrappers in self.getWrappersByType().items():
+                for index, wrapper in enumerate(list(wrappers)):
+                    seleniumHelper = getattr(wrapper, 'seleniumHelper', None)
+                    if isinstance(seleniumHelper, SeleniumWindowHelper):
+                        seleniumHelper = seleniumHelper.sharedBrowser.seleniumHelper
+
+                    processId = seleniumHelper.getProcessId() if seleniumHelper else os.getpid()
+                    if processId == None:
+                        continue
+
+                    # Browserless wrappers run in the CLI process.
+                    if processId == os.getpid():
+                        sample['wrappers'][wrapperType + ' ' + str(index)] = sample['cli']
+                        continue
+
+                    if processId not in browserResources:
+                        browserResources[processId] = self.__getProcessTreeResources(processId, processStats, childrenIds, elapsed)
+
+                    sample['wrappers'][wrapperType + ' ' + str(index)] = browserResources[processId]
+
+            self.previousTime = now
+            self.previousCpuTimes = cpuTimes
+            self.previousNetworkBytes = networkBytes
+            self.previousProcessStats = processStats
+
+            if elapsed:
+                self.samples.append(sample)
+
+        if elapsed:
+            self.__checkClientBound(sample)
+
+        return sample
+
+    def __checkClientBound(self, sample):
+        values = {
+            'cpu': sample['system']['cpuUsage'],
+            'memory': sample['system']['memoryUsage'],
+            'shm': sample['system']['shmUsage'],
+            'cliCpu': sample['cli']['cpu'],
+        }
+
+        for reason, value in values.items():
+            if value == None or value <= self.thresholds[reason] or reason in self.clientBoundReasons:
+                continue
+
+            self.clientBoundReasons[reason] = {
+                'time': sample['time'],
+                'value': value,
+            }
+
+            print('Warning: client saturated (' + reason + ' usage ' + str(round(value, 2)) + ' above ' + str(self.thresholds[reason]) + '), results may be limited by the client rather than by the server')
+
+            eventLog.addEvent({
+                'type': 'clientBound',
+                'reason': reason,
+                'value': value,
+                'time': sample['time'] * 1000,
+            }, 'resourceMonitor')
+
+    def isClientBound(self):
+        """
+        Returns whether any threshold was crossed since the monitor was started
+        or reset.
+        """
+
+        return bool(self.clientBoundReasons)
+
+    def getSamples(self):
+        """
+        Returns the kept samples.
+
+        :return: a list with the samples; each sample is a dict with "time" (in
+            seconds since the epoch), "system" (with "cpuUsage", "memoryUsage"
+            and "shmUsage" as fractions, and "networkReceivedBytesPerSecond"
+            and "networkSentBytesPerSecond"), "cli" and "wrappers" (which maps
+            the type and index of each wrapper, like "siege 0", to the
+            resources used by its browser); the resources used by a process
+            tree are "cpu" (in cores), "rss" (in bytes), "threads",
+            "fileDescriptors" and "processes".
+        """
+
+        with self.lock:
+            return list(self.samples)
+
+    def printUsage(self):
+        """
+        Prints the resources used in the last sample and whether the client is
+        saturated.
+        """
+
+        samples = self.getSamples()
+        if not samples:
+            print('No samples yet')
+            return
+
+        sample = samples[-1]
+        system = sample['system']
+
+        print('System: '
+              + ('CPU n/a' if system['cpuUsage'] == None else 'CPU ' + str(round(system['cpuUsage'] * 100, 1)) + '%') + ', '
+              + 'memory ' + str(round(system['memoryUsage'] * 100, 1)) + '%, '
+              + '/dev/shm ' + str(round(system['shmUsage'] * 100, 1)) + '%, '
+              + 'network ' + str(round(system['networkReceivedBytesPerSecond'] / 1024, 1)) + ' KiB/s in, '
+              + str(round(system['networkSentBytesPerSecond'] / 1024, 1)) + ' KiB/s out')
+
+        for name, resources in [('CLI', sample['cli'])] + list(sample['wrappers'].items()):
+            print(name + ': '
+                  + 'CPU ' + str(round(resources['cpu'], 2)) + ' cores, '
+                  + 'RSS ' + str(round(resources['rss'] / 1048576, 1)) + ' MiB, '
+                  + str(resources['threads']) + ' threads, '
+                  + str(resources['fileDescriptors']) + ' file descriptors, '
+                  + str(resources['processes']) + ' processes')
+
+        if self.clientBoundReasons:
+            print('Client bound: ' + ', '.join(reason + ' (' + str(round(details['value'], 2)) + ')' for reason, details in self.clientBoundReasons.items()))
+        else:
+            print('Client not saturated')
+
+    def reset(self):
+        """
+        Removes the kept samples and clears the crossed thresholds.
+        """
+
+        with self.lock:
+            self.samples.clear()
+            self.clientBoundReasons = {}
+
+
+class PerformanceMetricsCollector:
+    """
+    Periodically samples the performance metrics of the browser of each
+    wrapper.
+
+    Each sample has the metrics returned by "getPerformanceMetrics()" in each
+    wrapper (see :py:meth:`SeleniumHelper.getPerformanceMetrics`); wrappers
+    whose metrics can not be got (for example, browserless wrappers or Firefox
+    browsers) are ignored. The metrics are also appended to the stats store of
+    the wrappers whose stats sampler was started, and the last metrics of each
+    wrapper can be got with :py:meth:`getLastMetrics`.
+
+    If a directory is given the samples are also appended to
+    "performanceMetrics.jsonl" in that directory, so long runs can be analysed
+    later.
+    """
+
+    def __init__(self, getWrappersByType, interval = 5, maxLength = 720, directory = None):
+        """
+        :param getWrappersByType: function that returns a dict with the type of
+            the wrappers as key and a list with the wrappers as value.
+        :param interval: the seconds between samples.
+        :param maxLength: the maximum number of samples to keep.
+        :param directory: the directory to store the samples in, if any.
+        """
+
+        self.getWrappersByType = getWrappersByType
+        self.interval = interval
+
+        self.samples = collections.deque(maxlen=maxLength)
+        self.lastMetrics = weakref.WeakKeyDictionary()
+        self.collectionErrors = 0
+        self.lock = threading.Lock()
+
+        self.file = None
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+            self.file = open(os.path.join(directory, 'performanceMetrics.jsonl'), 'a')
+
+        self.stopped = threading.Event()
+
+        self.thread = threading.Thread(target=self.__sampleMetrics, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """
+        Stops sampling the metrics.
+        """
+
+        self.stopped.set()
+
+        with self.lock:
+            if self.file:
+                self.file.close()
+                self.file = None
+
+    def __sampleMetrics(self):
+        while not self.stopped.wait(self.interval):
+            self.takeSample()
+
+    def takeSample(self):
+        """
+        Samples the metrics.
+
+        This is periodically called from the thread of the collector, but it can
+        be also called to take a sample right away.
+
+        :return: the sample; see :py:meth:`getSamples`.
+        """
+
+        sample = {
+            'time': datetime.now().timestamp(),
+            'wrappers': {},
+        }
+
+        for wrapperType, wrappers in self.getWrappersByType().items():
+            # The list is copied, as wrappers could be added or removed from
+            # the CLI while the metrics are collected.
+            for index, wrapper in enumerate(list(wrappers)):
+                if not hasattr(wrapper, 'getPerformanceMetrics'):
+                    continue
+
+                try:
+                    metrics = wrapper.getPerformanceMetrics()
+                except Exception:
+                    self.collectionErrors += 1
+
+                    continue
+
+                if metrics != None:
+                    sample['wrappers'][wrapperType + ' ' + str(index)] = metrics
+
+                    self.lastMetrics[wrapper] = metrics
+
+                    statsStore = getattr(wrapper, 'statsStore', None)
+                    if statsStore is not None:
+                        statsStore.appendPerformanceMetrics(sample['time'] * 1000, metrics)
+
+        with self.lock:
+            self.samples.append(sample)
+
+            if self.file:
+                self.file.write(json.dumps(sample) + '\n')
+                self.file.flush()
+
+        return sample
+
+    def getSamples(self):
+        """
+        Returns the kept samples.
+
+        :return: a list with the samples; each sample is a dict with "time" (in
+            seconds since the epoch) and "wrappers", which maps the type and
+            index of each wrapper, like "realParticipant 0", to its metrics.
+        """
+
+        with self.lock:
+            return list(self.samples)
+
+    def getLastMetrics(self, wrapper):
+        """
+        Returns the metrics of the given wrapper in the last sample that
+        included it.
+
+        :param wrapper: the wrapper to get its metrics.
+        :return: the metrics, or None if they were never got.
+        """
+
+        return self.lastMetrics.get(wrapper)
+
+    def printMetrics(self):
+        """
+        Prints the main metrics of each wrapper in the last sample.
+
+        The busy time of the main thread ("TaskDuration") and of the renderer
+        process ("ProcessTime") are shown as the fraction of the time elapsed
+        since the previous sample.
+        """
+
+        samples = self.getSamples()
+        if not samples:
+            print('No samples yet')
+            return
+
+        sample = samples[-1]
+        previousSample = samples[-2] if len(samples) > 1 else None
+
+        for name, metrics in sample['wrappers'].items():
+            previousMetrics = previousSample['wrappers'].get(name) if previousSample else None
+
+            line = name + ': heap ' + str(round(metrics['HeapUsedSize'] / 1048576, 1)) + '/' + str(round(metrics['HeapTotalSize'] / 1048576, 1)) + ' MiB'
+
+            if previousMetrics and metrics['Timestamp'] > previousMetrics['Timestamp']:
+                elapsed = metrics['Timestamp'] - previousMetrics['Timestamp']
+
+                for metric, label in [('TaskDuration', 'tasks'), ('ProcessTime', 'process')]:
+                    if metric in metrics and metric in previousMetrics:
+                        line += ', ' + label + ' ' + str(round((metrics[metric] - previousMetrics[metric]) / elapsed * 100, 1)) + '%'
+
+                for metric, label in [('LayoutCount', 'layouts'), ('RecalcStyleCount', 'style recalculations')]:
+                    if metric in metrics and metric in previousMetrics:
+                        line += ', ' + str(round((metrics[metric] - previousMetrics[metric]) / elapsed, 1)) + ' ' + label + '/s'
+
+            if 'Nodes' in metrics:
+                line += ', ' + str(int(metrics['Nodes'])) + ' nodes'
+
+            print(line)
+
+        if self.collectionErrors:
+            print(str(self.collectionErrors) + ' metrics could not be collected')
+
+
+_asyncioLoop = None
+_asyncioLoopLock = threading.Lock()
+
+def _getAsyncioLoop():
+    """
+    Returns the asyncio event loop used by the browserless helpers.
+
+    The loop runs in its own thread, so the command line interface is not
+    blocked while the loop is running.
+    """
+
+    global _asyncioLoop
+
+    with _asyncioLoopLock:
+        if not _asyncioLoop:
+            _asyncioLoop = asyncio.new_event_loop()
+
+            asyncioThread = threading.Thread(target=_asyncioLoop.run_forever, daemon=True)
+            asyncioThread.start()
+
+    return _asyncioLoop
+
+def _runInAsyncioLoop(coroutine, timeout = None):
+    """
+    Runs the given coroutine in the asyncio event loop and waits for its result.
+    """
+
+    return asyncio.run_coroutine_threadsafe(coroutine, _getAsyncioLoop()).result(timeout)
+
+def _newSslContext():
+    # Like the browsers, which are started with "acceptInsecureCerts", the
+    # browserless helpers accept self-signed certificates, as test servers
+    # often use them.
+    sslContext = ssl.create_default_context()
+    sslContext.check_hostname = False
+    sslContext.verify_mode = ssl.CERT_NONE
+
+    return sslContext
+
+
+class AsyncWebSocket:
+    """
+    Minimal asyncio based WebSocket client.
+
+    The websocket module used for BiDi is synchronous, so each connection would
+    need its own thread to receive messages. This client uses the framing
+    provided by the websocket module, but sends and receives the frames using
+    asyncio streams, so thousands of connections can be kept open in a single
+    thread.
+
+    Ping frames are automatically answered while receiving messages.
+    """
+
+    def __init__(self):
+        self.reader = None
+        self.writer = None
+
+    async def connect(self, url):
+        """
+        Opens the connection.
+
+        :param url: the "ws://" or "wss://" URL to connect to.
+        """
+
+        parsedUrl = urllib.parse.urlparse(url)
+
+        secure = parsedUrl.scheme == 'wss'
+        port = parsedUrl.port or (443 if secure else 80)
+
+        self.reader, self.writer = await asyncio.open_connection(parsedUrl.hostname, port, ssl=_newSslContext() if secure else None)
+
+        path = parsedUrl.path or '/'
+        if parsedUrl.query:
+            path += '?' + parsedUrl.query
+
+        key = base64.b64encode(os.urandom(16)).decode()
+
+        self.writer.write((
+            'GET ' + path + ' HTTP/1.1\r\n'
+            'Host: ' + parsedUrl.netloc + '\r\n'
+            'Upgrade: websocket\r\n'
+            'Connection: Upgrade\r\n'
+            'Sec-WebSocket-Key: ' + key + '\r\n'
+            'Sec-WebSocket-Version: 13\r\n'
+            '\r\n'
+        ).encode())
+        await self.writer.drain()
+
+        response = (await self.reader.readuntil(b'\r\n\r\n')).decode('latin-1')
+        statusLine = response.split('\r\n')[0]
+        if statusLine.split(' ')[1:2] != ['101']:
+            self.writer.close()
+
+            raise Exception('WebSocket handshake failed: ' + statusLine)
+
+        expectedAccept = base64.b64encode(hashlib.sha1((key + '258EAFA5-E914-47DA-95CA-C5AB0DC85B11').encode()).digest()).decode()
+        if ('sec-websocket-accept: ' + expectedAccept.lower()) not in response.lower():
+            self.writer.close()
+
+            raise Exception('WebSocket handshake failed: invalid Sec-WebSocket-Accept')
+
+    async def send(self, data, opcode = websocket.ABNF.OPCODE_TEXT):
+        """
+        Sends a message.
+
+        :param data: the text (or bytes) to send.
+        :param opcode: the opcode of the frame; a text frame by default.
+        """
+
+        self.writer.write(websocket.ABNF.create_frame(data, opcode).format())
+        await self.writer.drain()
+
+    async def recv(self):
+        """
+        Receives the next message.
+
+        :return: the received text (or bytes, for binary messages), or None if
+            the connection was closed.
+        """
+
+        message = b''
+        messageOpcode = None
+
+        while True:
+            try:
+                header = await self.reader.readexactly(2)
+            except asyncio.IncompleteReadError:
+                return None
+
+            fin = header[0] & 0x80
+            opcode = header[0] & 0x0f
+            masked = header[1] & 0x80
+            length = header[1] & 0x7f
+
+            if length == 126:
+                length = struct.unpack('!H', await self.reader.readexactly(2))[0]
+            elif length == 127:
+                length = struct.unpack('!Q', await self.reader.readexactly(8))[0]
+
+            maskKey = None
+            if masked:
+                maskKey = await self.reader.readexactly(4)
+
+            payload = await self.reader.readexactly(length)
+            if maskKey:
+                payload = websocket.ABNF.mask(maskKey, payload)
+
+            if opcode == websocket.ABNF.OPCODE_PING:
+                await self.send(payload, websocket.ABNF.OPCODE_PONG)
+
+                continue
+
+            if opcode == websocket.ABNF.OPCODE_PONG:
+                continue
+
+            if opcode == websocket.ABNF.OPCODE_CLOSE:
+                await self.close()
+
+                return None
+
+            if opcode != websocket.ABNF.OPCODE_CONT:
+                messageOpcode = opcode
+
+            message += payload
+
+            if fin:
+                if messageOpcode == websocket.ABNF.OPCODE_TEXT:
+                    return message.decode()
+
+                return message
+
+    async def close(self):
+        """
+        Closes the connection.
+        """
+
+        if not self.writer or self.writer.is_closing():
+            return
+
+        try:
+            await self.send(b'', websocket.ABNF.OPCODE_CLOSE)
+        except Exception:
+            pass
+
+        self.writer.close()
+
+
+class TalkOcsClient:
+    """
+    Helper class to call the OCS API of Nextcloud Talk without a browser.
+
+    This is the counterpart of the OCS requests done by Talkbuchet.js. Each
+    client has its own cookies, so each client behaves like an independent
+    browser session (which is needed, for example, for guests).
+
+    Like in Talkbuchet.js the Nextcloud instance is expected to be at the root
+    of the host of the given URL.
+
+    Requests are done in a thread of the default executor of the asyncio event
+    loop, so they do not block the loop.
+    """
+
+    _capabilities = {}
+    _capabilitiesLock = threading.Lock()
+
+    def __init__(self, nextcloudUrl, user = '', appToken = ''):
+        """
+        :param nextcloudUrl: the URL of the Nextcloud instance.
+        :param user: the user ID; a guest is used if not given.
+        :param appToken: the app token for the user.
+        """
+
+        parsedUrl = urllib.parse.urlparse(nextcloudUrl)
+
+        self.host = parsedUrl.scheme + '://' + parsedUrl.netloc
+        self.user = user
+        self.appToken = appToken
+
+        self.opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()),
+            urllib.request.HTTPSHandler(context=_newSslContext()),
+        )
+
+    def __request(self, method, url, data = None):
+        headers = {
+            'OCS-APIRequest': 'true',
+            'Accept': 'application/json',
+        }
+
+        if self.user:
+            headers['Authorization'] = 'Basic ' + base64.b64encode((self.user + ':' + self.appToken).encode()).decode()
+
+        if data != None:
+            data = urllib.parse.urlencode(data).encode()
+
+        request = urllib.request.Request(url, data=data, headers=headers, method=method)
+
+        try:
+            with self.opener.open(request, timeout=30) as response:
+                return json.loads(response.read())['ocs']['data']
+        except urllib.error.HTTPError as error:
+            raise Exception(str(error.code) + ' ' + error.reason + ': ' + error.read().decode(errors='replace'))
+
+    async def request(self, method, url, data = None):
+        """
+        Sends an OCS request and fails in case of 40X or 50X error.
+
+        :param method: the HTTP method.
+        :param url: the full URL of the OCS endpoint.
+        :param data: the form data to send, if any.
+        :return: the "data" of the OCS response.
+        """
+
+        return await asyncio.get_running_loop().run_in_executor(None, self.__request, method, url, data)
+
+    async def getCapabilities(self):
+        """
+        Returns the capabilities of the Nextcloud instance.
+
+        Capabilities are fetched only once for each host, and then shared by all
+        the clients.
+        """
+
+        with TalkOcsClient._capabilitiesLock:
+            capabilities = TalkOcsClient._capabilities.get(self.host)
+
+        if capabilities:
+            return capabilities
+
+        capabilities = await self.request('GET', self.host + '/ocs/v1.php/cloud/capabilities')
+
+        with TalkOcsClient._capabilitiesLock:
+            TalkOcsClient._capabilities[self.host] = capabilities
+
+        return capabilities
+
+    async def __getFeatureVersion(self, feature):
+        capabilities = await self.getCapabilities()
+
+        talkFeatures = capabilities.get('capabilities', {}).get('spreed', {}).get('features')
+        if not talkFeatures:
+            raise Exception('Talk features not found')
+
+        for talkFeature in talkFeatures:
+            if talkFeature.startswith(feature + '-v'):
+                return talkFeature[len(feature) + 2:]
+
+        raise Exception('Failed to get feature version for ' + feature)
+
+    async def __getTalkOcsApiUrl(self, feature):
+        return self.host + '/ocs/v2.php/apps/spreed/api/v' + await self.__getFeatureVersion(feature) + '/'
+
+    async def getSignalingBackendUrl(self):
+        return await self.__getTalkOcsApiUrl('signaling') + 'signaling/backend'
+
+    async def getSignalingSettings(self, token):
+        return await self.request('GET', await self.__getTalkOcsApiUrl('signaling') + 'signaling/settings?token=' + urllib.parse.quote(token))
+
+    async def joinRoom(self, token):
+        """
+        Joins the room with the given token.
+
+        :return: the Nextcloud session ID.
+        """
+
+        joinRoomResult = await self.request('POST', await self.__getTalkOcsApiUrl('conversation') + 'room/' + token + '/participants/active', {})
+
+        return joinRoomResult['sessionId']
+
+    async def joinCall(self, token, flags):
+        await self.request('POST', await self.__getTalkOcsApiUrl('conversation') + 'call/' + token, {
+            'flags': flags,
+            'recordingConsent': 'true',
+        })
+
+    async def leaveCall(self, token):
+        await self.request('DELETE', await self.__getTalkOcsApiUrl('conversation') + 'call/' + token)
+
+    async def leaveRoom(self, token):
+        await self.request('DELETE', await self.__getTalkOcsApiUrl('conversation') + 'room/' + token + '/participants/active')
+
+
+class SignalingClient:
+    """
+    Helper class to interact with the signaling server without a browser.
+
+    This is the counterpart of the Signaling class in Talkbuchet.js. A new
+    signaling session is started when "connect()" is called. Received messages
+    are provided to the listeners added for the type of the message, which are
+    called with the message data (for example, for a "message" message the
+    listeners are called with the value of the "message" attribute).
+    """
+
+    def __init__(self, user, signalingSettings, signalingBackendUrl):
+        """
+        :param user: the user ID, or an empty string for guests.
+        :param signalingSettings: the signaling settings got from Nextcloud.
+        :param signalingBackendUrl: the URL of the signaling backend in
+            Nextcloud.
+        """
+
+        self.user = user
+        self.signalingTicket = signalingSettings['ticket']
+        self.signalingUrl = self.sanitizeSignalingUrl(signalingSettings['server'])
+        self.signalingBackendUrl = signalingBackendUrl
+
+        self.sessionId = None
+
+        self.messageId = 1
+        self.pendingResponses = {}
+
+        self.listeners = {}
+
+        self.websocket = None
+        self.receiveTask = None
+        self.closing = False
+
+    def sanitizeSignalingUrl(self, url):
+        if url.startswith('https://'):
+            url = 'wss://' + url[8:]
+        elif url.startswith('http://'):
+            url = 'ws://' + url[7:]
+        if url.endswith('/'):
+            url = url[:-1]
+
+        return url + '/spreed'
+
+    def addListener(self, messageType, listener):
+        """
+        Adds a listener for the given type of received message.
+
+        :param messageType: the type of the message ("message", "room",
+            "event"...).
+        :param listener: the function to call with the message data.
+        """
+
+        self.listeners.setdefault(messageType, []).append(listener)
+
+    def removeListener(self, messageType, listener):
+        """
+        Removes a listener previously added for the given type of message.
+
+        :param messageType: the type of the message.
+        :param listener: the function to remove.
+        """
+
+        if listener in self.listeners.get(messageType, []):
+            self.listeners[messageType].remove(listener)
+
+    async def connect(self, timeout = 30):
+        """
+        Connects to the signaling server and sends the hello message.
+
+        :param timeout: the seconds to wait for the hello response.
+        :return: the signaling session ID.
+        """
+
+        self.websocket = AsyncWebSocket()
+        await self.websocket.connect(self.signalingUrl)
+
+        self.receiveTask = asyncio.get_running_loop().create_task(self.__receiveMessages())
+
+        hello = await asyncio.wait_for(self.sendAndWaitForResponse({
+            'type': 'hello',
+            'hello': {
+                'version': '1.0',
+                'auth': {
+                    'url': self.signalingBackendUrl,
+                    'params': {
+                        'userid': self.user,
+                        'ticket': self.signalingTicket,
+                    },
+                },
+            },
+        }), timeout)
+
+        if hello.get('type') != 'hello':
+            raise Exception('Hello failed: ' + json.dumps(hello.get('error', hello)))
+
+        self.sessionId = hello['hello']['sessionid']
+
+        return self.sessionId
+
+    async def __receiveMessages(self):
+        while True:
+            try:
+                data = await self.websocket.recv()
+            except Exception:
+                data = None
+
+            if data == None:
+                if not self.closing:
+                    print('Signaling socket closed')
+
+                for pendingResponse in self.pendingResponses.values():
+                    if not pendingResponse.done():
+                        pendingResponse.set_exception(Exception('Signaling socket closed'))
+                self.pendingResponses = {}
+
+                return
+
+            message = json.loads(data)
+
+            if message.get('id') and message['id'] in self.pendingResponses:
+                self.pendingResponses.pop(message['id']).set_result(message)
+
+            messageType = message.get('type')
+
+            if messageType == 'error':
+                error = message.get('error', {})
+
+                print('Signaling error: ' + json.dumps(error))
+
+                if error.get('code') == 'not_allowed':
+                    print('Is "allowsubscribeany = true" set in the signaling server configuration?')
+
+            for listener in self.listeners.get(messageType, []):
+                try:
+                    listener(message.get(messageType))
+                except Exception as exception:
+                    print('Signaling listener error: ' + str(exception))
+
+    async def send(self, message):
+        await self.websocket.send(json.dumps(message))
+
+    async def sendAndWaitForResponse(self, message):
+        """
+        Sends a message and waits for the response with the same ID.
+
+        :return: the full response message.
+        """
+
+        message['id'] = str(self.messageId)
+        self.messageId += 1
+
+        response = asyncio.get_running_loop().create_future()
+        self.pendingResponses[message['id']] = response
+
+        await self.send(message)
+
+        return await response
+
+    async def sendMessage(self, data):
+        await self.send({
+            'type': 'message',
+            'message': {
+                'recipient': {
+                    'type': 'session',
+                    'sessionid': data['to'],
+                },
+                'data': data,
+            },
+        })
+
+    async def sendRequestOffer(self, publisherSessionId):
+        await self.send({
+            'type': 'message',
+            'message': {
+                'recipient': {
+                    'type': 'session',
+                    'sessionid': publisherSessionId,
+                },
+                'data': {
+                    'type': 'requestoffer',
+                    'roomType': 'video',
+                },
+            },
+        })
+
+    async def joinRoom(self, token, nextcloudSessionId):
+        await self.sendAndWaitForResponse({
+            'type': 'room',
+            'room': {
+                'roomid': token,
+                'sessionid': nextcloudSessionId,
+            },
+        })
+
+    async def leaveRoom(self):
+        await self.send({
+            'type': 'room',
+            'room': {
+                'roomid': '',
+            },
+        })
+
+    async def close(self):
+        """
+        Closes the signaling session.
+        """
+
+        self.closing = True
+
+        if self.websocket:
+            await self.websocket.close()
+
+        if self.receiveTask:
+            self.receiveTask.cancel()
+
+
+class BrowserlessVirtualParticipant:
+    """
+    Virtual participant without media that does not need a browser.
+
+    A virtual participant without media just joins the conversation and the
+    call through the OCS API and the signaling server, so there is no need to
+    launch a whole browser for it. This wrapper performs the same steps as
+    Talkbuchet.js directly from Python, so thousands of listening participants
+    can be run in a single process.
+
+    It provides the same methods as VirtualParticipant, although media is not
+    supported and therefore data channel messages can not be sent either.
+
+    The participant runs in a shared asyncio event loop, so it can be started
+    and stopped either with the blocking methods or, to start or stop a large
+    number of participants concurrently, with the coroutines
+    "startVirtualParticipantAsync()" and "stopVirtualParticipantAsync()".
+    """
+
+    def __init__(self, nextcloudUrl):
+        """
+        :param nextcloudUrl: the URL of the Nextcloud instance to join.
+        """
+
+        self.nextcloudUrl = nextcloudUrl
+
+        self.user = ''
+        self.appToken = ''
+        self.token = ''
+
+        self.ocsClient = None
+        self.signaling = None
+
+    def setCredentials(self, user, appToken):
+        """
+        See :py:meth:`TalkbuchetCommon.setCredentials`.
+        """
+
+        self.user = user
+        self.appToken = appToken
+
+    def setToken(self, token):
+        """
+        See :py:meth:`TalkbuchetCommon.setToken`.
+        """
+
+        self.token = token
+
+    def startMedia(self, audio, video):
+        """
+        Media is not supported by browserless virtual participants.
+        """
+
+        if audio or video:
+            raise Exception('Media is not supported by browserless virtual participants')
+
+    async def startVirtualParticipantAsync(self):
+        """
+        Starts the virtual participant.
+
+        Errors are printed rather than raised, like in Talkbuchet.js; use
+        :py:meth:`isStarted` to know if the virtual participant was started.
+        """
+
+        if not self.token:
+            print('Conversation token is not set')
+
+            return
+
+        ocsClient = TalkOcsClient(self.nextcloudUrl, self.user, self.appToken)
+
+        try:
+            signalingSettings = await ocsClient.getSignalingSettings(self.token)
+        except Exception as exception:
+            print('Virtual participant get signaling settings error: ' + str(exception))
+
+            return
+
+        signaling = None
+        try:
+            signaling = SignalingClient(self.user, signalingSettings, await ocsClient.getSignalingBackendUrl())
+
+            await signaling.connect()
+        except Exception as exception:
+            print('Virtual participant init error: ' + str(exception))
+
+            if signaling:
+                await signaling.close()
+
+            return
+
+        nextcloudSessionId = None
+        try:
+            nextcloudSessionId = await ocsClient.joinRoom(self.token)
+
+            await signaling.joinRoom(self.token, nextcloudSessionId)
+        except Exception as exception:
+            print('Virtual participant join room error: ' + str(exception))
+
+            if nextcloudSessionId:
+                await self.__leaveRoomAfterError(ocsClient)
+
+            await signaling.close()
+
+            return
+
+        try:
+            await ocsClient.joinCall(self.token, 1)
+        except Exception as exception:
+            print('Virtual participant join call error: ' + str(exception))
+
+            await self.__leaveRoomAfterError(ocsClient)
+
+            await signaling.close()
+
+            return
+
+        self.ocsClient = ocsClient
+        self.signaling = signaling
+
+    async def __leaveRoomAfterError(self, ocsClient):
+        # Otherwise the participant would stay in the room until its session
+        # expires.
+        try:
+            await ocsClient.leaveRoom(self.token)
+        except Exception as exception:
+            print('Virtual participant leave room error: ' + str(exception))
+
+    async def stopVirtualParticipantAsync(self):
+        """
+        Stops the virtual participant.
+        """
+
+        if not self.signaling:
+            return
+
+        try:
+            await self.ocsClient.leaveCall(self.token)
+        except Exception as exception:
+            print('Virtual participant leave call error: ' + str(exception))
+
+            return
+
+        try:
+            await self.ocsClient.leaveRoom(self.token)
+            await self.signaling.leaveRoom()
+        except Exception as exception:
+            print('Virtual participant leave room error: ' + str(exception))
+
+            return
+
+        await self.signaling.close()
+
+        self.signaling = None
+        self.ocsClient = None
+
+    def startVirtualParticipant(self):
+        """
+        Starts the virtual participant.
+        """
+
+        _runInAsyncioLoop(self.startVirtualParticipantAsync())
+
+    def stopVirtualParticipant(self):
+        """
+        Stops the virtual participant.
+        """
+
+        _runInAsyncioLoop(self.stopVirtualParticipantAsync())
+
+    def isStarted(self):
+        """
+        See :py:meth:`VirtualParticipant.isStarted`.
+        """
+
+        return self.signaling != None
+
+    def getMetrics(self):
+        """
+        See :py:meth:`TalkbuchetCommon.getMetrics`.
+
+        Browserless virtual participants have no connections, so only whether
+        the virtual participant is started is relevant.
+        """
+
+        peersMetrics = {
+            'iceConnectionStates': {},
+            'connectionFailures': 0,
+            'bytesSent': 0,
+            'bytesReceived': 0,
+        }
+
+        return {
+            'publishers': peersMetrics,
+            'subscribers': peersMetrics,
+            'handshakePhases': {
+                'publishers': [],
+                'subscribers': [],
+            },
+            'virtualParticipantStarted': self.isStarted(),
+        }
+
+    def release(self):
+        """
+        Closes the signaling session, if still open.
+
+        The virtual participant can not be used after releasing it.
+        """
+
+        if self.signaling:
+            _runInAsyncioLoop(self.signaling.close())
+
+        self.signaling = None
+
+    def __dataChannelNotAvailable(self):
+        print('Data channel not available for browserless virtual participants')
+
+    def sendMediaEnabledStateThroughDataChannel(self, mediaType, enabled):
+        self.__dataChannelNotAvailable()
+
+    def sendSpeakingStateThroughDataChannel(self, speaking):
+        self.__dataChannelNotAvailable()
+
+    def sendNickThroughDataChannel(self, nick):
+        self.__dataChannelNotAvailable()
+
+
+# Browserless subscribers replace a non public method of the aiortc receivers
+# to count the received packets without decoding them, so only the versions in
+# which that method is known to work are supported.
+_minimumAiortcVersion = (1, 9)
+_maximumAiortcVersion = (1, 15)
+
+def _importAiortc():
+    """
+    Returns the aiortc module.
+
+    aiortc, a WebRTC implementation in Python, is needed only for browserless
+    sieges, so it is imported only when used rather than being a dependency of
+    the whole script.
+
+    An exception is raised if the installed aiortc version is not supported.
+    """
+
+    aiortcRequirement = 'aiortc>=' + '.'.join(map(str, _minimumAiortcVersion)) + ',<' + '.'.join(map(str, (_maximumAiortcVersion[0], _maximumAiortcVersion[1] + 1)))
+
+    try:
+        import aiortc
+    except ImportError:
+        raise Exception('Browserless sieges require aiortc, please install it with "pip install \'' + aiortcRequirement + '\'"')
+
+    version = tuple(int(part) for part in re.findall(r'[0-9]+', aiortc.__version__)[:2])
+    if version < _minimumAiortcVersion or version > _maximumAiortcVersion:
+        raise Exception('Unsupported aiortc version ' + aiortc.__version__ + ', please install a supported one with "pip install \'' + aiortcRequirement + '\'"')
+
+    handleRtpPacket = getattr(aiortc.RTCRtpReceiver, '_handle_rtp_packet', None)
+    if not handleRtpPacket or list(inspect.signature(handleRtpPacket).parameters) != ['self', 'packet', 'arrival_time_ms']:
+        raise Exception('aiortc ' + aiortc.__version__ + ' does not provide the expected RTCRtpReceiver._handle_rtp_packet method, browserless subscribers can not be used')
+
+    return aiortc
+
+_syntheticMediaPackets = {}
+_syntheticMediaPacketsLock = threading.Lock()
+
+def _encodeSyntheticAudio(enabled):
+    import av
+
+    codec = av.CodecContext.create('libopus', 'w')
+    codec.sample_rate = 48000
+    codec.layout = 'mono'
+    codec.format = 's16'
+    codec.bit_rate = 32000
+    codec.time_base = fractions.Fraction(1, 48000)
+
+    # Like Chrome, a short beep every ~500ms (or silence if disabled).
+    packets = []
+    for i in range(25):
+        samples = []
+        for sample in range(960):
+            if enabled and i < 5:
+                samples.append(int(8000 * math.sin(2 * math.pi * 440 * (i * 960 + sample) / 48000)))
+            else:
+                samples.append(0)
+
+        frame = av.AudioFrame(format='s16', layout='mono', samples=960)
+        frame.planes[0].update(struct.pack('<960h', *samples))
+        frame.sample_rate = 48000
+        frame.time_base = fractions.Fraction(1, 48000)
+        frame.pts = i * 960
+
+        packets += codec.encode(frame)
+    packets += codec.encode(None)
+
+    return [bytes(packet) for packet in packets]
+
+def _encodeSyntheticVideo(enabled):
+    import av
+
+    codec = av.CodecContext.create('libvpx', 'w')
+    codec.width = 640
+    codec.height = 480
+    codec.pix_fmt = 'yuv420p'
+    codec.bit_rate = 500000
+    codec.framerate = fractions.Fraction(30, 1)
+    codec.time_base = fractions.Fraction(1, 30)
+    codec.gop_size = 30
+    codec.options = {'deadline': 'realtime', 'cpu-used': '8'}
+
+    # Like Firefox, a changing colour animation (or black if disabled).
+    packets = []
+    for i in range(30):
+        frame = av.VideoFrame(640, 480, 'yuv420p')
+        if enabled:
+            colour = [128, 128 + int(100 * math.sin(2 * math.pi * i / 30)), 128 + int(100 * math.cos(2 * math.pi * i / 30))]
+        else:
+            colour = [16, 128, 128]
+        for plane, value in zip(frame.planes, colour):
+            plane.update(bytes([value]) * plane.buffer_size)
+        frame.time_base = fractions.Fraction(1, 30)
+        frame.pts = i
+
+        packets += codec.encode(frame)
+    packets += codec.encode(None)
+
+    return [bytes(packet) for packet in packets]
+
+def _getSyntheticMediaPackets(kind, enabled = True):
+    """
+    Returns the encoded packets to be sent by synthetic media tracks.
+
+    The media is encoded only once per process: synthetic tracks just loop over
+    the encoded packets, so sending media in a browserless siege does not need
+    encoding nor decoding. Audio is encoded with Opus in 20 ms packets, and
+    video with VP8 at 640x480x30FPS.
+
+    :param kind: "audio" or "video".
+    :param enabled: False to get the packets for silence or black video.
+    :return: a list with the encoded packets for a short loop of media (half a
+        second of audio or one second of video).
+    """
+
+    with _syntheticMediaPacketsLock:
+        if (kind, enabled) not in _syntheticMediaPackets:
+            if kind == 'audio':
+                _syntheticMediaPackets[(kind, enabled)] = _encodeSyntheticAudio(enabled)
+            else:
+                _syntheticMediaPackets[(kind, enabled)] = _encodeSyntheticVideo(enabled)
+
+    return _syntheticMediaPackets[(kind, enabled)]
+
+_SyntheticMediaTrack = None
+
+def _newSyntheticMediaTrack(kind):
+    """
+    Returns a new aiortc media track that sends synthetic media.
+
+    Each publisher needs its own track, as in aiortc the frames of a track are
+    consumed by the sender.
+
+    :param kind: "audio" or "video".
+    """
+
+    global _SyntheticMediaTrack
+
+    if not _SyntheticMediaTrack:
+        aiortc = _importAiortc()
+        import av
+
+        class SyntheticMediaTrack(aiortc.MediaStreamTrack):
+            """
+            aiortc media track that loops over already encoded packets.
+
+            Like in browsers, if the track is disabled it still sends media,
+            but silence or black video. On the other hand, if the track is not
+            sending it keeps its timing, but it does not provide any media to
+            the sender, like replacing the track with null in a browser.
+            """
+
+            def __init__(self, kind):
+                super().__init__()
+
+                self.kind = kind
+                self.enabled = True
+                self.sending = True
+
+                if kind == 'audio':
+                    self.clockRate = 48000
+                    self.packetDuration = 960
+                else:
+                    self.clockRate = 90000
+                    self.packetDuration = 3000
+
+                self.packets = {
+                    True: _getSyntheticMediaPackets(kind, True),
+                    False: _getSyntheticMediaPackets(kind, False),
+                }
+
+                self.startTime = None
+                self.index = 0
+
+            async def recv(self):
+                if self.readyState != 'live':
+                    raise aiortc.mediastreams.MediaStreamError
+
+                if self.startTime == None:
+                    self.startTime = monotonic()
+                else:
+                    await asyncio.sleep(self.startTime + self.index * self.packetDuration / self.clockRate - monotonic())
+
+                while not self.sending:
+                    self.index += 1
+
+                    await asyncio.sleep(self.startTime + self.index * self.packetDuration / self.clockRate - monotonic())
+
+                    if self.readyState != 'live':
+                        raise aiortc.mediastreams.MediaStreamError
+
+                packets = self.packets[self.enabled]
+
+                packet = av.Packet(packets[self.index % len(packets)])
+                packet.pts = self.index * self.packetDuration
+                packet.time_base = fractions.Fraction(1, self.clockRate)
+
+                self.index += 1
+
+                return packet
+
+        _SyntheticMediaTrack = SyntheticMediaTrack
+
+    return _SyntheticMediaTrack(kind)
+
+
+class BrowserlessPeer:
+    """
+    Base class for browserless publishers and subscribers.
+
+    This is the counterpart of the Peer class in Talkbuchet.js, but using an
+    aiortc peer connection. aiortc does not trickle ICE candidates; all the
+    local candidates are included in the session description instead, so only
+    the remote candidates are exchanged through "candidate" messages.
+    Therefore, the candidates are gathered while the local description is set,
+    and the "iceGathering" phase of the handshake overlaps the "offer" or
+    "answer" phase.
+
+    Subclasses must set the "sessionId" and "isOfferer" attributes.
+    """
+
+    def __init__(self, signalingSettings, signaling):
+        aiortc = _importAiortc()
+
+        self.signaling = signaling
+
+        self.handshakeTimes = {}
+
+        iceServers = []
+        for iceServer in signalingSettings['stunservers'] + signalingSettings['turnservers']:
+            iceServers.append(aiortc.RTCIceServer(iceServer['urls'], iceServer.get('username'), iceServer.get('credential')))
+
+        self.peerConnection = aiortc.RTCPeerConnection(aiortc.RTCConfiguration(iceServers))
+
+        self.remoteDescriptionSet = asyncio.Event()
+
+        self.connected = False
+        self.connectedEvent = asyncio.Event()
+
+        @self.peerConnection.on('icegatheringstatechange')
+        def onIceGatheringStateChange():
+            if self.peerConnection.iceGatheringState == 'complete':
+                self.markHandshake('iceGatheringComplete')
+
+        @self.peerConnection.on('iceconnectionstatechange')
+        def onIceConnectionStateChange():
+            self.emitEvent('iceConnectionStateChange', {'state': self.peerConnection.iceConnectionState})
+
+            if self.peerConnection.iceConnectionState in ['connected', 'completed']:
+                self.markHandshake('iceConnected')
+                self.connected = True
+                self.connectedEvent.set()
+
+        self.signaling.addListener('message', self.handleMessage)
+
+        self.tasks = set()
+
+    def emitEvent(self, type, details = {}):
+        """
+        Adds an event with the given type and details about the peer to the
+        event log, like "Peer.emitEvent()" in Talkbuchet.js.
+        """
+
+        event = {
+            'type': type,
+            'role': 'publisher' if self.isOfferer else 'subscriber',
+            'sessionId': self.sessionId,
+        }
+        if hasattr(self, 'signalingIndex'):
+            event['signalingIndex'] = self.signalingIndex
+        event.update(details)
+
+        eventLog.addEvent(event, 'browserless')
+
+    def markHandshake(self, step):
+        """
+        See "Peer.markHandshake()" in Talkbuchet.js.
+        """
+
+        if step not in self.handshakeTimes:
+            self.handshakeTimes[step] = perf_counter() * 1000
+
+    def getHandshakePhases(self):
+        """
+        See "Peer.getHandshakePhases()" in Talkbuchet.js.
+        """
+
+        times = self.handshakeTimes
+
+        def duration(start, end):
+            if start not in times or end not in times:
+                return None
+
+            return times[end] - times[start]
+
+        phases = {
+            'offer': duration('start', 'localDescription' if self.isOfferer else 'remoteDescription'),
+            'answer': duration('localDescription', 'remoteDescription') if self.isOfferer else duration('remoteDescription', 'localDescription'),
+            'iceGathering': duration('localDescription', 'iceGatheringComplete'),
+            'iceConnected': duration('remoteDescription' if self.isOfferer else 'localDescription', 'iceConnected'),
+            'total': duration('start', 'iceConnected'),
+        }
+
+        return {phase: duration for phase, duration in phases.items() if duration is not None}
+
+    def handleMessage(self, message):
+        if message['data'].get('type') == 'candidate' and message['data'].get('from') == self.sessionId:
+            self.runTask(self.addIceCandidate(message['data']['payload']['candidate']))
+
+    def runTask(self, coroutine):
+        # Signaling listeners are synchronous, so asynchronous handlers are run
+        # as tasks (which need to be referenced until done).
+        task = asyncio.get_running_loop().create_task(coroutine)
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+    async def addIceCandidate(self, candidate):
+        if not candidate.get('candidate'):
+            return
+
+        from aiortc.sdp import candidate_from_sdp
+
+        iceCandidate = candidate_from_sdp(candidate['candidate'].split(':', 1)[1])
+        iceCandidate.sdpMid = candidate.get('sdpMid')
+        iceCandidate.sdpMLineIndex = candidate.get('sdpMLineIndex')
+
+        # Candidates can be received before the remote description was set.
+        await self.remoteDescriptionSet.wait()
+        await self.peerConnection.addIceCandidate(iceCandidate)
+
+    async def setRemoteDescription(self, description):
+        aiortc = _importAiortc()
+
+        await self.peerConnection.setRemoteDescription(aiortc.RTCSessionDescription(description['sdp'], description['type']))
+
+        self.remoteDescriptionSet.set()
+
+    async def connect(self, timeout):
+        """
+        Waits until the peer is connected.
+
+        :param timeout: the seconds to wait.
+        """
+
+        try:
+            await asyncio.wait_for(self.connectedEvent.wait(), timeout)
+        except asyncio.TimeoutError:
+            raise Exception('Peer has not connected in ' + str(timeout) + ' seconds')
+
+    async def send(self, type, data):
+        await self.signaling.sendMessage({
+            'to': self.sessionId,
+            'roomType': 'video',
+            'type': type,
+            'payload': data,
+        })
+
+    async def close(self):
+        self.signaling.removeListener('message', self.handleMessage)
+
+        await self.peerConnection.close()
+
+
+class BrowserlessPublisher(BrowserlessPeer):
+    """
+    Browserless counterpart of the Publisher class in Talkbuchet.js.
+
+    The publisher sends synthetic media; the media is encoded only once and
+    then the same packets are sent by all the publishers.
+    """
+
+    def __init__(self, signalingSettings, signaling, audio, video):
+        super().__init__(signalingSettings, signaling)
+
+        aiortc = _importAiortc()
+
+        self.sessionId = signaling.sessionId
+        self.isOfferer = True
+
+        # The synthetic media is already encoded, so the codecs need to be
+        # forced.
+        self.tracks = {}
+        for kind, enabled, mimeTypes in [('audio', audio, ['audio/opus']), ('video', video, ['video/VP8', 'video/rtx'])]:
+            if not enabled:
+                continue
+
+            self.tracks[kind] = _newSyntheticMediaTrack(kind)
+
+            transceiver = self.peerConnection.addTransceiver(self.tracks[kind], direction='sendonly')
+            transceiver.setCodecPreferences([codec for codec in aiortc.RTCRtpSender.getCapabilities(kind).codecs if codec.mimeType in mimeTypes])
+
+    def handleMessage(self, message):
+        super().handleMessage(message)
+
+        if message['data'].get('type') == 'answer':
+            self.markHandshake('remoteDescription')
+
+            self.runTask(self.setRemoteDescription(message['data']['payload']))
+
+    async def connect(self, timeout):
+        self.markHandshake('start')
+
+        offer = await self.peerConnection.createOffer()
+
+        self.markHandshake('localDescription')
+
+        await self.peerConnection.setLocalDescription(offer)
+
+        await self.send('offer', {
+            'type': self.peerConnection.localDescription.type,
+            'sdp': self.peerConnection.localDescription.sdp,
+        })
+
+        await super().connect(timeout)
+
+
+class BrowserlessSubscriber(BrowserlessPeer):
+    """
+    Browserless counterpart of the Subscriber class in Talkbuchet.js.
+
+    The received media is not decoded; the subscriber just counts the received
+    RTP packets and bytes (of payload and padding) in "packetsReceived" and
+    "bytesReceived", and the lost packets (based on the sequence numbers) in
+    "packetsLost".
+    """
+
+    def __init__(self, signalingSettings, signaling, publisherSessionId):
+        super().__init__(signalingSettings, signaling)
+
+        self.sessionId = publisherSessionId
+        self.isOfferer = False
+
+        self.packetsReceived = 0
+        self.bytesReceived = 0
+
+        # First and highest (extended) sequence number of each stream, used to
+        # know how many packets were lost.
+        self.rtpSequenceNumbers = {}
+
+    @property
+    def packetsLost(self):
+        packetsExpected = sum([highest - first + 1 for first, highest in self.rtpSequenceNumbers.values()])
+
+        return max(packetsExpected - self.packetsReceived, 0)
+
+    def handleMessage(self, message):
+        super().handleMessage(message)
+
+        if message['data'].get('type') == 'offer' and message['data'].get('from') == self.sessionId:
+            self.markHandshake('remoteDescription')
+
+            self.runTask(self.handleOffer(message['data']['payload']))
+
+    async def countRtpPacket(self, packet, arrival_time_ms):
+        self.packetsReceived += 1
+        self.bytesReceived += len(packet.payload) + packet.padding_size
+
+        sequenceNumbers = self.rtpSequenceNumbers.get(packet.ssrc)
+        if not sequenceNumbers:
+            self.rtpSequenceNumbers[packet.ssrc] = [packet.sequence_number, packet.sequence_number]
+        else:
+            # Sequence numbers wrap around after 65535; packets are considered
+            # newer if they are less than half the range ahead.
+            distance = (packet.sequence_number - sequenceNumbers[1]) & 0xffff
+            if distance < 0x8000:
+                sequenceNumbers[1] += distance
+
+    async def handleOffer(self, offer):
+        await self.setRemoteDescription(offer)
+
+        # Received packets are counted instead of being handled by the
+        # receivers, which would decode them.
+        for transceiver in self.peerConnection.getTransceivers():
+            transceiver.receiver._handle_rtp_packet = self.countRtpPacket
+
+        answer = await self.peerConnection.createAnswer()
+
+        self.markHandshake('localDescription')
+
+        await self.peerConnection.setLocalDescription(answer)
+
+        await self.send('answer', {
+            'type': self.peerConnection.localDescription.type,
+            'sdp': self.peerConnection.localDescription.sdp,
+        })
+
+    async def connect(self, timeout):
+        self.markHandshake('start')
+
+        await self.signaling.sendRequestOffer(self.sessionId)
+
+        await super().connect(timeout)
+
+
+class BrowserlessSiege:
+    """
+    Siege that does not need a browser.
+
+    Each publisher and subscriber of a siege run by Talkbuchet.js is a real
+    peer connection of the browser, so the number of connections is limited by
+    the browser (Chrome has a hardcoded limit) and the CPU needed to encode and
+    decode the media. This wrapper performs the same steps as Talkbuchet.js,
+    but using aiortc, a WebRTC implementation in Python, so the siege is run
+    directly from Python: publishers send synthetic media that was encoded only
+    once, and subscribers count the received packets and bytes without decoding
+    them. This allows a single system to keep many more connections to Janus.
+
+    aiortc is not needed for any other mode, so it needs to be explicitly
+    installed to run browserless sieges.
+
+    It provides the same methods as Siege. The siege runs in a shared asyncio
+    event loop, so it can be started and stopped either with the blocking
+    methods or with their coroutine counterparts ("siegeAsync()" and
+    "closeConnectionsAsync()").
+    """
+
+    def __init__(self, nextcloudUrl):
+        """
+        :param nextcloudUrl: the URL of the Nextcloud instance to siege.
+        """
+
+        _importAiortc()
+
+        self.nextcloudUrl = nextcloudUrl
+
+        self.user = ''
+        self.appToken = ''
+        self.token = ''
+
+        # Set default values from Talkbuchet.js.
+        self.audio = True
+        self.video = False
+        self.publishersCount = 5
+        self.subscribersPerPublisherCount = 40
+        self.connectionWarningTimeout = 5000
+        self.rampPolicy = _newRampPolicy()
+
+        self.publishers = {}
+        self.subscribers = []
+        self.signalings = []
+        self.subscriberSignalings = {}
+
+        self.statsStore = None
+        self.statsSamplerTask = None
+
+        self.connectionFailures = {
+            'publishers': 0,
+            'subscribers': 0,
+        }
+
+    def setCredentials(self, user, appToken):
+        """
+        See :py:meth:`TalkbuchetCommon.setCredentials`.
+        """
+
+        self.user = user
+        self.appToken = appToken
+
+    def setToken(self, token):
+        """
+        See :py:meth:`TalkbuchetCommon.setToken`.
+        """
+
+        self.token = token
+
+    def startMedia(self, audio, video):
+        """
+        Sets the media to be sent by the publishers.
+
+        The synthetic media is encoded (if it was not encoded yet) when this is
+        called.
+
+        :param audio: True to send audio, False otherwise.
+        :param video: True to send video, False otherwise.
+        """
+
+        self.audio = audio
+        self.video = video
+
+        for kind, enabled in [('audio', audio), ('video', video)]:
+            if enabled:
+                _getSyntheticMediaPackets(kind, True)
+                _getSyntheticMediaPackets(kind, False)
+
+    def setPublishersAndSubscribersCount(self, publishersCount, subscribersPerPublisherCount):
+        """
+        See :py:meth:`Siege.setPublishersAndSubscribersCount`.
+        """
+
+        self.publishersCount = publishersCount
+        self.subscribersPerPublisherCount = subscribersPerPublisherCount
+
+    def setConnectionWarningTimeout(self, connectionWarningTimeout):
+        """
+        See :py:meth:`Siege.setConnectionWarningTimeout`.
+        """
+
+        self.connectionWarningTimeout = connectionWarningTimeout
+
+    def setRampPolicy(self, maxInFlight = 1, arrival = 'constant', rate = 0, startRate = 0, rampDuration = 0, stepSize = 1, stepInterval = 0):
+        """
+        See :py:meth:`Siege.setRampPolicy`.
+        """
+
+        self.rampPolicy = _newRampPolicy(maxInFlight, arrival, rate, startRate, rampDuration, stepSize, stepInterval)
+
+    def __listenToConnectionChanges(self, peer, name):
+        @peer.peerConnection.on('iceconnectionstatechange')
+        def onIceConnectionStateChange():
+            if peer.peerConnection.iceConnectionState == 'failed':
+                self.connectionFailures[name.lower() + 's'] += 1
+
+                print(name + ' connection failed ' + peer.sessionId)
+
+    async def __newSignaling(self):
+        ocsClient = TalkOcsClient(self.nextcloudUrl, self.user, self.appToken)
+
+        signalingSettings = await ocsClient.getSignalingSettings(self.token)
+
+        signaling = SignalingClient(self.user, signalingSettings, await ocsClient.getSignalingBackendUrl())
+        self.signalings.append(signaling)
+
+        await signaling.connect()
+
+        return signalingSettings, signaling
+
+    async def __startPublishers(self, count):
+        startedPublishers = []
+        startedCount = 0
+
+        async def startPublisher(i):
+            nonlocal startedCount
+
+            try:
+                signalingSettings, signaling = await self.__newSignaling()
+            except Exception as exception:
+                print('Publisher ' + str(i) + ' init error: ' + str(exception))
+
+                return
+
+            publisher = BrowserlessPublisher(signalingSettings, signaling, self.audio, self.video)
+
+            try:
+                await publisher.connect(self.connectionWarningTimeout / 1000)
+
+                startedCount += 1
+
+                if startedCount % 5 == 0 and startedCount < count:
+                    print('Publisher started (' + str(startedCount) + '/' + str(count) + ')')
+            except Exception as exception:
+                self.connectionFailures['publishers'] += 1
+
+                publisher.emitEvent('connectionError', {'error': str(exception)})
+
+                print('Publisher ' + str(i) + ' error: ' + str(exception))
+
+            self.publishers[publisher.sessionId] = publisher
+            startedPublishers.append(publisher)
+
+            self.__listenToConnectionChanges(publisher, 'Publisher')
+
+        await _runWithRampPolicy(self.rampPolicy, count, startPublisher)
+
+        return startedPublishers
+
+    async def __getSubscriberSignaling(self, signalingIndex):
+        # The same signaling session can be shared between subscribers to
+        # different publishers, so subscribers are grouped, and each group of
+        # subscribers shares a signaling session (which is created by the first
+        # subscriber of the group to be started). The groups are kept while the
+        # siege is active, so subscribers to publishers added later can reuse
+        # them.
+        async def newSignaling():
+            try:
+                return await self.__newSignaling()
+            except Exception as exception:
+                print('Subscriber ' + str(signalingIndex) + ' init error: ' + str(exception))
+
+                return None
+
+        if signalingIndex not in self.subscriberSignalings:
+            self.subscriberSignalings[signalingIndex] = asyncio.get_running_loop().create_task(newSignaling())
+
+        return await self.subscriberSignalings[signalingIndex]
+
+    async def __startSubscribers(self, signalingIndexes, publisherSessionIds):
+        startedSubscribers = []
+
+        count = len(signalingIndexes) * len(publisherSessionIds)
+        startedCount = 0
+
+        async def startSubscriber(i):
+            nonlocal startedCount
+
+            signalingIndex = signalingIndexes[i // len(publisherSessionIds)]
+
+            signalingSettingsAndSignaling = await self.__getSubscriberSignaling(signalingIndex)
+            if not signalingSettingsAndSignaling:
+                return
+
+            signalingSettings, signaling = signalingSettingsAndSignaling
+
+            subscriber = BrowserlessSubscriber(signalingSettings, signaling, publisherSessionIds[i % len(publisherSessionIds)])
+            subscriber.signalingIndex = signalingIndex
+
+            self.subscribers.append(subscriber)
+            startedSubscribers.append(subscriber)
+
+            try:
+                await subscriber.connect(self.connectionWarningTimeout / 1000)
+
+                startedCount += 1
+
+                if startedCount % 5 == 0 and startedCount < count:
+                    print('Subscriber started (' + str(startedCount) + '/' + str(count) + ')')
+            except Exception as exception:
+                self.connectionFailures['subscribers'] += 1
+
+                subscriber.emitEvent('connectionError', {'error': str(exception)})
+
+                print('Subscriber ' + str(self.subscribers.index(subscriber)) + ' error: ' + str(exception))
+
+            self.__listenToConnectionChanges(subscriber, 'Subscriber')
+
+        await _runWithRampPolicy(self.rampPolicy, count, startSubscriber)
+
+        return startedSubscribers
+
+    async def __closeSignaling(self, signaling):
+        if signaling in self.signalings:
+            self.signalings.remove(signaling)
+
+        await signaling.close()
+
+    async def __closeSubscribers(self, subscribersToClose):
+        for subscriber in subscribersToClose:
+            self.subscribers.remove(subscriber)
+
+        await asyncio.gather(*[subscriber.close() for subscriber in subscribersToClose], return_exceptions=True)
+
+    async def siegeAsync(self):
+        """
+        Starts a siege.
+        """
+
+        if not self.user or not self.appToken:
+            print('Credentials (user and appToken) are not set')
+
+            return
+
+        await self.closeConnectionsAsync()
+
+        print('Preparing to siege')
+
+        await self.__startPublishers(self.publishersCount)
+
+        print('Publishers started the siege')
+
+        await self.__startSubscribers(list(range(self.subscribersPerPublisherCount)), list(self.publishers))
+
+        print('Subscribers started the siege')
+
+    async def addPublishersAsync(self, count):
+        """
+        See :py:meth:`Siege.addPublishers`.
+        """
+
+        startedPublishers = await self.__startPublishers(count)
+
+        self.publishersCount += count
+
+        await self.__startSubscribers(list(range(self.subscribersPerPublisherCount)), [publisher.sessionId for publisher in startedPublishers])
+
+        print('Added ' + str(len(startedPublishers)) + ' publishers to the siege')
+
+    async def removePublishersAsync(self, count):
+        """
+        See :py:meth:`Siege.removePublishers`.
+        """
+
+        publisherSessionIds = list(self.publishers)[max(len(self.publishers) - count, 0):]
+
+        for publisherSessionId in publisherSessionIds:
+            await self.__closeSubscribers([subscriber for subscriber in self.subscribers if subscriber.sessionId == publisherSessionId])
+
+            publisher = self.publishers.pop(publisherSessionId)
+
+            await publisher.close()
+            await self.__closeSignaling(publisher.signaling)
+
+        self.publishersCount = max(self.publishersCount - count, 0)
+
+        print('Removed ' + str(len(publisherSessionIds)) + ' publishers from the siege')
+
+    async def addSubscribersAsync(self, countPerPublisher):
+        """
+        See :py:meth:`Siege.addSubscribers`.
+        """
+
+        signalingIndexes = list(range(self.subscribersPerPublisherCount, self.subscribersPerPublisherCount + countPerPublisher))
+
+        self.subscribersPerPublisherCount += countPerPublisher
+
+        startedSubscribers = await self.__startSubscribers(signalingIndexes, list(self.publishers))
+
+        print('Added ' + str(len(startedSubscribers)) + ' subscribers to the siege')
+
+    async def removeSubscribersAsync(self, countPerPublisher):
+        """
+        See :py:meth:`Siege.removeSubscribers`.
+        """
+
+        remainingSubscribersPerPublisherCount = max(self.subscribersPerPublisherCount - countPerPublisher, 0)
+
+        subscribersToRemove = [subscriber for subscriber in self.subscribers if subscriber.signalingIndex >= remainingSubscribersPerPublisherCount]
+        await self.__closeSubscribers(subscribersToRemove)
+
+        for signalingIndex in [signalingIndex for signalingIndex in self.subscriberSignalings if signalingIndex >= remainingSubscribersPerPublisherCount]:
+            signalingSettingsAndSignaling = await self.subscriberSignalings.pop(signalingIndex)
+            if signalingSettingsAndSignaling:
+                await self.__closeSignaling(signalingSettingsAndSignaling[1])
+
+        self.subscribersPerPublisherCount = remainingSubscribersPerPublisherCount
+
+        print('Removed ' + str(len(subscribersToRemove)) + ' subscribers from the siege')
+
+    async def closeConnectionsAsync(self):
+        """
+        Stops the siege by closing the publisher and subscriber connections.
+        """
+
+        peers = self.subscribers + list(self.publishers.values())
+        signalings = self.signalings
+
+        self.subscribers = []
+        self.publishers = {}
+        self.signalings = []
+        self.subscriberSignalings = {}
+
+        await asyncio.gather(*[peer.close() for peer in peers], return_exceptions=True)
+        await asyncio.gather(*[signaling.close() for signaling in signalings], return_exceptions=True)
+
+    def siege(self):
+        """
+        Starts a siege.
+        """
+
+        # The media is encoded now, if needed, rather than blocking the event
+        # loop when the first publisher is created.
+        self.startMedia(self.audio, self.video)
+
+        _runInAsyncioLoop(self.siegeAsync())
+
+    def closeConnections(self):
+        """
+        Stops the siege by closing the publisher and subscriber connections.
+        """
+
+        _runInAsyncioLoop(self.closeConnectionsAsync())
+
+    def addPublishers(self, count):
+        """
+        See :py:meth:`Siege.addPublishers`.
+        """
+
+        _runInAsyncioLoop(self.addPublishersAsync(count))
+
+    def removePublishers(self, count):
+        """
+        See :py:meth:`Siege.removePublishers`.
+        """
+
+        _runInAsyncioLoop(self.removePublishersAsync(count))
+
+    def addSubscribers(self, countPerPublisher):
+        """
+        See :py:meth:`Siege.addSubscribers`.
+        """
+
+        _runInAsyncioLoop(self.addSubscribersAsync(countPerPublisher))
+
+    def removeSubscribers(self, countPerPublisher):
+        """
+        See :py:meth:`Siege.removeSubscribers`.
+        """
+
+        _runInAsyncioLoop(self.removeSubscribersAsync(countPerPublisher))
+
+    def release(self):
+        """
+        Stops the stats sampler, if started, and closes the connections, if
+        still open.
+        """
+
+        if self.statsSamplerTask:
+            _getAsyncioLoop().call_soon_threadsafe(self.statsSamplerTask.cancel)
+            self.statsSamplerTask = None
+
+        self.closeConnections()
+
+    def __printConnectionsSummary(self, peersByName):
+        iceConnectionStateCount = {}
+
+        for name, peer in peersByName:
+            print(str(name) + ': ' + peer.peerConnection.iceConnectionState)
+
+            iceConnectionStateCount[peer.peerConnection.iceConnectionState] = iceConnectionStateCount.get(peer.peerConnection.iceConnectionState, 0) + 1
+
+        print('Summary:')
+        print('  - New: ' + str(iceConnectionStateCount.get('new', 0) + iceConnectionStateCount.get('checking', 0)))
+        print('  - Connected: ' + str(iceConnectionStateCount.get('connected', 0) + iceConnectionStateCount.get('completed', 0)))
+        print('  - Disconnected: ' + str(iceConnectionStateCount.get('disconnected', 0)))
+        print('  - Failed: ' + str(iceConnectionStateCount.get('failed', 0)))
+
+    async def __getStatsValues(self, peer):
+        values = dict.fromkeys(_statsSamplerFields, math.nan)
+
+        if isinstance(peer, BrowserlessSubscriber):
+            values['bytesReceived'] = peer.bytesReceived
+            values['packetsReceived'] = peer.packetsReceived
+            values['packetsLost'] = peer.packetsLost
+
+            return values
+
+        for stat in (await peer.peerConnection.getStats()).values():
+            if stat.type == 'outbound-rtp':
+                values['bytesSent'] = (0 if math.isnan(values['bytesSent']) else values['bytesSent']) + stat.bytesSent
+                values['packetsSent'] = (0 if math.isnan(values['packetsSent']) else values['packetsSent']) + stat.packetsSent
+            elif stat.type == 'remote-inbound-rtp' and stat.roundTripTime != None:
+                values['roundTripTime'] = stat.roundTripTime if math.isnan(values['roundTripTime']) else max(values['roundTripTime'], stat.roundTripTime)
+
+        return values
+
+    async def __sampleStats(self, pendingColumns):
+        timestamp = datetime.now().timestamp() * 1000
+
+        peers = list(self.publishers.values()) + self.subscribers
+        peersValues = await asyncio.gather(*[self.__getStatsValues(peer) for peer in peers], return_exceptions=True)
+
+        for peer, values in zip(peers, peersValues):
+            if isinstance(values, Exception):
+                continue
+
+            if peer not in self.statsConnectionIds:
+                self.statsConnectionIds[peer] = self.nextStatsConnectionId
+                self.nextStatsConnectionId += 1
+
+                pendingColumns['connections'][self.statsConnectionIds[peer]] = ('publisher ' if isinstance(peer, BrowserlessPublisher) else 'subscriber ' + str(peer.signalingIndex) + ' ') + peer.sessionId
+
+            pendingColumns['timestamp'].append(timestamp)
+            pendingColumns['connection'].append(self.statsConnectionIds[peer])
+            for field in _statsSamplerFields:
+                pendingColumns[field].append(values[field])
+
+    async def __runStatsSampler(self, interval, capacity):
+        while True:
+            await asyncio.sleep(interval / 1000)
+
+            await self.__sampleStats(self.pendingStatsColumns)
+
+            # Like in Talkbuchet.js, the oldest samples are dropped if the
+            # stats are not pulled in time.
+            droppedCount = len(self.pendingStatsColumns['timestamp']) - capacity
+            if droppedCount > 0:
+                for column in StatsStore.columnTypes:
+                    del self.pendingStatsColumns[column][:droppedCount]
+                self.pendingStatsColumns['droppedCount'] += droppedCount
+
+    def __newPendingStatsColumns(self):
+        pendingStatsColumns = {column: [] for column in StatsStore.columnTypes}
+        pendingStatsColumns['connections'] = {}
+        pendingStatsColumns['droppedCount'] = 0
+
+        return pendingStatsColumns
+
+    def startStatsSampler(self, interval = 1000, capacity = 100000, directory = None):
+        """
+        See :py:meth:`Siege.startStatsSampler`.
+
+        The subscribers do not handle the received packets, so only bytes,
+        packets and packets lost are sampled for them.
+        """
+
+        self.stopStatsSampler()
+
+        self.statsStore = StatsStore(directory)
+        self.pendingStatsColumns = self.__newPendingStatsColumns()
+
+        self.statsConnectionIds = weakref.WeakKeyDictionary()
+        self.nextStatsConnectionId = 0
+
+        async def startStatsSamplerTask():
+            return asyncio.get_running_loop().create_task(self.__runStatsSampler(interval, capacity))
+
+        self.statsSamplerTask = _runInAsyncioLoop(startStatsSamplerTask())
+
+    def pullStats(self, maxCount = None):
+        """
+        See :py:meth:`Siege.pullStats`.
+        """
+
+        if self.statsStore is None:
+            print('Stats sampler was not started')
+
+            return None
+
+        async def takePendingStatsColumns():
+            # Taken in the event loop to not race with the sampler.
+            pendingStatsColumns = self.pendingStatsColumns
+            count = min(len(pendingStatsColumns['timestamp']), maxCount or len(pendingStatsColumns['timestamp']))
+
+            columns = {}
+            for column, typeCode in StatsStore.columnTypes.items():
+                values = array.array(typeCode, pendingStatsColumns[column][:count])
+                if sys.byteorder == 'big':
+                    values.byteswap()
+                columns[column] = values.tobytes()
+
+                del pendingStatsColumns[column][:count]
+
+            connections = pendingStatsColumns['connections']
+            pendingStatsColumns['connections'] = {}
+
+            droppedCount = pendingStatsColumns['droppedCount']
+            pendingStatsColumns['droppedCount'] = 0
+
+            return connections, columns, droppedCount
+
+        self.statsStore.appendColumns(*_runInAsyncioLoop(takePendingStatsColumns()))
+
+        return self.statsStore
+
+    def stopStatsSampler(self):
+        """
+        See :py:meth:`Siege.stopStatsSampler`.
+        """
+
+        if not self.statsSamplerTask:
+            return
+
+        _getAsyncioLoop().call_soon_threadsafe(self.statsSamplerTask.cancel)
+        self.statsSamplerTask = None
+
+        self.pullStats()
+
+    def getHandshakeHistograms(self):
+        """
+        See :py:meth:`Siege.getHandshakeHistograms`.
+        """
+
+        return _newHandshakeHistograms(self.getHandshakePhases())
+
+    def getHandshakePhases(self):
+        """
+        See :py:meth:`Siege.getHandshakePhases`.
+        """
+
+        async def getHandshakePhases():
+            # Got in the event loop to not race with the handshakes.
+            return {
+                'publishers': [publisher.getHandshakePhases() for publisher in self.publishers.values()],
+                'subscribers': [subscriber.getHandshakePhases() for subscriber in self.subscribers],
+            }
+
+        return _runInAsyncioLoop(getHandshakePhases())
+
+    def printHandshakeTimings(self):
+        """
+        See :py:meth:`Siege.printHandshakeTimings`.
+        """
+
+        _printHandshakeHistograms(self.getHandshakeHistograms())
+
+    def getMetrics(self):
+        """
+        See :py:meth:`TalkbuchetCommon.getMetrics`.
+        """
+
+        async def getPeersMetrics(peers, peersConnectionFailures):
+            peersMetrics = {
+                'iceConnectionStates': {},
+                'connectionFailures': peersConnectionFailures,
+                'bytesSent': 0,
+                'bytesReceived': 0,
+            }
+
+            for peer in peers:
+                iceConnectionState = peer.peerConnection.iceConnectionState
+                peersMetrics['iceConnectionStates'][iceConnectionState] = peersMetrics['iceConnectionStates'].get(iceConnectionState, 0) + 1
+
+            for values in await asyncio.gather(*[self.__getStatsValues(peer) for peer in peers], return_exceptions=True):
+                if isinstance(values, Exception):
+                    continue
+
+                for field in ['bytesSent', 'bytesReceived']:
+                    if not math.isnan(values[field]):
+                        peersMetrics[field] += values[field]
+
+            return peersMetrics
+
+        async def getMetrics():
+            return {
+                'publishers': await getPeersMetrics(list(self.publishers.values()), self.connectionFailures['publishers']),
+                'subscribers': await getPeersMetrics(list(self.subscribers), self.connectionFailures['subscribers']),
+                'handshakePhases': {
+                    'publishers': [publisher.getHandshakePhases() for publisher in self.publishers.values()],
+                    'subscribers': [subscriber.getHandshakePhases() for subscriber in self.subscribers],
+                },
+                'virtualParticipantStarted': False,
+            }
+
+        return _runInAsyncioLoop(getMetrics())
+
+    def checkPublishersConnections(self):
+        """
+        Prints the state of the publisher connections.
+        """
+
+        self.__printConnectionsSummary(self.publishers.items())
+
+    def checkSubscribersConnections(self):
+        """
+        Prints the state of the subscriber connections.
+        """
+
+        self.__printConnectionsSummary(enumerate(self.subscribers))
+
+    def getPublishersConnectionsSummary(self, states = None, offset = 0, limit = 100):
+        """
+        See :py:meth:`Siege.getPublishersConnectionsSummary`.
+        """
+
+        connections = [({'sessionId': publisherSessionId}, publisher) for publisherSessionId, publisher in self.publishers.items()]
+
+        return _getConnectionsSummary(connections, states or _problemIceConnectionStates, offset, limit)
+
+    def getSubscribersConnectionsSummary(self, states = None, offset = 0, limit = 100):
+        """
+        See :py:meth:`Siege.getSubscribersConnectionsSummary`.
+        """
+
+        connections = [({'index': index, 'sessionId': subscriber.sessionId, 'signalingIndex': subscriber.signalingIndex}, subscriber) for index, subscriber in enumerate(self.subscribers)]
+
+        return _getConnectionsSummary(connections, states or _problemIceConnectionStates, offset, limit)
+
+    def printPublisherStats(self, publisherSessionId):
+        """
+        Prints the stats of the given publisher connection.
+
+        :param publisherSessionId: the session ID of the publisher.
+        """
+
+        if publisherSessionId not in self.publishers:
+            print('Invalid publisher session ID')
+
+            return
+
+        stats = _runInAsyncioLoop(self.publishers[publisherSessionId].peerConnection.getStats())
+        for stat in stats.values():
+            print(stat)
+
+    def printSubscriberStats(self, index):
+        """
+        Prints the stats of the given subscriber connection.
+
+        As the received packets are not handled by aiortc only the number of
+        received packets and bytes are printed.
+
+        :param index: the index of the subscriber in the list of subscribers.
+        """
+
+        if index < 0 or index >= len(self.subscribers):
+            print('Index out of range')
+
+            return
+
+        subscriber = self.subscribers[index]
+
+        print('packetsReceived: ' + str(subscriber.packetsReceived))
+        print('bytesReceived: ' + str(subscriber.bytesReceived))
+
+    def __setTracksEnabled(self, kind, enabled):
+        if not getattr(self, kind):
+            print(kind.capitalize() + ' was not initialized')
+
+            return
+
+        for publisher in self.publishers.values():
+            publisher.tracks[kind].enabled = enabled
+
+    def __setSendersEnabled(self, kind, enabled):
+        if not getattr(self, kind):
+            print(kind.capitalize() + ' was not initialized')
+
+            return
+
+        for publisher in self.publishers.values():
+            publisher.tracks[kind].sending = enabled
+
+    def setAudioEnabled(self, audioEnabled):
+        """
+        See :py:meth:`TalkbuchetCommon.setAudioEnabled`.
+        """
+
+        self.__setTracksEnabled('audio', audioEnabled)
+
+    def setVideoEnabled(self, videoEnabled):
+        """
+        See :py:meth:`TalkbuchetCommon.setVideoEnabled`.
+        """
+
+        self.__setTracksEnabled('video', videoEnabled)
+
+    def setSentAudioStreamEnabled(self, sentAudioStreamEnabled):
+        """
+        See :py:meth:`TalkbuchetCommon.setSentAudioStreamEnabled`.
+        """
+
+        self.__setSendersEnabled('audio', sentAudioStreamEnabled)
+
+    def setSentVideoStreamEnabled(self, sentVideoStreamEnabled):
+        """
+        See :py:meth:`TalkbuchetCommon.setSentVideoStreamEnabled`.
+        """
+
+        self.__setSendersEnabled('video', sentVideoStreamEnabled)
+
+    def setMediaEnabled(self, audioEnabled = None, videoEnabled = None, sentAudioStreamEnabled = None, sentVideoStreamEnabled = None):
+        """
+        See :py:meth:`TalkbuchetCommon.setMediaEnabled`.
+        """
+
+        if audioEnabled != None:
+            self.setAudioEnabled(audioEnabled)
+        if videoEnabled != None:
+            self.setVideoEnabled(videoEnabled)
+        if sentAudioStreamEnabled != None:
+            self.setSentAudioStreamEnabled(sentAudioStreamEnabled)
+        if sentVideoStreamEnabled != None:
+            self.setSentVideoStreamEnabled(sentVideoStreamEnabled)
+
+
+def _percentile(sortedValues, percentile):
+    """
+    Returns the given percentile (nearest-rank) of the already sorted values.
+    """
+
+    if not sortedValues:
+        return 0
+
+    index = max(math.ceil(percentile / 100 * len(sortedValues)) - 1, 0)
+
+    return sortedValues[index]
+
+
+class SignalingBenchmarkResult:
+    """
+    Result of a run of a SignalingBenchmark.
+
+    Latencies are in seconds, and they are measured from the moment a message
+    was sent to the moment it was relayed back by the signaling server to its
+    recipient (as all the sessions run in the same process the same clock is
+    used for both).
+
+    "clientLimited" is True if the messages could not be sent at the requested
+    rate, which means that the client, rather than the signaling server, was the
+    bottleneck.
+    """
+
+    def __init__(self, messagesPerSecond, duration):
+        self.messagesPerSecond = messagesPerSecond
+        self.duration = duration
+
+        self.sent = 0
+        self.received = 0
+        self.latencies = []
+        self.clientLimited = False
+
+    @property
+    def lost(self):
+        return self.sent - self.received
+
+    @property
+    def receivedPerSecond(self):
+        return self.received / self.duration if self.duration else 0
+
+    def getLatencyPercentiles(self):
+        """
+        Returns the p50, p90, p99 and max relay latencies.
+
+        :return: a dict with "p50", "p90", "p99" and "max" keys.
+        """
+
+        sortedLatencies = sorted(self.latencies)
+
+        return {
+            'p50': _percentile(sortedLatencies, 50),
+            'p90': _percentile(sortedLatencies, 90),
+            'p99': _percentile(sortedLatencies, 99),
+            'max': sortedLatencies[-1] if sortedLatencies else 0,
+        }
+
+    def __repr__(self):
+        latencyPercentiles = self.getLatencyPercentiles()
+
+        return ('<SignalingBenchmarkResult: ' + str(self.messagesPerSecond) + ' msg/s requested, '
+                + str(round(self.receivedPerSecond, 1)) + ' msg/s relayed, '
+                + str(self.sent) + ' sent, ' + str(self.lost) + ' lost, latency '
+                + 'p50=' + str(round(latencyPercentiles['p50'] * 1000, 1)) + 'ms '
+                + 'p90=' + str(round(latencyPercentiles['p90'] * 1000, 1)) + 'ms '
+                + 'p99=' + str(round(latencyPercentiles['p99'] * 1000, 1)) + 'ms '
+                + 'max=' + str(round(latencyPercentiles['max'] * 1000, 1)) + 'ms'
+                + (', client limited' if self.clientLimited else '') + '>')
+
+
+class SignalingBenchmark:
+    """
+    Benchmark of the message relay of the signaling server.
+
+    The benchmark opens several signaling sessions, and then each session sends
+    timestamped "message" messages to the next session (using the same envelope
+    that Talkbuchet.js uses to send offers, answers and candidates) at the
+    requested rate. The relay latency of each message and the rate at which
+    messages are relayed is measured, which isolates the scaling of the
+    signaling server from the scaling of Janus.
+
+    If a conversation token is given the sessions also join the conversation,
+    as it would be done by real participants; otherwise they just connect to the
+    signaling server, like the publishers and subscribers of a siege.
+
+    All the sessions run in the shared asyncio event loop, so no browser is
+    needed. Note, however, that the CPU of the system running the benchmark can
+    be saturated too; that is reported in the results.
+    """
+
+    def __init__(self, nextcloudUrl, user, appToken, token = ''):
+        """
+        :param nextcloudUrl: the URL of the Nextcloud instance.
+        :param user: the user ID.
+        :param appToken: the app token for the user.
+        :param token: the conversation token to join, if any.
+        """
+
+        self.nextcloudUrl = nextcloudUrl
+        self.user = user
+        self.appToken = appToken
+        self.token = token
+
+        self.sessions = []
+
+        self.runId = None
+        self.result = None
+
+    def __onMessage(self, message):
+        data = message.get('data', {})
+        if data.get('type') != 'talkbuchetBenchmark':
+            return
+
+        payload = data.get('payload', {})
+        if payload.get('run') != self.runId or not self.result:
+            return
+
+        self.result.received += 1
+        self.result.latencies.append(perf_counter() - payload['sent'])
+
+    async def __openSession(self, semaphore):
+        async with semaphore:
+            ocsClient = TalkOcsClient(self.nextcloudUrl, self.user, self.appToken)
+
+            signaling = SignalingClient(self.user, await ocsClient.getSignalingSettings(self.token), await ocsClient.getSignalingBackendUrl())
+            signaling.addListener('message', self.__onMessage)
+
+            try:
+                await signaling.connect()
+
+                if self.token:
+                    await signaling.joinRoom(self.token, await ocsClient.joinRoom(self.token))
+            except:
+                await signaling.close()
+
+                raise
+
+            return signaling
+
+    async def startAsync(self, sessionsCount, parallelism = 10):
+        """
+        Opens the signaling sessions.
+
+        :param sessionsCount: the number of sessions to open.
+        :param parallelism: the maximum number of sessions to open at the same
+            time.
+        """
+
+        semaphore = asyncio.Semaphore(parallelism)
+
+        sessions = await asyncio.gather(*[self.__openSession(semaphore) for i in range(sessionsCount)], return_exceptions=True)
+
+        for session in sessions:
+            if isinstance(session, Exception):
+                print('Signaling session could not be opened: ' + str(session))
+            else:
+                self.sessions.append(session)
+
+        print('Opened ' + str(len(self.sessions)) + '/' + str(sessionsCount) + ' signaling sessions')
+
+    async def runAsync(self, messagesPerSecond, duration = 10, payloadSize = 0, drainTimeout = 5):
+        """
+        Sends messages between the sessions at the given rate.
+
+        :param messagesPerSecond: the total number of messages to send each
+            second (between all the sessions).
+        :param duration: the seconds to send messages.
+        :param payloadSize: the size, in bytes, of additional padding added to
+            each message.
+        :param drainTimeout: the seconds to wait, once all the messages were
+            sent, for the pending messages to be received.
+        :return: a :py:class:`SignalingBenchmarkResult`.
+        """
+
+        if len(self.sessions) < 2:
+            raise Exception('At least two signaling sessions are needed')
+
+        self.runId = base64.b64encode(os.urandom(6)).decode()
+        self.result = SignalingBenchmarkResult(messagesPerSecond, duration)
+
+        padding = 'x' * payloadSize
+
+        # Messages are sent in small batches to keep the requested rate without
+        # waking up for every single message.
+        startTime = perf_counter()
+        elapsed = 0
+        while elapsed < duration:
+            due = min(int(elapsed * messagesPerSecond), int(duration * messagesPerSecond))
+
+            # If the sender is more than 100 ms late the client can not keep up
+            # with the requested rate.
+            if due - self.result.sent > messagesPerSecond / 10 + 1:
+                self.result.clientLimited = True
+
+            while self.result.sent < due:
+                sender = self.sessions[self.result.sent % len(self.sessions)]
+                recipient = self.sessions[(self.result.sent + 1) % len(self.sessions)]
+
+                await sender.sendMessage({
+                    'to': recipient.sessionId,
+                    'roomType': 'video',
+                    'type': 'talkbuchetBenchmark',
+                    'payload': {
+                        'run': self.runId,
+                        'sent': perf_counter(),
+                        'padding': padding,
+                    },
+                })
+
+                self.result.sent += 1
+
+            await asyncio.sleep(0.005)
+
+            elapsed = perf_counter() - startTime
+
+        drainStartTime = perf_counter()
+        while self.result.received < self.result.sent and perf_counter() - drainStartTime < drainTimeout:
+            await asyncio.sleep(0.01)
+
+        result = self.result
+        self.result = None
+
+        return result
+
+    async def stopAsync(self):
+        """
+        Closes the signaling sessions.
+        """
+
+        await asyncio.gather(*[session.close() for session in self.sessions], return_exceptions=True)
+
+        self.sessions = []
+
+    def start(self, sessionsCount, parallelism = 10):
+        """
+        See :py:meth:`startAsync`.
+        """
+
+        _runInAsyncioLoop(self.startAsync(sessionsCount, parallelism))
+
+    def run(self, messagesPerSecond, duration = 10, payloadSize = 0, drainTimeout = 5):
+        """
+        See :py:meth:`runAsync`.
+        """
+
+        return _runInAsyncioLoop(self.runAsync(messagesPerSecond, duration, payloadSize, drainTimeout))
+
+    def findMaxRate(self, startRate = 100, maxRate = 100000, factor = 1.5, stepDuration = 10, maxLatency = 1, payloadSize = 0):
+        """
+        Finds the sustained rate of messages before the server falls behind.
+
+        The benchmark is run with increasing rates (each one "factor" times the
+        previous one) until the server falls behind, that is, until some
+        messages are not relayed or the p99 latency is higher than the given
+        maximum. The search also stops if the client could not send messages at
+        the requested rate.
+
+        :param startRate: the messages per second of the first step.
+        :param maxRate: the maximum messages per second to try.
+        :param factor: the rate increase between steps.
+        :param stepDuration: the seconds to run each step.
+        :param maxLatency: the maximum p99 latency, in seconds, to consider that
+            the server keeps up with the rate.
+        :param payloadSize: the size, in bytes, of additional padding added to
+            each message.
+        :return: the highest sustained messages per second (or 0 if not even the
+            first step was sustained) and the results of all the steps.
+        """
+
+        sustainedRate = 0
+        results = []
+
+        rate = startRate
+        while rate <= maxRate:
+            result = self.run(rate, stepDuration, payloadSize)
+            results.append(result)
+
+            print(result)
+
+            if result.clientLimited:
+                print('Client could not keep up with the requested rate, stopping')
+                break
+
+            if result.lost > 0 or result.getLatencyPercentiles()['p99'] > maxLatency:
+                break
+
+            sustainedRate = rate
+
+            rate = int(rate * factor)
+
+        print('Sustained rate: ' + str(sustainedRate) + ' messages per second')
+
+        return sustainedRate, results
+
+    def stop(self):
+        """
+        See :py:meth:`stopAsync`.
+        """
+
+        _runInAsyncioLoop(self.stopAsync())
+
+
+_talkbuchetMode = ''
+
+_browser = ''
+_browserDefault = ''
+
+_nextcloudUrl = ''
+_remoteSeleniumUrl = ''
+_seleniumScheduler = SeleniumScheduler()
+_headless = True
 
 _user = ''
 _appToken = ''
 
-_token = ''
+_token = ''
+
+_audio = False
+_video = False
+
+_startupParallelism = 1
+
+_browserPool = None
+
+_virtualParticipantsPerBrowser = 1
+_browserless = False
+_bidiScriptsEnabled = True
+_fastBootstrap = False
+_fastBootstrapLandingPath = '/robots.txt'
+_talkbuchetScript = None
+_sharedBrowsers = []
+_sharedBrowsersLock = threading.Lock()
+
+_signalingSessionsCount = 10
+
+_metricsServer = None
+_resourceMonitor = None
+_performanceMetricsCollector = None
+
+_logsMaxLength = 10000
+_logsMinimumLevel = None
+_logsRepeatInterval = 10
+_logsDirectory = None
+_logsMaxFileSize = 10485760
+_logsBackupCount = 5
+
+def _isValidBrowser():
+    if not _browser:
+        print("Set browser first")
+        return False
+
+    if _getRemoteSeleniumUrl() and _browser == 'default':
+        print("Set an explicit browser name to be used in the remote Selenium instance")
+        return False
+
+    if _browser == 'default' and not _browserDefault:
+        print("Set an explicit browser name, no default browser found")
+        return False
+
+    return True
+
+def _findDefaultBrowser():
+    global _browserDefault
+
+    # Try to get the browser from the Selenium Docker image.
+    try:
+        _browserDefault = Path('/opt/selenium/browser_name').read_text().strip()
+    except:
+        pass
+
+    if _browserDefault:
+        setBrowser('default')
+    else:
+        print('No default browser found, please set the browser to use with setBrowser("chrome") or setBrowser("firefox")')
+
+def _getBrowser():
+    if _browser == 'chrome' or (_browser == 'default' and _browserDefault == 'chrome'):
+        return 'chrome'
+
+    return 'firefox'
+
+def _getRemoteSeleniumUrl():
+    if _seleniumScheduler.hasServers():
+        return _seleniumScheduler
+
+    return _remoteSeleniumUrl
+
+def setBrowser(browser):
+    """
+    Sets the browser to use.
+
+    Supported browsers are "chrome" and "firefox"; the browser needs to be
+    available in the Selenium server.
+
+    The special value "default" (which is the default value) can be set to try
+    to find which is the default browser in the Selenium server and use it
+    without having to specify it.
+
+    This is used only for the global helper functions and is not taken into
+    account if a Talkbuchet wrapper is manually created.
+
+    :param browser: "default", "chrome" or "firefox".
+    """
+
+    if browser != 'default' and browser != 'chrome' and browser != 'firefox':
+        print('Browser value not valid. Allowed values: "default", "chrome" or "firefox"')
+        return
+
+    global _browser
+    _browser = browser
+
+def setTarget(nextcloudUrl):
+    """
+    Sets the Nextcloud URL to use.
+
+    This is used only for the global helper functions and is not taken into
+    account if a Talkbuchet wrapper is manually created.
+
+    :param nextcloudUrl: the URL of the Nextcloud instance to test against
+        (for example, "https://cloud.mydomain.com").
+    """
+
+    global _nextcloudUrl
+    _nextcloudUrl = nextcloudUrl
+
+def setHeadless(headless):
+    """
+    Sets whether the browsers will be started in headless mode or not.
+
+    By default browsers are started in headless mode, as each instance uses a
+    little less memory.
+
+    This is used only for the global helper functions and is not taken into
+    account if a Talkbuchet wrapper is manually created.
+
+    :param headless: True for headless mode, False otherwise.
+    """
+
+    global _headless
+    _headless = headless
+
+def setRemoteSeleniumUrl(remoteSeleniumUrl):
+    """
+    Sets the URL of the remote Selenium server to use.
+
+    By default the local Selenium server is used.
+
+    When a remote Selenium server is used its session timeout (which is
+    independent from the timeouts set in the driver) must be kept in mind, as it
+    can cause the browser to "unexpectedly" close. Also note that each
+    Talkbuchet wrapper will use its own browser instance, so the remote Selenium
+    server should have enough available sessions for all the instances running
+    at the same time (for example, if several virtual participants are used).
+
+    This is used only for the global helper functions and is not taken into
+    account if a Talkbuchet wrapper is manually created.
+
+    :param remoteSeleniumUrl: the URL of the remote Selenium server, or None to
+        use the local one.
+    """
+
+    global _remoteSeleniumUrl
+    _remoteSeleniumUrl = remoteSeleniumUrl
+
+def addRemoteSeleniumServer(remoteSeleniumUrl, capacity, weight = None):
+    """
+    Adds a remote Selenium server to distribute the browsers between.
+
+    By default all the browsers are launched in a single Selenium server (the
+    local one, or the one set with "setRemoteSeleniumUrl(URL)"). When several
+    remote Selenium servers are added the browsers are distributed between them
+    instead, and the URL set with "setRemoteSeleniumUrl(URL)" is ignored. Each
+    server is added with the maximum number of browsers that it can run at the
+    same time, and no more browsers than that will be launched in it.
+
+    The server for each new browser is chosen with the strategy set with
+    "setRemoteSeleniumStrategy(STRATEGY)"; by default the least loaded server
+    is used. If a server fails to launch a browser the browser is launched in
+    another server, and the failed server is not used again for some time.
+
+    Calling this function again with the same URL updates the capacity and
+    weight of the server.
+
+    This is used only for the global helper functions and is not taken into
+    account if a Talkbuchet wrapper is manually created.
+
+    :param remoteSeleniumUrl: the URL of the remote Selenium server.
+    :param capacity: the maximum number of browsers to launch in the server.
+    :param weight: the relative share of browsers to launch in the server when
+        weighted round-robin is used; by default it is the capacity.
+    """
+
+    if capacity < 1:
+        print('Capacity must be at least 1')
+        return
+
+    _seleniumScheduler.addServer(remoteSeleniumUrl, capacity, weight)
+
+def removeRemoteSeleniumServer(remoteSeleniumUrl):
+    """
+    Removes a remote Selenium server previously added.
+
+    The browsers already running in the server are not affected, but no new
+    browsers will be launched in it.
+
+    :param remoteSeleniumUrl: the URL of the remote Selenium server.
+    """
+
+    _seleniumScheduler.removeServer(remoteSeleniumUrl)
+
+def setRemoteSeleniumStrategy(strategy):
+    """
+    Sets the strategy to choose the remote Selenium server for new browsers.
+
+    Supported strategies are "leastLoaded" (the default), which chooses the
+    server with the lowest ratio of running browsers to capacity, and
+    "weightedRoundRobin", which chooses the servers in turns proportionally to
+    their weight.
+
+    :param strategy: "leastLoaded" or "weightedRoundRobin".
+    """
+
+    if strategy != 'leastLoaded' and strategy != 'weightedRoundRobin':
+        print('Strategy value not valid. Allowed values: "leastLoaded" or "weightedRoundRobin"')
+        return
+
+    _seleniumScheduler.setStrategy(strategy)
+
+def printRemoteSeleniumServers():
+    """
+    Prints the running browsers, capacity and state of each remote Selenium
+    server added.
+    """
+
+    _seleniumScheduler.printServers()
+
+def setCredentials(user, appToken):
+    """
+    Sets the credentials to use.
+
+    An app token/password can be generated in the Security section of the
+    personal settings (index.php/settings/user/security).
+
+    This is used only for the global helper functions and is not taken into
+    account if a Talkbuchet wrapper is manually created.
+
+    :param user: the user ID.
+    :param appToken: the app token for the user.
+    """
+
+    global _user, _appToken
+    _user = user
+    _appToken = appToken
+
+def setToken(token):
+    """
+    Sets the conversation token to use.
+
+    This is used only for the global helper functions and is not taken into
+    account if a Talkbuchet wrapper is manually created.
+
+    :param token: the conversation token.
+    """
+
+    global _token
+    _token = token
+
+def setMedia(audio, video):
+    """
+    Sets the media to be started in the Talkbuchet wrappers.
+
+    By default in siege mode audio will be used, and in virtual participant
+    mode neither audio nor video will be used.
+
+    Note that audio will be used too in siege mode even if both audio and video
+    are disabled, as some media needs to be published.
+
+    This is used only for the global helper functions and is not taken into
+    account if a Talkbuchet wrapper is manually created.
+
+    :param audio: True to start audio, False otherwise
+    :param video: True to start video, False otherwise
+    """
+
+    global _audio, _video
+    _audio = audio
+    _video = video
+
+def setStartupParallelism(startupParallelism):
+    """
+    Sets the maximum number of Talkbuchet wrappers to create at the same time.
+
+    By default wrappers are created one after the other. When several wrappers
+    are added at once (for example, with "addVirtualParticipants(COUNT)") they
+    can be created in parallel instead, which greatly reduces the time needed to
+    add all of them. However, note that each wrapper launches its own browser,
+    so the system running the browsers (or the remote Selenium server) must have
+    enough resources to launch that many browsers at the same time.
+
+    This is used only for the global helper functions and is not taken into
+    account if a Talkbuchet wrapper is manually created.
+
+    :param startupParallelism: the maximum number of wrappers to create at the
+        same time.
+    """
+
+    if startupParallelism < 1:
+        print('Startup parallelism must be at least 1')
+        return
+
+    global _startupParallelism
+    _startupParallelism = startupParallelism
+
+def setBrowserPoolSize(browserPoolSize):
+    """
+    Sets the maximum number of idle browsers to keep warm.
+
+    By default each Talkbuchet wrapper launches a new browser, and the browser
+    is quit when the wrapper is removed (for example, with "endSiege()" or
+    "removeVirtualParticipant(INDEX)"). If a browser pool size is set removed
+    wrappers give their browser back to the pool instead, and new wrappers take
+    an idle browser from the pool if there is one, which avoids launching and
+    quitting browsers on each test iteration. Browsers given back to the pool
+    are reset (connections are closed, virtual participants are stopped, cookies
+    and storage are cleared and the page and Talkbuchet are reloaded) before
+    being used again.
+
+    Idle browsers can be launched in advance with "warmUpBrowserPool()".
+
+    Note that idle browsers still use resources in the system running them (or
+    in the remote Selenium server). A size of 0 disables the pool and quits
+    all its idle browsers.
+
+    This is used only for the global helper functions and is not taken into
+    account if a Talkbuchet wrapper is manually created.
+
+    :param browserPoolSize: the maximum number of idle browsers to keep.
+    """
+
+    global _browserPool
+
+    if browserPoolSize <= 0:
+        if _browserPool:
+            _browserPool.clear()
+
+        _browserPool = None
+
+        return
+
+    if not _browserPool:
+        _browserPool = BrowserPool(browserPoolSize)
+    else:
+        _browserPool.setSize(browserPoolSize)
+
+def setVirtualParticipantsPerBrowser(virtualParticipantsPerBrowser):
+    """
+    Sets the maximum number of virtual participants to run in each browser.
+
+    By default each virtual participant uses its own browser. Several virtual
+    participants can share a single browser instead, each one in its own window
+    and with its own cookies and storage, which greatly reduces the memory
+    needed for each virtual participant (specially for virtual participants
+    without media or with just audio). However, please note that all the
+    virtual participants in a browser share its CPU, and that the commands
+    executed on the virtual participants of the same browser are executed one
+    after the other.
+
+    Sharing browsers requires the BiDi protocol to be available in the browser.
+    The browser pool is not used for shared browsers.
+
+    This is used only for the global helper functions and is not taken into
+    account if a Talkbuchet wrapper is manually created.
+
+    :param virtualParticipantsPerBrowser: the maximum number of virtual
+        participants in each browser.
+    """
+
+    if virtualParticipantsPerBrowser < 1:
+        print('Virtual participants per browser must be at least 1')
+        return
+
+    global _virtualParticipantsPerBrowser
+    _virtualParticipantsPerBrowser = virtualParticipantsPerBrowser
+
+def setBrowserless(browserless):
+    """
+    Sets whether sieges and virtual participants without media are run without
+    a browser.
+
+    Virtual participants without media just join the conversation and the call,
+    so they can be run directly from Python instead of launching a browser for
+    each one. This needs much less resources, so thousands of virtual
+    participants without media can be added from a single system.
+
+    Virtual participants with media always need a browser, so this has no
+    effect on them if media was set with "setMedia(AUDIO, VIDEO)".
+
+    Note that browserless virtual participants can not send data channel
+    messages.
+
+    Sieges, on the other hand, are run with aiortc (which needs to be installed)
+    instead of a browser, which is not limited in the number of connections and
+    needs much less CPU for each connection. See "help(switchToSiegeMode)".
+
+    This is used only for the global helper functions and is not taken into
+    account if a Talkbuchet wrapper is manually created.
+
+    :param browserless: True to run sieges and virtual participants without
+        media without a browser, False otherwise.
+    """
+
+    global _browserless
+    _browserless = browserless
+
+def setBiDiScriptsEnabled(bidiScriptsEnabled):
+    """
+    Sets whether scripts are executed through BiDi when available.
+
+    When BiDi is available (Firefox, and Chrome >= 115) the connection used to
+    receive the logs is also used by default to execute the scripts, which is
+    faster and needs less resources in the Selenium server than executing them
+    through the classic WebDriver protocol, which needs an HTTP request for
+    each script. This can be disabled in case a script does not work as
+    expected through BiDi.
+
+    Unlike other settings, this affects all the browsers launched afterwards,
+    even by manually created Talkbuchet wrappers.
+
+    :param bidiScriptsEnabled: True to execute the scripts through BiDi when
+        available, False to always use the classic WebDriver protocol.
+    """
+
+    global _bidiScriptsEnabled
+    _bidiScriptsEnabled = bidiScriptsEnabled
+
+def setFastBootstrap(fastBootstrap, landingPath = '/robots.txt'):
+    """
+    Sets whether Talkbuchet is loaded in the browsers in a faster way.
+
+    By default, Talkbuchet is loaded in each browser by opening the Nextcloud
+    URL, which loads the whole web UI even if it is not used by Talkbuchet,
+    then reading Talkbuchet.js and executing it, which fetches the capabilities
+    of the Nextcloud instance. When fast bootstrap is enabled the given
+    landing path of the Nextcloud instance is opened instead, which should be a
+    lightweight page (any page with the same origin works, even if it is not
+    found), Talkbuchet.js is read only once (so changes to it after loading it
+    in the first browser are ignored), and the capabilities are fetched only
+    once and shared between all the browsers.
+
+    Unlike other settings, this affects all the browsers in which Talkbuchet is
+    loaded afterwards, even by manually created Talkbuchet wrappers.
+
+    :param fastBootstrap: True to load Talkbuchet in the faster way, False
+        otherwise.
+    :param landingPath: the path, relative to the Nextcloud URL, of the page to
+        open.
+    """
+
+    global _fastBootstrap, _fastBootstrapLandingPath, _talkbuchetScript
+    _fastBootstrap = fastBootstrap
+    _fastBootstrapLandingPath = landingPath
+
+    # Talkbuchet.js is read again when fast bootstrap is enabled again.
+    _talkbuchetScript = None
+
+def setLogsBuffering(maxLength = 10000, minimumLevel = None, repeatInterval = 10):
+    """
+    Sets how the browser logs not printed yet are kept.
+
+    Browser logs are kept in memory until they are printed (for example, when
+    the next command is executed in the browser). Only the last "maxLength"
+    logs of each browser are kept, logs less severe than "minimumLevel" are
+    ignored, and repetitions of a log within "repeatInterval" seconds are
+    suppressed and just counted. See "help(LogBuffer)".
+
+    The console logs less severe than "minimumLevel" are discarded already in
+    the browser when Talkbuchet is loaded, so they are not even sent to the CLI;
+    other logs (like those of the browser itself) are ignored once received.
+
+    Unlike other settings, this affects all the browsers launched afterwards,
+    even by manually created Talkbuchet wrappers.
+
+    :param maxLength: the maximum number of logs to keep for each browser.
+    :param minimumLevel: the least severe level of the logs to keep ("debug",
+        "info", "log", "warn" or "error"), or None to keep all.
+    :param repeatInterval: the seconds during which repetitions of a log are
+        suppressed, or 0 to keep every repetition.
+    """
+
+    if minimumLevel != None and minimumLevel not in _logLevels:
+        print('Invalid log level: ' + str(minimumLevel))
+        return
+
+    global _logsMaxLength, _logsMinimumLevel, _logsRepeatInterval
+    _logsMaxLength = maxLength
+    _logsMinimumLevel = minimumLevel
+    _logsRepeatInterval = repeatInterval
+
+def setLogsDirectory(logsDirectory, maxFileSize = 10485760, backupCount = 5):
+    """
+    Sets the directory to write the browser logs to.
+
+    The logs of each browser are written to a file named after its Selenium
+    session ID, so they can be searched with "searchLogs(PATTERN)" in the
+    Selenium helper of the wrapper after a long run without keeping all of them
+    in memory. The files are rotated when they reach "maxFileSize" bytes, and
+    the rotated files are compressed with gzip.
+
+    Unlike other settings, this affects all the browsers launched afterwards,
+    even by manually created Talkbuchet wrappers.
+
+    :param logsDirectory: the directory to write the logs to, or None to not
+        write them.
+    :param maxFileSize: the size in bytes at which the files are rotated.
+    :param backupCount: the number of rotated files to keep for each browser.
+    """
+
+    if logsDirectory:
+        os.makedirs(logsDirectory, exist_ok=True)
+
+    global _logsDirectory, _logsMaxFileSize, _logsBackupCount
+    _logsDirectory = logsDirectory
+    _logsMaxFileSize = maxFileSize
+    _logsBackupCount = backupCount
+
+def _newLogBuffer(name):
+    file = None
+    if _logsDirectory:
+        file = os.path.join(_logsDirectory, name + '.log')
+
+    return LogBuffer(_logsMaxLength, _logsMinimumLevel, _logsRepeatInterval, file, _logsMaxFileSize, _logsBackupCount)
+
+def _reserveSharedBrowserWindow():
+    browser = _getBrowser()
+    remoteSeleniumUrl = _getRemoteSeleniumUrl()
+
+    with _sharedBrowsersLock:
+        # Shared browsers are weakly referenced so they are quit once all their
+        # windows are closed.
+        _sharedBrowsers[:] = [sharedBrowserReference for sharedBrowserReference in _sharedBrowsers if sharedBrowserReference()]
+
+        for sharedBrowserReference in _sharedBrowsers:
+            sharedBrowser = sharedBrowserReference()
+
+            if (sharedBrowser
+                    and sharedBrowser.browser == browser
+                    and sharedBrowser.headless == _headless
+                    and sharedBrowser.remoteSeleniumUrl == remoteSeleniumUrl
+                    and sharedBrowser.maxWindows == _virtualParticipantsPerBrowser
+                    and sharedBrowser.reserveWindow()):
+                return sharedBrowser
+
+        sharedBrowser = SharedBrowser(browser, _headless, remoteSeleniumUrl, _virtualParticipantsPerBrowser)
+        sharedBrowser.reserveWindow()
+
+        _sharedBrowsers.append(weakref.ref(sharedBrowser))
+
+        return sharedBrowser
+
+def warmUpBrowserPool(count = None):
+    """
+    Launches idle browsers in the browser pool.
+
+    The browsers are launched with the global browser, target Nextcloud URL,
+    headless mode and remote Selenium server, so they need to be set before
+    warming up the pool, and the browsers will be used only by wrappers created
+    with those same values. If a startup parallelism was set the browsers are
+    launched in parallel.
+
+    A browser pool size must have been set first with
+    "setBrowserPoolSize(SIZE)".
+
+    :param count: the number of browsers to launch; by default the pool is
+        filled up to its size.
+    """
+
+    if not _browserPool:
+        print("Set browser pool size first")
+        return
+
+    if not _isValidBrowser():
+        return
+
+    if not _nextcloudUrl:
+        print("Set target Nextcloud URL first")
+        return
+
+    if count == None:
+        count = _browserPool.size
+
+    _browserPool.warmUp(count, _getBrowser(), _nextcloudUrl, _headless, _getRemoteSeleniumUrl(), _startupParallelism)
+
+def startMetricsServer(port = 9464, address = '127.0.0.1'):
+    """
+    Starts serving metrics of all the sieges, virtual participants and real
+    participants at "http://ADDRESS:PORT/metrics".
+
+    The metrics are aggregated between all the wrappers, and served in the
+    OpenMetrics text format, so they can be scraped by Prometheus and graphed
+    next to the server metrics. See :py:class:`MetricsServer` for the provided
+    metrics.
+
+    If a metrics server was already started it is stopped first.
+
+    :param port: the port to listen on.
+    :param address: the address to listen on; by default only local
+        connections are accepted.
+    """
+
+    global _metricsServer
+
+    stopMetricsServer()
+
+    try:
+        _metricsServer = MetricsServer(_getWrappersByType, port, address)
+    except OSError as exception:
+        print('Metrics server could not be started: ' + str(exception))
+
+def stopMetricsServer():
+    """
+    Stops serving metrics.
+    """
+
+    global _metricsServer
+
+    if not _metricsServer:
+        return
+
+    _metricsServer.stop()
+    _metricsServer = None
+
+def _getWrappersByType():
+    return {
+        'siege': sieges,
+        'virtualParticipant': virtualParticipants,
+        'realParticipant': realParticipants,
+    }
+
+def startResourceMonitor(interval = 1, cpuThreshold = 0.9, memoryThreshold = 0.9, shmThreshold = 0.9, cliCpuThreshold = 0.9):
+    """
+    Starts sampling the resources used in the client system by the browsers of
+    all the sieges, virtual participants and real participants, and by the CLI
+    itself.
+
+    The client is flagged as saturated (client bound) if any threshold is
+    crossed, so a bottleneck in the client is not mistaken for one in the
+    server. The usage in the last sample can be printed with
+    "printResourceUsage()". See :py:class:`ResourceMonitor`.
+
+    If a resource monitor was already started it is stopped first.
+
+    :param interval: the seconds between samples.
+    """
+
+    global _resourceMonitor
+
+    stopResourceMonitor()
+
+    try:
+        _resourceMonitor = ResourceMonitor(_getWrappersByType, interval, cpuThreshold=cpuThreshold, memoryThreshold=memoryThreshold, shmThreshold=shmThreshold, cliCpuThreshold=cliCpuThreshold)
+    except Exception as exception:
+        print('Resource monitor could not be started: ' + str(exception))
+
+def stopResourceMonitor():
+    """
+    Stops sampling the resources.
+    """
+
+    global _resourceMonitor
+
+    if not _resourceMonitor:
+        return
+
+    _resourceMonitor.stop()
+    _resourceMonitor = None
+
+def printResourceUsage():
+    """
+    Prints the resources used in the last sample of the resource monitor and
+    whether the client is saturated.
+    """
+
+    if not _resourceMonitor:
+        print('Start the resource monitor first')
+        return
+
+    _resourceMonitor.printUsage()
+
+def startPerformanceMetricsCollector(interval = 5, directory = None):
+    """
+    Starts sampling the performance metrics (like the JavaScript heap, the time
+    spent running tasks or the number of layouts) of the browsers of all the
+    sieges, virtual participants and real participants.
+
+    The metrics are got with the DevTools protocol, so they are only available
+    in Chrome. The main metrics in the last sample can be printed with
+    "printPerformanceMetrics()". The metrics are also stored with the stats of
+    the sieges whose stats sampler was started and, when a scenario is run,
+    with the metrics of each wrapper collected by each "metrics" step. See
+    :py:class:`PerformanceMetricsCollector`.
+
+    If a collector was already started it is stopped first.
+
+    :param interval: the seconds between samples.
+    :param directory: the directory to store the samples in, if any.
+    """
+
+    global _performanceMetricsCollector
+
+    stopPerformanceMetricsCollector()
+
+    _performanceMetricsCollector = PerformanceMetricsCollector(_getWrappersByType, interval, directory=directory)
+
+def stopPerformanceMetricsCollector():
+    """
+    Stops sampling the performance metrics.
+    """
+
+    global _performanceMetricsCollector
+
+    if not _performanceMetricsCollector:
+        return
+
+    _performanceMetricsCollector.stop()
+    _performanceMetricsCollector = None
+
+def printPerformanceMetrics():
+    """
+    Prints the main performance metrics of each browser in the last sample of
+    the performance metrics collector.
+    """
+
+    if not _performanceMetricsCollector:
+        print('Start the performance metrics collector first')
+        return
+
+    _performanceMetricsCollector.printMetrics()
+
+def broadcast(wrappers, method, *args, selection = None, parallelism = None, **kwargs):
+    """
+    Calls a method in several Talkbuchet wrappers at the same time.
+
+    For example, to mute all the virtual participants at once:
+    >>>> broadcast(virtualParticipants, 'setAudioEnabled', False)
+
+    Several media states can be set in a single round trip to each browser
+    with "setMediaEnabled"; for example, to mute and disable the video of all
+    the virtual participants:
+    >>>> broadcast(virtualParticipants, 'setMediaEnabled', audioEnabled=False, videoEnabled=False)
+
+    The wrappers can be selected by index, range or slice, or with a function;
+    for example, to send the nick from the first ten virtual participants:
+    >>>> broadcast(virtualParticipants, 'sendNickThroughDataChannel', 'Jane', selection=range(10))
+
+    The calls are made concurrently and started together, so the server
+    receives them in a burst, like when a real conference reacts to something.
+    See :py:class:`Broadcaster`.
+
+    :param wrappers: the list of wrappers, for example :py:data:`sieges` or
+        :py:data:`virtualParticipants`.
+    :param method: the name of the wrapper method to call, or a function that
+        receives the wrapper as its first argument.
+    :param selection: the wrappers to call the method in; an index, a range, a
+        slice, a list of indexes or a function that returns True for the
+        wrappers to select. All the wrappers are selected by default.
+    :param parallelism: the maximum number of calls to make at the same time;
+        all the calls are made at the same time by default.
+    :return: a :py:class:`BroadcastReport` with the success, latency and
+        result or error of each call; None if the selection or the parallelism
+        is not valid.
+    """
+
+    try:
+        selectedWrappers = _selectWrappers(wrappers, selection)
+        broadcaster = Broadcaster(parallelism)
+    except Exception as exception:
+        print(str(exception))
+        return None
+
+    return broadcaster.run(selectedWrappers, method, *args, **kwargs)
+
+
+def _getCpuTimes():
+    """
+    Returns the busy and total CPU times of the system, or None if they are not
+    available (they are read from "/proc/stat", so only in Linux).
+    """
+
+    try:
+        with open('/proc/stat') as file:
+            times = [int(time) for time in file.readline().split()[1:]]
+    except (OSError, ValueError):
+        return None
+
+    # Idle and I/O wait.
+    idleTime = times[3] + times[4]
+
+    return sum(times) - idleTime, sum(times)
+
+def _getCpuUsage(cpuTimes, finalCpuTimes):
+    """
+    Returns the fraction of the CPU of the system that was busy between the two
+    given CPU times, or None if they are not available.
+    """
+
+    if not cpuTimes or not finalCpuTimes or finalCpuTimes[1] == cpuTimes[1]:
+        return None
+
+    return (finalCpuTimes[0] - cpuTimes[0]) / (finalCpuTimes[1] - cpuTimes[1])
+
+
+_publishersCount = None
+_subscribersPerPublisherCount = None
+_rampPolicy = None
+
+# Maximum number of stable connections in a siege found by "calibrate()", by
+# browser ("browserless" for browserless sieges).
+_calibratedCapacities = {}
+
+sieges = []
+
+def switchToSiegeMode():
+    """
+    Sets the siege mode as the active one.
+
+    This adjusts the global helper functions to those relevant for this mode
+    (so, for example, there will be no function to add a virtual participant).
+
+    A siege can be started in the following way:
+    >>>> setTarget('https://THE-NEXTCLOUD-DOMAIN')
+    >>>> setCredentials('THE-USER-ID', 'THE-APP-TOKEN')
+    >>>> setPublishersAndSubscribersCount(XXX, YYY)
+    >>>> startSiege()
+
+    Note that a conversation token does not need to be set, except if the server
+    is configured in conversation clustering mode.
+
+    Setting the publishers and subscribers count is not mandatory, but it is
+    recommended to adjust it based on the maximum number supported by the
+    client machine running the browser, as well as the values that need to be
+    tested on the server.
+
+    In any case, it is recommended to initially set a low number, for example
+    "setPublishersAndSubscribersCount(1, 2)", start a siege to verify that
+    everything works as expected, and then perform the real test.
+
+    Note that starting a new siege does not stop the previous one. That should
+    be explicitly done by calling "endSiege()". Starting several sieges instead
+    of a single siege with a higher number of publishers and subscribers could
+    be needed in powerful client machines that can handle more connections than
+    what a single browser is able to (for example, Chromium has a hardcoded
+    limit on the maximum number of concurrent connections).
+
+    Sieges are done with audio only connections by default. If a different media
+    needs to be used (either video but not audio, or both audio and video) this
+    needs to be specified (before starting the siege) with:
+    >>>> setMedia(CONNECT-WITH-AUDIO, CONNECT-WITH-VIDEO)
+
+    By default the connections are established one after the other. Several
+    connections can be established at the same time, and the rate at which new
+    connections are started can be controlled, with a ramp policy. For example,
+    to establish up to 20 connections at the same time starting 10 connections
+    per second:
+    >>>> setRampPolicy(maxInFlight=20, arrival='constant', rate=10)
+    Linear ramps, steps and Poisson arrivals are supported too; see
+    "help(Siege.setRampPolicy)".
+
+    The number of publishers and subscribers of an active siege can be stepped
+    up or down without restarting it (and thus without closing the existing
+    connections) with "addPublishers(COUNT)", "removePublishers(COUNT)",
+    "addSubscribers(COUNT-PER-PUBLISHER)" and
+    "removeSubscribers(COUNT-PER-PUBLISHER)".
+
+    When a siege is active it is possible to check the state of the publisher
+    connections with "checkPublishersConnections()" and the state of the
+    subscriber connections with "checkSubscribersConnections()". The number of
+    connections in each state and the failed or disconnected connections of all
+    the sieges are shown, and they are also returned as a dict to be able to
+    process them.
+
+    Besides that, changes in the state of the connections, connection errors
+    and disconnections that were not restored in time are received in real time
+    from all the sieges as structured events, which are kept in the global
+    "eventLog". For example, the number of events of each type can be shown with
+    "eventLog.printCounters()", and the connection errors with
+    "eventLog.printEvents('connectionError')".
+
+    The number of connections of a siege in a browser is limited by the browser
+    and by the CPU needed to encode and decode the media. Sieges can be run
+    without a browser instead, with synthetic media that is encoded only once
+    and received media that is not decoded, with:
+    >>>> setBrowserless(True)
+    Note that browserless sieges require aiortc to be installed.
+
+    Printing the full stats of each connection is not practical in large
+    sieges. Instead, some fields of the stats (bytes, packets, packets lost,
+    jitter, frames decoded and round trip time) of all the connections can be
+    periodically sampled with "startStatsSampler(INTERVAL-IN-MS)". The samples
+    are kept in the browser until they are pulled with "pullStats()", which
+    returns a StatsStore with all the samples pulled so far, stored in columns
+    (NumPy arrays, if NumPy is available). The bitrate and loss of each
+    connection over the whole run can then be shown with
+    "pullStats().printSummary()".
+
+    The duration of each phase of the handshake of the connections (creating
+    the offer, receiving the answer, gathering the ICE candidates and connecting
+    ICE) can be shown, as the p50, p90, p99 and max of each phase, with
+    "printHandshakeTimings()". Increasing tail latencies in these phases are
+    usually the first sign of an overloaded Janus.
+
+    The number of connections that can be kept stable in this client, which
+    depends on the browser and the CPU and network of the client, can be found
+    with "calibrate()", which runs growing sieges until connections fail or the
+    CPU is saturated. Then the number of publishers of the next sieges can be
+    set from the measured capacity with
+    "setCalibratedPublishersAndSubscribersCount(SUBSCRIBERS-PER-PUBLISHER)".
+
+    Global functions for additional actions, like enabling or disabling media
+    during the siege, are not provided. They must be directly called on the
+    Talkbuchet wrapper objects in the "sieges" list. For example:
+    >>>> sieges[0].setAudioEnabled(False)
+    """
+
+    def _isValidConfiguration():
+        if not _browserless and not _isValidBrowser():
+            return False
+
+        if not _nextcloudUrl:
+            print("Set target Nextcloud URL first")
+            return False
+
+        if not _user or not _appToken:
+            print("Set credentials (user and app token) first")
+            return False
+
+        return True
+
+    def setPublishersAndSubscribersCount(publishersCount, subscribersPerPublisherCount):
+        """
+        Sets the number of publishers and subscribers per publisher to use.
+
+        By the default the number from Talkbuchet.js is used, which is 5
+        publishers and 40 subscribers per publisher.
+
+        This is used only for the global helper functions and is not taken into
+        account if a Talkbuchet wrapper is manually created.
+
+        :param publishersCount: the number of publishers.
+        :param subscribersPerPublisherCount: the number of subscribers for each
+            publisher.
+        """
+
+        global _publishersCount, _subscribersPerPublisherCount
+        _publishersCount = publishersCount
+        _subscribersPerPublisherCount = subscribersPerPublisherCount
+
+    def setRampPolicy(maxInFlight = 1, arrival = 'constant', rate = 0, startRate = 0, rampDuration = 0, stepSize = 1, stepInterval = 0):
+        """
+        Sets how the connections of the sieges are established.
+
+        By default the connections are established one after the other, as
+        fast as possible.
+
+        This is used only for the global helper functions and is not taken into
+        account if a Talkbuchet wrapper is manually created.
+
+        See :py:meth:`Siege.setRampPolicy` for the parameters.
+        """
+
+        global _rampPolicy
+
+        try:
+            _rampPolicy = _newRampPolicy(maxInFlight, arrival, rate, startRate, rampDuration, stepSize, stepInterval)
+        except Exception as exception:
+            print(exception)
+
+    def startSiege():
+        """
+        Starts a siege.
+
+        The global target Nextcloud URL and credentials need to be set first.
+
+        If global token, media or publishers and subscribers count were set they
+        will be applied to the siege.
+
+        Note that changing any of those values later will have no effect on a
+        running siege, the updated value will be used only on sieges started
+        after they were changed.
+
+        If there is already a running siege it will not be ended when a new one
+        is started; the new one will run along the previous one.
+        """
+
+        if not _isValidConfiguration():
+            return
+
+        if _browserless:
+            siege = BrowserlessSiege(_nextcloudUrl)
+        else:
+            siege = Siege(_getBrowser(), _nextcloudUrl, _headless, _getRemoteSeleniumUrl(), _browserPool)
+
+        sieges.append(siege)
+
+        siege.setCredentials(_user, _appToken)
+
+        if _token:
+            siege.setToken(_token)
+
+        if _audio or _video:
+            siege.startMedia(_audio, _video)
+
+        if _publishersCount != None and _subscribersPerPublisherCount != None:
+            siege.setPublishersAndSubscribersCount(_publishersCount, _subscribersPerPublisherCount)
+
+        if _rampPolicy:
+            siege.setRampPolicy(**_rampPolicy)
+
+        siege.siege()
+
+    def _getSiegeIndex(index = None):
+        if not sieges:
+            return -1
+
+        if index == None and len(sieges) > 1:
+            print("Index needs to be specified")
+            return -1
+
+        if index == None and len(sieges) == 1:
+            index = 0
+
+        if index < 0 or index >= len(sieges):
+            print("Index out of range")
+            return -1
+
+        return index
+
+    def _checkConnections(peerType, index, states, offset, limit):
+        states = states or _problemIceConnectionStates
+
+        if index != None:
+            index = _getSiegeIndex(index)
+            if index < 0:
+                return None
+
+            summary = getattr(sieges[index], 'get' + peerType + 'ConnectionsSummary')(states, offset, limit)
+        else:
+            # The matching connections are paged after merging them, so all
+            # of them up to the last one in the page are needed.
+            summary = _mergeConnectionsSummaries([(index, getattr(siege, 'get' + peerType + 'ConnectionsSummary')(states, 0, offset + limit)) for index, siege in enumerate(sieges)], offset, limit)
+
+        _printConnectionsSummary(summary, states, offset)
+
+        return summary
+
+    def checkPublishersConnections(index = None, states = None, offset = 0, limit = 100):
+        """
+        Checks the publisher connections of the siege with the given index, or
+        of all the sieges.
+
+        Only the number of connections in each state and the connections in
+        the given states (failed or disconnected by default) are printed, so
+        the check is cheap enough to be done every few seconds even with
+        thousands of connections. The state of every publisher connection of a
+        siege can be printed with "sieges[INDEX].checkPublishersConnections()".
+
+        If no index is given the connections of all the sieges are aggregated.
+
+        :param index: the index in :py:data:`sieges` of the siege to check its
+            publisher connections.
+        :param states: the ICE connection states of the connections to list.
+        :param offset: the number of connections in those states to skip.
+        :param limit: the maximum number of connections in those states to
+            list.
+        :return: the summary; see
+            :py:meth:`Siege.getPublishersConnectionsSummary`.
+        """
+
+        return _checkConnections('Publishers', index, states, offset, limit)
+
+    def checkSubscribersConnections(index = None, states = None, offset = 0, limit = 100):
+        """
+        Checks the subscriber connections of the siege with the given index, or
+        of all the sieges.
+
+        See "checkPublishersConnections()"; the state of every subscriber
+        connection of a siege can be printed with
+        "sieges[INDEX].checkSubscribersConnections()".
+        """
+
+        return _checkConnections('Subscribers', index, states, offset, limit)
+
+    def startStatsSampler(interval = 1000, directory = None, index = None):
+        """
+        Starts periodically sampling the stats of the connections of the siege
+        with the given index.
+
+        The samples need to be periodically pulled with "pullStats()".
+
+        If a single siege is active the index does not need to be specified.
+
+        :param interval: the milliseconds between samples.
+        :param directory: the directory to store the samples in, if any.
+        :param index: the index in :py:data:`sieges` of the siege to sample
+            its stats.
+        """
+
+        index = _getSiegeIndex(index)
+        if index < 0:
+            return
+
+        sieges[index].startStatsSampler(interval, directory=directory)
+
+    def pullStats(index = None):
+        """
+        Pulls the stats sampled since the previous call from the siege with
+        the given index.
+
+        If a single siege is active the index does not need to be specified.
+
+        :param index: the index in :py:data:`sieges` of the siege to pull its
+            stats.
+        :return: the StatsStore with all the samples pulled from the siege.
+        """
+
+        index = _getSiegeIndex(index)
+        if index < 0:
+            return
+
+        return sieges[index].pullStats()
+
+    def stopStatsSampler(index = None):
+        """
+        Stops sampling the stats of the siege with the given index and pulls
+        the remaining samples.
+
+        If a single siege is active the index does not need to be specified.
+
+        :param index: the index in :py:data:`sieges` of the siege to stop
+            sampling its stats.
+        """
+
+        index = _getSiegeIndex(index)
+        if index < 0:
+            return
+
+        sieges[index].stopStatsSampler()
+
+    def printHandshakeTimings(index = None):
+        """
+        Prints the p50, p90, p99 and max durations of each phase of the
+        handshake of the connections of the siege with the given index.
+
+        If no index is given the timings of each siege are printed, followed by
+        the timings of all the sieges together if there are several sieges.
+
+        :param index: the index in :py:data:`sieges` of the siege to print its
+            handshake timings.
+        """
+
+        if index != None:
+            index = _getSiegeIndex(index)
+            if index < 0:
+                return
+
+            sieges[index].printHandshakeTimings()
+
+            return
+
+        handshakeHistogramsList = []
+        for index, siege in enumerate(sieges):
+            handshakeHistograms = siege.getHandshakeHistograms()
+            handshakeHistogramsList.append(handshakeHistograms)
+
+            print('Siege ' + str(index) + ':')
+            _printHandshakeHistograms(handshakeHistograms)
+
+        if len(handshakeHistogramsList) > 1:
+            print('All sieges:')
+            _printHandshakeHistograms(_mergeHandshakeHistograms(handshakeHistogramsList))
+
+    def addPublishers(count, index = None):
+        """
+        Adds publishers to the siege with the given index.
+
+        Like in a real call, the existing subscribers also subscribe to the new
+        publishers, so the number of subscribers per publisher does not change.
+
+        If a single siege is active the index does not need to be specified.
+
+        :param count: the number of publishers to add.
+        :param index: the index in :py:data:`sieges` of the siege to add the
+            publishers to.
+        """
+
+        index = _getSiegeIndex(index)
+        if index < 0:
+            return
+
+        sieges[index].addPublishers(count)
+
+    def removePublishers(count, index = None):
+        """
+        Removes publishers, and the subscribers to them, from the siege with the
+        given index.
+
+        If a single siege is active the index does not need to be specified.
+
+        :param count: the number of publishers to remove.
+        :param index: the index in :py:data:`sieges` of the siege to remove the
+            publishers from.
+        """
+
+        index = _getSiegeIndex(index)
+        if index < 0:
+            return
+
+        sieges[index].removePublishers(count)
+
+    def addSubscribers(countPerPublisher, index = None):
+        """
+        Adds subscribers to each publisher of the siege with the given index.
+
+        If a single siege is active the index does not need to be specified.
+
+        :param countPerPublisher: the number of subscribers to add to each
+            publisher.
+        :param index: the index in :py:data:`sieges` of the siege to add the
+            subscribers to.
+        """
+
+        index = _getSiegeIndex(index)
+        if index < 0:
+            return
+
+        sieges[index].addSubscribers(countPerPublisher)
+
+    def removeSubscribers(countPerPublisher, index = None):
+        """
+        Removes subscribers to each publisher from the siege with the given
+        index.
+
+        If a single siege is active the index does not need to be specified.
+
+        :param countPerPublisher: the number of subscribers to remove from each
+            publisher.
+        :param index: the index in :py:data:`sieges` of the siege to remove the
+            subscribers from.
+        """
+
+        index = _getSiegeIndex(index)
+        if index < 0:
+            return
+
+        sieges[index].removeSubscribers(countPerPublisher)
+
+    def endSiege(index = None):
+        """
+        Ends the siege with the given index.
+
+        If a single siege is active the index does not need to be specified.
+
+        :param index: the index in :py:data:`sieges` of the siege to remove.
+        """
+
+        index = _getSiegeIndex(index)
+        if index < 0:
+            return
+
+        sieges[index].closeConnections()
+        sieges[index].release()
+        del sieges[index]
+
+    def _runCalibrationStep(connectionsCount, subscribersPerPublisherCount, stepDuration, maxFailureRate, maxCpuUsage):
+        publishersCount = max(round(connectionsCount / (1 + subscribersPerPublisherCount)), 1)
+        connectionsCount = publishersCount * (1 + subscribersPerPublisherCount)
+
+        setPublishersAndSubscribersCount(publishersCount, subscribersPerPublisherCount)
+
+        # The siege is added to the sieges before starting its connections, so
+        # it needs to be ended even if starting it fails.
+        try:
+            startSiege()
+
+            if not sieges:
+                raise Exception('Siege could not be started')
+
+            # The CPU usage is measured once all the connections were started,
+            # while the media flows.
+            cpuTimes = _getCpuTimes()
+            clientResources = _getClientResources()
+            startTime = monotonic()
+
+            sleep(stepDuration)
+
+            finalCpuTimes = _getCpuTimes()
+            finalClientResources = _getClientResources()
+            duration = monotonic() - startTime
+
+            publishersSummary = sieges[0].getPublishersConnectionsSummary()
+            subscribersSummary = sieges[0].getSubscribersConnectionsSummary()
+        finally:
+            while sieges:
+                endSiege(0)
+
+        # Browserless sieges run in the asyncio loop of this process, which can
+        # use a single CPU at most.
+        if _browserless:
+            cpuUsage = (finalClientResources['cpuTime'] - clientResources['cpuTime']) / duration
+        else:
+            cpuUsage = _getCpuUsage(cpuTimes, finalCpuTimes)
+
+        connectedCount = 0
+        for summary in [publishersSummary, subscribersSummary]:
+            connectedCount += summary['iceConnectionStates'].get('connected', 0) + summary['iceConnectionStates'].get('completed', 0)
+
+        failureRate = 1 - connectedCount / connectionsCount
+
+        step = {
+            'connections': connectionsCount,
+            'publishers': publishersCount,
+            'subscribersPerPublisher': subscribersPerPublisherCount,
+            'failureRate': failureRate,
+            'cpuUsage': cpuUsage,
+            'stable': failureRate <= maxFailureRate and (cpuUsage == None or cpuUsage <= maxCpuUsage),
+        }
+
+        print('Calibration step: ' + str(connectionsCount) + ' connections, '
+              + str(round(failureRate * 100, 1)) + '% failed, '
+              + ('CPU usage not available' if cpuUsage == None else str(round(cpuUsage * 100, 1)) + '% CPU usage')
+              + (', stable' if step['stable'] else ', not stable'))
+
+        return step
+
+    def calibrate(subscribersPerPublisherCount = 5, startConnections = 10, maxConnections = 2000, stepDuration = 10, maxFailureRate = 0.01, maxCpuUsage = 0.9, precision = 0.1):
+        """
+        Finds the maximum number of connections that a siege can keep stable in
+        this client with the current browser.
+
+        Sieges with a growing number of publishers (and a fixed number of
+        subscribers per publisher) are started one after the other; the number
+        of connections is doubled until a siege is not stable, and then the
+        maximum stable number is searched by bisection. A siege is stable if,
+        "stepDuration" seconds after all its connections were started, the
+        rate of connections that are not connected is at most
+        "maxFailureRate" and the CPU usage during those seconds is at most
+        "maxCpuUsage".
+
+        The CPU usage is the one of the whole system (read from "/proc/stat",
+        so it is not taken into account if not available), which is only
+        meaningful if the browsers run in this system. For browserless sieges
+        it is the usage of a single CPU by this process instead.
+
+        The media, ramp policy and the rest of global settings are used by the
+        sieges. There must be no running sieges, and the publishers and
+        subscribers count are restored after the calibration.
+
+        The maximum stable number is kept for the current browser, so the
+        publishers and subscribers count of the next sieges can be set from
+        it with "setCalibratedPublishersAndSubscribersCount()".
+
+        :param subscribersPerPublisherCount: the number of subscribers for each
+            publisher.
+        :param startConnections: the number of connections of the first siege.
+        :param maxConnections: the maximum number of connections to try.
+        :param stepDuration: the seconds to wait after starting each siege.
+        :param maxFailureRate: the maximum rate of connections not connected.
+        :param maxCpuUsage: the maximum CPU usage, from 0 to 1.
+        :param precision: the bisection stops once the difference between the
+            stable and not stable numbers is at most this fraction of the not
+            stable number.
+        :return: the maximum stable number of connections (or 0 if not even the
+            first siege was stable) and the results of all the steps.
+        """
+
+        if not _isValidConfiguration():
+            return
+
+        if sieges:
+            print('End the running sieges first')
+            return
+
+        global _publishersCount, _subscribersPerPublisherCount
+        previousPublishersCount = _publishersCount
+        previousSubscribersPerPublisherCount = _subscribersPerPublisherCount
+
+        stableCount = 0
+        notStableCount = None
+        steps = []
+
+        connectionsCount = startConnections
+
+        try:
+            while True:
+                step = _runCalibrationStep(connectionsCount, subscribersPerPublisherCount, stepDuration, maxFailureRate, maxCpuUsage)
+                steps.append(step)
+
+                if step['stable']:
+                    stableCount = max(stableCount, step['connections'])
+                else:
+                    notStableCount = step['connections'] if notStableCount == None else min(notStableCount, step['connections'])
+
+                if notStableCount == None:
+                    if connectionsCount >= maxConnections:
+                        break
+
+                    connectionsCount = min(connectionsCount * 2, maxConnections)
+                else:
+                    if notStableCount - stableCount <= max(notStableCount * precision, 1 + subscribersPerPublisherCount):
+                        break
+
+                    connectionsCount = (stableCount + notStableCount) // 2
+        finally:
+            _publishersCount = previousPublishersCount
+            _subscribersPerPublisherCount = previousSubscribersPerPublisherCount
+
+        browser = 'browserless' if _browserless else _getBrowser()
+        _calibratedCapacities[browser] = stableCount
+
+        print('Maximum stable connections (' + browser + '): ' + str(stableCount))
+
+        return stableCount, steps
+
+    def setCalibratedPublishersAndSubscribersCount(subscribersPerPublisherCount = 5, usage = 0.8):
+        """
+        Sets the number of publishers and subscribers per publisher to use
+        from the capacity found by "calibrate()" for the current browser.
+
+        The number of publishers is set so the connections of a siege (the
+        publishers and their subscribers) are the given fraction of the
+        capacity.
+
+        :param subscribersPerPublisherCount: the number of subscribers for each
+            publisher.
+        :param usage: the fraction of the capacity to use.
+        """
+
+        browser = 'browserless' if _browserless else _getBrowser()
+        if browser not in _calibratedCapacities:
+            print('Calibrate ' + browser + ' first')
+            return
+
+        publishersCount = int(_calibratedCapacities[browser] * usage / (1 + subscribersPerPublisherCount))
+        if publishersCount < 1:
+            print('The capacity of ' + browser + ' is not enough for ' + str(subscribersPerPublisherCount) + ' subscribers per publisher')
+            return
+
+        setPublishersAndSubscribersCount(publishersCount, subscribersPerPublisherCount)
+
+        print('Publishers and subscribers count set to ' + str(publishersCount) + ' and ' + str(subscribersPerPublisherCount))
+
+    if globals()['_talkbuchetMode'] == 'virtualParticipant':
+        if removeVirtualParticipants:
+            removeVirtualParticipants()
+
+        del globals()['prepareVirtualParticipant']
+        del globals()['prepareVirtualParticipants']
+        del globals()['startVirtualParticipants']
+        del globals()['startVirtualParticipantsParallel']
+        del globals()['stopVirtualParticipants']
+        del globals()['stopVirtualParticipantsParallel']
+        del globals()['addVirtualParticipant']
+        del globals()['addVirtualParticipants']
+        del globals()['removeVirtualParticipant']
+        del globals()['removeVirtualParticipants']
+
+    if globals()['_talkbuchetMode'] == 'realParticipant':
+        if removeRealParticipants:
+            removeRealParticipants()
+
+        del globals()['addRealParticipant']
+        del globals()['addRealParticipants']
+        del globals()['removeRealParticipant']
+        del globals()['removeRealParticipants']
+
+    if globals()['_talkbuchetMode'] == 'signalingBenchmark':
+        if endSignalingBenchmarks:
+            endSignalingBenchmarks()
+
+        del globals()['setSignalingSessionsCount']
+        del globals()['startSignalingBenchmark']
+        del globals()['runSignalingBenchmark']
+        del globals()['findMaxSignalingRate']
+        del globals()['endSignalingBenchmark']
+        del globals()['endSignalingBenchmarks']
+
+    globals()['setPublishersAndSubscribersCount'] = setPublishersAndSubscribersCount
+    globals()['setRampPolicy'] = setRampPolicy
+    globals()['startSiege'] = startSiege
+    globals()['checkPublishersConnections'] = checkPublishersConnections
+    globals()['checkSubscribersConnections'] = checkSubscribersConnections
+    globals()['startStatsSampler'] = startStatsSampler
+    globals()['pullStats'] = pullStats
+    globals()['stopStatsSampler'] = stopStatsSampler
+    globals()['printHandshakeTimings'] = printHandshakeTimings
+    globals()['addPublishers'] = addPublishers
+    globals()['removePublishers'] = removePublishers
+    globals()['addSubscribers'] = addSubscribers
+    globals()['removeSubscribers'] = removeSubscribers
+    globals()['endSiege'] = endSiege
+    globals()['calibrate'] = calibrate
+    globals()['setCalibratedPublishersAndSubscribersCount'] = setCalibratedPublishersAndSubscribersCount
+
+    globals()['_talkbuchetMode'] = 'siege'
+
+
+virtualParticipants = []
+
+def switchToVirtualParticipantMode():
+    """
+    Sets the virtual participant mode as the active one.
+
+    This adjusts the global helper functions to those relevant for this mode
+    (so, for example, there will be no function to start a siege).
+
+    Virtual participants can be added to a call in the following way:
+    >>>> setTarget('https://THE-NEXTCLOUD-DOMAIN')
+    >>>> setToken('THE-CONVERSATION-TOKEN')
+    >>>> addVirtualParticipants(NUMBER-OF-VIRTUAL-PARTICIPANTS)
+
+    If no credentials are set the added participants will be guests. To add a
+    registered user (note that the same user can be added several times) set the
+    credentials first before adding the virtual participants:
+    >>>> setCredentials('THE-USER-ID', 'THE-APP-TOKEN')
+
+    If no media is explicitly set virtual participants will join without media.
+    To join with specific media set the desired type first before adding the
+    virtual participants:
+    >>>> setMedia(JOIN-WITH-AUDIO, JOIN-WITH-VIDEO)
+
+    By default each virtual participant uses its own browser. To reduce the
+    memory used by each virtual participant several of them can run in the same
+    browser, each one in its own window, with:
+    >>>> setVirtualParticipantsPerBrowser(NUMBER-OF-VIRTUAL-PARTICIPANTS)
+
+    Virtual participants without media can be run without a browser at all,
+    which allows to add thousands of them from a single system, with:
+    >>>> setBrowserless(True)
+
+    By default virtual participants are added one after the other. If the
+    system running the browsers has enough resources several virtual
+    participants can be added at the same time to speed up adding a large
+    number of them:
+    >>>> setStartupParallelism(NUMBER-OF-PARALLEL-STARTS)
+
+    Note that adding a new participant does not remove the previous ones. That
+    should be explicitly done by calling "removeVirtualParticipants()" (or
+    "removeVirtualParticipant(INDEX)" to remove just a specific participant).
+    Therefore, it is possible to add several participants with different
+    parameters (like several guests and then several users, or participants with
+    and without media) by setting the parameters, calling
+    "addVirtualParticipants(NUMBER)", setting the new parameters and calling
+    "addVirtualParticipants(NUMBER)" again.
+
+    In case joining/leaving a call should be tested, it makes sense to use
+    "prepareVirtualParticipant()" / "prepareVirtualParticipants(NUMBER)" and
+    then start them with "startVirtualParticipants()" and stop them with
+    "stopVirtualParticipants()". In case joining/leaving should be done in
+    parallel one can use "startVirtualParticipantsParallel()" and
+    "stopVirtualParticipantsParallel()".
+
+    Global functions provided for virtual participants only cover adding and
+    removing them. Any specific action, like enabling or disabling media of a
+    virtual participant, must be directly called on the Talkbuchet wrapper
+    objects in the "virtualParticipants" list. For example:
+    >>>> virtualParticipants[0].setAudioEnabled(False)
+
+    Note that clients may not show any nick for the virtual participants unless
+    explicitly given, even if the virtual participant is a registered user. The
+    nick for a specific virtual participant can be set with:
+    >>>> virtualParticipants[INDEX].sendNickThroughDataChannel(NICK)
+    """
+
+    def _isValidConfiguration():
+        # Virtual participants with media always need a browser, even in
+        # browserless mode.
+        if not (_browserless and not _audio and not _video) and not _isValidBrowser():
+            return False
+
+        if not _nextcloudUrl:
+            print("Set target Nextcloud URL first")
+            return False
+
+        if not _token:
+            print("Set conversation token first")
+            return False
+
+        return True
+
+    def _newVirtualParticipant():
+        if _browserless and not _audio and not _video:
+            virtualParticipant = BrowserlessVirtualParticipant(_nextcloudUrl)
+
+            virtualParticipant.setToken(_token)
+
+            if _user or _appToken:
+                virtualParticipant.setCredentials(_user, _appToken)
+
+            return virtualParticipant
+
+        sharedBrowser = None
+        if _virtualParticipantsPerBrowser > 1:
+            sharedBrowser = _reserveSharedBrowserWindow()
+
+        virtualParticipant = VirtualParticipant(_getBrowser(), _nextcloudUrl, _headless, _getRemoteSeleniumUrl(), _browserPool, sharedBrowser)
+
+        try:
+            virtualParticipant.setToken(_token)
+
+            if _user or _appToken:
+                virtualParticipant.setCredentials(_user, _appToken)
+
+            if _audio or _video:
+                virtualParticipant.startMedia(_audio, _video)
+        except Exception:
+            _releaseWrapper(virtualParticipant)
+
+            raise
+
+        return virtualParticipant
+
+    def _newStartedVirtualParticipant():
+        virtualParticipant = _newVirtualParticipant()
+
+        try:
+            virtualParticipant.startVirtualParticipant()
+
+            if not virtualParticipant.isStarted():
+                raise Exception('Virtual participant could not be started')
+        except Exception:
+            _releaseWrapper(virtualParticipant)
+
+            raise
+
+        return virtualParticipant
+
+    def prepareVirtualParticipant():
+        """
+        Prepares a single virtual participant.
+
+        The global target Nextcloud URL and conversation token need to be set
+        first.
+
+        If global credentials or media were set they will be applied to the
+        virtual participant.
+
+        Note that changing any of those values later will have no effect on an
+        existing virtual participant, the updated value will be used only by
+        virtual participants added after they were changed.
+
+        This method just prepares a virtual participant, but does not start it.
+        See :py:func:`addVirtualParticipant` as an alternative.
+        """
+
+        if not _isValidConfiguration():
+            return
+
+        virtualParticipant = _newVirtualParticipant()
+
+        virtualParticipants.append(virtualParticipant)
+
+        return virtualParticipant
+
+    def prepareVirtualParticipants(count):
+        """
+        Prepares as many virtual participants as the given count.
+
+        The virtual participants are prepared in parallel if a startup
+        parallelism was set (see :py:func:`setStartupParallelism`). Virtual
+        participants that could not be prepared are reported, and once all of
+        them were prepared the total time is printed.
+
+        See :py:func:`prepareVirtualParticipant`.
+
+        :param count: the number of virtual participants to prepare.
+        :return: a :py:class:`StartupReport` with the prepared virtual
+            participants.
+        """
+
+        if not _isValidConfiguration():
+            return
+
+        report = StartupPool(_startupParallelism).run(count, _newVirtualParticipant)
+
+        virtualParticipants.extend(report.wrappers)
+
+        return report
+
+    def startVirtualParticipants():
+        """
+        Starts all virtual participants which are prepared.
+
+        Note that there is no check if a virtual participant was already started
+        before. The result of starting again a virtual participant before
+        stopping it first is undefined, no matter if the virtual participant was
+        started with any of the "startVirtualParticipants" or
+        "addVirtualParticipant" variants.
+
+        See :py:func:`prepareVirtualParticipant`.
+        """
+        for virtualParticipant in virtualParticipants:
+            virtualParticipant.startVirtualParticipant()
+
+    def startVirtualParticipantsParallel():
+        """
+        Starts all virtual participants.
+
+        Same as :py:func:`startVirtualParticipants`, but starting each virtual
+        participant in parallel.
+
+        This method returns before the virtual participants were fully started,
+        so it should be ensured that starting them finished before starting more
+        virtual participants or stopping them.
+        """
+
+        for virtualParticipant in virtualParticipants:
+            startThread = threading.Thread(target=virtualParticipant.startVirtualParticipant)
+            startThread.start()
+
+    def stopVirtualParticipants():
+        """
+        Stops all virtual participants.
+
+        The participants are not removed and can be started again.
+        See :py:func:`prepareVirtualParticipant`.
+
+        Note that there is no check if a virtual participant was started/stopped
+        before.
+
+        See :py:func:`prepareVirtualParticipant`.
+        """
+
+        for virtualParticipant in virtualParticipants:
+            virtualParticipant.stopVirtualParticipant()
+
+    def stopVirtualParticipantsParallel():
+        """
+        Stops all virtual participants.
+
+        Same as :py:func:`stopVirtualParticipants`, but stopping each virtual
+        participant in parallel.
+
+        This method returns before the virtual participants were fully stopped,
+        so it should be ensured that stopping them finished before starting or
+        stopping them again.
+        """
+
+        for virtualParticipant in virtualParticipants:
+            stopThread = threading.Thread(target=virtualParticipant.stopVirtualParticipant)
+            stopThread.start()
+
+    def addVirtualParticipant():
+        """
+        Adds a single virtual participant.
+
+        The global target Nextcloud URL and conversation token need to be set
+        first.
+
+        If global credentials or media were set they will be applied to the
+        virtual participant.
+
+        Note that changing any of those values later will have no effect on an
+        existing virtual participant, the updated value will be used only by
+        virtual participants added after they were changed.
+
+        This method prepares a participant and immediately starts it.
+        """
+
+        if not _isValidConfiguration():
+            return
+
+        virtualParticipant = prepareVirtualParticipant()
+
+        virtualParticipant.startVirtualParticipant()
+
+    def addVirtualParticipants(count):
+        """
+        Adds as many virtual participants as the given count.
+
+        The virtual participants are added in parallel if a startup parallelism
+        was set (see :py:func:`setStartupParallelism`). Virtual participants
+        that could not be added (including those that could not be started) are
+        reported, and once all of them were added the total time is printed.
+
+        See :py:func:`addVirtualParticipant`.
+
+        :param count: the number of virtual participants to add.
+        :return: a :py:class:`StartupReport` with the added virtual
+            participants.
+        """
+
+        if not _isValidConfiguration():
+            return
+
+        report = StartupPool(_startupParallelism).run(count, _newStartedVirtualParticipant)
+
+        virtualParticipants.extend(report.wrappers)
+
+        return report
+
+    def removeVirtualParticipant(index):
+        """
+        Removes the virtual participant with the given index.
+
+        :param index: the index in :py:data:`virtualParticipants` of the virtual
+            participant to remove.
+        """
+
+        if index < 0 or index >= len(virtualParticipants):
+            print("Index out of range")
+            return
+
+        virtualParticipants[index].stopVirtualParticipant()
+        virtualParticipants[index].release()
+        del virtualParticipants[index]
+
+    def removeVirtualParticipants():
+        """
+        Removes all the virtual participants previously added.
+        """
+
+        while virtualParticipants:
+            removeVirtualParticipant(0)
+
+    if globals()['_talkbuchetMode'] == 'siege':
+        if endSiege:
+            endSiege()
+
+        del globals()['setPublishersAndSubscribersCount']
+        del globals()['setRampPolicy']
+        del globals()['startSiege']
+        del globals()['checkPublishersConnections']
+        del globals()['checkSubscribersConnections']
+        del globals()['startStatsSampler']
+        del globals()['pullStats']
+        del globals()['stopStatsSampler']
+        del globals()['printHandshakeTimings']
+        del globals()['addPublishers']
+        del globals()['removePublishers']
+        del globals()['addSubscribers']
+        del globals()['removeSubscribers']
+        del globals()['endSiege']
+        del globals()['calibrate']
+        del globals()['setCalibratedPublishersAndSubscribersCount']
+
+    if globals()['_talkbuchetMode'] == 'realParticipant':
+        if removeRealParticipants:
+            removeRealParticipants()
+
+        del globals()['addRealParticipant']
+        del globals()['addRealParticipants']
+        del globals()['removeRealParticipant']
+        del globals()['removeRealParticipants']
+
+    if globals()['_talkbuchetMode'] == 'signalingBenchmark':
+        if endSignalingBenchmarks:
+            endSignalingBenchmarks()
+
+        del globals()['setSignalingSessionsCount']
+        del globals()['startSignalingBenchmark']
+        del globals()['runSignalingBenchmark']
+        del globals()['findMaxSignalingRate']
+        del globals()['endSignalingBenchmark']
+        del globals()['endSignalingBenchmarks']
+
+    globals()['prepareVirtualParticipant'] = prepareVirtualParticipant
+    globals()['prepareVirtualParticipants'] = prepareVirtualParticipants
+    globals()['startVirtualParticipants'] = startVirtualParticipants
+    globals()['startVirtualParticipantsParallel'] = startVirtualParticipantsParallel
+    globals()['stopVirtualParticipants'] = stopVirtualParticipants
+    globals()['stopVirtualParticipantsParallel'] = stopVirtualParticipantsParallel
+    globals()['addVirtualParticipant'] = addVirtualParticipant
+    globals()['addVirtualParticipants'] = addVirtualParticipants
+    globals()['removeVirtualParticipant'] = removeVirtualParticipant
+    globals()['removeVirtualParticipants'] = removeVirtualParticipants
+
+    globals()['_talkbuchetMode'] = 'virtualParticipant'
+
+
+realParticipants = []
+
+def switchToRealParticipantMode():
+    """
+    Sets the real participant mode as the active one.
+
+    This adjusts the global helper functions to those relevant for this mode
+    (so, for example, there will be no function to start a siege).
+
+    Real participants can be added to a conversation in the following way:
+    >>>> setTarget('https://THE-NEXTCLOUD-DOMAIN')
+    >>>> setToken('THE-CONVERSATION-TOKEN')
+    >>>> addRealParticipants(NUMBER-OF-REAL-PARTICIPANTS)
+
+    If no credentials are set the added participants will be guests. To add a
+    registered user (note that the same user can be added several times) set the
+    credentials first before adding the real participants:
+    >>>> setCredentials('THE-USER-ID', 'THE-APP-TOKEN')
+
+    Note that adding a new participant does not remove the previous ones. That
+    should be explicitly done by calling "removeRealParticipants()" (or
+    "removeRealParticipant(INDEX)" to remove just a specific participant).
+    Therefore, it is possible to add several participants with different
+    parameters (like several guests and then several users) by setting the
+    parameters, calling "addRealParticipants(NUMBER)", setting the new
+    parameters and calling "addRealParticipants(NUMBER)" again.
+
+    Global functions provided for real participants only cover joining and
+    leaving the conversation. Joining the call must be directly done on the
+    Talkbuchet wrapper objects in the "realParticipants" list with:
+    >>>> realParticipants[INDEX].joinCall()
+    """
+
+    def _isValidConfiguration():
+        if not _isValidBrowser():
+            return False
+
+        if not _nextcloudUrl:
+            print("Set target Nextcloud URL first")
+            return False
+
+        if not _token:
+            print("Set conversation token first")
+            return False
+
+        return True
+
+    def _newRealParticipant():
+        realParticipant = RealParticipant(_getBrowser(), _nextcloudUrl, _headless, _getRemoteSeleniumUrl(), _browserPool)
+
+        try:
+            if _user or _appToken:
+                realParticipant.login(_user, _appToken)
+
+            realParticipant.joinRoom(_token)
+        except Exception:
+            _releaseWrapper(realParticipant)
+
+            raise
+
+        return realParticipant
+
+    def addRealParticipant():
+        """
+        Adds a single real participant.
+
+        The global target Nextcloud URL and conversation token need to be set
+        first.
+
+        If global credentials were set the user will be logged in with them.
+
+        Note that changing any of those values later will have no effect on an
+        existing real participant, the updated value will be used only by real
+        participants added after they were changed.
+        """
+
+        if not _isValidConfiguration():
+            return
+
+        realParticipant = _newRealParticipant()
+
+        realParticipants.append(realParticipant)
+
+    def addRealParticipants(count):
+        """
+        Adds as many real participants as the given count.
+
+        The real participants are added in parallel if a startup parallelism
+        was set (see :py:func:`setStartupParallelism`).
+
+        See :py:func:`addRealParticipant`.
+
+        :param count: the number of real participants to add.
+        :return: a :py:class:`StartupReport` with the added real participants.
+        """
+
+        if not _isValidConfiguration():
+            return
+
+        report = StartupPool(_startupParallelism).run(count, _newRealParticipant)
+
+        realParticipants.extend(report.wrappers)
+
+        return report
+
+    def removeRealParticipant(index):
+        """
+        Removes the real participant with the given index.
+
+        :param index: the index in :py:data:`realParticipants` of the real
+            participant to remove.
+        """
+
+        if index < 0 or index >= len(realParticipants):
+            print("Index out of range")
+            return
+
+        realParticipants[index].release()
+        del realParticipants[index]
+
+    def removeRealParticipants():
+        """
+        Removes all the real participants previously added.
+        """
+
+        while realParticipants:
+            removeRealParticipant(0)
+
+    if globals()['_talkbuchetMode'] == 'siege':
+        if endSiege:
+            endSiege()
+
+        del globals()['setPublishersAndSubscribersCount']
+        del globals()['setRampPolicy']
+        del globals()['startSiege']
+        del globals()['checkPublishersConnections']
+        del globals()['checkSubscribersConnections']
+        del globals()['startStatsSampler']
+        del globals()['pullStats']
+        del globals()['stopStatsSampler']
+        del globals()['printHandshakeTimings']
+        del globals()['addPublishers']
+        del globals()['removePublishers']
+        del globals()['addSubscribers']
+        del globals()['removeSubscribers']
+        del globals()['endSiege']
+        del globals()['calibrate']
+        del globals()['setCalibratedPublishersAndSubscribersCount']
+
+    if globals()['_talkbuchetMode'] == 'virtualParticipant':
+        if removeVirtualParticipants:
+            removeVirtualParticipants()
+
+        del globals()['prepareVirtualParticipant']
+        del globals()['prepareVirtualParticipants']
+        del globals()['startVirtualParticipants']
+        del globals()['startVirtualParticipantsParallel']
+        del globals()['stopVirtualParticipants']
+        del globals()['stopVirtualParticipantsParallel']
+        del globals()['addVirtualParticipant']
+        del globals()['addVirtualParticipants']
+        del globals()['removeVirtualParticipant']
+        del globals()['removeVirtualParticipants']
+
+    if globals()['_talkbuchetMode'] == 'signalingBenchmark':
+        if endSignalingBenchmarks:
+            endSignalingBenchmarks()
+
+        del globals()['setSignalingSessionsCount']
+        del globals()['startSignalingBenchmark']
+        del globals()['runSignalingBenchmark']
+        del globals()['findMaxSignalingRate']
+        del globals()['endSignalingBenchmark']
+        del globals()['endSignalingBenchmarks']
 
-_audio = False
-_video = False
+    globals()['addRealParticipant'] = addRealParticipant
+    globals()['addRealParticipants'] = addRealParticipants
+    globals()['removeRealParticipant'] = removeRealParticipant
+    globals()['removeRealParticipants'] = removeRealParticipants
 
-def _isValidBrowser():
-    if not _browser:
-        print("Set browser first")
-        return False
+    globals()['_talkbuchetMode'] = 'realParticipant'
 
-    if _remoteSeleniumUrl and _browser == 'default':
-        print("Set an explicit browser name to be used in the remote Selenium instance")
-        return False
 
-    if _browser == 'default' and not _browserDefault:
-        print("Set an explicit browser name, no default browser found")
-        return False
+signalingBenchmarks = []
 
-    return True
+def switchToSignalingBenchmarkMode():
+    """
+    Sets the signaling benchmark mode as the active one.
 
-def _findDefaultBrowser():
-    global _browserDefault
+    This adjusts the global helper functions to those relevant for this mode
+    (so, for example, there will be no function to start a siege).
 
-    # Try to get the browser from the Selenium Docker image.
-    try:
-        _browserDefault = Path('/opt/selenium/browser_name').read_text().strip()
-    except:
-        pass
+    The signaling benchmark measures the throughput and latency of the message
+    relay of the signaling server, without involving Janus nor any browser.
+    Several signaling sessions are opened, and then messages are sent between
+    them at a constant rate. A benchmark can be run in the following way:
+    >>>> setTarget('https://THE-NEXTCLOUD-DOMAIN')
+    >>>> setCredentials('THE-USER-ID', 'THE-APP-TOKEN')
+    >>>> setSignalingSessionsCount(NUMBER-OF-SESSIONS)
+    >>>> startSignalingBenchmark()
+    >>>> runSignalingBenchmark(MESSAGES-PER-SECOND)
 
-    if _browserDefault:
-        setBrowser('default')
-    else:
-        print('No default browser found, please set the browser to use with setBrowser("chrome") or setBrowser("firefox")')
+    "runSignalingBenchmark()" returns (and prints) the number of sent and lost
+    messages, the rate at which the messages were relayed and the p50, p90, p99
+    and max relay latencies. The size of the messages can be increased by adding
+    some padding with "runSignalingBenchmark(MESSAGES-PER-SECOND, DURATION,
+    PADDING-BYTES)".
 
-def _getBrowser():
-    if _browser == 'chrome' or (_browser == 'default' and _browserDefault == 'chrome'):
-        return 'chrome'
+    Instead of trying specific rates the maximum sustained rate can be searched
+    with "findMaxSignalingRate()", which runs the benchmark with increasing
+    rates until messages are lost or the p99 latency is too high.
 
-    return 'firefox'
+    If a conversation token is set the sessions also join that conversation;
+    in that case the credentials are not needed if the conversation is public.
 
-def setBrowser(browser):
+    Note that starting a new benchmark does not end the previous one. That
+    should be explicitly done by calling "endSignalingBenchmark()".
     """
-    Sets the browser to use.
 
-    Supported browsers are "chrome" and "firefox"; the browser needs to be
-    available in the Selenium server.
+    def _isValidConfiguration():
+        if not _nextcloudUrl:
+            print("Set target Nextcloud URL first")
+            return False
 
-    The special value "default" (which is the default value) can be set to try
-    to find which is the default browser in the Selenium server and use it
-    without having to specify it.
+        if (not _user or not _appToken) and not _token:
+            print("Set credentials (user and app token) or token first")
+            return False
 
-    This is used only for the global helper functions and is not taken into
-    account if a Talkbuchet wrapper is manually created.
+        return True
 
-    :param browser: "default", "chrome" or "firefox".
-    """
+    def setSignalingSessionsCount(signalingSessionsCount):
+        """
+        Sets the number of signaling sessions to open in the benchmark.
 
-    if browser != 'default' and browser != 'chrome' and browser != 'firefox':
-        print('Browser value not valid. Allowed values: "default", "chrome" or "firefox"')
-        return
+        By default 10 sessions are opened.
 
-    global _browser
-    _browser = browser
+        This is used only for the global helper functions and is not taken into
+        account if a SignalingBenchmark is manually created.
 
-def setTarget(nextcloudUrl):
-    """
-    Sets the Nextcloud URL to use.
+        :param signalingSessionsCount: the number of signaling sessions.
+        """
 
-    This is used only for the global helper functions and is not taken into
-    account if a Talkbuchet wrapper is manually created.
+        global _signalingSessionsCount
+        _signalingSessionsCount = signalingSessionsCount
 
-    :param nextcloudUrl: the URL of the Nextcloud instance to test against
-        (for example, "https://cloud.mydomain.com").
-    """
+    def startSignalingBenchmark():
+        """
+        Starts a signaling benchmark, opening its signaling sessions.
 
-    global _nextcloudUrl
-    _nextcloudUrl = nextcloudUrl
+        The benchmark is added to the "signalingBenchmarks" list.
+        """
 
-def setHeadless(headless):
-    """
-    Sets whether the browsers will be started in headless mode or not.
+        if not _isValidConfiguration():
+            return
 
-    By default browsers are started in headless mode, as each instance uses a
-    little less memory.
+        signalingBenchmark = SignalingBenchmark(_nextcloudUrl, _user, _appToken, _token)
+        signalingBenchmark.start(_signalingSessionsCount, max(_startupParallelism, 10))
 
-    This is used only for the global helper functions and is not taken into
-    account if a Talkbuchet wrapper is manually created.
+        signalingBenchmarks.append(signalingBenchmark)
 
-    :param headless: True for headless mode, False otherwise.
+    def _getSignalingBenchmarkIndex(index):
+        if index is None and len(signalingBenchmarks) == 1:
+            return 0
+
+        if index is None:
+            print("Index needs to be specified")
+            return -1
+
+        if index < 0 or index >= len(signalingBenchmarks):
+            print("Index out of range")
+            return -1
+
+        return index
+
+    def runSignalingBenchmark(messagesPerSecond, duration = 10, payloadSize = 0, index = None):
+        """
+        Sends messages between the sessions of the benchmark at the given rate.
+
+        If a single benchmark is active the index does not need to be specified.
+
+        :param messagesPerSecond: the total number of messages to send each
+            second.
+        :param duration: the seconds to send messages.
+        :param payloadSize: the size, in bytes, of additional padding added to
+            each message.
+        :param index: the index in :py:data:`signalingBenchmarks` of the
+            benchmark to run.
+        :return: a :py:class:`SignalingBenchmarkResult`.
+        """
+
+        index = _getSignalingBenchmarkIndex(index)
+        if index < 0:
+            return
+
+        result = signalingBenchmarks[index].run(messagesPerSecond, duration, payloadSize)
+
+        print(result)
+
+        return result
+
+    def findMaxSignalingRate(startRate = 100, maxRate = 100000, stepDuration = 10, maxLatency = 1, payloadSize = 0, index = None):
+        """
+        Finds the sustained rate of messages before the server falls behind.
+
+        If a single benchmark is active the index does not need to be specified.
+
+        See :py:meth:`SignalingBenchmark.findMaxRate`.
+        """
+
+        index = _getSignalingBenchmarkIndex(index)
+        if index < 0:
+            return
+
+        return signalingBenchmarks[index].findMaxRate(startRate, maxRate, stepDuration=stepDuration, maxLatency=maxLatency, payloadSize=payloadSize)
+
+    def endSignalingBenchmark(index = None):
+        """
+        Ends the signaling benchmark with the given index.
+
+        If a single benchmark is active the index does not need to be specified.
+
+        :param index: the index in :py:data:`signalingBenchmarks` of the
+            benchmark to remove.
+        """
+
+        index = _getSignalingBenchmarkIndex(index)
+        if index < 0:
+            return
+
+        signalingBenchmarks[index].stop()
+        del signalingBenchmarks[index]
+
+    def endSignalingBenchmarks():
+        """
+        Ends all the signaling benchmarks previously started.
+        """
+
+        while signalingBenchmarks:
+            endSignalingBenchmark(0)
+
+    if globals()['_talkbuchetMode'] == 'siege':
+        if endSiege:
+            endSiege()
+
+        del globals()['setPublishersAndSubscribersCount']
+        del globals()['setRampPolicy']
+        del globals()['startSiege']
+        del globals()['checkPublishersConnections']
+        del globals()['checkSubscribersConnections']
+        del globals()['startStatsSampler']
+        del globals()['pullStats']
+        del globals()['stopStatsSampler']
+        del globals()['printHandshakeTimings']
+        del globals()['addPublishers']
+        del globals()['removePublishers']
+        del globals()['addSubscribers']
+        del globals()['removeSubscribers']
+        del globals()['endSiege']
+        del globals()['calibrate']
+        del globals()['setCalibratedPublishersAndSubscribersCount']
+
+    if globals()['_talkbuchetMode'] == 'virtualParticipant':
+        if removeVirtualParticipants:
+            removeVirtualParticipants()
+
+        del globals()['prepareVirtualParticipant']
+        del globals()['prepareVirtualParticipants']
+        del globals()['startVirtualParticipants']
+        del globals()['startVirtualParticipantsParallel']
+        del globals()['stopVirtualParticipants']
+        del globals()['stopVirtualParticipantsParallel']
+        del globals()['addVirtualParticipant']
+        del globals()['addVirtualParticipants']
+        del globals()['removeVirtualParticipant']
+        del globals()['removeVirtualParticipants']
+
+    if globals()['_talkbuchetMode'] == 'realParticipant':
+        if removeRealParticipants:
+            removeRealParticipants()
+
+        del globals()['addRealParticipant']
+        del globals()['addRealParticipants']
+        del globals()['removeRealParticipant']
+        del globals()['removeRealParticipants']
+
+    globals()['setSignalingSessionsCount'] = setSignalingSessionsCount
+    globals()['startSignalingBenchmark'] = startSignalingBenchmark
+    globals()['runSignalingBenchmark'] = runSignalingBenchmark
+    globals()['findMaxSignalingRate'] = findMaxSignalingRate
+    globals()['endSignalingBenchmark'] = endSignalingBenchmark
+    globals()['endSignalingBenchmarks'] = endSignalingBenchmarks
+
+    globals()['_talkbuchetMode'] = 'signalingBenchmark'
+
+
+def _importYaml():
     """
+    Returns the yaml module, or None if it is not available.
 
-    global _headless
-    _headless = headless
+    PyYAML is optional; it is only needed to load scenarios and benchmark
+    configurations written in YAML.
+    """
 
-def setRemoteSeleniumUrl(remoteSeleniumUrl):
+    try:
+        import yaml
+    except ImportError:
+        return None
+
+    return yaml
+
+def _loadJsonOrYaml(path):
+    """
+    Returns the contents of the given JSON or YAML file.
     """
-    Sets the URL of the remote Selenium server to use.
 
-    By default the local Selenium server is used.
+    with open(path) as file:
+        if not path.endswith('.yaml') and not path.endswith('.yml'):
+            return json.load(file)
 
-    When a remote Selenium server is used its session timeout (which is
-    independent from the timeouts set in the driver) must be kept in mind, as it
-    can cause the browser to "unexpectedly" close. Also note that each
-    Talkbuchet wrapper will use its own browser instance, so the remote Selenium
-    server should have enough available sessions for all the instances running
-    at the same time (for example, if several virtual participants are used).
+        yaml = _importYaml()
+        if not yaml:
+            raise Exception('PyYAML is needed to load YAML files')
 
-    This is used only for the global helper functions and is not taken into
-    account if a Talkbuchet wrapper is manually created.
+        return yaml.safe_load(file)
 
-    :param remoteSeleniumUrl: the URL of the remote Selenium server, or None to
-        use the local one.
+def _callSetters(settings, ignoreUnavailable = False):
     """
+    Calls the global setter of each setting, "setXXX()" for "xXX".
 
-    global _remoteSeleniumUrl
-    _remoteSeleniumUrl = remoteSeleniumUrl
+    Lists are passed as positional arguments, dicts as keyword arguments and
+    any other value as the only argument.
 
-def setCredentials(user, appToken):
+    If "ignoreUnavailable" is True settings without a setter (for example,
+    because the setter is not available in the current mode) are ignored
+    instead of raising an exception.
     """
-    Sets the credentials to use.
 
-    An app token/password can be generated in the Security section of the
-    personal settings (index.php/settings/user/security).
+    for name, value in settings.items():
+        setter = globals().get('set' + name[0].upper() + name[1:])
+        if not callable(setter) and ignoreUnavailable:
+            continue
 
-    This is used only for the global helper functions and is not taken into
-    account if a Talkbuchet wrapper is manually created.
+        if not callable(setter):
+            raise Exception('Invalid setting: ' + name)
 
-    :param user: the user ID.
-    :param appToken: the app token for the user.
+        if isinstance(value, list):
+            setter(*value)
+        elif isinstance(value, dict):
+            setter(**value)
+        else:
+            setter(value)
+
+def _reportToJson(value):
+    """
+    Returns a summary of the given step result that can be serialized to JSON.
     """
 
-    global _user, _appToken
-    _user = user
-    _appToken = appToken
+    if isinstance(value, StartupReport):
+        return {
+            'created': len(value.wrappers),
+            'failed': len(value.failures),
+            'errors': {index: str(failure) for index, failure in value.failures.items()},
+            'rampTime': value.rampTime,
+        }
+
+    if isinstance(value, BroadcastReport):
+        latencies = sorted(result['latency'] for result in value.results.values())
+
+        return {
+            'succeeded': len(value.getSuccesses()),
+            'failed': len(value.getFailures()),
+            'errors': {index: str(result['error']) for index, result in value.getFailures().items()},
+            'totalTime': value.totalTime,
+            'latency': {
+                'p50': _percentile(latencies, 50),
+                'p95': _percentile(latencies, 95),
+                'max': _percentile(latencies, 100),
+            },
+        }
 
-def setToken(token):
+    try:
+        json.dumps(value)
+    except (TypeError, ValueError):
+        return repr(value)
+
+    return value
+
+
+# The global values set by each setting that can be used in a scenario group.
+_groupSettingGlobals = {
+    'browser': ['_browser'],
+    'headless': ['_headless'],
+    'remoteSeleniumUrl': ['_remoteSeleniumUrl'],
+    'credentials': ['_user', '_appToken'],
+    'media': ['_audio', '_video'],
+    'startupParallelism': ['_startupParallelism'],
+    'virtualParticipantsPerBrowser': ['_virtualParticipantsPerBrowser'],
+    'browserless': ['_browserless'],
+    'biDiScriptsEnabled': ['_bidiScriptsEnabled'],
+}
+
+class ScenarioRunner:
+    """
+    Runs a scenario, a declarative description of a load test with a timeline,
+    so the same load can be replayed exactly on each run.
+
+    A scenario is a dict, usually loaded from a JSON or YAML file, like:
+    {
+        "mode": "virtualParticipant",
+        "settings": {
+            "target": "https://THE-NEXTCLOUD-DOMAIN",
+            "token": "THE-CONVERSATION-TOKEN",
+            "startupParallelism": 4
+        },
+        "groups": {
+            "speakers": { "media": [true, true] },
+            "listeners": { "browserless": true }
+        },
+        "timeline": [
+            { "at": 0, "action": "join", "group": "listeners", "count": 100 },
+            { "at": 0, "action": "join", "group": "speakers", "count": 5 },
+            { "at": 60, "action": "call", "group": "speakers", "method": "setVideoEnabled", "args": [false] },
+            { "at": 90, "action": "call", "group": "speakers", "method": "sendSpeakingStateThroughDataChannel", "args": [true], "count": 1 },
+            { "at": 120, "action": "leave", "group": "listeners", "fraction": 0.2 },
+            { "at": 150, "action": "metrics" },
+            { "at": 300, "action": "end" }
+        ]
+    }
+
+    The mode is "siege" or "virtualParticipant" (the default). Each setting
+    calls the global setter with the same name ("target" calls "setTarget()");
+    lists are passed as positional arguments and dicts as keyword arguments.
+    The scenario settings are applied once when the run starts. The settings of
+    a group are applied before joining virtual participants of that group, and
+    the previous values are restored once joined, so they do not affect other
+    groups. Only settings of how the virtual participants are created can be
+    used in a group: "browser", "headless", "remoteSeleniumUrl",
+    "credentials", "media", "startupParallelism",
+    "virtualParticipantsPerBrowser", "browserless" and "biDiScriptsEnabled".
+
+    The steps of the timeline are run at the given second since the start of
+    the run, one after the other; if a step takes longer than the time until
+    the next one the next step is run late rather than skipped. The actions
+    are:
+    - "join": adds "count" virtual participants to the group.
+    - "leave": removes the first "count" virtual participants (or the given
+      "fraction" of them) of the group.
+    - "call": calls the wrapper "method" with the given "args" in all the
+      wrappers of the group (or in the first "count" or in the given "fraction"
+      of them) at the same time; see :py:func:`broadcast`. If no group is given
+      the method is called in all the sieges or virtual participants.
+    - "function": calls the global function "name" with the given "args" (for
+      example, "startSiege" or "addPublishers").
+    - "metrics": collects the metrics of all the sieges or virtual
+      participants.
+    - "end": ends the run.
+
+    All the wrappers are removed once the run ends.
+
+    The results are written to the output directory: "scenario.json" (the
+    scenario run), "timeline.jsonl" (the start time, lateness, duration and
+    result of each step), "metrics.jsonl" (the metrics collected by each
+    "metrics" step; if the performance metrics collector was started the
+    metrics of each wrapper include the "performanceMetrics" of its browser),
+    "events.jsonl" (the events
+    emitted during the run; see :py:class:`EventLog`), "summary.json" (with
+    the "error" if the mode or the scenario settings could not be set) and the
+    browser logs in "logs". A logs directory set before the run is restored
+    once the run ends.
     """
-    Sets the conversation token to use.
 
-    This is used only for the global helper functions and is not taken into
-    account if a Talkbuchet wrapper is manually created.
+    def __init__(self, scenario):
+        """
+        :param scenario: the scenario to run.
+        """
 
-    :param token: the conversation token.
-    """
+        self.scenario = scenario
+        self.mode = scenario.get('mode', 'virtualParticipant')
 
-    global _token
-    _token = token
+        if self.mode not in ['siege', 'virtualParticipant']:
+            raise Exception('Invalid mode: ' + str(self.mode))
+
+        self.timeline = sorted(scenario.get('timeline', []), key=lambda step: step.get('at', 0))
+
+        for step in self.timeline:
+            if step.get('action') not in ['join', 'leave', 'call', 'function', 'metrics', 'end']:
+                raise Exception('Invalid action: ' + str(step.get('action')))
+
+        for group, groupSettings in scenario.get('groups', {}).items():
+            for setting in groupSettings:
+                if setting not in _groupSettingGlobals:
+                    raise Exception('Invalid setting in group ' + group + ': ' + setting)
+
+        self.groups = {}
+
+    def __getWrappers(self, group = None):
+        if self.mode == 'siege':
+            return sieges
+
+        if group == None:
+            return virtualParticipants
+
+        if group not in self.scenario.get('groups', {}):
+            raise Exception('Invalid group: ' + str(group))
+
+        return self.groups.setdefault(group, [])
+
+    def __getSelection(self, step, wrappers):
+        if 'count' in step:
+            return range(min(step['count'], len(wrappers)))
+
+        if 'fraction' in step:
+            return range(round(step['fraction'] * len(wrappers)))
+
+        return step.get('selection')
+
+    def __join(self, step):
+        if self.mode != 'virtualParticipant':
+            raise Exception('Virtual participants can only join in virtual participant mode')
+
+        group = step.get('group')
+        wrappers = self.__getWrappers(group)
+
+        groupSettings = self.scenario['groups'][group] if group != None else {}
+
+        # The settings of a group apply only to its own virtual participants,
+        # so the values backing them are restored once joined; otherwise the
+        # settings not set in the next group would leak into it.
+        previousValues = {name: globals()[name] for setting in groupSettings for name in _groupSettingGlobals[setting]}
+
+        try:
+            _callSetters(groupSettings)
+
+            report = globals()['addVirtualParticipants'](step.get('count', 1))
+        finally:
+            globals().update(previousValues)
+
+        if not report:
+            raise Exception('Virtual participants could not be added')
+
+        if group != None:
+            wrappers.extend(report.wrappers)
+
+        return report
+
+    def __leave(self, step):
+        if self.mode != 'virtualParticipant':
+            raise Exception('Virtual participants can only leave in virtual participant mode')
+
+        wrappers = self.__getWrappers(step.get('group'))
+
+        leavingWrappers = [wrapper for index, wrapper in _selectWrappers(wrappers, self.__getSelection(step, wrappers))]
+
+        for wrapper in leavingWrappers:
+            for groupWrappers in self.groups.values():
+                if wrapper in groupWrappers:
+                    groupWrappers.remove(wrapper)
+
+            globals()['removeVirtualParticipant'](virtualParticipants.index(wrapper))
+
+        return len(leavingWrappers)
+
+    def __call(self, step):
+        wrappers = self.__getWrappers(step.get('group'))
+
+        return Broadcaster().run(_selectWrappers(wrappers, self.__getSelection(step, wrappers)), step['method'], *step.get('args', []))
+
+    def __callFunction(self, step):
+        function = globals().get(step['name'])
+        if not callable(function):
+            raise Exception('Invalid function: ' + str(step['name']))
+
+        return function(*step.get('args', []))
+
+    def __collectMetrics(self, metricsFile, time):
+        report = Broadcaster().run(list(enumerate(self.__getWrappers())), 'getMetrics')
+
+        record = {
+            'time': time,
+            'metrics': {index: result['result'] for index, result in report.getSuccesses().items()},
+        }
+
+        if _performanceMetricsCollector:
+            _performanceMetricsCollector.takeSample()
+
+            wrappers = self.__getWrappers()
+            for index, metrics in record['metrics'].items():
+                performanceMetrics = _performanceMetricsCollector.getLastMetrics(wrappers[index])
+                if performanceMetrics != None and isinstance(metrics, dict):
+                    metrics['performanceMetrics'] = performanceMetrics
+
+        metricsFile.write(json.dumps(record) + '\n')
+        metricsFile.flush()
+
+        return report
+
+    def __runStep(self, step, metricsFile, time):
+        action = step['action']
+
+        if action == 'join':
+            return self.__join(step)
+
+        if action == 'leave':
+            return self.__leave(step)
+
+        if action == 'call':
+            return self.__call(step)
+
+        if action == 'function':
+            return self.__callFunction(step)
+
+        if action == 'metrics':
+            return self.__collectMetrics(metricsFile, time)
+
+    def __removeWrappers(self):
+        if self.mode == 'siege':
+            while sieges:
+                globals()['endSiege'](0)
+        elif virtualParticipants:
+            globals()['removeVirtualParticipants']()
+
+        self.groups = {}
 
-def setMedia(audio, video):
-    """
-    Sets the media to be started in the Talkbuchet wrappers.
+    def run(self, outputDirectory):
+        """
+        Runs the scenario and writes the results to the given directory.
 
-    By default in siege mode audio will be used, and in virtual participant
-    mode neither audio nor video will be used.
+        :param outputDirectory: the directory to write the results to; it is
+            created if needed.
+        :return: a dict with the summary of the run.
+        """
 
-    Note that audio will be used too in siege mode even if both audio and video
-    are disabled, as some media needs to be published.
+        os.makedirs(outputDirectory, exist_ok=True)
 
-    This is used only for the global helper functions and is not taken into
-    account if a Talkbuchet wrapper is manually created.
+        with open(os.path.join(outputDirectory, 'scenario.json'), 'w') as scenarioFile:
+            json.dump(self.scenario, scenarioFile, indent=4)
 
-    :param audio: True to start audio, False otherwise
-    :param video: True to start video, False otherwise
-    """
+        # The logs directory set before the run, if any, is restored once
+        # finished.
+        previousLogsDirectory = (_logsDirectory, _logsMaxFileSize, _logsBackupCount)
 
-    global _audio, _video
-    _audio = audio
-    _video = video
+        setLogsDirectory(os.path.join(outputDirectory, 'logs'))
 
+        summary = {
+            'steps': len(self.timeline),
+            'succeededSteps': 0,
+            'failedSteps': 0,
+            'maxLateness': 0,
+        }
 
-_publishersCount = None
-_subscribersPerPublisherCount = None
+        runStartTime = datetime.now().timestamp() * 1000
+        startTime = monotonic()
 
-sieges = []
+        try:
+            try:
+                if self.mode == 'siege':
+                    switchToSiegeMode()
+                else:
+                    switchToVirtualParticipantMode()
 
-def switchToSiegeMode():
-    """
-    Sets the siege mode as the active one.
+                _callSetters(self.scenario.get('settings', {}))
+            except Exception as exception:
+                print('Scenario could not be set up: ' + str(exception))
 
-    This adjusts the global helper functions to those relevant for this mode
-    (so, for example, there will be no function to add a virtual participant).
+                summary['error'] = str(exception)
 
-    A siege can be started in the following way:
-    >>>> setTarget('https://THE-NEXTCLOUD-DOMAIN')
-    >>>> setCredentials('THE-USER-ID', 'THE-APP-TOKEN')
-    >>>> setPublishersAndSubscribersCount(XXX, YYY)
-    >>>> startSiege()
+                return summary
 
-    Note that a conversation token does not need to be set, except if the server
-    is configured in conversation clustering mode.
+            with open(os.path.join(outputDirectory, 'timeline.jsonl'), 'w') as timelineFile, open(os.path.join(outputDirectory, 'metrics.jsonl'), 'w') as metricsFile:
+                for index, step in enumerate(self.timeline):
+                    # Steps are scheduled from the start of the run rather
+                    # than from the previous step, so delays do not accumulate.
+                    scheduledTime = startTime + step.get('at', 0)
+                    sleep(max(scheduledTime - monotonic(), 0))
 
-    Setting the publishers and subscribers count is not mandatory, but it is
-    recommended to adjust it based on the maximum number supported by the
-    client machine running the browser, as well as the values that need to be
-    tested on the server.
+                    stepStartTime = monotonic()
 
-    In any case, it is recommended to initially set a low number, for example
-    "setPublishersAndSubscribersCount(1, 2)", start a siege to verify that
-    everything works as expected, and then perform the real test.
+                    print('Step ' + str(index) + ' (' + step['action'] + ') at ' + str(round(stepStartTime - startTime, 1)) + ' seconds')
 
-    Note that starting a new siege does not stop the previous one. That should
-    be explicitly done by calling "endSiege()". Starting several sieges instead
-    of a single siege with a higher number of publishers and subscribers could
-    be needed in powerful client machines that can handle more connections than
-    what a single browser is able to (for example, Chromium has a hardcoded
-    limit on the maximum number of concurrent connections).
+                    record = {
+                        'step': index,
+                        'action': step['action'],
+                        'at': step.get('at', 0),
+                        'startedAt': stepStartTime - startTime,
+                        'lateness': stepStartTime - scheduledTime,
+                    }
 
-    Sieges are done with audio only connections by default. If a different media
-    needs to be used (either video but not audio, or both audio and video) this
-    needs to be specified (before starting the siege) with:
-    >>>> setMedia(CONNECT-WITH-AUDIO, CONNECT-WITH-VIDEO)
+                    if step['action'] == 'end':
+                        timelineFile.write(json.dumps(record) + '\n')
 
-    When a siege is active it is possible to check the state of the publisher
-    connections with "checkPublishersConnections()" and the state of the
-    subscriber connections with "checkSubscribersConnections()".
+                        break
 
-    Global functions for additional actions, like enabling or disabling media
-    during the siege, are not provided. They must be directly called on the
-    Talkbuchet wrapper objects in the "sieges" list. For example:
-    >>>> sieges[0].setAudioEnabled(False)
-    """
+                    try:
+                        record['result'] = _reportToJson(self.__runStep(step, metricsFile, stepStartTime - startTime))
+                        record['success'] = True
 
-    def _isValidConfiguration():
-        if not _isValidBrowser():
-            return False
+                        summary['succeededSteps'] += 1
+                    except Exception as exception:
+                        print('Step ' + str(index) + ' failed: ' + str(exception))
 
-        if not _nextcloudUrl:
-            print("Set target Nextcloud URL first")
-            return False
+                        record['error'] = str(exception)
+                        record['success'] = False
 
-        if not _user or not _appToken:
-            print("Set credentials (user and app token) first")
-            return False
+                        summary['failedSteps'] += 1
 
-        return True
+                    record['duration'] = monotonic() - stepStartTime
+                    summary['maxLateness'] = max(summary['maxLateness'], record['lateness'])
 
-    def setPublishersAndSubscribersCount(publishersCount, subscribersPerPublisherCount):
-        """
-        Sets the number of publishers and subscribers per publisher to use.
+                    timelineFile.write(json.dumps(record) + '\n')
+                    timelineFile.flush()
+        finally:
+            self.__removeWrappers()
 
-        By the default the number from Talkbuchet.js is used, which is 5
-        publishers and 40 subscribers per publisher.
+            summary['duration'] = monotonic() - startTime
 
-        This is used only for the global helper functions and is not taken into
-        account if a Talkbuchet wrapper is manually created.
+            with open(os.path.join(outputDirectory, 'events.jsonl'), 'w') as eventsFile:
+                for event in eventLog.getEvents(since=runStartTime):
+                    eventsFile.write(json.dumps(event) + '\n')
 
-        :param publishersCount: the number of publishers.
-        :param subscribersPerPublisherCount: the number of subscribers for each
-            publisher.
-        """
+            summary['eventCounters'] = eventLog.getCounters()
 
-        global _publishersCount, _subscribersPerPublisherCount
-        _publishersCount = publishersCount
-        _subscribersPerPublisherCount = subscribersPerPublisherCount
+            with open(os.path.join(outputDirectory, 'summary.json'), 'w') as summaryFile:
+                json.dump(summary, summaryFile, indent=4)
 
-    def startSiege():
-        """
-        Starts a siege.
+            setLogsDirectory(*previousLogsDirectory)
 
-        The global target Nextcloud URL and credentials need to be set first.
+        return summary
 
-        If global token, media or publishers and subscribers count were set they
-        will be applied to the siege.
 
-        Note that changing any of those values later will have no effect on a
-        running siege, the updated value will be used only on sieges started
-        after they were changed.
+def runScenario(scenarioFile, outputDirectory):
+    """
+    Runs the scenario in the given JSON or YAML file.
 
-        If there is already a running siege it will not be ended when a new one
-        is started; the new one will run along the previous one.
-        """
+    The mode is switched to the one of the scenario, and all the sieges or
+    virtual participants are removed once the run ends. See
+    :py:class:`ScenarioRunner` for the format of the scenario and the results.
 
-        if not _isValidConfiguration():
-            return
+    A scenario can be also run without the interactive mode with:
+    python3 Talkbuchet-cli.py --scenario SCENARIO-FILE --output OUTPUT-DIRECTORY
 
-        siege = Siege(_getBrowser(), _nextcloudUrl, _headless, _remoteSeleniumUrl)
+    In that case the exit status is not zero if the scenario could not be
+    loaded or set up, or if any of its steps failed.
 
-        sieges.append(siege)
+    :param scenarioFile: the path to the scenario file; YAML files (".yaml" or
+        ".yml") need PyYAML.
+    :param outputDirectory: the directory to write the results to.
+    :return: a dict with the summary of the run, or None if the scenario could
+        not be loaded.
+    """
 
-        siege.setCredentials(_user, _appToken)
+    try:
+        scenarioRunner = ScenarioRunner(_loadJsonOrYaml(scenarioFile))
+    except Exception as exception:
+        print('Scenario could not be loaded: ' + str(exception))
+        return None
 
-        if _token:
-            siege.setToken(_token)
+    return scenarioRunner.run(outputDirectory)
 
-        if _audio or _video:
-            siege.startMedia(_audio, _video)
 
-        if _publishersCount != None and _subscribersPerPublisherCount != None:
-            siege.setPublishersAndSubscribersCount(_publishersCount, _subscribersPerPublisherCount)
+def _getClientResources():
+    """
+    Returns the CPU time (in seconds) used so far by this process and its
+    current resident memory (in bytes, read from "/proc/self/statm", so None if
+    not available).
 
-        siege.siege()
+    Browsers are not included, but browserless sieges and virtual participants
+    are, as they run in this process.
+    """
 
-    def _getSiegeIndex(index = None):
-        if not sieges:
-            return -1
+    usage = resource.getrusage(resource.RUSAGE_SELF)
 
-        if index == None and len(sieges) > 1:
-            print("Index needs to be specified")
-            return -1
+    try:
+        with open('/proc/self/statm') as file:
+            rss = int(file.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        rss = None
 
-        if index == None and len(sieges) == 1:
-            index = 0
+    return {
+        'cpuTime': usage.ru_utime + usage.ru_stime,
+        'rss': rss,
+    }
 
-        if index < 0 or index >= len(sieges):
-            print("Index out of range")
-            return -1
 
-        return index
+class ClientResourcesSampler:
+    """
+    Periodically samples the resources used in the client by this process and
+    its descendants (like the local Selenium drivers and the browsers launched
+    by them) while a benchmark runs.
 
-    def checkPublishersConnections(index = None):
-        """
-        Checks the publisher connections of the siege with the given index.
+    The CPU time used by each process since the previous sample is added in
+    each sample, so the browsers that are quit during the benchmark are taken
+    into account until their last sample. Browsers launched by a remote
+    Selenium server can not be measured. The growth of the resident memory of
+    this process since the sampler was started is sampled too.
 
-        If a single siege is active the index does not need to be specified.
+    Processes are read from "/proc", so it is only available in Linux.
+    """
 
-        :param index: the index in :py:data:`sieges` of the siege to check its
-            publisher connections.
+    def __init__(self, interval = 1):
+        """
+        :param interval: the seconds between samples.
         """
 
-        index = _getSiegeIndex(index)
-        if index < 0:
-            return
+        if not os.path.exists('/proc/stat'):
+            raise Exception('"/proc" is not available')
 
-        sieges[index].checkPublishersConnections()
+        self.interval = interval
 
-    def checkSubscribersConnections(index = None):
-        """
-        Checks the subscriber connections of the siege with the given index.
+        self.cpuTime = 0
+        self.cpuUsageSamples = []
+        self.rssSamples = []
+        self.rssGrowthSamples = []
 
-        If a single siege is active the index does not need to be specified.
+        self.startRss = _getClientResources()['rss']
 
-        :param index: the index in :py:data:`sieges` of the siege to check its
-            subscriber connections.
-        """
+        self.previousTime = None
+        self.previousCpuTimes = None
 
-        index = _getSiegeIndex(index)
-        if index < 0:
-            return
+        self.stopped = threading.Event()
 
-        sieges[index].checkSubscribersConnections()
+        # A first sample is taken right away to have a reference for the CPU
+        # time in the next one.
+        self.__takeSample()
 
-    def endSiege(index = None):
+        self.thread = threading.Thread(target=self.__sampleResources, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """
+        Stops sampling the resources, taking a last sample.
         """
-        Ends the siege with the given index.
 
-        If a single siege is active the index does not need to be specified.
+        self.stopped.set()
+        self.thread.join()
 
-        :param index: the index in :py:data:`sieges` of the siege to remove.
-        """
+        self.__takeSample()
 
-        index = _getSiegeIndex(index)
-        if index < 0:
-            return
+    def __sampleResources(self):
+        while not self.stopped.wait(self.interval):
+            self.__takeSample()
 
-        sieges[index].closeConnections()
-        del sieges[index]
+    def __takeSample(self):
+        now = monotonic()
 
-    if globals()['_talkbuchetMode'] == 'virtualParticipant':
-        if removeVirtualParticipants:
-            removeVirtualParticipants()
+        processStats = _readProcessStats()
+        childrenIds = _getChildrenIds(processStats)
 
-        del globals()['prepareVirtualParticipant']
-        del globals()['prepareVirtualParticipants']
-        del globals()['startVirtualParticipants']
-        del globals()['startVirtualParticipantsParallel']
-        del globals()['stopVirtualParticipants']
-        del globals()['stopVirtualParticipantsParallel']
-        del globals()['addVirtualParticipant']
-        del globals()['addVirtualParticipants']
-        del globals()['removeVirtualParticipant']
-        del globals()['removeVirtualParticipants']
+        cpuTimes = {}
+        cpuTime = 0
+        rss = 0
 
-    if globals()['_talkbuchetMode'] == 'realParticipant':
-        if removeRealParticipants:
-            removeRealParticipants()
+        processIds = [os.getpid()]
+        while processIds:
+            processId = processIds.pop()
+            if processId not in processStats:
+                continue
 
-        del globals()['addRealParticipant']
-        del globals()['addRealParticipants']
-        del globals()['removeRealParticipant']
-        del globals()['removeRealParticipants']
+            stats = processStats[processId]
 
-    globals()['setPublishersAndSubscribersCount'] = setPublishersAndSubscribersCount
-    globals()['startSiege'] = startSiege
-    globals()['checkPublishersConnections'] = checkPublishersConnections
-    globals()['checkSubscribersConnections'] = checkSubscribersConnections
-    globals()['endSiege'] = endSiege
+            # Processes started since the previous sample used all their CPU
+            # time during the benchmark.
+            cpuTimes[processId] = stats['cpuTime']
+            if self.previousCpuTimes != None:
+                cpuTime += stats['cpuTime'] - self.previousCpuTimes.get(processId, 0)
+            rss += stats['rss']
 
-    globals()['_talkbuchetMode'] = 'siege'
+            processIds += childrenIds.get(processId, [])
 
+        if self.previousTime != None and now > self.previousTime:
+            self.cpuTime += cpuTime
+            self.cpuUsageSamples.append(cpuTime / (now - self.previousTime))
 
-virtualParticipants = []
+        self.rssSamples.append(rss)
+        self.rssGrowthSamples.append(_getClientResources()['rss'] - self.startRss)
 
-def switchToVirtualParticipantMode():
+        self.previousTime = now
+        self.previousCpuTimes = cpuTimes
+
+def _newBenchmarkMetric(value, better, samples = None, counts = None):
+    """
+    Returns a benchmark metric.
+
+    :param value: the value of the metric.
+    :param better: "lower" or "higher", whichever is better.
+    :param samples: the name of the samples in the benchmark result that the
+        metric was computed from, if any.
+    :param counts: for rates, a list with the number of events and the total
+        number of tries that the rate was computed from.
     """
-    Sets the virtual participant mode as the active one.
 
-    This adjusts the global helper functions to those relevant for this mode
-    (so, for example, there will be no function to start a siege).
+    metric = {
+        'value': value,
+        'better': better,
+    }
 
-    Virtual participants can be added to a call in the following way:
-    >>>> setTarget('https://THE-NEXTCLOUD-DOMAIN')
-    >>>> setToken('THE-CONVERSATION-TOKEN')
-    >>>> addVirtualParticipants(NUMBER-OF-VIRTUAL-PARTICIPANTS)
+    if samples:
+        metric['samples'] = samples
 
-    If no credentials are set the added participants will be guests. To add a
-    registered user (note that the same user can be added several times) set the
-    credentials first before adding the virtual participants:
-    >>>> setCredentials('THE-USER-ID', 'THE-APP-TOKEN')
+    if counts:
+        metric['counts'] = counts
 
-    If no media is explicitly set virtual participants will join without media.
-    To join with specific media set the desired type first before adding the
-    virtual participants:
-    >>>> setMedia(JOIN-WITH-AUDIO, JOIN-WITH-VIDEO)
+    return metric
 
-    Note that adding a new participant does not remove the previous ones. That
-    should be explicitly done by calling "removeVirtualParticipants()" (or
-    "removeVirtualParticipant(INDEX)" to remove just a specific participant).
-    Therefore, it is possible to add several participants with different
-    parameters (like several guests and then several users, or participants with
-    and without media) by setting the parameters, calling
-    "addVirtualParticipants(NUMBER)", setting the new parameters and calling
-    "addVirtualParticipants(NUMBER)" again.
+def _addLatencyMetrics(benchmarkResult, name, latencies):
+    """
+    Adds the given latencies (in seconds) to the samples of the benchmark
+    result, and their p50, p90 and p99 to its metrics.
+    """
 
-    In case joining/leaving a call should be tested, it makes sense to use
-    "prepareVirtualParticipant()" / "prepareVirtualParticipants(NUMBER)" and
-    then start them with "startVirtualParticipants()" and stop them with
-    "stopVirtualParticipants()". In case joining/leaving should be done in
-    parallel one can use "startVirtualParticipantsParallel()" and
-    "stopVirtualParticipantsParallel()".
+    sortedLatencies = sorted(latencies)
 
-    Global functions provided for virtual participants only cover adding and
-    removing them. Any specific action, like enabling or disabling media of a
-    virtual participant, must be directly called on the Talkbuchet wrapper
-    objects in the "virtualParticipants" list. For example:
-    >>>> virtualParticipants[0].setAudioEnabled(False)
+    benchmarkResult['samples'][name] = latencies
 
-    Note that clients may not show any nick for the virtual participants unless
-    explicitly given, even if the virtual participant is a registered user. The
-    nick for a specific virtual participant can be set with:
-    >>>> virtualParticipants[INDEX].sendNickThroughDataChannel(NICK)
+    for percentile in [50, 90, 99]:
+        benchmarkResult['metrics'][name + 'P' + str(percentile)] = _newBenchmarkMetric(_percentile(sortedLatencies, percentile), 'lower', name)
+
+
+class BenchmarkSuite:
+    """
+    Standard set of benchmarks to compare the performance of different Talk or
+    HPB versions.
+
+    The suite consists of:
+    - "siege-PxS": a siege with P publishers and S subscribers per publisher
+      for each of the siege sizes; the connection latency (from starting a
+      connection until ICE is connected), the rate of connections that were
+      not established and the sent and received throughput (during
+      "duration" seconds after all the connections were started) are
+      measured.
+    - "virtualParticipantRamp": virtual participants are added until each
+      of the ramp steps is reached; the join latency (the time to add each
+      virtual participant) and the rate of virtual participants that could not
+      be added are measured.
+    - "churn": "churnCount" virtual participants are added and then removed
+      "churnIterations" times; the join and leave latencies and the failure
+      rate are measured.
+
+    The client resources used by each benchmark are measured too: the CPU time
+    and the peak resident memory of this process and its descendants (which
+    include the browsers launched by a local Selenium server, but not those
+    launched by a remote one; see :py:class:`ClientResourcesSampler`), and the
+    growth of the resident memory of this process.
+
+    A benchmark that fails is recorded with its "error" and the rest of the
+    benchmarks are run anyway.
+
+    The benchmarks use the global settings (target, token, credentials,
+    browser, media...), which can be also set in the configuration; settings
+    specific to a mode (like "rampPolicy") are applied only in the benchmarks
+    of that mode.
+
+    The results are a dict with the configuration and, for each benchmark,
+    "metrics" (which map the name of the metric to its value and whether
+    "lower" or "higher" values are better, as well as the samples or counts
+    they were computed from) and "samples" (the individual latencies in
+    seconds, throughputs in each second, and client CPU usage and memory in
+    each second, used by "compareBenchmarkResults()" to check if a difference
+    is significant).
     """
 
-    def _isValidConfiguration():
-        if not _isValidBrowser():
-            return False
+    def __init__(self, configuration = None):
+        """
+        :param configuration: dict with "settings" (applied through the global
+            setters, like in a scenario), "siegeSizes" (list of [publishers,
+            subscribers per publisher]), "rampSteps" (list of virtual
+            participant counts), "churnCount", "churnIterations", "duration"
+            (seconds) and "benchmarks" (list with the benchmarks to run, any of
+            "siege", "virtualParticipantRamp" and "churn"); any missing value
+            uses its default.
+        """
 
-        if not _nextcloudUrl:
-            print("Set target Nextcloud URL first")
-            return False
+        configuration = dict(configuration or {})
 
-        if not _token:
-            print("Set conversation token first")
-            return False
+        configuration.setdefault('settings', {})
+        configuration.setdefault('siegeSizes', [[5, 5], [10, 10]])
+        configuration.setdefault('rampSteps', [5, 10, 20])
+        configuration.setdefault('churnCount', 5)
+        configuration.setdefault('churnIterations', 5)
+        configuration.setdefault('duration', 30)
+        configuration.setdefault('benchmarks', ['siege', 'virtualParticipantRamp', 'churn'])
 
-        return True
+        for benchmark in configuration['benchmarks']:
+            if benchmark not in ['siege', 'virtualParticipantRamp', 'churn']:
+                raise Exception('Invalid benchmark: ' + str(benchmark))
 
-    def prepareVirtualParticipant():
-        """
-        Prepares a single virtual participant.
+        self.configuration = configuration
 
-        The global target Nextcloud URL and conversation token need to be set
-        first.
+    def __checkNoWrappers(self):
+        # The benchmarks use the first siege or all the virtual participants,
+        # and remove them once finished, so other wrappers would be measured
+        # and removed too.
+        if sieges or virtualParticipants:
+            raise Exception('End the running sieges and remove the virtual participants first')
 
-        If global credentials or media were set they will be applied to the
-        virtual participant.
+    def __runSiege(self, publishersCount, subscribersPerPublisherCount):
+        self.__checkNoWrappers()
 
-        Note that changing any of those values later will have no effect on an
-        existing virtual participant, the updated value will be used only by
-        virtual participants added after they were changed.
+        switchToSiegeMode()
+        _callSetters(self.configuration['settings'], True)
+
+        globals()['setPublishersAndSubscribersCount'](publishersCount, subscribersPerPublisherCount)
+
+        throughputs = {peerType + direction: [] for peerType in ['publishers', 'subscribers'] for direction in ['Sent', 'Received']}
+
+        # The siege is added to the sieges before starting its connections, so
+        # it needs to be ended even if starting it fails.
+        try:
+            globals()['startSiege']()
+
+            if not sieges:
+                raise Exception('Siege could not be started')
+
+            siege = sieges[0]
+
+            metrics = siege.getMetrics()
+            startTime = monotonic()
 
-        This method just prepares a virtual participant, but does not start it.
-        See :py:func:`addVirtualParticipant` as an alternative.
-        """
+            # The throughput is sampled every second to have samples to check
+            # if a difference is significant.
+            previousMetrics = metrics
+            previousTime = startTime
+            endTime = startTime + self.configuration['duration']
+            while monotonic() < endTime:
+                sleep(min(1, endTime - monotonic()))
 
-        if not _isValidConfiguration():
-            return
+                currentMetrics = siege.getMetrics()
+                currentTime = monotonic()
 
-        virtualParticipant = VirtualParticipant(_getBrowser(), _nextcloudUrl, _headless, _remoteSeleniumUrl)
+                for peerType in ['publishers', 'subscribers']:
+                    for direction in ['Sent', 'Received']:
+                        throughputs[peerType + direction].append((currentMetrics[peerType]['bytes' + direction] - previousMetrics[peerType]['bytes' + direction]) / (currentTime - previousTime))
 
-        virtualParticipants.append(virtualParticipant)
+                previousMetrics = currentMetrics
+                previousTime = currentTime
 
-        virtualParticipant.setToken(_token)
+            finalMetrics = previousMetrics
+            duration = previousTime - startTime
 
-        if _user or _appToken:
-            virtualParticipant.setCredentials(_user, _appToken)
+            handshakePhases = siege.getHandshakePhases()
+            publishersSummary = siege.getPublishersConnectionsSummary()
+            subscribersSummary = siege.getSubscribersConnectionsSummary()
+        finally:
+            while sieges:
+                globals()['endSiege'](0)
 
-        if _audio or _video:
-            virtualParticipant.startMedia(_audio, _video)
+        result = {
+            'metrics': {},
+            'samples': {},
+        }
 
-        return virtualParticipant
+        # Latencies are in milliseconds in the handshake phases.
+        connectLatencies = [peerHandshakePhases['total'] / 1000 for peerType in ['publishers', 'subscribers'] for peerHandshakePhases in handshakePhases[peerType] if 'total' in peerHandshakePhases]
+        _addLatencyMetrics(result, 'connectLatency', connectLatencies)
 
-    def prepareVirtualParticipants(count):
-        """
-        Prepares as many virtual participants as the given count.
+        connectionsCount = publishersSummary['count'] + subscribersSummary['count']
+        failuresCount = connectionsCount - len(connectLatencies)
+        result['metrics']['failureRate'] = _newBenchmarkMetric(failuresCount / connectionsCount if connectionsCount else 0, 'lower', counts=[failuresCount, connectionsCount])
 
-        See :py:func:`prepareVirtualParticipant`.
+        for peerType in ['publishers', 'subscribers']:
+            for direction in ['Sent', 'Received']:
+                name = peerType + direction + 'BytesPerSecond'
+                transferredBytes = finalMetrics[peerType]['bytes' + direction] - metrics[peerType]['bytes' + direction]
 
-        :param count: the number of virtual participants to prepare.
-        """
+                result['samples'][name] = throughputs[peerType + direction]
+                result['metrics'][name] = _newBenchmarkMetric(transferredBytes / duration if duration else 0, 'higher', name)
 
-        if not _isValidConfiguration():
-            return
+        return result
 
-        for i in range(count):
-            prepareVirtualParticipant()
+    def __runVirtualParticipantRamp(self):
+        self.__checkNoWrappers()
 
-            print('.', end='', flush=True)
+        switchToVirtualParticipantMode()
+        _callSetters(self.configuration['settings'], True)
 
-        print("")
+        result = {
+            'metrics': {},
+            'samples': {},
+        }
 
-    def startVirtualParticipants():
-        """
-        Starts all virtual participants which are prepared.
+        joinLatencies = []
+        failuresCount = 0
+        requestedCount = 0
 
-        Note that there is no check if a virtual participant was already started
-        before. The result of starting again a virtual participant before
-        stopping it first is undefined, no matter if the virtual participant was
-        started with any of the "startVirtualParticipants" or
-        "addVirtualParticipant" variants.
+        try:
+            for rampStep in self.configuration['rampSteps']:
+                count = rampStep - len(virtualParticipants)
+                if count <= 0:
+                    continue
 
-        See :py:func:`prepareVirtualParticipant`.
-        """
-        for virtualParticipant in virtualParticipants:
-            virtualParticipant.startVirtualParticipant()
+                report = globals()['addVirtualParticipants'](count)
+                if not report:
+                    raise Exception('Virtual participants could not be added')
 
-    def startVirtualParticipantsParallel():
-        """
-        Starts all virtual participants.
+                joinLatencies += [creationTime for index, creationTime in report.creationTimes.items() if index not in report.failures]
+                failuresCount += len(report.failures)
+                requestedCount += count
+        finally:
+            globals()['removeVirtualParticipants']()
 
-        Same as :py:func:`startVirtualParticipants`, but starting each virtual
-        participant in parallel.
+        _addLatencyMetrics(result, 'joinLatency', joinLatencies)
+        result['metrics']['failureRate'] = _newBenchmarkMetric(failuresCount / requestedCount if requestedCount else 0, 'lower', counts=[failuresCount, requestedCount])
 
-        This method returns before the virtual participants were fully started,
-        so it should be ensured that starting them finished before starting more
-        virtual participants or stopping them.
-        """
+        return result
 
-        for virtualParticipant in virtualParticipants:
-            startThread = threading.Thread(target=virtualParticipant.startVirtualParticipant)
-            startThread.start()
+    def __runChurn(self):
+        self.__checkNoWrappers()
 
-    def stopVirtualParticipants():
-        """
-        Stops all virtual participants.
+        switchToVirtualParticipantMode()
+        _callSetters(self.configuration['settings'], True)
 
-        The participants are not removed and can be started again.
-        See :py:func:`prepareVirtualParticipant`.
+        result = {
+            'metrics': {},
+            'samples': {},
+        }
 
-        Note that there is no check if a virtual participant was started/stopped
-        before.
+        joinLatencies = []
+        leaveLatencies = []
+        failuresCount = 0
 
-        See :py:func:`prepareVirtualParticipant`.
-        """
+        try:
+            for iteration in range(self.configuration['churnIterations']):
+                report = globals()['addVirtualParticipants'](self.configuration['churnCount'])
+                if not report:
+                    raise Exception('Virtual participants could not be added')
 
-        for virtualParticipant in virtualParticipants:
-            virtualParticipant.stopVirtualParticipant()
+                joinLatencies += [creationTime for index, creationTime in report.creationTimes.items() if index not in report.failures]
+                failuresCount += len(report.failures)
 
-    def stopVirtualParticipantsParallel():
-        """
-        Stops all virtual participants.
+                while virtualParticipants:
+                    leaveStartTime = monotonic()
 
-        Same as :py:func:`stopVirtualParticipants`, but stopping each virtual
-        participant in parallel.
+                    globals()['removeVirtualParticipant'](len(virtualParticipants) - 1)
 
-        This method returns before the virtual participants were fully stopped,
-        so it should be ensured that stopping them finished before starting or
-        stopping them again.
-        """
+                    leaveLatencies.append(monotonic() - leaveStartTime)
+        finally:
+            globals()['removeVirtualParticipants']()
 
-        for virtualParticipant in virtualParticipants:
-            stopThread = threading.Thread(target=virtualParticipant.stopVirtualParticipant)
-            stopThread.start()
+        _addLatencyMetrics(result, 'joinLatency', joinLatencies)
+        _addLatencyMetrics(result, 'leaveLatency', leaveLatencies)
 
-    def addVirtualParticipant():
-        """
-        Adds a single virtual participant.
+        requestedCount = self.configuration['churnCount'] * self.configuration['churnIterations']
+        result['metrics']['failureRate'] = _newBenchmarkMetric(failuresCount / requestedCount if requestedCount else 0, 'lower', counts=[failuresCount, requestedCount])
 
-        The global target Nextcloud URL and conversation token need to be set
-        first.
+        return result
 
-        If global credentials or media were set they will be applied to the
-        virtual participant.
+    def __runBenchmark(self, name, runBenchmark, *args):
+        print('Running benchmark ' + name)
 
-        Note that changing any of those values later will have no effect on an
-        existing virtual participant, the updated value will be used only by
-        virtual participants added after they were changed.
+        clientResourcesSampler = ClientResourcesSampler()
+        startTime = monotonic()
 
-        This method prepares a participant and immediately starts it.
-        """
+        try:
+            result = runBenchmark(*args)
+        except Exception as exception:
+            print('Benchmark ' + name + ' failed: ' + str(exception))
+
+            result = {
+                'error': str(exception),
+                'metrics': {},
+                'samples': {},
+            }
+        finally:
+            clientResourcesSampler.stop()
 
-        if not _isValidConfiguration():
-            return
+        result['duration'] = monotonic() - startTime
 
-        virtualParticipant = prepareVirtualParticipant()
+        if 'error' in result:
+            return result
 
-        virtualParticipant.startVirtualParticipant()
+        result['samples']['clientCpuUsage'] = clientResourcesSampler.cpuUsageSamples
+        result['samples']['clientRss'] = clientResourcesSampler.rssSamples
+        result['samples']['clientRssGrowth'] = clientResourcesSampler.rssGrowthSamples
 
-    def addVirtualParticipants(count):
+        # The last sample was taken once the benchmark finished.
+        result['metrics']['clientCpuTime'] = _newBenchmarkMetric(clientResourcesSampler.cpuTime, 'lower', 'clientCpuUsage')
+        result['metrics']['clientPeakRss'] = _newBenchmarkMetric(max(clientResourcesSampler.rssSamples), 'lower', 'clientRss')
+        result['metrics']['clientRssGrowth'] = _newBenchmarkMetric(clientResourcesSampler.rssGrowthSamples[-1], 'lower', 'clientRssGrowth')
+
+        return result
+
+    def run(self):
         """
-        Adds as many virtual participants as the given count.
+        Runs the benchmarks.
 
-        See :py:func:`addVirtualParticipant`.
+        There must be no sieges nor virtual participants, and the mode is
+        switched as needed by each benchmark.
 
-        :param count: the number of virtual participants to add.
+        :return: a dict with the results.
         """
 
-        if not _isValidConfiguration():
-            return
+        self.__checkNoWrappers()
 
-        for i in range(count):
-            addVirtualParticipant()
+        results = {
+            'startTime': datetime.now().isoformat(),
+            'configuration': self.configuration,
+            'benchmarks': {},
+        }
 
-            print('.', end='', flush=True)
+        if 'siege' in self.configuration['benchmarks']:
+            for publishersCount, subscribersPerPublisherCount in self.configuration['siegeSizes']:
+                name = 'siege-' + str(publishersCount) + 'x' + str(subscribersPerPublisherCount)
 
-        print("")
+                results['benchmarks'][name] = self.__runBenchmark(name, self.__runSiege, publishersCount, subscribersPerPublisherCount)
 
-    def removeVirtualParticipant(index):
-        """
-        Removes the virtual participant with the given index.
+        if 'virtualParticipantRamp' in self.configuration['benchmarks']:
+            results['benchmarks']['virtualParticipantRamp'] = self.__runBenchmark('virtualParticipantRamp', self.__runVirtualParticipantRamp)
 
-        :param index: the index in :py:data:`virtualParticipants` of the virtual
-            participant to remove.
-        """
+        if 'churn' in self.configuration['benchmarks']:
+            results['benchmarks']['churn'] = self.__runBenchmark('churn', self.__runChurn)
 
-        if index < 0 or index >= len(virtualParticipants):
-            print("Index out of range")
-            return
+        return results
 
-        virtualParticipants[index].stopVirtualParticipant()
-        del virtualParticipants[index]
 
-    def removeVirtualParticipants():
-        """
-        Removes all the virtual participants previously added.
-        """
+def _mannWhitneyU(samples, otherSamples):
+    """
+    Returns the two-sided p-value of the Mann-Whitney U test of the given
+    samples, using the normal approximation with tie correction.
 
-        while virtualParticipants:
-            removeVirtualParticipant(0)
+    A low p-value means that the values of one of the samples tend to be
+    higher than those of the other.
+    """
 
-    if globals()['_talkbuchetMode'] == 'siege':
-        if endSiege:
-            endSiege()
+    n1 = len(samples)
+    n2 = len(otherSamples)
+    n = n1 + n2
 
-        del globals()['setPublishersAndSubscribersCount']
-        del globals()['startSiege']
-        del globals()['checkPublishersConnections']
-        del globals()['checkSubscribersConnections']
-        del globals()['endSiege']
+    if not n1 or not n2:
+        return 1
 
-    if globals()['_talkbuchetMode'] == 'realParticipant':
-        if removeRealParticipants:
-            removeRealParticipants()
+    values = sorted([(value, 0) for value in samples] + [(value, 1) for value in otherSamples])
 
-        del globals()['addRealParticipant']
-        del globals()['addRealParticipants']
-        del globals()['removeRealParticipant']
-        del globals()['removeRealParticipants']
+    # Tied values get the average of their ranks.
+    rankSum = 0
+    tieCorrection = 0
 
-    globals()['prepareVirtualParticipant'] = prepareVirtualParticipant
-    globals()['prepareVirtualParticipants'] = prepareVirtualParticipants
-    globals()['startVirtualParticipants'] = startVirtualParticipants
-    globals()['startVirtualParticipantsParallel'] = startVirtualParticipantsParallel
-    globals()['stopVirtualParticipants'] = stopVirtualParticipants
-    globals()['stopVirtualParticipantsParallel'] = stopVirtualParticipantsParallel
-    globals()['addVirtualParticipant'] = addVirtualParticipant
-    globals()['addVirtualParticipants'] = addVirtualParticipants
-    globals()['removeVirtualParticipant'] = removeVirtualParticipant
-    globals()['removeVirtualParticipants'] = removeVirtualParticipants
+    i = 0
+    while i < n:
+        j = i
+        while j < n and values[j][0] == values[i][0]:
+            j += 1
 
-    globals()['_talkbuchetMode'] = 'virtualParticipant'
+        averageRank = (i + 1 + j) / 2
+        rankSum += averageRank * sum(1 for value, sample in values[i:j] if sample == 0)
+        tieCorrection += (j - i) ** 3 - (j - i)
 
+        i = j
 
-realParticipants = []
+    u = rankSum - n1 * (n1 + 1) / 2
+    mean = n1 * n2 / 2
+    variance = n1 * n2 / 12 * ((n + 1) - tieCorrection / (n * (n - 1)))
 
-def switchToRealParticipantMode():
+    if variance <= 0:
+        return 1
+
+    z = (u - mean) / math.sqrt(variance)
+
+    return math.erfc(abs(z) / math.sqrt(2))
+
+def _twoProportionsZTest(counts, otherCounts):
     """
-    Sets the real participant mode as the active one.
+    Returns the two-sided p-value of the z-test of two proportions, like the
+    failure rates of two runs.
 
-    This adjusts the global helper functions to those relevant for this mode
-    (so, for example, there will be no function to start a siege).
+    :param counts: a list with the number of events and the number of tries.
+    :param otherCounts: the same for the other proportion.
+    """
 
-    Real participants can be added to a conversation in the following way:
-    >>>> setTarget('https://THE-NEXTCLOUD-DOMAIN')
-    >>>> setToken('THE-CONVERSATION-TOKEN')
-    >>>> addRealParticipants(NUMBER-OF-REAL-PARTICIPANTS)
+    events, tries = counts
+    otherEvents, otherTries = otherCounts
 
-    If no credentials are set the added participants will be guests. To add a
-    registered user (note that the same user can be added several times) set the
-    credentials first before adding the real participants:
-    >>>> setCredentials('THE-USER-ID', 'THE-APP-TOKEN')
+    if not tries or not otherTries:
+        return 1
 
-    Note that adding a new participant does not remove the previous ones. That
-    should be explicitly done by calling "removeRealParticipants()" (or
-    "removeRealParticipant(INDEX)" to remove just a specific participant).
-    Therefore, it is possible to add several participants with different
-    parameters (like several guests and then several users) by setting the
-    parameters, calling "addRealParticipants(NUMBER)", setting the new
-    parameters and calling "addRealParticipants(NUMBER)" again.
+    pooledProportion = (events + otherEvents) / (tries + otherTries)
+    variance = pooledProportion * (1 - pooledProportion) * (1 / tries + 1 / otherTries)
 
-    Global functions provided for real participants only cover joining and
-    leaving the conversation. Joining the call must be directly done on the
-    Talkbuchet wrapper objects in the "realParticipants" list with:
-    >>>> realParticipants[INDEX].joinCall()
-    """
+    if variance <= 0:
+        return 1
 
-    def _isValidConfiguration():
-        if not _isValidBrowser():
-            return False
+    z = (events / tries - otherEvents / otherTries) / math.sqrt(variance)
 
-        if not _nextcloudUrl:
-            print("Set target Nextcloud URL first")
-            return False
+    return math.erfc(abs(z) / math.sqrt(2))
 
-        if not _token:
-            print("Set conversation token first")
-            return False
+def compareBenchmarkResults(baseline, results, threshold = 0.1, significance = 0.05):
+    """
+    Compares the results of two benchmark runs.
+
+    A metric regressed if it got worse by more than the threshold (relative to
+    the baseline) and if the difference is also statistically significant, so
+    noise in a few samples is not reported as a regression. Metrics computed
+    from samples (like latencies, throughputs or client resources) are checked
+    with a Mann-Whitney U test on the samples, and rates (like failure rates)
+    with a z-test of the two proportions.
+
+    A benchmark that failed, or that is in the baseline but not in the results,
+    is always reported as a regression, with "error" as the metric.
+
+    :param baseline: the results of the baseline run.
+    :param results: the results of the run to compare.
+    :param threshold: the relative change above which a metric is considered
+        to be worse.
+    :param significance: the p-value below which a difference in the samples
+        is considered significant.
+    :return: a list with a dict for each metric in both runs with "benchmark",
+        "metric", "baseline", "value", "change" (relative to the baseline, or
+        None if the baseline is 0), "pValue" (None if it can not be checked)
+        and "regression".
+    """
 
-        return True
+    comparisons = []
+
+    for benchmark in baseline['benchmarks']:
+        if benchmark not in results['benchmarks']:
+            comparisons.append({
+                'benchmark': benchmark,
+                'metric': 'error',
+                'baseline': baseline['benchmarks'][benchmark].get('error'),
+                'value': 'missing in the results',
+                'change': None,
+                'pValue': None,
+                'regression': True,
+            })
+
+    for benchmark, benchmarkResult in results['benchmarks'].items():
+        if 'error' in benchmarkResult:
+            comparisons.append({
+                'benchmark': benchmark,
+                'metric': 'error',
+                'baseline': baseline['benchmarks'].get(benchmark, {}).get('error'),
+                'value': benchmarkResult['error'],
+                'change': None,
+                'pValue': None,
+                'regression': True,
+            })
+
+            continue
+
+        baselineResult = baseline['benchmarks'].get(benchmark)
+        if not baselineResult or 'error' in baselineResult:
+            continue
+
+        for metric, value in benchmarkResult['metrics'].items():
+            baselineValue = baselineResult['metrics'].get(metric)
+            if not baselineValue:
+                continue
 
-    def addRealParticipant():
-        """
-        Adds a single real participant.
+            difference = value['value'] - baselineValue['value']
+            if value['better'] == 'higher':
+                difference = -difference
 
-        The global target Nextcloud URL and conversation token need to be set
-        first.
+            change = None
+            if baselineValue['value']:
+                change = difference / abs(baselineValue['value'])
 
-        If global credentials were set the user will be logged in with them.
+            # Metrics are compared with the samples or counts they were
+            # computed from.
+            samplesName = value.get('samples')
 
-        Note that changing any of those values later will have no effect on an
-        existing real participant, the updated value will be used only by real
-        participants added after they were changed.
-        """
+            pValue = None
+            if samplesName in benchmarkResult['samples'] and samplesName in baselineResult['samples']:
+                pValue = _mannWhitneyU(baselineResult['samples'][samplesName], benchmarkResult['samples'][samplesName])
+            elif 'counts' in value and 'counts' in baselineValue:
+                pValue = _twoProportionsZTest(baselineValue['counts'], value['counts'])
 
-        if not _isValidConfiguration():
-            return
+            worse = difference > 0 and (change == None or change > threshold)
 
-        realParticipant = RealParticipant(_getBrowser(), _nextcloudUrl, _headless, _remoteSeleniumUrl)
+            comparisons.append({
+                'benchmark': benchmark,
+                'metric': metric,
+                'baseline': baselineValue['value'],
+                'value': value['value'],
+                'change': change,
+                'pValue': pValue,
+                'regression': worse and (pValue == None or pValue < significance),
+            })
 
-        realParticipants.append(realParticipant)
+    return comparisons
 
-        if _user or _appToken:
-            realParticipant.login(_user, _appToken)
+def runBenchmarks(resultsFile, configurationFile = None):
+    """
+    Runs the benchmark suite and writes the results to the given file.
 
-        realParticipant.joinRoom(_token)
+    The global settings (target, token, credentials, browser, media...) are
+    used by the benchmarks, unless they are overriden in the configuration.
+    See :py:class:`BenchmarkSuite` for the benchmarks and the configuration.
 
-    def addRealParticipants(count):
-        """
-        Adds as many real participants as the given count.
+    The benchmarks can be also run without the interactive mode with:
+    python3 Talkbuchet-cli.py --benchmark RESULTS-FILE [--configuration CONFIGURATION-FILE]
 
-        See :py:func:`addRealParticipant`.
+    :param resultsFile: the path of the JSON file to write the results to.
+    :param configurationFile: the path of the JSON or YAML file with the
+        configuration of the suite, if any.
+    :return: a dict with the results, or None if the configuration is not
+        valid or if there are sieges or virtual participants. The results are written even if some benchmarks failed, in
+        which case the exit status is 1 when run without the interactive mode.
+    """
 
-        :param count: the number of real participants to add.
-        """
+    try:
+        benchmarkSuite = BenchmarkSuite(_loadJsonOrYaml(configurationFile) if configurationFile else None)
+    except Exception as exception:
+        print('Benchmark configuration could not be loaded: ' + str(exception))
+        return None
 
-        if not _isValidConfiguration():
-            return
+    try:
+        results = benchmarkSuite.run()
+    except Exception as exception:
+        print('Benchmarks could not be run: ' + str(exception))
+        return None
 
-        for i in range(count):
-            addRealParticipant()
+    with open(resultsFile, 'w') as file:
+        json.dump(results, file, indent=4)
 
-            print('.', end='', flush=True)
+    return results
 
-        print("")
+def compareBenchmarks(baselineFile, resultsFile, threshold = 0.1, significance = 0.05):
+    """
+    Compares two benchmark results files and prints the differences.
 
-    def removeRealParticipant(index):
-        """
-        Removes the real participant with the given index.
+    Regressions (metrics that got worse by more than the threshold with a
+    significant difference, and failed benchmarks) are flagged. See
+    :py:func:`compareBenchmarkResults`.
 
-        :param index: the index in :py:data:`realParticipants` of the real
-            participant to remove.
-        """
+    The results can be also compared without the interactive mode with:
+    python3 Talkbuchet-cli.py --compare BASELINE-FILE RESULTS-FILE
+    in which case the exit status is 1 if there are regressions.
 
-        if index < 0 or index >= len(realParticipants):
-            print("Index out of range")
-            return
+    :param baselineFile: the path of the results file of the baseline run.
+    :param resultsFile: the path of the results file of the run to compare.
+    :return: the number of regressions.
+    """
 
-        del realParticipants[index]
+    with open(baselineFile) as file:
+        baseline = json.load(file)
 
-    def removeRealParticipants():
-        """
-        Removes all the real participants previously added.
-        """
+    with open(resultsFile) as file:
+        results = json.load(file)
 
-        while realParticipants:
-            removeRealParticipant(0)
+    comparisons = compareBenchmarkResults(baseline, results, threshold, significance)
 
-    if globals()['_talkbuchetMode'] == 'siege':
-        if endSiege:
-            endSiege()
+    for comparison in comparisons:
+        if comparison['metric'] == 'error':
+            print('REGRESSION ' + comparison['benchmark'] + ' failed: ' + comparison['value'])
+            continue
 
-        del globals()['setPublishersAndSubscribersCount']
-        del globals()['startSiege']
-        del globals()['checkPublishersConnections']
-        del globals()['checkSubscribersConnections']
-        del globals()['endSiege']
+        change = 'n/a'
+        if comparison['change'] == 0:
+            change = 'unchanged'
+        elif comparison['change'] != None:
+            change = str(round(abs(comparison['change']) * 100, 1)) + ('% worse' if comparison['change'] >= 0 else '% better')
+        pValue = '' if comparison['pValue'] == None else ' p=' + str(round(comparison['pValue'], 4))
 
-    if globals()['_talkbuchetMode'] == 'virtualParticipant':
-        if removeVirtualParticipants:
-            removeVirtualParticipants()
+        print(('REGRESSION ' if comparison['regression'] else '           ') + comparison['benchmark'] + ' ' + comparison['metric'] + ': '
+              + str(round(comparison['baseline'], 4)) + ' -> ' + str(round(comparison['value'], 4)) + ' (' + change + pValue + ')')
 
-        del globals()['prepareVirtualParticipant']
-        del globals()['prepareVirtualParticipants']
-        del globals()['startVirtualParticipants']
-        del globals()['startVirtualParticipantsParallel']
-        del globals()['stopVirtualParticipants']
-        del globals()['stopVirtualParticipantsParallel']
-        del globals()['addVirtualParticipant']
-        del globals()['addVirtualParticipants']
-        del globals()['removeVirtualParticipant']
-        del globals()['removeVirtualParticipants']
+    regressionsCount = sum(1 for comparison in comparisons if comparison['regression'])
 
-    globals()['addRealParticipant'] = addRealParticipant
-    globals()['addRealParticipants'] = addRealParticipants
-    globals()['removeRealParticipant'] = removeRealParticipant
-    globals()['removeRealParticipants'] = removeRealParticipants
+    print(str(regressionsCount) + ' regressions')
 
-    globals()['_talkbuchetMode'] = 'realParticipant'
+    return regressionsCount
 
 
 def _deleteTalkbuchetInstancesOnExit():
@@ -1784,6 +10702,17 @@ def _deleteTalkbuchetInstancesOnExit():
     while realParticipants:
         del realParticipants[0]
 
+    while signalingBenchmarks:
+        signalingBenchmarks[0].stop()
+        del signalingBenchmarks[0]
+
+    if _browserPool:
+        _browserPool.clear()
+
+    stopMetricsServer()
+    stopResourceMonitor()
+    stopPerformanceMetricsCollector()
+
 # Talkbuchet instances should be explicitly deleted before exiting, as if they
 # are implicitly deleted while exiting the Selenium driver may not cleanly quit.
 atexit.register(_deleteTalkbuchetInstancesOnExit)
@@ -1793,3 +10722,30 @@ _findDefaultBrowser()
 print('Full documentation can be shown by calling help(__name__)')
 
 switchToSiegeMode()
+
+_argumentParser = argparse.ArgumentParser(description='Command line interface for Talkbuchet.')
+_argumentParser.add_argument('--scenario', help='scenario file (JSON or YAML) to run; see help(ScenarioRunner)')
+_argumentParser.add_argument('--output', default='talkbuchet-results', help='directory to write the results of the scenario to')
+_argumentParser.add_argument('--benchmark', metavar='RESULTS-FILE', help='run the benchmark suite and write the results to the given file; see help(BenchmarkSuite)')
+_argumentParser.add_argument('--configuration', help='configuration file (JSON or YAML) of the benchmark suite')
+_argumentParser.add_argument('--compare', nargs=2, metavar=('BASELINE-FILE', 'RESULTS-FILE'), help='compare the results of two benchmark runs')
+_arguments = _argumentParser.parse_args()
+
+_failed = False
+
+if _arguments.scenario:
+    _scenarioSummary = runScenario(_arguments.scenario, _arguments.output)
+    if not _scenarioSummary or 'error' in _scenarioSummary or _scenarioSummary['failedSteps'] > 0:
+        _failed = True
+
+if _arguments.benchmark:
+    _benchmarkResults = runBenchmarks(_arguments.benchmark, _arguments.configuration)
+    if not _benchmarkResults or any('error' in result for result in _benchmarkResults['benchmarks'].values()):
+        _failed = True
+
+if _arguments.compare:
+    if compareBenchmarks(*_arguments.compare):
+        _failed = True
+
+if _failed and not sys.flags.interactive:
+    sys.exit(1)
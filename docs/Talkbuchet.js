@@ -69,7 +69,16 @@
  *   regular call with N participants you would have N publishers and N-1
  *   subscribers) by calling "setPublishersAndSubscribersCount(publishersCount,
  *   subscribersPerPublisherCount)" in the console.
+ * - By default the connections are established one after the other. To
+ *   establish several connections at the same time and/or to control the rate
+ *   at which new connections are started call "setRampPolicy({ maxInFlight:
+ *   MAX_CONNECTIONS_BEING_ESTABLISHED, arrival: ARRIVAL, ... })" in the console
+ *   (see "rampPolicy" for the supported values).
  * - Once all the needed parameters are set execute "siege()" in the console.
+ * - The number of publishers and subscribers of an active siege can be changed
+ *   without restarting it by calling "addPublishers(count)",
+ *   "removePublishers(count)", "addSubscribers(countPerPublisher)" or
+ *   "removeSubscribers(countPerPublisher)" in the console.
  * - To run it again execute "siege()" again in the console; if any parameter
  *   needs to be changed it is recommended to first stop the previous siege by
  *   calling "closeConnections()" in the console before changing the parameters.
@@ -117,6 +126,11 @@
  * there is a large number of those messages or the CPU consumption is very high
  * the client has probably reached its limit.
  *
+ * When Talkbuchet is run through Talkbuchet-cli.py the calibration can be done
+ * automatically with "calibrate()", which runs growing sieges until the
+ * connections fail or the CPU is saturated and reports the maximum number of
+ * stable connections.
+ *
  * Besides the messages written by the script itself you can manually check the
  * connection state by running the following commands in the browser console:
  * - For the publishers:
@@ -124,6 +138,27 @@
  * - For the subscribers:
  * checkSubscribersConnections()
  *
+ * With a large number of connections it is better to get just the number of
+ * connections in each state and the connections with problems (failed or
+ * disconnected by default, optionally paged) with
+ * "getPublishersConnectionsSummary(STATES, OFFSET, LIMIT)" and
+ * "getSubscribersConnectionsSummary(STATES, OFFSET, LIMIT)".
+ *
+ * Printing the full stats of a connection is not practical with a large number
+ * of connections. Instead, some fields of the stats (bytes, packets, packets
+ * lost, jitter, frames decoded and round trip time) of all the connections can
+ * be periodically sampled by calling "startStatsSampler(intervalInMs)" in the
+ * console. The samples are then taken in batches by the CLI.
+ *
+ * Similarly, the time taken by each phase of the handshake of the connections
+ * (creating the offer, receiving the answer, gathering the ICE candidates and
+ * connecting ICE) can be got by calling "getHandshakePhases()" in the console.
+ *
+ * Changes in the connection state, connection errors and disconnections that
+ * were not restored in time are also written to the console as structured
+ * events (debug messages starting with "@talkbuchet-event " followed by a JSON
+ * object), which are collected by the CLI.
+ *
  * DISCLAIMER:
  * -----------------------------------------------------------------------------
  * Talk performs some optimizations during calls, like reducing the video
@@ -179,7 +214,10 @@
  * However, note that each web browser session can execute a single virtual
  * participant. Due to this it is recommended to use Talkbuchet CLI instead to
  * easily start several web browser sessions, each one with its own virtual
- * participant, and control the virtual participants from the CLI.
+ * participant, and control the virtual participants from the CLI. The CLI can
+ * also run several virtual participants in a single browser, each one in its
+ * own window with its own cookies, to reduce the resources needed for each
+ * virtual participant.
  *
  * HOW TO RUN:
  * -----------------------------------------------------------------------------
@@ -268,6 +306,27 @@ const mediaConstraints = {
 
 let connectionWarningTimeout = 5000
 
+// How the connections of a siege are established; by default they are
+// established one after the other.
+const rampPolicy = {
+	// Maximum number of connections being established at the same time, or
+	// null for no limit.
+	maxInFlight: 1,
+	// When each connection attempt starts:
+	// - "constant": "rate" connections per second (or as fast as possible if
+	//   "rate" is 0).
+	// - "linear": the rate grows from "startRate" to "rate" connections per
+	//   second during "rampDuration" seconds, and then it stays at "rate".
+	// - "step": "stepSize" connections every "stepInterval" seconds.
+	// - "poisson": random arrivals, "rate" connections per second on average.
+	arrival: 'constant',
+	rate: 0,
+	startRate: 0,
+	rampDuration: 0,
+	stepSize: 1,
+	stepInterval: 0,
+}
+
 /*
  * End of configuration section
  */
@@ -309,13 +368,18 @@ async function getCapabilities() {
 	return capabilities.ocs.data
 }
 
-let capabilities = null
-try {
-	capabilities = await getCapabilities()
-} catch (exception) {
-	console.error('Capabilities could not be got: ' + exception)
+// The capabilities can be provided when loading the script in
+// "talkbuchetCapabilities" (for example, by the CLI, which fetches them once and
+// shares them between all the browsers) to avoid fetching them again.
+let capabilities = typeof talkbuchetCapabilities !== 'undefined' ? talkbuchetCapabilities : null
+if (!capabilities) {
+	try {
+		capabilities = await getCapabilities()
+	} catch (exception) {
+		console.error('Capabilities could not be got: ' + exception)
 
-	throw Error('Talkbuchet could not be initialized, is the current page a working Nextcloud instance?')
+		throw Error('Talkbuchet could not be initialized, is the current page a working Nextcloud instance?')
+	}
 }
 
 function extractFeatureVersion(feature) {
@@ -347,6 +411,20 @@ let joinLeaveCallUrl = talkOcsApiUrl + 'v' + conversationApiVersion + '/call/' +
 const publishers = []
 const subscribers = []
 
+// The same signaling session can be shared between subscribers to different
+// publishers, so subscribers are grouped, and each group of subscribers shares
+// a signaling session (which is created by the first subscriber of the group to
+// be started). The groups are kept while the siege is active, so subscribers to
+// publishers added later can reuse them.
+const subscriberSignalings = []
+
+// Number of connections that were not established in time or that failed after
+// being established since Talkbuchet was loaded.
+const connectionFailures = {
+	publishers: 0,
+	subscribers: 0,
+}
+
 let virtualParticipant
 
 let stream
@@ -600,6 +678,21 @@ class Signaling extends EventTarget {
 	}
 }
 
+// Prefix of the console messages with the structured events for the CLI.
+const eventMarker = '@talkbuchet-event '
+
+/**
+ * Emits a structured event.
+ *
+ * Events are written to the console as a JSON object prefixed with
+ * "eventMarker", so the CLI can receive them in real time along with the rest
+ * of the logs. Besides the given details each event has a "type" and the
+ * "time" at which it was emitted (in milliseconds since the epoch).
+ */
+function emitEvent(type, details = {}) {
+	console.debug(eventMarker + JSON.stringify({ type, time: Date.now(), ...details }))
+}
+
 /**
  * Base class for publishers and subscribers.
  *
@@ -609,16 +702,35 @@ class Signaling extends EventTarget {
  * "connect()" must be called once the signaling is already connected; this can
  * be done by waiting for "signaling.getSessionId()".
  *
- * Subclasses must set the "sessionId" attribute.
+ * Subclasses must set the "sessionId" attribute, and also the "isOfferer"
+ * attribute, which is true if the peer sends the offer and false if it sends
+ * the answer.
+ *
+ * The time at which each step of the handshake happened is recorded in
+ * "handshakeTimes" and the duration of each phase of the handshake can be got
+ * with "getHandshakePhases()".
+ *
+ * An "iceConnectionStateChange" event is emitted whenever the ICE connection
+ * state changes.
  */
 class Peer {
 	constructor(user, signalingSettings, signaling) {
 		this.signaling = signaling
 
+		this.handshakeTimes = {}
+
 		let iceServers = signalingSettings.stunservers
 		iceServers = iceServers.concat(signalingSettings.turnservers)
 
 		this.peerConnection = new RTCPeerConnection({ iceServers: iceServers })
+		this.peerConnection.addEventListener('iceconnectionstatechange', () => {
+			this.emitEvent('iceConnectionStateChange', { state: this.peerConnection.iceConnectionState })
+		})
+		this.peerConnection.addEventListener('icegatheringstatechange', () => {
+			if (this.peerConnection.iceGatheringState === 'complete') {
+				this.markHandshake('iceGatheringComplete')
+			}
+		})
 		this.peerConnection.onicecandidate = async event => {
 			const candidate = event.candidate
 
@@ -656,6 +768,7 @@ class Peer {
 	async connect() {
 		this.peerConnection.addEventListener('iceconnectionstatechange', () => {
 			if (this.peerConnection.iceConnectionState === 'connected' || this.peerConnection.iceConnectionState === 'completed') {
+				this.markHandshake('iceConnected')
 				this.connectedPromiseResolve()
 				this.connected = true
 			}
@@ -670,6 +783,65 @@ class Peer {
 		return this.connectedPromise
 	}
 
+	/**
+	 * Emits an event with the given type and details about the peer.
+	 */
+	emitEvent(type, details = {}) {
+		emitEvent(type, {
+			role: this.isOfferer ? 'publisher' : 'subscriber',
+			sessionId: this.sessionId,
+			signalingIndex: this.signalingIndex,
+			...details,
+		})
+	}
+
+	/**
+	 * Records the time at which the given step of the handshake happened.
+	 *
+	 * Only the first time is recorded; later calls for the same step (for
+	 * example, when the connection is restored after being disconnected) are
+	 * ignored.
+	 */
+	markHandshake(step) {
+		if (this.handshakeTimes[step] === undefined) {
+			this.handshakeTimes[step] = performance.now()
+		}
+	}
+
+	/**
+	 * Returns the milliseconds that each phase of the handshake took.
+	 *
+	 * The phases are "offer" (for publishers, creating the offer; for
+	 * subscribers, from requesting the offer until it is received), "answer"
+	 * (for publishers, from setting the offer until the answer is received;
+	 * for subscribers, from receiving the offer until the answer is created),
+	 * "iceGathering" (from setting the local description until all the local
+	 * candidates were gathered), "iceConnected" (from having both descriptions
+	 * until ICE is connected) and "total" (from the start until ICE is
+	 * connected).
+	 *
+	 * Phases that did not end (yet) are not included.
+	 */
+	getHandshakePhases() {
+		const times = this.handshakeTimes
+
+		const phases = {
+			offer: this.isOfferer ? times.localDescription - times.start : times.remoteDescription - times.start,
+			answer: this.isOfferer ? times.remoteDescription - times.localDescription : times.localDescription - times.remoteDescription,
+			iceGathering: times.iceGatheringComplete - times.localDescription,
+			iceConnected: this.isOfferer ? times.iceConnected - times.remoteDescription : times.iceConnected - times.localDescription,
+			total: times.iceConnected - times.start,
+		}
+
+		Object.keys(phases).forEach(phase => {
+			if (isNaN(phases[phase])) {
+				delete phases[phase]
+			}
+		})
+
+		return phases
+	}
+
 	send(type, data) {
 		this.signaling.sendMessage({
 			to: this.sessionId,
@@ -692,6 +864,8 @@ class Publisher extends Peer {
 	constructor(user, signalingSettings, signaling, stream) {
 		super(user, signalingSettings, signaling)
 
+		this.isOfferer = true
+
 		stream.getTracks().forEach(track => {
 			this.peerConnection.addTrack(track, stream)
 		})
@@ -700,6 +874,8 @@ class Publisher extends Peer {
 			const message = event.detail
 
 			if (message.data.type === 'answer') {
+				this.markHandshake('remoteDescription')
+
 				const answer = message.data.payload
 				this.peerConnection.setRemoteDescription(answer)
 			}
@@ -709,7 +885,12 @@ class Publisher extends Peer {
 	async connect() {
 		this.sessionId = await this.signaling.getSessionId()
 
+		this.markHandshake('start')
+
 		const offer = await this.peerConnection.createOffer({ offerToReceiveAudio: 0, offerToReceiveVideo: 0 })
+
+		this.markHandshake('localDescription')
+
 		await this.peerConnection.setLocalDescription(offer)
 
 		this.send('offer', offer)
@@ -739,15 +920,21 @@ class Subscriber extends Peer {
 		super(user, signalingSettings, signaling)
 
 		this.sessionId = publisherSessionId
+		this.isOfferer = false
 
 		this.signaling.addEventListener('message', async event => {
 			const message = event.detail
 
 			if (message.data.type === 'offer' && message.data.from === this.sessionId) {
+				this.markHandshake('remoteDescription')
+
 				const offer = message.data.payload
 				await this.peerConnection.setRemoteDescription(offer)
 
 				const answer = await this.peerConnection.createAnswer()
+
+				this.markHandshake('localDescription')
+
 				await this.peerConnection.setLocalDescription(answer)
 
 				this.send('answer', answer)
@@ -756,14 +943,99 @@ class Subscriber extends Peer {
 	}
 
 	async connect() {
+		this.markHandshake('start')
+
 		this.signaling.sendRequestOffer(this.sessionId)
 
 		return super.connect()
 	}
 }
 
-function listenToPublisherConnectionChanges() {
-	Object.values(publishers).forEach(publisher => {
+/**
+ * Returns the time, in milliseconds since the first one, at which each of the
+ * given number of connection attempts should start according to the ramp
+ * policy.
+ */
+function getRampArrivalTimes(count) {
+	const arrivalTimes = []
+
+	let arrivalTime = 0
+	for (let i = 0; i < count; i++) {
+		if (rampPolicy.arrival === 'constant') {
+			arrivalTime = rampPolicy.rate ? i * 1000 / rampPolicy.rate : 0
+		} else if (rampPolicy.arrival === 'linear') {
+			// Connections started until "t" are "startRate * t + (rate -
+			// startRate) * t^2 / (2 * rampDuration)" during the ramp, so the
+			// quadratic equation is solved to get when "i" connections were
+			// started.
+			const rampConnections = (rampPolicy.startRate + rampPolicy.rate) * rampPolicy.rampDuration / 2
+			const acceleration = (rampPolicy.rate - rampPolicy.startRate) / (2 * rampPolicy.rampDuration)
+			if (i >= rampConnections) {
+				arrivalTime = (rampPolicy.rampDuration + (i - rampConnections) / rampPolicy.rate) * 1000
+			} else if (!acceleration) {
+				arrivalTime = i * 1000 / rampPolicy.rate
+			} else {
+				arrivalTime = (-rampPolicy.startRate + Math.sqrt(rampPolicy.startRate * rampPolicy.startRate + 4 * acceleration * i)) / (2 * acceleration) * 1000
+			}
+		} else if (rampPolicy.arrival === 'step') {
+			arrivalTime = Math.floor(i / rampPolicy.stepSize) * rampPolicy.stepInterval * 1000
+		} else if (rampPolicy.arrival === 'poisson' && i > 0) {
+			arrivalTime += -Math.log(1 - Math.random()) * 1000 / rampPolicy.rate
+		}
+
+		arrivalTimes.push(arrivalTime)
+	}
+
+	return arrivalTimes
+}
+
+/**
+ * Calls "connect(i)" for each of the given number of connections following the
+ * ramp policy.
+ *
+ * "connect" must be an async function; the returned promise is fulfilled once
+ * all the connection attempts ended.
+ */
+async function runWithRampPolicy(count, connect) {
+	const arrivalTimes = getRampArrivalTimes(count)
+	const maxInFlight = rampPolicy.maxInFlight || Infinity
+
+	let inFlight = 0
+	const waitingForSlot = []
+
+	const connectionAttempts = []
+
+	const startTime = performance.now()
+	for (let i = 0; i < count; i++) {
+		const delay = startTime + arrivalTimes[i] - performance.now()
+		if (delay > 0) {
+			await new Promise(resolve => setTimeout(resolve, delay))
+		}
+
+		while (inFlight >= maxInFlight) {
+			await new Promise(resolve => waitingForSlot.push(resolve))
+		}
+
+		inFlight++
+
+		connectionAttempts.push((async () => {
+			try {
+				await connect(i)
+			} finally {
+				inFlight--
+
+				if (waitingForSlot.length) {
+					waitingForSlot.shift()()
+				}
+			}
+		})())
+	}
+
+	await Promise.all(connectionAttempts)
+}
+
+function listenToPublisherConnectionChanges(publishersToListen = Object.values(publishers)) {
+	publishersToListen.forEach(publisher => {
 		publisher.peerConnection.addEventListener('iceconnectionstatechange', event => {
 			if (publisher.peerConnection.iceConnectionState === 'connected'
 					|| publisher.peerConnection.iceConnectionState === 'completed') {
@@ -778,24 +1050,36 @@ function listenToPublisherConnectionChanges() {
 				// relevant if the connection has not been restored after some
 				// seconds.
 				publisher.connectionWarning = setTimeout(() => {
+					publisher.emitEvent('disconnectWarning')
+
 					console.warn('Publisher disconnected', publisher.sessionId)
 				}, connectionWarningTimeout)
 			} else if (publisher.peerConnection.iceConnectionState === 'failed') {
+				connectionFailures.publishers++
+
 				console.warn('Publisher connection failed', publisher.sessionId)
 			}
 		})
 	})
 }
 
-async function initPublishers() {
-	for (let i = 0; i < publishersCount; i++) {
+/**
+ * Starts the given number of publishers following the ramp policy.
+ *
+ * Returns the publishers that were started.
+ */
+async function startPublishers(count) {
+	const startedPublishers = []
+	let startedCount = 0
+
+	await runWithRampPolicy(count, async i => {
 		let signalingSettings = null
 		try {
 			signalingSettings = await getSignalingSettings(user, appToken, token)
 		} catch (exception) {
 			console.error('Publisher ' + i + ' get signaling settings error: ' + exception)
 
-			continue
+			return
 		}
 
 		let signaling = null
@@ -804,7 +1088,7 @@ async function initPublishers() {
 		} catch (exception) {
 			console.error('Publisher ' + i + ' init error: ' + exception)
 
-			continue
+			return
 		}
 
 		const [publisherSessionId, publisher] = await newPublisher(signalingSettings, signaling, stream)
@@ -812,23 +1096,36 @@ async function initPublishers() {
 		try {
 			await publisher.connect()
 
-			if ((i + 1) % 5 === 0 && (i + 1) < publishersCount) {
-				console.info('Publisher started (' + (i + 1) + '/' + publishersCount + ')')
+			startedCount++
+
+			if (startedCount % 5 === 0 && startedCount < count) {
+				console.info('Publisher started (' + startedCount + '/' + count + ')')
 			}
 		} catch (exception) {
+			connectionFailures.publishers++
+
+			publisher.emitEvent('connectionError', { error: String(exception) })
+
 			console.warn('Publisher ' + i + ' error: ' + exception)
 		}
 
 		publishers[publisherSessionId] = publisher
-	}
+		startedPublishers.push(publisher)
+	})
 
-	console.info('Publishers started the siege')
+	listenToPublisherConnectionChanges(startedPublishers)
 
-	listenToPublisherConnectionChanges()
+	return startedPublishers
 }
 
-function listenToSubscriberConnectionChanges() {
-	subscribers.forEach(subscriber => {
+async function initPublishers() {
+	await startPublishers(publishersCount)
+
+	console.info('Publishers started the siege')
+}
+
+function listenToSubscriberConnectionChanges(subscribersToListen = subscribers) {
+	subscribersToListen.forEach(subscriber => {
 		subscriber.peerConnection.addEventListener('iceconnectionstatechange', event => {
 			if (subscriber.peerConnection.iceConnectionState === 'connected'
 					|| subscriber.peerConnection.iceConnectionState === 'completed') {
@@ -843,61 +1140,309 @@ function listenToSubscriberConnectionChanges() {
 				// relevant if the connection has not been restored after some
 				// seconds.
 				subscriber.connectionWarning = setTimeout(() => {
+					subscriber.emitEvent('disconnectWarning')
+
 					console.warn('Subscriber disconnected', subscriber.sessionId)
 				}, connectionWarningTimeout)
 			} else if (subscriber.peerConnection.iceConnectionState === 'failed') {
+				connectionFailures.subscribers++
+
 				console.warn('Subscriber connection failed', subscriber.sessionId)
 			}
 		})
 	})
 }
 
-async function initSubscribers() {
-	for (let i = 0; i < subscribersPerPublisherCount; i++) {
-		// The same signaling session can be shared between subscribers to
-		// different publishers.
-		let signalingSettings = null
-		try {
-			signalingSettings = await getSignalingSettings(user, appToken, token)
-		} catch (exception) {
-			console.error('Subscriber ' + i + ' get signaling settings error: ' + exception)
+function getSubscriberSignaling(signalingIndex) {
+	if (subscriberSignalings[signalingIndex] === undefined) {
+		subscriberSignalings[signalingIndex] = (async () => {
+			let signalingSettings = null
+			try {
+				signalingSettings = await getSignalingSettings(user, appToken, token)
+			} catch (exception) {
+				console.error('Subscriber ' + signalingIndex + ' get signaling settings error: ' + exception)
+
+				return null
+			}
+
+			let signaling = null
+			try {
+				signaling = new Signaling(user, signalingSettings)
+			} catch (exception) {
+				console.error('Subscriber ' + signalingIndex + ' init error: ' + exception)
+
+				return null
+			}
+
+			await signaling.getSessionId()
+
+			return [signalingSettings, signaling]
+		})()
+	}
+
+	return subscriberSignalings[signalingIndex]
+}
+
+/**
+ * Starts a subscriber to each of the given publishers in each of the given
+ * subscriber groups following the ramp policy.
+ *
+ * Returns the subscribers that were started.
+ */
+async function startSubscribers(signalingIndexes, publisherSessionIds) {
+	const startedSubscribers = []
 
-			continue
+	const count = signalingIndexes.length * publisherSessionIds.length
+	let startedCount = 0
+
+	await runWithRampPolicy(count, async i => {
+		const signalingIndex = signalingIndexes[Math.floor(i / publisherSessionIds.length)]
+
+		const signalingSettingsAndSignaling = await getSubscriberSignaling(signalingIndex)
+		if (!signalingSettingsAndSignaling) {
+			return
 		}
 
-		let signaling = null
+		const [signalingSettings, signaling] = signalingSettingsAndSignaling
+
+		const subscriber = new Subscriber(user, signalingSettings, signaling, publisherSessionIds[i % publisherSessionIds.length])
+		subscriber.signalingIndex = signalingIndex
+
+		subscribers.push(subscriber)
+		startedSubscribers.push(subscriber)
+
 		try {
-			signaling = new Signaling(user, signalingSettings)
+			await subscriber.connect()
+
+			startedCount++
+
+			if (startedCount % 5 === 0 && startedCount < count) {
+				console.info('Subscriber started (' + startedCount + '/' + count + ')')
+			}
 		} catch (exception) {
-			console.error('Subscriber ' + i + ' init error: ' + exception)
+			connectionFailures.subscribers++
+
+			subscriber.emitEvent('connectionError', { error: String(exception) })
 
-			continue
+			console.warn('Subscriber ' + subscribers.indexOf(subscriber) + ' error: ' + exception)
 		}
+	})
 
-		await signaling.getSessionId()
+	listenToSubscriberConnectionChanges(startedSubscribers)
+
+	return startedSubscribers
+}
+
+async function initSubscribers() {
+	await startSubscribers([...Array(subscribersPerPublisherCount).keys()], Object.keys(publishers))
+
+	console.info('Subscribers started the siege')
+}
+
+function closeSubscriber(subscriber) {
+	clearTimeout(subscriber.connectionWarning)
 
-		Object.keys(publishers).forEach(async publisherSessionId => {
-			const subscriber = new Subscriber(user, signalingSettings, signaling, publisherSessionId)
+	subscriber.peerConnection.close()
 
-			subscribers.push(subscriber)
+	subscribers.splice(subscribers.indexOf(subscriber), 1)
+}
+
+/**
+ * Returns the bytes of the given typed array encoded as a base64 string.
+ */
+function typedArrayToBase64(typedArray) {
+	const bytes = new Uint8Array(typedArray.buffer, typedArray.byteOffset, typedArray.byteLength)
+
+	// Converted in chunks, as there is a limit in the number of arguments that
+	// can be passed to a function.
+	let binary = ''
+	for (let i = 0; i < bytes.length; i += 0x8000) {
+		binary += String.fromCharCode.apply(null, bytes.subarray(i, i + 0x8000))
+	}
+
+	return btoa(binary)
+}
+
+// Fields of the stats of each connection kept by the stats sampler.
+const statsSamplerFields = ['bytesSent', 'packetsSent', 'bytesReceived', 'packetsReceived', 'packetsLost', 'jitter', 'framesDecoded', 'roundTripTime']
+
+/**
+ * Helper class to periodically sample the stats of the siege connections.
+ *
+ * Only a few fields of the stats of each connection are kept (the counters of
+ * all the RTP streams of the connection are added up, and the maximum jitter
+ * and round trip time are kept), and they are stored in typed arrays used as a
+ * ring buffer. Therefore the samples of thousands of connections can be kept
+ * without flooding the console and using much memory.
+ *
+ * Each connection is given a numeric ID when sampled for the first time. The
+ * samples are taken in batches with "takeBatch()", which returns the columns
+ * encoded as base64 strings of the typed arrays and the IDs of the connections
+ * seen since the previous batch. If the ring buffer becomes full before the
+ * samples are taken the oldest samples are overwritten; the number of dropped
+ * samples is returned in the next batch.
+ */
+class StatsSampler {
+	constructor(capacity) {
+		this.capacity = capacity
+
+		this.timestamps = new Float64Array(capacity)
+		this.connectionIds = new Uint32Array(capacity)
+		this.values = {}
+		statsSamplerFields.forEach(field => {
+			this.values[field] = new Float64Array(capacity)
 		})
+
+		this.first = 0
+		this.count = 0
+		this.droppedCount = 0
+
+		this.peerConnectionIds = new WeakMap()
+		this.nextConnectionId = 0
+		this.newConnections = {}
+
+		this.interval = null
+		this.sampling = false
 	}
 
-	for (let i = 0; i < subscribers.length; i++) {
-		try {
-			await subscribers[i].connect()
+	start(interval) {
+		this.stop()
 
-			if ((i + 1) % 5 === 0 && (i + 1) < subscribers.length) {
-				console.info('Subscriber started (' + (i + 1) + '/' + subscribers.length + ')')
+		this.interval = setInterval(async () => {
+			// Skip the sample if the previous one has not finished yet.
+			if (this.sampling) {
+				return
 			}
-		} catch (exception) {
-			console.warn('Subscriber ' + i + ' error: ' + exception)
+
+			this.sampling = true
+
+			try {
+				await this.sample()
+			} finally {
+				this.sampling = false
+			}
+		}, interval)
+	}
+
+	stop() {
+		clearInterval(this.interval)
+		this.interval = null
+	}
+
+	getConnectionId(peer, label) {
+		if (!this.peerConnectionIds.has(peer)) {
+			this.peerConnectionIds.set(peer, this.nextConnectionId)
+			this.newConnections[this.nextConnectionId] = label
+			this.nextConnectionId++
 		}
+
+		return this.peerConnectionIds.get(peer)
 	}
 
-	console.info('Subscribers started the siege')
+	async sample() {
+		const peersAndLabels = []
+		Object.values(publishers).forEach(publisher => {
+			peersAndLabels.push([publisher, 'publisher ' + publisher.sessionId])
+		})
+		subscribers.forEach(subscriber => {
+			peersAndLabels.push([subscriber, 'subscriber ' + subscriber.signalingIndex + ' ' + subscriber.sessionId])
+		})
+
+		const timestamp = Date.now()
+
+		await Promise.all(peersAndLabels.map(async ([peer, label]) => {
+			let stats = null
+			try {
+				stats = await peer.peerConnection.getStats()
+			} catch (exception) {
+				return
+			}
+
+			const values = {}
+			statsSamplerFields.forEach(field => {
+				values[field] = NaN
+			})
+
+			const add = (field, value) => {
+				if (value !== undefined) {
+					values[field] = (isNaN(values[field]) ? 0 : values[field]) + value
+				}
+			}
+			const max = (field, value) => {
+				if (value !== undefined) {
+					values[field] = isNaN(values[field]) ? value : Math.max(values[field], value)
+				}
+			}
+
+			for (const stat of stats.values()) {
+				if (stat.type === 'outbound-rtp') {
+					add('bytesSent', stat.bytesSent)
+					add('packetsSent', stat.packetsSent)
+				} else if (stat.type === 'inbound-rtp') {
+					add('bytesReceived', stat.bytesReceived)
+					add('packetsReceived', stat.packetsReceived)
+					add('packetsLost', stat.packetsLost)
+					add('framesDecoded', stat.framesDecoded)
+					max('jitter', stat.jitter)
+				} else if (stat.type === 'remote-inbound-rtp') {
+					max('roundTripTime', stat.roundTripTime)
+				} else if (stat.type === 'candidate-pair' && stat.nominated) {
+					max('roundTripTime', stat.currentRoundTripTime)
+				}
+			}
+
+			this.push(timestamp, this.getConnectionId(peer, label), values)
+		}))
+	}
+
+	push(timestamp, connectionId, values) {
+		const index = (this.first + this.count) % this.capacity
+		if (this.count === this.capacity) {
+			this.first = (this.first + 1) % this.capacity
+			this.droppedCount++
+		} else {
+			this.count++
+		}
+
+		this.timestamps[index] = timestamp
+		this.connectionIds[index] = connectionId
+		statsSamplerFields.forEach(field => {
+			this.values[field][index] = values[field]
+		})
+	}
+
+	takeBatch(maxCount = Infinity) {
+		const count = Math.min(this.count, maxCount)
 
-	listenToSubscriberConnectionChanges()
+		// Copies the oldest samples in the ring buffer to a new typed array.
+		const take = typedArray => {
+			const taken = new typedArray.constructor(count)
+			const firstPartCount = Math.min(count, this.capacity - this.first)
+			taken.set(typedArray.subarray(this.first, this.first + firstPartCount))
+			taken.set(typedArray.subarray(0, count - firstPartCount), firstPartCount)
+
+			return typedArrayToBase64(taken)
+		}
+
+		const batch = {
+			count,
+			droppedCount: this.droppedCount,
+			connections: this.newConnections,
+			timestamp: take(this.timestamps),
+			connection: take(this.connectionIds),
+			values: {},
+		}
+		statsSamplerFields.forEach(field => {
+			batch.values[field] = take(this.values[field])
+		})
+
+		this.first = (this.first + count) % this.capacity
+		this.count -= count
+		this.droppedCount = 0
+		this.newConnections = {}
+
+		return batch
+	}
 }
 
 // Expose publishers to CLI.
@@ -915,6 +1460,7 @@ const closeConnections = function() {
 		subscriber.peerConnection.close()
 	})
 	subscribers.splice(0)
+	subscriberSignalings.splice(0)
 
 	Object.values(publishers).forEach(publisher => {
 		publisher.peerConnection.close()
@@ -1041,6 +1587,59 @@ const checkSubscribersConnections = function() {
 	console.info('  - Failed: ' + (iceConnectionStateCount['failed'] ?? 0))
 }
 
+/**
+ * Returns a compact summary of the state of the given connections.
+ *
+ * Rather than the state of every connection only the number of connections in
+ * each ICE connection state is returned, as well as the details of the
+ * connections in any of the given states (by default, those with problems).
+ * The connections in the given states are paged with "offset" and "limit".
+ *
+ * "connections" is a list of [details, peer] pairs.
+ */
+function getConnectionsSummary(connections, states, offset, limit) {
+	const summary = {
+		count: connections.length,
+		iceConnectionStates: {},
+		matchingCount: 0,
+		matchingConnections: [],
+	}
+
+	connections.forEach(([details, peer]) => {
+		const iceConnectionState = peer.peerConnection.iceConnectionState
+
+		summary.iceConnectionStates[iceConnectionState] = (summary.iceConnectionStates[iceConnectionState] ?? 0) + 1
+
+		if (!states.includes(iceConnectionState)) {
+			return
+		}
+
+		if (summary.matchingCount >= offset && summary.matchingConnections.length < limit) {
+			summary.matchingConnections.push({ ...details, state: iceConnectionState })
+		}
+
+		summary.matchingCount++
+	})
+
+	return summary
+}
+
+const getPublishersConnectionsSummary = function(states = ['failed', 'disconnected'], offset = 0, limit = 100) {
+	const connections = Object.keys(publishers).map(publisherSessionId => {
+		return [{ sessionId: publisherSessionId }, publishers[publisherSessionId]]
+	})
+
+	return getConnectionsSummary(connections, states, offset, limit)
+}
+
+const getSubscribersConnectionsSummary = function(states = ['failed', 'disconnected'], offset = 0, limit = 100) {
+	const connections = subscribers.map((subscriber, index) => {
+		return [{ index, sessionId: subscriber.sessionId, signalingIndex: subscriber.signalingIndex }, subscriber]
+	})
+
+	return getConnectionsSummary(connections, states, offset, limit)
+}
+
 const printPublisherStats = async function(publisherSessionId, stringify = false) {
 	if (!(publisherSessionId in publishers)) {
 		console.error('Invalid publisher session ID')
@@ -1077,6 +1676,99 @@ const printSubscriberStats = async function(index, stringify = false) {
 	}
 }
 
+let statsSampler = null
+
+const startStatsSampler = function(interval = 1000, capacity = 100000) {
+	if (statsSampler) {
+		statsSampler.stop()
+	}
+
+	statsSampler = new StatsSampler(capacity)
+	statsSampler.start(interval)
+}
+
+const stopStatsSampler = function() {
+	if (!statsSampler) {
+		console.error('Stats sampler was not started')
+
+		return
+	}
+
+	statsSampler.stop()
+}
+
+const takeStatsSamples = function(maxCount = Infinity) {
+	if (!statsSampler) {
+		console.error('Stats sampler was not started')
+
+		return null
+	}
+
+	return statsSampler.takeBatch(maxCount)
+}
+
+/**
+ * Returns the phases of the handshake of each publisher and subscriber.
+ *
+ * See "Peer.getHandshakePhases()".
+ */
+const getHandshakePhases = function() {
+	return {
+		publishers: Object.values(publishers).map(publisher => publisher.getHandshakePhases()),
+		subscribers: subscribers.map(subscriber => subscriber.getHandshakePhases()),
+	}
+}
+
+/**
+ * Returns the state of the connections, meant to be periodically collected to
+ * monitor long runs.
+ *
+ * For publishers and subscribers the number of connections in each ICE
+ * connection state, the number of connection failures and the bytes sent and
+ * received by the current connections are returned, as well as the phases of
+ * the handshake of each connection and whether the virtual participant is
+ * started.
+ */
+const getMetrics = async function() {
+	const getPeersMetrics = async (peers, peersConnectionFailures) => {
+		const peersMetrics = {
+			iceConnectionStates: {},
+			connectionFailures: peersConnectionFailures,
+			bytesSent: 0,
+			bytesReceived: 0,
+		}
+
+		await Promise.all(peers.map(async peer => {
+			const iceConnectionState = peer.peerConnection.iceConnectionState
+			peersMetrics.iceConnectionStates[iceConnectionState] = (peersMetrics.iceConnectionStates[iceConnectionState] ?? 0) + 1
+
+			let stats = null
+			try {
+				stats = await peer.peerConnection.getStats()
+			} catch (exception) {
+				return
+			}
+
+			for (const stat of stats.values()) {
+				if (stat.type === 'outbound-rtp') {
+					peersMetrics.bytesSent += stat.bytesSent ?? 0
+				} else if (stat.type === 'inbound-rtp') {
+					peersMetrics.bytesReceived += stat.bytesReceived ?? 0
+				}
+			}
+		}))
+
+		return peersMetrics
+	}
+
+	return {
+		publishers: await getPeersMetrics(Object.values(publishers), connectionFailures.publishers),
+		subscribers: await getPeersMetrics(subscribers, connectionFailures.subscribers),
+		handshakePhases: getHandshakePhases(),
+		virtualParticipantStarted: virtualParticipant ? true : false,
+	}
+}
+
 const setCredentials = function(userToSet, appTokenToSet) {
 	user = userToSet
 	appToken = appTokenToSet
@@ -1117,6 +1809,122 @@ const setConnectionWarningTimeout = function(connectionWarningTimeoutToSet) {
 	connectionWarningTimeout = connectionWarningTimeoutToSet
 }
 
+const setRampPolicy = function(rampPolicyToSet) {
+	// The new values are validated along with the current ones, as they can be
+	// set independently.
+	const newRampPolicy = Object.assign({}, rampPolicy, rampPolicyToSet)
+
+	if (!['constant', 'linear', 'step', 'poisson'].includes(newRampPolicy.arrival)) {
+		console.error('Invalid arrival: ' + newRampPolicy.arrival)
+
+		return
+	}
+
+	if (newRampPolicy.maxInFlight !== null && !(Number.isInteger(newRampPolicy.maxInFlight) && newRampPolicy.maxInFlight >= 1)) {
+		console.error('Invalid maxInFlight, it must be at least 1 (or null for no limit): ' + newRampPolicy.maxInFlight)
+
+		return
+	}
+
+	for (const parameter of ['rate', 'startRate', 'rampDuration', 'stepInterval']) {
+		if (!(newRampPolicy[parameter] >= 0)) {
+			console.error('Invalid ' + parameter + ', it can not be negative: ' + newRampPolicy[parameter])
+
+			return
+		}
+	}
+
+	if (['linear', 'poisson'].includes(newRampPolicy.arrival) && newRampPolicy.rate <= 0) {
+		console.error('A rate is needed for ' + newRampPolicy.arrival + ' arrival')
+
+		return
+	}
+
+	if (newRampPolicy.arrival === 'step' && !(Number.isInteger(newRampPolicy.stepSize) && newRampPolicy.stepSize >= 1)) {
+		console.error('Step size must be at least 1')
+
+		return
+	}
+
+	Object.assign(rampPolicy, newRampPolicy)
+}
+
+/**
+ * Adds publishers to the active siege.
+ *
+ * Like in a real call, the existing subscriber groups also subscribe to the new
+ * publishers, so the number of subscribers per publisher does not change.
+ */
+const addPublishers = async function(count) {
+	const startedPublishers = await startPublishers(count)
+
+	publishersCount += count
+
+	await startSubscribers([...Array(subscribersPerPublisherCount).keys()], startedPublishers.map(publisher => publisher.sessionId))
+
+	console.info('Added ' + startedPublishers.length + ' publishers to the siege')
+}
+
+/**
+ * Removes the given number of publishers (the last ones added) from the active
+ * siege, as well as the subscribers to them.
+ */
+const removePublishers = function(count) {
+	const publisherSessionIds = Object.keys(publishers).slice(Math.max(Object.keys(publishers).length - count, 0))
+
+	publisherSessionIds.forEach(publisherSessionId => {
+		subscribers.filter(subscriber => subscriber.sessionId === publisherSessionId).forEach(closeSubscriber)
+
+		const publisher = publishers[publisherSessionId]
+
+		clearTimeout(publisher.connectionWarning)
+
+		publisher.peerConnection.close()
+		publisher.signaling.socket.close()
+
+		delete publishers[publisherSessionId]
+	})
+
+	publishersCount = Math.max(publishersCount - count, 0)
+
+	console.info('Removed ' + publisherSessionIds.length + ' publishers from the siege')
+}
+
+/**
+ * Adds the given number of subscribers for each publisher to the active siege.
+ */
+const addSubscribers = async function(count) {
+	const signalingIndexes = [...Array(count).keys()].map(i => subscribersPerPublisherCount + i)
+
+	subscribersPerPublisherCount += count
+
+	const startedSubscribers = await startSubscribers(signalingIndexes, Object.keys(publishers))
+
+	console.info('Added ' + startedSubscribers.length + ' subscribers to the siege')
+}
+
+/**
+ * Removes the given number of subscribers for each publisher (the last ones
+ * added) from the active siege.
+ */
+const removeSubscribers = function(count) {
+	const remainingSubscribersPerPublisherCount = Math.max(subscribersPerPublisherCount - count, 0)
+
+	const subscribersToRemove = subscribers.filter(subscriber => subscriber.signalingIndex >= remainingSubscribersPerPublisherCount)
+	subscribersToRemove.forEach(closeSubscriber)
+
+	subscriberSignalings.splice(remainingSubscribersPerPublisherCount).forEach(async subscriberSignaling => {
+		const signalingSettingsAndSignaling = await subscriberSignaling
+		if (signalingSettingsAndSignaling) {
+			signalingSettingsAndSignaling[1].socket.close()
+		}
+	})
+
+	subscribersPerPublisherCount = remainingSubscribersPerPublisherCount
+
+	console.info('Removed ' + subscribersToRemove.length + ' subscribers from the siege')
+}
+
 const siege = async function() {
 	if (!user || !appToken) {
 		console.error('Credentials (user and appToken) are not set')
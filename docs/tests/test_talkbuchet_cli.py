@@ -0,0 +1,395 @@
+#
+# SPDX-FileCopyrightText: 2026 Nextcloud GmbH and Nextcloud contributors
+# SPDX-License-Identifier: AGPL-3.0-or-later
+#
+
+"""
+Unit tests for the helpers of Talkbuchet-cli.py that do not need a browser nor
+a Nextcloud instance.
+
+Run them with "python -m pytest docs/tests".
+"""
+
+import importlib.util
+import math
+import os
+import random
+import sys
+
+from pathlib import Path
+
+import pytest
+
+
+@pytest.fixture(scope='module')
+def talkbuchet():
+    """
+    Loads Talkbuchet-cli.py as a module.
+
+    The script parses the command line arguments when loaded, so it is loaded
+    without arguments, and from its own directory, like when it is run.
+    """
+
+    docsDirectory = Path(__file__).resolve().parent.parent
+
+    previousArguments = sys.argv
+    previousDirectory = os.getcwd()
+
+    sys.argv = ['Talkbuchet-cli.py']
+    os.chdir(docsDirectory)
+
+    try:
+        spec = importlib.util.spec_from_file_location('talkbuchet_cli', docsDirectory / 'Talkbuchet-cli.py')
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+    finally:
+        sys.argv = previousArguments
+        os.chdir(previousDirectory)
+
+    return module
+
+
+class TestLatencyHistogram:
+
+    def testEmpty(self, talkbuchet):
+        histogram = talkbuchet.LatencyHistogram()
+
+        assert histogram.count == 0
+        assert histogram.getValueAtPercentile(50) == 0
+        assert histogram.getCountAtOrBelow(100) == 0
+        assert histogram.getPercentiles() == {'p50': 0, 'p90': 0, 'p99': 0, 'max': 0}
+
+    def testPercentilesHaveBoundedRelativeError(self, talkbuchet):
+        histogram = talkbuchet.LatencyHistogram()
+
+        for latency in range(1, 1001):
+            histogram.record(latency)
+
+        assert histogram.count == 1000
+        assert histogram.max == 1000
+
+        for percentile in [50, 90, 99]:
+            assert histogram.getValueAtPercentile(percentile) == pytest.approx(percentile * 10, rel=1 / 128)
+
+        assert histogram.getValueAtPercentile(100) == 1000
+
+    def testPercentileIsNeverHigherThanMaximum(self, talkbuchet):
+        histogram = talkbuchet.LatencyHistogram()
+
+        histogram.record(10.3)
+
+        assert histogram.getValueAtPercentile(99) == 10.3
+
+    def testNegativeLatenciesAreRecordedAsZero(self, talkbuchet):
+        histogram = talkbuchet.LatencyHistogram()
+
+        histogram.record(-5)
+
+        assert histogram.getCountAtOrBelow(0) == 1
+
+    def testGetCountAtOrBelow(self, talkbuchet):
+        histogram = talkbuchet.LatencyHistogram()
+
+        for latency in [1, 2, 3, 100, 200]:
+            histogram.record(latency)
+
+        assert histogram.getCountAtOrBelow(3) == 3
+        assert histogram.getCountAtOrBelow(150) == 4
+        assert histogram.getCountAtOrBelow(1000) == 5
+
+    def testMerge(self, talkbuchet):
+        histogram = talkbuchet.LatencyHistogram()
+        otherHistogram = talkbuchet.LatencyHistogram()
+
+        histogram.record(1)
+        otherHistogram.record(2)
+        otherHistogram.record(3)
+
+        histogram.merge(otherHistogram)
+
+        assert histogram.count == 3
+        assert histogram.sum == 6
+        assert histogram.max == 3
+        assert histogram.getCountAtOrBelow(3) == 3
+
+    def testMergeWithDifferentSubBuckets(self, talkbuchet):
+        histogram = talkbuchet.LatencyHistogram(128)
+
+        with pytest.raises(Exception):
+            histogram.merge(talkbuchet.LatencyHistogram(64))
+
+
+class TestPercentile:
+
+    def testEmpty(self, talkbuchet):
+        assert talkbuchet._percentile([], 50) == 0
+
+    def testNearestRank(self, talkbuchet):
+        values = list(range(1, 11))
+
+        assert talkbuchet._percentile(values, 0) == 1
+        assert talkbuchet._percentile(values, 50) == 5
+        assert talkbuchet._percentile(values, 55) == 6
+        assert talkbuchet._percentile(values, 100) == 10
+
+    def testSingleValue(self, talkbuchet):
+        assert talkbuchet._percentile([7], 99) == 7
+
+
+class TestRamp:
+
+    def testConstant(self, talkbuchet):
+        rampPolicy = talkbuchet._newRampPolicy(arrival='constant', rate=2)
+
+        assert talkbuchet._getRampArrivalTimes(rampPolicy, 4) == [0, 0.5, 1, 1.5]
+
+    def testConstantWithoutRate(self, talkbuchet):
+        rampPolicy = talkbuchet._newRampPolicy()
+
+        assert talkbuchet._getRampArrivalTimes(rampPolicy, 3) == [0, 0, 0]
+
+    def testNoConnections(self, talkbuchet):
+        rampPolicy = talkbuchet._newRampPolicy(arrival='constant', rate=2)
+
+        assert talkbuchet._getRampArrivalTimes(rampPolicy, 0) == []
+        assert talkbuchet._estimateRampDuration(rampPolicy, 0, 10) == 0
+
+    def testLinear(self, talkbuchet):
+        rampPolicy = talkbuchet._newRampPolicy(arrival='linear', rate=2, startRate=0, rampDuration=2)
+
+        assert talkbuchet._getRampArrivalTimes(rampPolicy, 4) == pytest.approx([0, math.sqrt(2), 2, 2.5])
+
+    def testLinearWithoutAcceleration(self, talkbuchet):
+        rampPolicy = talkbuchet._newRampPolicy(arrival='linear', rate=2, startRate=2, rampDuration=10)
+
+        assert talkbuchet._getRampArrivalTimes(rampPolicy, 3) == [0, 0.5, 1]
+
+    def testStep(self, talkbuchet):
+        rampPolicy = talkbuchet._newRampPolicy(arrival='step', stepSize=2, stepInterval=3)
+
+        assert talkbuchet._getRampArrivalTimes(rampPolicy, 5) == [0, 0, 3, 3, 6]
+
+    def testPoisson(self, talkbuchet):
+        random.seed(0)
+
+        rampPolicy = talkbuchet._newRampPolicy(arrival='poisson', rate=10)
+
+        arrivalTimes = talkbuchet._getRampArrivalTimes(rampPolicy, 100)
+
+        assert arrivalTimes[0] == 0
+        assert arrivalTimes == sorted(arrivalTimes)
+
+    def testInvalidPolicies(self, talkbuchet):
+        with pytest.raises(Exception):
+            talkbuchet._newRampPolicy(arrival='unknown')
+
+        with pytest.raises(Exception):
+            talkbuchet._newRampPolicy(maxInFlight=0)
+
+        with pytest.raises(Exception):
+            talkbuchet._newRampPolicy(arrival='linear')
+
+        with pytest.raises(Exception):
+            talkbuchet._newRampPolicy(rate=-1)
+
+    def testEstimateRampDuration(self, talkbuchet):
+        rampPolicy = talkbuchet._newRampPolicy(maxInFlight=2, arrival='constant', rate=2)
+
+        assert talkbuchet._estimateRampDuration(rampPolicy, 4, 10) == 1.5 + 2 * 10
+
+    def testEstimateRampDurationWithoutLimit(self, talkbuchet):
+        rampPolicy = talkbuchet._newRampPolicy(maxInFlight=None, arrival='constant', rate=2)
+
+        assert talkbuchet._estimateRampDuration(rampPolicy, 4, 10) == 1.5 + 10
+
+    def testEstimateRampDurationOfPoisson(self, talkbuchet):
+        rampPolicy = talkbuchet._newRampPolicy(maxInFlight=None, arrival='poisson', rate=2)
+
+        assert talkbuchet._estimateRampDuration(rampPolicy, 4, 10) == 2 * 4 / 2 + 10
+
+
+class TestMannWhitneyU:
+
+    def testEmptySamples(self, talkbuchet):
+        assert talkbuchet._mannWhitneyU([], [1, 2, 3]) == 1
+        assert talkbuchet._mannWhitneyU([1, 2, 3], []) == 1
+
+    def testAllValuesTied(self, talkbuchet):
+        assert talkbuchet._mannWhitneyU([5, 5, 5], [5, 5]) == 1
+
+    def testIdenticalSamples(self, talkbuchet):
+        assert talkbuchet._mannWhitneyU([1, 2, 3], [1, 2, 3]) == pytest.approx(1)
+
+    def testSeparatedSamples(self, talkbuchet):
+        # U = 0, with mean 4.5 and variance 5.25.
+        expected = math.erfc(4.5 / math.sqrt(5.25) / math.sqrt(2))
+
+        assert talkbuchet._mannWhitneyU([1, 2, 3], [4, 5, 6]) == pytest.approx(expected)
+
+    def testTieCorrection(self, talkbuchet):
+        # The three 2 get the rank 3, so U = 1; the tie correction lowers the
+        # variance from 5.25 to 0.75 * (7 - 24 / 30).
+        expected = math.erfc(3.5 / math.sqrt(0.75 * (7 - 24 / 30)) / math.sqrt(2))
+
+        assert talkbuchet._mannWhitneyU([1, 2, 2], [2, 3, 4]) == pytest.approx(expected)
+
+    def testSymmetry(self, talkbuchet):
+        samples = [1, 3, 3, 7, 9]
+        otherSamples = [2, 3, 8, 10, 11, 12]
+
+        assert talkbuchet._mannWhitneyU(samples, otherSamples) == pytest.approx(talkbuchet._mannWhitneyU(otherSamples, samples))
+
+    def testSignificantDifference(self, talkbuchet):
+        assert talkbuchet._mannWhitneyU(list(range(20)), list(range(100, 120))) < 0.001
+
+
+class TestTwoProportionsZTest:
+
+    def testNoTries(self, talkbuchet):
+        assert talkbuchet._twoProportionsZTest([0, 0], [1, 10]) == 1
+        assert talkbuchet._twoProportionsZTest([1, 10], [0, 0]) == 1
+
+    def testZeroVariance(self, talkbuchet):
+        assert talkbuchet._twoProportionsZTest([0, 10], [0, 20]) == 1
+        assert talkbuchet._twoProportionsZTest([10, 10], [5, 5]) == 1
+
+    def testEqualProportions(self, talkbuchet):
+        assert talkbuchet._twoProportionsZTest([5, 50], [10, 100]) == pytest.approx(1)
+
+    def testDifferentProportions(self, talkbuchet):
+        variance = 0.15 * 0.85 * (1 / 100 + 1 / 100)
+        expected = math.erfc(0.1 / math.sqrt(variance) / math.sqrt(2))
+
+        assert talkbuchet._twoProportionsZTest([10, 100], [20, 100]) == pytest.approx(expected)
+        assert talkbuchet._twoProportionsZTest([20, 100], [10, 100]) == pytest.approx(expected)
+
+
+class TestLogBuffer:
+
+    @pytest.fixture
+    def now(self, talkbuchet, monkeypatch):
+        now = [1000]
+
+        monkeypatch.setattr(talkbuchet, 'monotonic', lambda: now[0])
+
+        return now
+
+    def testRepetitionsAreSuppressed(self, talkbuchet, now, capsys):
+        logBuffer = talkbuchet.LogBuffer(repeatInterval=10)
+
+        logBuffer.addLog('warn', 'Subscriber disconnected 1234', 'warn: Subscriber disconnected 1234')
+        logBuffer.addLog('warn', 'Subscriber disconnected 5678', 'warn: Subscriber disconnected 5678')
+        logBuffer.addLog('warn', 'Subscriber disconnected abcdefghijklmnopqrstuvwxyz', 'warn: Subscriber disconnected abcdefghijklmnopqrstuvwxyz')
+
+        logBuffer.printLogs()
+
+        assert capsys.readouterr().out.splitlines() == [
+            'warn: Subscriber disconnected 1234',
+            'warn: Subscriber disconnected abcdefghijklmnopqrstuvwxyz [repeated 2 times]',
+        ]
+
+    def testDifferentLevelsAreNotRepetitions(self, talkbuchet, now, capsys):
+        logBuffer = talkbuchet.LogBuffer(repeatInterval=10)
+
+        logBuffer.addLog('warn', 'Disconnected 1', 'warn: Disconnected 1')
+        logBuffer.addLog('error', 'Disconnected 2', 'error: Disconnected 2')
+
+        logBuffer.printLogs()
+
+        assert capsys.readouterr().out.splitlines() == [
+            'warn: Disconnected 1',
+            'error: Disconnected 2',
+        ]
+
+    def testRepeatIntervalExpires(self, talkbuchet, now, capsys):
+        logBuffer = talkbuchet.LogBuffer(repeatInterval=10)
+
+        logBuffer.addLog('log', 'Ping 1', 'Ping 1')
+        logBuffer.addLog('log', 'Ping 2', 'Ping 2')
+
+        now[0] += 10
+
+        logBuffer.addLog('log', 'Ping 3', 'Ping 3')
+
+        logBuffer.printLogs()
+
+        assert capsys.readouterr().out.splitlines() == [
+            'Ping 1',
+            'Ping 2 [repeated 1 times]',
+            'Ping 3',
+        ]
+
+    def testRepetitionsAreKeptWithoutRepeatInterval(self, talkbuchet, now, capsys):
+        logBuffer = talkbuchet.LogBuffer(repeatInterval=0)
+
+        logBuffer.addLog('log', 'Ping 1', 'Ping 1')
+        logBuffer.addLog('log', 'Ping 2', 'Ping 2')
+
+        logBuffer.printLogs()
+
+        assert capsys.readouterr().out.splitlines() == ['Ping 1', 'Ping 2']
+
+    def testMinimumLevel(self, talkbuchet, now, capsys):
+        logBuffer = talkbuchet.LogBuffer(minimumLevel='warn')
+
+        logBuffer.addLog('log', 'Ignored', 'Ignored')
+        logBuffer.addLog('error', 'Kept', 'Kept')
+        logBuffer.addLog('unknown', 'Also kept', 'Also kept')
+
+        logBuffer.printLogs()
+
+        assert capsys.readouterr().out.splitlines() == ['Kept', 'Also kept']
+
+    def testInvalidMinimumLevel(self, talkbuchet):
+        with pytest.raises(Exception):
+            talkbuchet.LogBuffer(minimumLevel='verbose')
+
+    def testDroppedLogs(self, talkbuchet, now, capsys):
+        logBuffer = talkbuchet.LogBuffer(maxLength=2, repeatInterval=0)
+
+        for text in ['First', 'Second', 'Third']:
+            logBuffer.addLog('log', text, text)
+
+        logBuffer.printLogs()
+
+        assert capsys.readouterr().out.splitlines() == [
+            '(1 older logs were dropped)',
+            'Second',
+            'Third',
+        ]
+
+
+class TestSelectWrappers:
+
+    wrappers = ['a', 'b', 'c', 'd']
+
+    def testAll(self, talkbuchet):
+        assert talkbuchet._selectWrappers(self.wrappers, None) == [(0, 'a'), (1, 'b'), (2, 'c'), (3, 'd')]
+
+    def testEmpty(self, talkbuchet):
+        assert talkbuchet._selectWrappers([], None) == []
+        assert talkbuchet._selectWrappers([], slice(None)) == []
+
+    def testIndex(self, talkbuchet):
+        assert talkbuchet._selectWrappers(self.wrappers, 2) == [(2, 'c')]
+
+    def testSlice(self, talkbuchet):
+        assert talkbuchet._selectWrappers(self.wrappers, slice(1, None, 2)) == [(1, 'b'), (3, 'd')]
+        assert talkbuchet._selectWrappers(self.wrappers, slice(-2, None)) == [(2, 'c'), (3, 'd')]
+
+    def testRangeAndList(self, talkbuchet):
+        assert talkbuchet._selectWrappers(self.wrappers, range(2)) == [(0, 'a'), (1, 'b')]
+        assert talkbuchet._selectWrappers(self.wrappers, [3, 0]) == [(3, 'd'), (0, 'a')]
+
+    def testFunction(self, talkbuchet):
+        assert talkbuchet._selectWrappers(self.wrappers, lambda wrapper: wrapper in ['b', 'd']) == [(1, 'b'), (3, 'd')]
+
+    def testInvalidSelection(self, talkbuchet):
+        with pytest.raises(Exception):
+            talkbuchet._selectWrappers(self.wrappers, 4)
+
+        with pytest.raises(Exception):
+            talkbuchet._selectWrappers(self.wrappers, -1)
+
+        with pytest.raises(Exception):
+            talkbuchet._selectWrappers(self.wrappers, ['a'])